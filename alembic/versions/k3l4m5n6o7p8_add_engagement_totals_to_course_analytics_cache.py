@@ -0,0 +1,42 @@
+"""add engagement totals and lesson step counts to course_analytics_cache
+
+Revision ID: k3l4m5n6o7p8
+Revises: j2k3l4m5n6o7
+Create Date: 2026-03-02
+
+The course overview reads structure and engagement totals from
+course_analytics_cache instead of scanning step_progress on every request.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'k3l4m5n6o7p8'
+down_revision: Union[str, Sequence[str], None] = 'j2k3l4m5n6o7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('course_analytics_cache', sa.Column('total_completed_steps', sa.Integer(), server_default='0'))
+    op.add_column('course_analytics_cache', sa.Column('total_time_spent_minutes', sa.Integer(), server_default='0'))
+    op.add_column('course_analytics_cache', sa.Column('lesson_step_counts', sa.JSON(), nullable=True))
+    op.alter_column('course_analytics_cache', 'last_calculated_at', nullable=True)
+    # Existing rows were never filled; force a recalculation on first read
+    op.execute("UPDATE course_analytics_cache SET last_calculated_at = NULL")
+
+    op.create_index(
+        'idx_step_progress_course_status',
+        'step_progress',
+        ['course_id', 'status'],
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_step_progress_course_status', table_name='step_progress', if_exists=True)
+    op.drop_column('course_analytics_cache', 'lesson_step_counts')
+    op.drop_column('course_analytics_cache', 'total_time_spent_minutes')
+    op.drop_column('course_analytics_cache', 'total_completed_steps')
@@ -0,0 +1,37 @@
+"""add conversation indexes to messages
+
+Revision ID: l4m5n6o7p8q9
+Revises: k3l4m5n6o7p8
+Create Date: 2026-03-04
+
+Backs the single-query thread list (partner, last message, unread count).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = 'l4m5n6o7p8q9'
+down_revision: Union[str, Sequence[str], None] = 'k3l4m5n6o7p8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'idx_messages_to_from_created',
+        'messages',
+        ['to_user_id', 'from_user_id', 'created_at'],
+        if_not_exists=True
+    )
+    op.create_index(
+        'idx_messages_from_to_created',
+        'messages',
+        ['from_user_id', 'to_user_id', 'created_at'],
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_messages_from_to_created', table_name='messages', if_exists=True)
+    op.drop_index('idx_messages_to_from_created', table_name='messages', if_exists=True)
@@ -0,0 +1,41 @@
+"""add dictionary_lookups table
+
+Revision ID: m5n6o7p8q9r0
+Revises: l4m5n6o7p8q9
+Create Date: 2026-03-06
+
+Persistent cache of /ai-tools/lookup results keyed by normalized word and
+context fingerprint.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'm5n6o7p8q9r0'
+down_revision: Union[str, Sequence[str], None] = 'l4m5n6o7p8q9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('dictionary_lookups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('word', sa.String(length=100), nullable=False),
+        sa.Column('context_fingerprint', sa.String(length=64), nullable=True),
+        sa.Column('result', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_dictionary_lookups_id'), 'dictionary_lookups', ['id'], unique=False)
+    op.create_index(op.f('ix_dictionary_lookups_cache_key'), 'dictionary_lookups', ['cache_key'], unique=True)
+    op.create_index(op.f('ix_dictionary_lookups_word'), 'dictionary_lookups', ['word'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_dictionary_lookups_word'), table_name='dictionary_lookups')
+    op.drop_index(op.f('ix_dictionary_lookups_cache_key'), table_name='dictionary_lookups')
+    op.drop_index(op.f('ix_dictionary_lookups_id'), table_name='dictionary_lookups')
+    op.drop_table('dictionary_lookups')
@@ -0,0 +1,27 @@
+"""add sync_version to users
+
+Revision ID: o7p8q9r0s1t2
+Revises: n6o7p8q9r0s1
+Create Date: 2026-03-16
+
+Version of the last Central Auth user event applied by the RabbitMQ
+consumer, so redelivered or out-of-order events are not applied twice.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'o7p8q9r0s1t2'
+down_revision: Union[str, Sequence[str], None] = 'n6o7p8q9r0s1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('sync_version', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'sync_version')
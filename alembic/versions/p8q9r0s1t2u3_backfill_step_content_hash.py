@@ -0,0 +1,49 @@
+"""backfill steps.content_hash
+
+Revision ID: p8q9r0s1t2u3
+Revises: o7p8q9r0s1t2
+Create Date: 2026-03-17
+
+Compiled quiz answer keys are cached by (step id, content_hash); the hash
+is now kept current on every write to content_text. Fill it in for steps
+saved before that.
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'p8q9r0s1t2u3'
+down_revision: Union[str, Sequence[str], None] = 'o7p8q9r0s1t2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    steps = sa.table('steps', sa.column('id', sa.Integer), sa.column('content_text', sa.Text),
+                     sa.column('content_hash', sa.String(64)))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(steps.c.id, steps.c.content_text)
+            .where(steps.c.id > last_id, steps.c.content_text.isnot(None))
+            .order_by(steps.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            steps.update().where(steps.c.id == sa.bindparam('step_id')).values(content_hash=sa.bindparam('hash')),
+            [{'step_id': row.id, 'hash': hashlib.sha256(row.content_text.encode('utf-8')).hexdigest()} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    # The hashes are derived data; nothing to undo
+    pass
@@ -0,0 +1,81 @@
+"""add quiz_attempt_answers
+
+Revision ID: q9r0s1t2u3v4
+Revises: p8q9r0s1t2u3
+Create Date: 2026-03-18
+
+One row per answered question of a finished quiz attempt, scored against
+the step's answer key, so per-question error rates are a GROUP BY instead
+of decoding every attempt's answers JSON. Existing finished attempts are
+backfilled with the same scoring the app uses (src.services.quiz_answers).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'q9r0s1t2u3v4'
+down_revision: Union[str, Sequence[str], None] = 'p8q9r0s1t2u3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    answers = op.create_table(
+        'quiz_attempt_answers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('attempt_id', sa.Integer(), nullable=False),
+        sa.Column('step_id', sa.Integer(), nullable=False),
+        sa.Column('question_id', sa.String(), nullable=False),
+        sa.Column('user_answer', sa.Text(), nullable=True),
+        sa.Column('is_correct', sa.Boolean(), nullable=True),
+        sa.Column('error_score', sa.Float(), nullable=True),
+        sa.Column('content_hash', sa.String(length=64), nullable=True),
+        sa.ForeignKeyConstraint(['attempt_id'], ['quiz_attempts.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['step_id'], ['steps.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_quiz_attempt_answers_id'), 'quiz_attempt_answers', ['id'], unique=False)
+    op.create_index(op.f('ix_quiz_attempt_answers_attempt_id'), 'quiz_attempt_answers', ['attempt_id'], unique=False)
+    op.create_index('idx_quiz_attempt_answers_step_question', 'quiz_attempt_answers', ['step_id', 'question_id'], unique=False)
+
+    from src.services.quiz_answers import answer_rows
+    from src.services.quiz_content import compile_quiz
+
+    bind = op.get_bind()
+    attempts = sa.table('quiz_attempts', sa.column('id', sa.Integer), sa.column('step_id', sa.Integer),
+                        sa.column('answers', sa.Text), sa.column('is_draft', sa.Boolean))
+    steps = sa.table('steps', sa.column('id', sa.Integer), sa.column('content_text', sa.Text),
+                     sa.column('content_hash', sa.String(64)))
+    quizzes = {}
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(attempts.c.id, attempts.c.step_id, attempts.c.answers)
+            .where(attempts.c.id > last_id, attempts.c.is_draft == sa.false(), attempts.c.answers.isnot(None))
+            .order_by(attempts.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        missing = {row.step_id for row in rows} - quizzes.keys()
+        if missing:
+            for step in bind.execute(sa.select(steps).where(steps.c.id.in_(missing))):
+                quizzes[step.id] = (compile_quiz(step.content_text), step.content_hash)
+        batch = []
+        for row in rows:
+            quiz, content_hash = quizzes.get(row.step_id, (compile_quiz(None), None))
+            batch.extend(answer_rows(row.id, row.step_id, row.answers, quiz, content_hash))
+        if batch:
+            bind.execute(answers.insert(), batch)
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    op.drop_index('idx_quiz_attempt_answers_step_question', table_name='quiz_attempt_answers')
+    op.drop_index(op.f('ix_quiz_attempt_answers_attempt_id'), table_name='quiz_attempt_answers')
+    op.drop_index(op.f('ix_quiz_attempt_answers_id'), table_name='quiz_attempt_answers')
+    op.drop_table('quiz_attempt_answers')
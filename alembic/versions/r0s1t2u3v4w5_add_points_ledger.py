@@ -0,0 +1,72 @@
+"""add points ledger
+
+Revision ID: r0s1t2u3v4w5
+Revises: q9r0s1t2u3v4
+Create Date: 2026-03-24
+
+Weekly and monthly point totals per user (point_totals), ranked through
+(period, period_start, points), replacing the extract(year/month) sums
+over point_history. Teacher bonuses get a structured awarded_by column in
+place of the 'teacher:<id>' description search. Both are backfilled from
+the existing history; weeks start on Monday, UTC (src.services.points_ledger).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'r0s1t2u3v4w5'
+down_revision: Union[str, Sequence[str], None] = 'q9r0s1t2u3v4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('point_history', sa.Column('awarded_by', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_point_history_awarded_by', 'point_history', 'users', ['awarded_by'], ['id'], ondelete='SET NULL')
+    op.create_index('ix_point_history_awarded_by_created', 'point_history', ['awarded_by', 'created_at'], unique=False)
+    op.create_index('ix_users_role_activity_points', 'users', ['role', 'activity_points'], unique=False)
+
+    op.create_table(
+        'point_totals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('period', sa.String(length=8), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('points', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'period', 'period_start', name='uq_point_total_user_period'),
+    )
+    op.create_index(op.f('ix_point_totals_id'), 'point_totals', ['id'], unique=False)
+    op.create_index('ix_point_totals_period_points', 'point_totals', ['period', 'period_start', 'points'], unique=False)
+
+    op.execute("""
+        UPDATE point_history ph
+        SET awarded_by = CAST(substring(ph.description FROM '^teacher:([0-9]+)\\|') AS INTEGER)
+        WHERE ph.reason = 'teacher_bonus'
+          AND EXISTS (
+              SELECT 1 FROM users u
+              WHERE u.id = CAST(substring(ph.description FROM '^teacher:([0-9]+)\\|') AS INTEGER)
+          )
+    """)
+    for period in ('week', 'month'):
+        op.execute(f"""
+            INSERT INTO point_totals (user_id, period, period_start, points, updated_at)
+            SELECT user_id, '{period}', CAST(date_trunc('{period}', created_at) AS DATE), SUM(amount), now()
+            FROM point_history
+            WHERE created_at IS NOT NULL
+            GROUP BY user_id, CAST(date_trunc('{period}', created_at) AS DATE)
+        """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_point_totals_period_points', table_name='point_totals')
+    op.drop_index(op.f('ix_point_totals_id'), table_name='point_totals')
+    op.drop_table('point_totals')
+    op.drop_index('ix_users_role_activity_points', table_name='users')
+    op.drop_index('ix_point_history_awarded_by_created', table_name='point_history')
+    op.drop_constraint('fk_point_history_awarded_by', 'point_history', type_='foreignkey')
+    op.drop_column('point_history', 'awarded_by')
@@ -0,0 +1,93 @@
+"""add blob store
+
+Revision ID: s1t2u3v4w5x6
+Revises: r0s1t2u3v4w5
+Create Date: 2026-03-30
+
+Reference table for content-addressed uploads (stored_blobs,
+file_references) with per-user usage and store-wide counters for quotas
+and the storage report. Files uploaded before this are brought into the
+store by scripts/migrate_uploads_to_blob_store.py, which needs the upload
+directory and so is not run here.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 's1t2u3v4w5x6'
+down_revision: Union[str, Sequence[str], None] = 'r0s1t2u3v4w5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stored_blobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('unreferenced_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sha256'),
+    )
+    op.create_index(op.f('ix_stored_blobs_id'), 'stored_blobs', ['id'], unique=False)
+    op.create_index('ix_stored_blobs_unreferenced', 'stored_blobs', ['ref_count', 'unreferenced_at'], unique=False)
+
+    op.create_table(
+        'file_references',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('blob_id', sa.Integer(), nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('owner_type', sa.String(length=32), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.Column('uploaded_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['blob_id'], ['stored_blobs.id']),
+        sa.ForeignKeyConstraint(['uploaded_by'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('path'),
+    )
+    op.create_index(op.f('ix_file_references_id'), 'file_references', ['id'], unique=False)
+    op.create_index(op.f('ix_file_references_blob_id'), 'file_references', ['blob_id'], unique=False)
+    op.create_index(op.f('ix_file_references_uploaded_by'), 'file_references', ['uploaded_by'], unique=False)
+    op.create_index('ix_file_references_owner', 'file_references', ['owner_type', 'owner_id'], unique=False)
+
+    op.create_table(
+        'user_storage_usage',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('bytes_used', sa.BigInteger(), nullable=False),
+        sa.Column('file_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_index(op.f('ix_user_storage_usage_bytes_used'), 'user_storage_usage', ['bytes_used'], unique=False)
+
+    totals = op.create_table(
+        'storage_totals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('logical_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('reference_count', sa.Integer(), nullable=False),
+        sa.Column('physical_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('blob_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.bulk_insert(totals, [{'id': 1, 'logical_bytes': 0, 'reference_count': 0, 'physical_bytes': 0, 'blob_count': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('storage_totals')
+    op.drop_index(op.f('ix_user_storage_usage_bytes_used'), table_name='user_storage_usage')
+    op.drop_table('user_storage_usage')
+    op.drop_index('ix_file_references_owner', table_name='file_references')
+    op.drop_index(op.f('ix_file_references_uploaded_by'), table_name='file_references')
+    op.drop_index(op.f('ix_file_references_blob_id'), table_name='file_references')
+    op.drop_index(op.f('ix_file_references_id'), table_name='file_references')
+    op.drop_table('file_references')
+    op.drop_index('ix_stored_blobs_unreferenced', table_name='stored_blobs')
+    op.drop_index(op.f('ix_stored_blobs_id'), table_name='stored_blobs')
+    op.drop_table('stored_blobs')
@@ -0,0 +1,33 @@
+"""add cache generations
+
+Revision ID: t2u3v4w5x6y7
+Revises: s1t2u3v4w5x6
+Create Date: 2026-04-02
+
+Generation counters for per-process caches (src.services.cache_generations):
+a commit that changes a cache's source rows bumps its row, and every worker
+rebuilds entries tagged with an older generation.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 't2u3v4w5x6y7'
+down_revision: Union[str, Sequence[str], None] = 's1t2u3v4w5x6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'cache_generations',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('generation', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('cache_generations')
@@ -0,0 +1,67 @@
+"""add user blob usage
+
+Revision ID: u3v4w5x6y7z8
+Revises: t2u3v4w5x6y7
+Create Date: 2026-04-03
+
+Users are charged once per distinct blob instead of once per reference:
+user_blob_usage counts each user's references per blob, and
+user_storage_usage.bytes_used is recomputed from it. Submission uploads are
+now owned by the submission that uses them (they were owned by the
+assignment); uploads no submission uses are left unowned, so the blob
+collector releases them.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'u3v4w5x6y7z8'
+down_revision: Union[str, Sequence[str], None] = 't2u3v4w5x6y7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_blob_usage',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('blob_id', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['blob_id'], ['stored_blobs.id']),
+        sa.PrimaryKeyConstraint('user_id', 'blob_id'),
+    )
+    op.create_index(op.f('ix_user_blob_usage_blob_id'), 'user_blob_usage', ['blob_id'], unique=False)
+
+    op.execute("""
+        INSERT INTO user_blob_usage (user_id, blob_id, ref_count)
+        SELECT uploaded_by, blob_id, COUNT(*) FROM file_references
+        WHERE uploaded_by IS NOT NULL
+        GROUP BY uploaded_by, blob_id
+    """)
+    op.execute("""
+        UPDATE user_storage_usage SET bytes_used = COALESCE((
+            SELECT SUM(b.size_bytes) FROM user_blob_usage u JOIN stored_blobs b ON b.id = u.blob_id
+            WHERE u.user_id = user_storage_usage.user_id
+        ), 0)
+    """)
+    op.execute("""
+        UPDATE file_references SET owner_id = (
+            SELECT MIN(s.id) FROM assignment_submissions s
+            WHERE s.file_url = '/uploads/' || file_references.path
+               OR s.answers LIKE '%/uploads/' || file_references.path || '%'
+        )
+        WHERE owner_type = 'submission'
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        UPDATE user_storage_usage SET bytes_used = COALESCE((
+            SELECT SUM(r.size_bytes) FROM file_references r WHERE r.uploaded_by = user_storage_usage.user_id
+        ), 0)
+    """)
+    op.drop_index(op.f('ix_user_blob_usage_blob_id'), table_name='user_blob_usage')
+    op.drop_table('user_blob_usage')
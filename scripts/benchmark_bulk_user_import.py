@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark the bulk user import (/admin/users/bulk) against the old
+row-by-row path.
+
+Runs against a throwaway SQLite database unless --db-url is given. The old
+path hashes on the request thread, so with real bcrypt it needs minutes for
+1k users; by default it runs on a sample and is extrapolated.
+
+    python -m scripts.benchmark_bulk_user_import --users 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("POSTGRES_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'lms-benchmark.db')}")
+
+from sqlalchemy import ARRAY, create_engine, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from src.models import Base
+from src.schemas.models import Group, GroupStudent, UserInDB
+from src.services import bulk_user_import
+from src.services.bulk_user_import import ImportRow, generate_password, generate_student_id, import_users
+from src.utils.auth_utils import hash_password
+
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@compiles(ARRAY, "sqlite")
+def _compile_array_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+def legacy_import(db, rows):
+    """The per-row loop the bulk endpoints used before"""
+    for row in rows:
+        if db.query(UserInDB).filter(UserInDB.email == row.email).first():
+            continue
+        student_id = generate_student_id()
+        while db.query(UserInDB).filter(UserInDB.student_id == student_id).first():
+            student_id = generate_student_id()
+        user = UserInDB(
+            email=row.email, name=row.name, hashed_password=hash_password(row.password),
+            role=row.role, student_id=student_id, is_active=True,
+        )
+        db.add(user)
+        db.flush()
+        for group_id in row.group_ids:
+            if db.query(Group).filter(Group.id == group_id).first():
+                if not db.query(GroupStudent).filter(
+                    GroupStudent.group_id == group_id, GroupStudent.student_id == user.id
+                ).first():
+                    db.add(GroupStudent(group_id=group_id, student_id=user.id))
+    db.commit()
+
+
+def make_rows(prefix, count, group_id):
+    return [
+        ImportRow(email=f"{prefix}{i}@example.com", name=f"Student {i}", password=generate_password(), group_ids=[group_id])
+        for i in range(count)
+    ]
+
+
+def timed(engine, fn):
+    queries = 0
+
+    def count(*args):
+        nonlocal queries
+        queries += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return time.perf_counter() - started, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--baseline-sample", type=int, default=50, help="rows of the old path to run and extrapolate from")
+    parser.add_argument("--full-baseline", action="store_true", help="run the old path for every row")
+    parser.add_argument("--db-url", help="database to benchmark against (tables are created, rows left behind)")
+    args = parser.parse_args()
+
+    if args.db_url:
+        engine = create_engine(args.db_url)
+    else:
+        engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    teacher = UserInDB(email=f"bench-teacher-{time.time_ns()}@example.com", name="Teacher", hashed_password="x", role="teacher")
+    db.add(teacher)
+    db.flush()
+    group = Group(name="Benchmark group", teacher_id=teacher.id, is_active=True)
+    db.add(group)
+    db.commit()
+    run_id = time.time_ns()
+
+    print(f"Importing {args.users} users, {bulk_user_import.BULK_IMPORT_HASH_PROCESSES} hashing processes")
+
+    # Warm the pool so process start-up is not billed to the import
+    bulk_user_import.hash_passwords(["warmup"] * bulk_user_import.BULK_IMPORT_MIN_POOL_BATCH)
+
+    def bulk():
+        created, failed = import_users(db, make_rows(f"bulk-{run_id}-", args.users, group.id))
+        db.commit()
+        assert len(created) == args.users and not failed, failed
+
+    bulk_seconds, bulk_queries = timed(engine, bulk)
+
+    baseline_rows = args.users if args.full_baseline else min(args.baseline_sample, args.users)
+    legacy_seconds, legacy_queries = timed(
+        engine, lambda: legacy_import(db, make_rows(f"legacy-{run_id}-", baseline_rows, group.id))
+    )
+    scale = args.users / baseline_rows
+    db.close()
+    bulk_user_import.stop_hash_pool()
+
+    label = "measured" if scale == 1 else f"extrapolated from {baseline_rows} rows"
+    print(f"  row by row: {legacy_seconds * scale:8.2f}s  {int(legacy_queries * scale):6d} queries  ({label})")
+    print(f"  bulk:       {bulk_seconds:8.2f}s  {bulk_queries:6d} queries")
+    print(f"  speedup:    {legacy_seconds * scale / bulk_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark the monthly /gamification/leaderboard and /gamification/status
+rank over the point_totals ledger against the old extract(year/month) sums
+over point_history.
+
+Runs against a throwaway SQLite database unless --db-url is given. History
+rows and their totals are bulk-inserted first; only the reads are timed.
+
+    python -m scripts.benchmark_leaderboard --awards 200000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("POSTGRES_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'lms-benchmark.db')}")
+
+from sqlalchemy import ARRAY, create_engine, extract, func, insert
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from src.gamification.routes.gamification import get_gamification_status, get_leaderboard
+from src.models import Base
+from src.schemas.models import PointHistory, PointTotal, UserInDB
+from src.services.points_ledger import PERIODS, period_bounds
+
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@compiles(ARRAY, "sqlite")
+def _compile_array_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+def legacy_monthly(db, user_id, limit):
+    """The leaderboard query and rank recount the routes ran before"""
+    now = datetime.now(timezone.utc)
+    in_month = (extract('year', PointHistory.created_at) == now.year,
+                extract('month', PointHistory.created_at) == now.month)
+    top = db.query(PointHistory.user_id, func.sum(PointHistory.amount)).filter(*in_month).group_by(
+        PointHistory.user_id).order_by(func.sum(PointHistory.amount).desc()).limit(limit).all()
+    mine = db.query(func.coalesce(func.sum(PointHistory.amount), 0)).filter(
+        PointHistory.user_id == user_id, *in_month).scalar()
+    totals = db.query(PointHistory.user_id, func.sum(PointHistory.amount).label('total')).filter(
+        *in_month).group_by(PointHistory.user_id).subquery()
+    ahead = db.query(func.count()).select_from(totals).filter(totals.c.total > mine).scalar()
+    return top, ahead + 1
+
+
+def seed(db, award_count, student_count, rng):
+    students = [{"id": i + 1, "email": f"s{i}@example.com", "name": f"S{i}", "hashed_password": "x",
+                 "role": "student", "activity_points": 0} for i in range(student_count)]
+    db.execute(insert(UserInDB), students)
+    now = datetime.now(timezone.utc)
+    history, totals = [], {}
+    for _ in range(award_count):
+        user_id = rng.randrange(1, student_count + 1)
+        amount = rng.randrange(1, 50)
+        at = now - timedelta(minutes=rng.randrange(0, 60 * 24 * 365))
+        history.append({"user_id": user_id, "amount": amount, "reason": "homework", "created_at": at})
+        students[user_id - 1]["activity_points"] += amount
+        for period in PERIODS:
+            key = (user_id, period, period_bounds(period, at)[0])
+            totals[key] = totals.get(key, 0) + amount
+    db.execute(insert(PointHistory), history)
+    db.execute(insert(PointTotal), [{"user_id": u, "period": p, "period_start": s, "points": points}
+                                    for (u, p, s), points in totals.items()])
+    db.commit()
+    user = students[0]
+    return UserInDB(id=user["id"], email=user["email"], name=user["name"], role="student",
+                    activity_points=user["activity_points"], daily_streak=0, is_active=True)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--awards", type=int, default=200000)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--db-url", default=None)
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{tempfile.mkdtemp()}/leaderboard.db"
+    engine = create_engine(db_url)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    print(f"Seeding {args.awards} awards over {args.students} students")
+    student = seed(db, args.awards, args.students, random.Random(1))
+
+    legacy_seconds, (legacy_top, legacy_rank) = timed(lambda: legacy_monthly(db, student.id, 50))
+
+    def ledger():
+        board = get_leaderboard(period="monthly", group_id=None, limit=50, current_user=student, db=db)
+        return board, get_gamification_status(current_user=student, db=db)
+
+    ledger_seconds, (board, status) = timed(ledger)
+    assert [e.points for e in board.entries] == [int(points) for _, points in legacy_top]
+    assert status.rank_this_month == board.my_rank == legacy_rank
+
+    print(f"  history sums:  {legacy_seconds * 1000:8.1f} ms")
+    print(f"  ledger:        {ledger_seconds * 1000:8.1f} ms  ({legacy_seconds / ledger_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
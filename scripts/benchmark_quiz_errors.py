@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark /analytics/course/{id}/quiz-errors over the quiz_attempt_answers
+rows against the old scan that loaded every attempt and decoded its answers.
+
+Runs against a throwaway SQLite database unless --db-url is given. Attempts
+and their answer rows are bulk-inserted first; only the report is timed.
+
+    python -m scripts.benchmark_quiz_errors --attempts 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("POSTGRES_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'lms-benchmark.db')}")
+
+from sqlalchemy import ARRAY, create_engine, insert
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from src.admin.routes.analytics import get_quiz_question_errors
+from src.models import Base
+from src.schemas.models import Course, Lesson, Module, QuizAttempt, QuizAttemptAnswer, Step, UserInDB
+from src.services.quiz_answers import answer_rows
+from src.services.quiz_content import get_compiled_quiz, iter_answers
+
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@compiles(ARRAY, "sqlite")
+def _compile_array_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+def legacy_question_errors(db, course_id):
+    """The attempt scan the report ran before (with compiled answer keys)"""
+    attempts = db.query(QuizAttempt).filter(
+        QuizAttempt.course_id == course_id, QuizAttempt.is_draft == False, QuizAttempt.answers.isnot(None)
+    ).all()
+    steps = db.query(Step).filter(Step.id.in_({a.step_id for a in attempts})).all()
+    quizzes = {s.id: get_compiled_quiz(s) for s in steps}
+    stats = {}
+    for attempt in attempts:
+        quiz = quizzes[attempt.step_id]
+        for qid, val in iter_answers(attempt.answers):
+            err = quiz.error_score(qid, val)
+            if err is not None:
+                total, wrong = stats.get((attempt.step_id, str(qid)), (0, 0.0))
+                stats[(attempt.step_id, str(qid))] = (total + 1, wrong + err)
+    return len(attempts), stats
+
+
+def seed(db, attempt_count, step_count, question_count, rng):
+    admin = UserInDB(email="admin@example.com", name="Admin", hashed_password="x", role="admin")
+    students = [UserInDB(email=f"s{i}@example.com", name=f"S{i}", hashed_password="x", role="student") for i in range(200)]
+    db.add_all([admin, *students])
+    db.flush()
+    course = Course(title="Benchmark", teacher_id=admin.id)
+    db.add(course)
+    db.flush()
+    module = Module(course_id=course.id, title="M", order_index=1)
+    db.add(module)
+    db.flush()
+    lesson = Lesson(module_id=module.id, title="L", order_index=1)
+    db.add(lesson)
+    db.flush()
+    steps = []
+    for n in range(step_count):
+        questions = [{"id": f"q{i}", "question_type": "short_answer", "question_text": f"Q{i}",
+                      "correct_answer": "1/2|0.5" if i % 2 else "paris"} for i in range(question_count)]
+        steps.append(Step(lesson_id=lesson.id, title=f"Quiz {n}", content_type="quiz", order_index=n,
+                          content_text=json.dumps({"questions": questions})))
+    db.add_all(steps)
+    db.commit()
+
+    attempts = []
+    for i in range(attempt_count):
+        step = rng.choice(steps)
+        answers = {f"q{q}": rng.choice(["paris", "Lyon", "0,5", "1/3"]) for q in range(question_count)}
+        attempts.append({"id": i + 1, "user_id": rng.choice(students).id, "step_id": step.id, "course_id": course.id,
+                         "lesson_id": lesson.id, "total_questions": question_count, "correct_answers": 0,
+                         "score_percentage": 0, "answers": json.dumps(answers), "is_draft": False})
+    db.execute(insert(QuizAttempt), attempts)
+    quizzes = {s.id: (get_compiled_quiz(s), s.content_hash) for s in steps}
+    rows = []
+    for attempt in attempts:
+        quiz, content_hash = quizzes[attempt["step_id"]]
+        rows.extend(answer_rows(attempt["id"], attempt["step_id"], attempt["answers"], quiz, content_hash))
+    db.execute(insert(QuizAttemptAnswer), rows)
+    db.commit()
+    # A detached principal, as the route gets from the auth dependency
+    return UserInDB(id=admin.id, email=admin.email, name=admin.name, role="admin", is_active=True), course.id
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=50000)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--db-url", default=None)
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{tempfile.mkdtemp()}/quiz-errors.db"
+    engine = create_engine(db_url)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    print(f"Seeding {args.attempts} attempts over {args.steps} quizzes of {args.questions} questions")
+    admin, course_id = seed(db, args.attempts, args.steps, args.questions, random.Random(1))
+    db.expunge_all()
+
+    legacy_seconds, (legacy_count, legacy) = timed(lambda: legacy_question_errors(db, course_id))
+    db.expunge_all()
+    report = lambda: get_quiz_question_errors(course_id, group_id=None, lesson_id=None, limit=500, current_user=admin, db=db)
+    grouped_seconds, result = timed(report)
+    assert result["total_attempts_analyzed"] == legacy_count
+    assert {(q["step_id"], q["question_id"]): q["total_attempts"] for q in result["questions"]} == \
+        {key: total for key, (total, wrong) in legacy.items() if wrong / total >= 0.05}
+
+    print(f"  attempt scan:  {legacy_seconds * 1000:8.1f} ms")
+    print(f"  GROUP BY:      {grouped_seconds * 1000:8.1f} ms  ({legacy_seconds / grouped_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Benchmark quiz-error scoring (/analytics/course/{id}/quiz-errors) with
+compiled answer keys against the old per-answer normalization.
+
+Steps and attempts are built in memory (no database): --steps quizzes of
+--questions questions each, mixing short answers with alternatives and
+fractions and multi-gap fill-blanks, and --attempts attempts spread over
+them. "attempt scan" is the floor: decoding each attempt's answers and
+walking them without scoring.
+
+    python -m scripts.benchmark_quiz_scoring --attempts 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("POSTGRES_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'lms-benchmark.db')}")
+
+from src.schemas.models import Step
+from src.services import quiz_content
+from src.services.quiz_content import get_compiled_quiz, iter_answers
+
+
+def legacy_error_score(step_content, question_id, user_answer):
+    """The per-answer check get_quiz_question_errors ran before"""
+    questions = step_content.get("questions", [])
+    for q in questions:
+        if str(q.get("id")) == str(question_id):
+            if q.get("question_type") == "long_text":
+                return None
+            actual_correct = q.get("correct_answer")
+            if actual_correct is None:
+                actual_correct = q.get("correctAnswer")
+
+            def norm_val(v):
+                if v is None: return ""
+                s = str(v).strip().lower()
+                s = s.replace(",", ".")
+                s = "".join(s.split())
+                if s.startswith("[") and s.endswith("]") and "," not in s:
+                    s = s[1:-1].strip()
+                return s
+
+            def to_float(s):
+                try:
+                    if "/" in s:
+                        parts = s.split("/")
+                        if len(parts) == 2:
+                            return float(parts[0]) / float(parts[1])
+                    return float(s)
+                except:
+                    return None
+
+            def check_match(u, a):
+                u_norm = norm_val(u)
+                options = [norm_val(o) for o in str(a).strip().lower().split("|")]
+                if u_norm in options:
+                    return True
+                u_float = to_float(u_norm)
+                if u_float is not None:
+                    for opt in options:
+                        o_float = to_float(opt)
+                        if o_float is not None and abs(u_float - o_float) < 0.0001:
+                            return True
+                return False
+
+            if actual_correct is None: return None
+            if isinstance(actual_correct, str) and not actual_correct.strip(): return None
+            if isinstance(actual_correct, list) and len(actual_correct) == 0: return None
+            if isinstance(actual_correct, list) and all(not norm_val(x) for x in actual_correct): return None
+            if isinstance(actual_correct, list):
+                u_list = user_answer if isinstance(user_answer, list) else [user_answer]
+                mismatches = 0
+                for i in range(len(actual_correct)):
+                    if not check_match(u_list[i] if i < len(u_list) else "", actual_correct[i]):
+                        mismatches += 1
+                if len(u_list) > len(actual_correct):
+                    mismatches += len(u_list) - len(actual_correct)
+                return min(mismatches / max(len(actual_correct), 1), 1.0)
+            u_val = user_answer[0] if isinstance(user_answer, list) and user_answer else user_answer
+            return 0.0 if check_match(u_val, actual_correct) else 1.0
+    return None
+
+
+def legacy_scan(steps, attempts):
+    step_data = {s.id: json.loads(s.content_text) for s in steps}
+    totals = {}
+    for step_id, answers in attempts:
+        content = step_data[step_id]
+        for qid, val in json.loads(answers).items():
+            err = legacy_error_score(content, qid, val)
+            if err is not None:
+                totals[(step_id, qid)] = totals.get((step_id, qid), 0) + err
+    return totals
+
+
+def compiled_scan(steps, attempts):
+    quizzes = {s.id: get_compiled_quiz(s) for s in steps}
+    totals = {}
+    for step_id, answers in attempts:
+        quiz = quizzes[step_id]
+        for qid, val in iter_answers(answers):
+            err = quiz.error_score(qid, val)
+            if err is not None:
+                totals[(step_id, qid)] = totals.get((step_id, qid), 0) + err
+    return totals
+
+
+def bare_scan(steps, attempts):
+    seen = 0
+    for step_id, answers in attempts:
+        for qid, val in iter_answers(answers):
+            seen += 1
+    return seen
+
+
+def make_data(step_count, question_count, attempt_count, seed):
+    rng = random.Random(seed)
+    steps, keys = [], {}
+    for step_id in range(1, step_count + 1):
+        questions = []
+        for n in range(question_count):
+            qid = f"q{n}"
+            if n % 3 == 0:
+                correct = ["Paris", "Rome|Roma", "1/2"]
+                questions.append({"id": qid, "question_type": "fill_blank", "question_text": f"Gaps {n}", "correct_answer": correct})
+            elif n % 3 == 1:
+                correct = "1/16|0.0625"
+                questions.append({"id": qid, "question_type": "short_answer", "question_text": f"Fraction {n}", "correct_answer": correct})
+            else:
+                correct = "photosynthesis"
+                questions.append({"id": qid, "question_type": "short_answer", "question_text": f"Term {n}", "correct_answer": correct})
+            keys[(step_id, qid)] = correct
+        steps.append(Step(id=step_id, lesson_id=1, title=f"Quiz {step_id}", content_type="quiz",
+                          content_text=json.dumps({"title": f"Quiz {step_id}", "questions": questions})))
+    attempts = []
+    for _ in range(attempt_count):
+        step_id = rng.randrange(1, step_count + 1)
+        answers = {}
+        for n in range(question_count):
+            correct = keys[(step_id, f"q{n}")]
+            if isinstance(correct, list):
+                answers[f"q{n}"] = rng.choice([["paris", "roma", "0,5"], ["Paris", "Milan", "1/3"], ["lyon"]])
+            else:
+                answers[f"q{n}"] = rng.choice(["1/16", "0,0625", "1/8", "Photosynthesis ", "respiration"])
+        attempts.append((step_id, json.dumps(answers)))
+    return steps, attempts
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=50000)
+    parser.add_argument("--steps", type=int, default=40)
+    parser.add_argument("--questions", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"Scoring {args.attempts} attempts over {args.steps} quizzes of {args.questions} questions")
+    steps, attempts = make_data(args.steps, args.questions, args.attempts, seed=1)
+
+    scan_seconds, _ = timed(lambda: bare_scan(steps, attempts))
+    legacy_seconds, legacy = timed(lambda: legacy_scan(steps, attempts))
+    quiz_content.clear_quiz_cache()
+    cold_seconds, compiled = timed(lambda: compiled_scan(steps, attempts))
+    warm_seconds, _ = timed(lambda: compiled_scan(steps, attempts))
+    assert legacy == compiled
+
+    print(f"  attempt scan:      {scan_seconds * 1000:8.1f} ms")
+    print(f"  per-answer parse:  {legacy_seconds * 1000:8.1f} ms")
+    print(f"  compiled (cold):   {cold_seconds * 1000:8.1f} ms  ({legacy_seconds / cold_seconds:.1f}x)")
+    print(f"  compiled (cached): {warm_seconds * 1000:8.1f} ms  ({legacy_seconds / warm_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Benchmark the batched RabbitMQ user-sync consumer against one-at-a-time
+consumption (prefetch 1, one transaction and one ack per message, which is
+what the consumer did before).
+
+Both runs go through RabbitMQConsumer.start_consuming against an in-process
+broker stand-in that enforces prefetch and charges --rtt-ms for every ack
+and publish, and write to a throwaway SQLite database unless --db-url is
+given.
+
+    python -m scripts.benchmark_rabbitmq_consumer --users 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("POSTGRES_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'lms-benchmark.db')}")
+
+from sqlalchemy import ARRAY, create_engine, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from src.models import Base
+from src.services.rabbitmq_consumer import RabbitMQConsumer
+
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@compiles(ARRAY, "sqlite")
+def _compile_array_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+class LocalBroker:
+    """
+    In-process stand-in for a RabbitMQ connection and channel: queues,
+    prefetch-limited delivery, (multiple) acks and default-exchange publishes.
+    """
+
+    def __init__(self, rtt: float = 0.0):
+        self.rtt = rtt
+        self.queues = defaultdict(deque)
+        self.unacked = OrderedDict()
+        self.prefetch = 0
+        self.consumer = None
+        self.next_tag = 1
+        self.round_trips = 0
+        self.is_open = True
+        self._lock = threading.Lock()
+
+    # Connection
+    def channel(self):
+        return self
+
+    def close(self):
+        self.is_open = False
+
+    def process_data_events(self, time_limit=0):
+        delivered = 0
+        while True:
+            with self._lock:
+                queue = self.queues[self.consumer[0]]
+                if not queue or (self.prefetch and len(self.unacked) >= self.prefetch):
+                    break
+                body, properties = queue.popleft()
+                tag = self.next_tag
+                self.next_tag += 1
+                self.unacked[tag] = (body, properties)
+            self.consumer[1](self, SimpleNamespace(delivery_tag=tag), properties, body)
+            delivered += 1
+        if not delivered:
+            time.sleep(min(time_limit, 0.005))
+
+    # Channel
+    def exchange_declare(self, **kwargs):
+        pass
+
+    def queue_declare(self, queue, **kwargs):
+        self.queues[queue]
+        return SimpleNamespace(method=SimpleNamespace(queue=queue))
+
+    def queue_bind(self, **kwargs):
+        pass
+
+    def basic_qos(self, prefetch_count):
+        self.prefetch = prefetch_count
+
+    def basic_consume(self, queue, on_message_callback):
+        self.consumer = (queue, on_message_callback)
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self._round_trip()
+        with self._lock:
+            tags = [tag for tag in self.unacked if tag <= delivery_tag] if multiple else [delivery_tag]
+            for tag in tags:
+                del self.unacked[tag]
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self._round_trip()
+        with self._lock:
+            self.queues[routing_key].append((body, properties))
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def drained(self, queue):
+        with self._lock:
+            return not self.queues[queue] and not self.unacked
+
+
+def make_messages(prefix, users, updates):
+    messages = []
+    for i in range(users):
+        user = {"id": f"{prefix}-{i}", "email": f"{prefix}-{i}@example.com", "first_name": "Student",
+                "last_name": str(i), "role": "student", "allowed_services_json": '["lms"]', "password_hash": "x"}
+        messages.append({"event_type": "user.created", "version": 1, "user": user})
+    for n in range(updates):
+        i = n % users
+        user = {"email": f"{prefix}-{i}@example.com", "first_name": "Renamed", "last_name": str(n),
+                "role": "student", "allowed_services_json": '["lms"]'}
+        messages.append({"event_type": "user.updated", "version": 2 + n // users, "user": user})
+    return [json.dumps(message).encode() for message in messages]
+
+
+def run(engine, messages, rtt, **settings):
+    Session = sessionmaker(bind=engine, autoflush=False)
+    broker = LocalBroker(rtt=rtt)
+    consumer = RabbitMQConsumer("amqp://local", "user_events", session_factory=Session,
+                                connection_factory=lambda: broker, **settings)
+    for body in messages:
+        broker.queues[consumer.queue].append((body, None))
+
+    queries = 0
+
+    def count(*args):
+        nonlocal queries
+        queries += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    thread = threading.Thread(target=consumer.start_consuming, daemon=True)
+    thread.start()
+    while not broker.drained(consumer.queue):
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    consumer.stop()
+    thread.join()
+    event.remove(engine, "before_cursor_execute", count)
+    return elapsed, queries, broker.round_trips, consumer.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=2000, help="user.updated events after the user.created ones")
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="simulated broker round trip per ack/publish")
+    parser.add_argument("--prefetch", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--batch-timeout-ms", type=int, default=50)
+    parser.add_argument("--db-url", help="database to benchmark against (tables are created, rows left behind)")
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    Base.metadata.create_all(engine)
+    run_id = time.time_ns()
+    total = args.users + args.updates
+    rtt = args.rtt_ms / 1000
+
+    print(f"Consuming {args.users} user.created + {args.updates} user.updated events, {args.rtt_ms}ms broker round trip")
+    results = [
+        ("one at a time", run(engine, make_messages(f"single-{run_id}", args.users, args.updates), rtt,
+                              prefetch=1, batch_size=1, batch_timeout_ms=0)),
+        ("batched", run(engine, make_messages(f"batched-{run_id}", args.users, args.updates), rtt,
+                        prefetch=args.prefetch, batch_size=args.batch_size, batch_timeout_ms=args.batch_timeout_ms)),
+    ]
+    for label, (seconds, queries, round_trips, stats) in results:
+        print(f"  {label:14s} {seconds:8.2f}s  {total / seconds:8.0f} msg/s  {queries:6d} queries  "
+              f"{round_trips:6d} broker round trips  {stats['batches']} batches")
+    print(f"  speedup:       {results[0][1][0] / results[1][1][0]:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
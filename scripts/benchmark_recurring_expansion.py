@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark recurring-event expansion (EventService.expand_recurring_events)
+against the old day-by-day walk that built a transient ORM Event per
+occurrence.
+
+Parents are built in memory (no database): a mix of daily, weekly, biweekly
+and monthly events created up to --history-days ago, each linked to two
+groups. The window is one calendar month, as /events/calendar asks for.
+
+    python -m scripts.benchmark_recurring_expansion --parents 5000
+"""
+import argparse
+import calendar
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("POSTGRES_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'lms-benchmark.db')}")
+
+from src.schemas.models import Event, EventGroup, UserInDB
+from src.services import recurrence
+from src.services.event_service import EventService
+
+PATTERNS = ["daily", "weekly", "weekly", "biweekly", "monthly"]
+
+
+def legacy_expand(parents, start_date, end_date):
+    """The loop expand_recurring_events ran before"""
+    generated = []
+    for parent in parents:
+        current_start = parent.start_datetime
+        duration = parent.end_datetime - parent.start_datetime
+        original_start_day = parent.start_datetime.day
+        parent_group_ids = [eg.group_id for eg in parent.event_groups] if parent.event_groups else []
+        instance_counter = 1
+        while current_start <= end_date:
+            if start_date <= current_start <= end_date:
+                virtual_event = Event(
+                    id=int(f"{parent.id}{int(current_start.timestamp())}") % 2147483647,
+                    title=parent.title, description=parent.description, event_type=parent.event_type,
+                    start_datetime=current_start, end_datetime=current_start + duration,
+                    location=parent.location, is_online=parent.is_online, meeting_url=parent.meeting_url,
+                    created_by=parent.created_by, is_recurring=True, recurrence_pattern=parent.recurrence_pattern,
+                    max_participants=parent.max_participants, creator=parent.creator,
+                    event_groups=parent.event_groups, created_at=parent.created_at,
+                    updated_at=parent.updated_at, is_active=True,
+                )
+                virtual_event._group_ids = parent_group_ids
+                virtual_event._instance_number = instance_counter
+                generated.append(virtual_event)
+                instance_counter += 1
+            if parent.recurrence_pattern == "daily":
+                current_start += timedelta(days=1)
+            elif parent.recurrence_pattern == "weekly":
+                current_start += timedelta(weeks=1)
+            elif parent.recurrence_pattern == "biweekly":
+                current_start += timedelta(weeks=2)
+            elif parent.recurrence_pattern == "monthly":
+                year = current_start.year + (current_start.month // 12)
+                month = (current_start.month % 12) + 1
+                day = min(original_start_day, calendar.monthrange(year, month)[1])
+                current_start = current_start.replace(year=year, month=month, day=day)
+            else:
+                break
+            if parent.recurrence_end_date and current_start.date() > parent.recurrence_end_date:
+                break
+    return generated
+
+
+def make_parents(count, history_days, window_start, seed):
+    rng = random.Random(seed)
+    creator = UserInDB(id=1, email="teacher@example.com", name="Teacher", hashed_password="x", role="teacher")
+    parents = []
+    for i in range(count):
+        start = window_start - timedelta(days=rng.randrange(history_days), hours=rng.randrange(8, 20))
+        parent = Event(
+            id=i + 1, title=f"Club {i}", event_type="webinar", start_datetime=start,
+            end_datetime=start + timedelta(minutes=90), created_by=1, creator=creator,
+            is_recurring=True, recurrence_pattern=rng.choice(PATTERNS), is_active=True,
+            created_at=start, updated_at=start,
+        )
+        parent.event_groups = [EventGroup(group_id=rng.randrange(1, 200)) for _ in range(2)]
+        parents.append(parent)
+    return parents
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parents", type=int, default=5000)
+    parser.add_argument("--history-days", type=int, default=365, help="parents started up to this many days before the window")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    window_start = datetime(2026, 3, 1)
+    window_end = datetime(2026, 3, 31, 23, 59, 59)
+    print(f"Expanding {args.parents} recurring parents into March 2026, up to {args.history_days} days of history")
+
+    parents = make_parents(args.parents, args.history_days, window_start, seed=1)
+
+    def expand():
+        return EventService.expand_recurring_events(None, window_start, window_end, parent_events=parents)
+
+    def cold():
+        recurrence.clear_occurrence_cache()
+        return expand()
+
+    cold_seconds, occurrences = timed(cold, args.repeat)
+    warm_seconds, _ = timed(expand, args.repeat)
+
+    # The old loop re-parents each EventGroup onto the occurrences it builds, so give it its own parents
+    legacy_parents = make_parents(args.parents, args.history_days, window_start, seed=1)
+    legacy_seconds, legacy = timed(lambda: legacy_expand(legacy_parents, window_start, window_end), 1)
+    assert [e.id for e in legacy] == [e.id for e in occurrences]
+
+    print(f"  occurrences:    {len(occurrences)}")
+    print(f"  day-by-day:     {legacy_seconds * 1000:8.1f} ms")
+    print(f"  fast-forward:   {cold_seconds * 1000:8.1f} ms  ({legacy_seconds / cold_seconds:.1f}x)")
+    print(f"  memoized:       {warm_seconds * 1000:8.1f} ms  ({legacy_seconds / warm_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
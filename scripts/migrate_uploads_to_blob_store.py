@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Bring files uploaded before the blob store into it.
+
+Walks the media upload directories, moves each file nobody references yet
+into uploads/.blobs (identical files end up sharing one blob) and records
+a file_references row with the owner recovered from the database or the
+file name. URLs do not change. Safe to re-run; run it once after the
+s1t2u3v4w5x6 migration, before the blob collector first runs.
+
+    python scripts/migrate_uploads_to_blob_store.py [--dry-run]
+"""
+import argparse
+import re
+import sys
+from pathlib import Path
+
+from sqlalchemy import or_
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import SessionLocal
+from src.models import Assignment, AssignmentSubmission, FileReference, LessonMaterial
+from src.services import blob_store, media_storage
+
+# Directories the media router writes, and the generic /media/upload types
+OWNED_DIRS = ("courses/thumbnails", "step_attachments", "materials", "assignments", "submissions")
+GENERIC_DIRS = ("teacher_assignment", "assignment", "submission", "step_attachment", "question_media")
+
+_NUMBERED = {
+    "courses/thumbnails": re.compile(r"^course_(\d+)_thumb\."),
+    "step_attachments": re.compile(r"^step_(\d+)_"),
+    "submissions": re.compile(r"^submission_(\d+)_(\d+)_"),
+}
+_GENERIC = re.compile(r"^\d{8}_\d{6}_(\d+)_")
+
+
+def owner_of(db, directory, path):
+    """(owner_type, owner_id, uploaded_by) for an upload"""
+    url = f"/uploads/{directory}/{path.name}"
+    if directory == "materials":
+        material_id = db.query(LessonMaterial.id).filter(LessonMaterial.file_url == url).scalar()
+        return "material", material_id, None
+    if directory == "assignments":
+        assignment_id = db.query(Assignment.id).filter(Assignment.file_url == url).scalar()
+        return "assignment", assignment_id, None
+    if directory in ("submissions", "submission"):
+        # Owned by the submission using it; left unowned (released by the collector) when none does
+        submission_id = db.query(AssignmentSubmission.id).filter(or_(
+            AssignmentSubmission.file_url == url, AssignmentSubmission.answers.contains(url)
+        )).order_by(AssignmentSubmission.id).limit(1).scalar()
+        if directory == "submissions":
+            match = _NUMBERED[directory].match(path.name)
+            return "submission", submission_id, int(match.group(2)) if match else None
+        match = _GENERIC.match(path.name[len(directory) + 1:])
+        return "submission", submission_id, int(match.group(1)) if match else None
+    if directory in GENERIC_DIRS:
+        match = _GENERIC.match(path.name[len(directory) + 1:])
+        return directory, None, int(match.group(1)) if match else None
+    match = _NUMBERED[directory].match(path.name)
+    return ("course_thumbnail" if directory == "courses/thumbnails" else "step"), int(match.group(1)) if match else None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be adopted")
+    args = parser.parse_args()
+
+    root = Path(media_storage.MEDIA_UPLOAD_ROOT)
+    db = SessionLocal()
+    adopted = skipped = 0
+    try:
+        known = {path for (path,) in db.query(FileReference.path)}
+        for directory in OWNED_DIRS + GENERIC_DIRS:
+            folder = root / directory
+            if not folder.is_dir():
+                continue
+            for path in sorted(folder.iterdir()):
+                if not path.is_file() or f"{directory}/{path.name}" in known:
+                    skipped += 1
+                    continue
+                owner_type, owner_id, uploaded_by = owner_of(db, directory, path)
+                if not args.dry_run:
+                    blob_store.adopt_file(db, path, owner_type, owner_id, uploaded_by)
+                    db.commit()
+                adopted += 1
+        report = blob_store.storage_report(db)
+    finally:
+        db.close()
+
+    print(f"Adopted {adopted} files ({skipped} skipped){' [dry run]' if args.dry_run else ''}")
+    print(f"  uploads: {report['logical_bytes']} bytes in {report['reference_count']} files")
+    print(f"  on disk: {report['physical_bytes']} bytes in {report['blob_count']} blobs")
+
+
+if __name__ == "__main__":
+    main()
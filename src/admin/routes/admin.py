@@ -14,6 +14,8 @@ from src.schemas.models import (
     StepProgress, Step, Lesson, LessonSchedule, CourseGroupAccess, CourseHeadTeacher
 )
 from src.utils.auth_utils import hash_password
+from src.services.principal_cache import invalidate_principal
+from src.services.bulk_user_import import ImportRow, generate_password, generate_student_id, import_users
 from src.utils.permissions import require_admin, require_teacher_or_admin_for_groups, require_teacher_curator_or_admin
 import secrets
 import string
@@ -165,17 +167,8 @@ class AdminDashboardResponse(BaseModel):
     recent_groups: List[GroupSchema]
     recent_courses: List[dict]
 
-def generate_password(length: int = 8) -> str:
-    """Generate a random password"""
-    characters = string.ascii_letters + string.digits
-    return ''.join(secrets.choice(characters) for _ in range(length))
-
-def generate_student_id() -> str:
-    """Generate a unique student ID"""
-    return f"STU{secrets.randbelow(100000):05d}"
-
 @router.post("/users/single", response_model=CreateUserResponse)
-async def create_single_user(
+def create_single_user(
     user_data: CreateUserRequest,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -270,99 +263,28 @@ async def create_single_user(
         raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
 
 @router.post("/users/bulk", response_model=BulkCreateResponse)
-async def create_bulk_users(
+def create_bulk_users(
     request: BulkCreateUsersRequest,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
 ):
     """Create multiple users at once (admin only)"""
-    created_users = []
-    failed_users = []
-    
-    for user_data in request.users:
-        try:
-            # Normalize email
-            user_data.email = user_data.email.lower()
-            
-            # Check if email already exists
-            existing_user = db.query(UserInDB).filter(UserInDB.email == user_data.email).first()
-            if existing_user:
-                failed_users.append({
-                    "email": user_data.email,
-                    "error": "Email already registered"
-                })
-                continue
-            
-            # Generate password if not provided
-            password = user_data.password
-            generated_password = None
-            if not password:
-                password = generate_password()
-                generated_password = password
-            
-            # Generate student ID for students if not provided
-            student_id = user_data.student_id
-            if user_data.role == "student" and not student_id:
-                student_id = generate_student_id()
-                # Ensure student_id is unique
-                while db.query(UserInDB).filter(UserInDB.student_id == student_id).first():
-                    student_id = generate_student_id()
-            
-            # Create user
-            new_user = UserInDB(
-                email=user_data.email,
-                name=user_data.name,
-                hashed_password=hash_password(password),
-                role=user_data.role,
-                student_id=student_id,
-                is_active=user_data.is_active
-            )
-            
-            db.add(new_user)
-            db.flush()  # Get ID without committing
-            
-            # Assign user to groups if group_ids provided and user is a student
-            if user_data.group_ids and user_data.role == "student":
-                for group_id in user_data.group_ids:
-                    # Verify group exists
-                    group = db.query(Group).filter(Group.id == group_id).first()
-                    if group:
-                        # Check if association already exists
-                        existing = db.query(GroupStudent).filter(
-                            GroupStudent.group_id == group_id,
-                            GroupStudent.student_id == new_user.id
-                        ).first()
-                        if not existing:
-                            group_student = GroupStudent(
-                                group_id=group_id,
-                                student_id=new_user.id
-                            )
-                            db.add(group_student)
-            
-            created_users.append(CreateUserResponse(
-                user=UserSchema.from_orm(new_user),
-                generated_password=generated_password
-            ))
-            
-        except Exception as e:
-            failed_users.append({
-                "email": user_data.email,
-                "error": str(e)
-            })
-    
-    # Commit all successful creations
-    if created_users:
-        db.commit()
-    else:
-        db.rollback()
-    
-    return BulkCreateResponse(
-        created_users=created_users,
-        failed_users=failed_users
-    )
+    rows = [
+        ImportRow(
+            email=user_data.email,
+            name=user_data.name,
+            password=user_data.password,
+            role=user_data.role,
+            student_id=user_data.student_id,
+            is_active=user_data.is_active,
+            group_ids=user_data.group_ids,
+        )
+        for user_data in request.users
+    ]
+    return _import_bulk_users(db, rows)
 
 @router.post("/users/bulk-text", response_model=BulkCreateResponse)
-async def create_bulk_users_from_text(
+def create_bulk_users_from_text(
     request: BulkCreateUsersFromTextRequest,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -373,7 +295,7 @@ async def create_bulk_users_from_text(
     Lines starting with # are ignored as comments.
     Empty lines are skipped.
     """
-    created_users = []
+    rows = []
     failed_users = []
     
     lines = request.text.strip().split('\n')
@@ -385,109 +307,73 @@ async def create_bulk_users_from_text(
         if not line or line.startswith('#'):
             continue
         
-        try:
-            # Split by tab
-            parts = line.split('\t')
-            
-            if len(parts) < 5:
-                failed_users.append({
-                    "email": f"Line {line_num}",
-                    "error": f"Invalid format: expected 5 tab-separated values, got {len(parts)}. Line: {line[:50]}..."
-                })
-                continue
-            
-            name = parts[0].strip()
-            phone = parts[1].strip()
-            # months = parts[2].strip()  # Not used for user creation, could be stored in notes
-            # date = parts[3].strip()    # Not used for user creation, could be stored in notes
-            email = parts[4].strip().lower()
-            
-            # Validate required fields
-            if not name:
-                failed_users.append({
-                    "email": f"Line {line_num}",
-                    "error": "Name is required"
-                })
-                continue
-            
-            if not email:
-                failed_users.append({
-                    "email": f"Line {line_num}",
-                    "error": "Email is required"
-                })
-                continue
-            
-            # Validate email format (basic check)
-            if '@' not in email or '.' not in email:
-                failed_users.append({
-                    "email": email,
-                    "error": "Invalid email format"
-                })
-                continue
-            
-            # Check if email already exists
-            existing_user = db.query(UserInDB).filter(UserInDB.email == email).first()
-            if existing_user:
-                failed_users.append({
-                    "email": email,
-                    "error": "Email already registered"
-                })
-                continue
-            
-            # Generate password
-            password = generate_password() if request.generate_passwords else None
-            generated_password = password
-            
-            # Generate student ID for students
-            student_id = None
-            if request.role == "student":
-                student_id = generate_student_id()
-                # Ensure student_id is unique
-                while db.query(UserInDB).filter(UserInDB.student_id == student_id).first():
-                    student_id = generate_student_id()
-            
-            # Create user
-            new_user = UserInDB(
-                email=email,
-                name=name,
-                hashed_password=hash_password(password) if password else hash_password(generate_password()),
-                role=request.role,
-                student_id=student_id,
-                is_active=True,
-                onboarding_completed=request.role != 'student'
-            )
-            
-            db.add(new_user)
-            db.flush()  # Get ID without committing
-            
-            # Assign user to groups if group_ids provided and user is a student
-            if request.group_ids and request.role == "student":
-                for group_id in request.group_ids:
-                    # Verify group exists
-                    group = db.query(Group).filter(Group.id == group_id).first()
-                    if group:
-                        # Check if association already exists
-                        existing = db.query(GroupStudent).filter(
-                            GroupStudent.group_id == group_id,
-                            GroupStudent.student_id == new_user.id
-                        ).first()
-                        if not existing:
-                            group_student = GroupStudent(
-                                group_id=group_id,
-                                student_id=new_user.id
-                            )
-                            db.add(group_student)
-            
-            created_users.append(CreateUserResponse(
-                user=UserSchema.from_orm(new_user),
-                generated_password=generated_password
-            ))
-            
-        except Exception as e:
+        # Split by tab
+        parts = line.split('\t')
+        
+        if len(parts) < 5:
             failed_users.append({
                 "email": f"Line {line_num}",
-                "error": str(e)
+                "error": f"Invalid format: expected 5 tab-separated values, got {len(parts)}. Line: {line[:50]}..."
             })
+            continue
+        
+        name = parts[0].strip()
+        phone = parts[1].strip()
+        # months = parts[2].strip()  # Not used for user creation, could be stored in notes
+        # date = parts[3].strip()    # Not used for user creation, could be stored in notes
+        email = parts[4].strip().lower()
+        
+        # Validate required fields
+        if not name:
+            failed_users.append({
+                "email": f"Line {line_num}",
+                "error": "Name is required"
+            })
+            continue
+        
+        if not email:
+            failed_users.append({
+                "email": f"Line {line_num}",
+                "error": "Email is required"
+            })
+            continue
+        
+        # Validate email format (basic check)
+        if '@' not in email or '.' not in email:
+            failed_users.append({
+                "email": email,
+                "error": "Invalid email format"
+            })
+            continue
+        
+        rows.append(ImportRow(
+            email=email,
+            name=name,
+            role=request.role,
+            onboarding_completed=request.role != 'student',
+            group_ids=request.group_ids,
+            return_password=request.generate_passwords,
+        ))
+    
+    response = _import_bulk_users(db, rows)
+    response.failed_users = failed_users + response.failed_users
+    return response
+
+def _import_bulk_users(db: Session, rows: List[ImportRow]) -> BulkCreateResponse:
+    """Create the rows in one transaction; rows that fail are reported, the rest committed"""
+    try:
+        created, failed_users = import_users(db, rows)
+        created_users = [
+            CreateUserResponse(user=UserSchema.from_orm(user), generated_password=generated_password)
+            for user, generated_password in created
+        ]
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[ADMIN] Bulk user import failed: {e}", exc_info=True)
+        return BulkCreateResponse(
+            created_users=[],
+            failed_users=[{"email": row.email, "error": "Import failed, please retry"} for row in rows]
+        )
     
     # Commit all successful creations
     if created_users:
@@ -501,7 +387,7 @@ async def create_bulk_users_from_text(
     )
 
 @router.post("/create-admin", response_model=CreateAdminResponse)
-async def create_admin(
+def create_admin(
     admin_data: CreateAdminRequest,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -550,7 +436,7 @@ async def create_admin(
 
 
 @router.delete("/users/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -579,13 +465,15 @@ async def delete_user(
     db.query(GroupStudent).filter(GroupStudent.student_id == user_id).delete()
     db.query(AssignmentExtension).filter(AssignmentExtension.student_id == user_id).delete()
     
+    user_email = user.email
     db.delete(user)
     db.commit()
+    invalidate_principal(user_id=user_id, email=user_email)
     
     return {"detail": "User deleted successfully"}
 
 @router.get("/stats", response_model=AdminStatsResponse)
-async def get_admin_stats(
+def get_admin_stats(
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
 ):
@@ -613,7 +501,7 @@ async def get_admin_stats(
     )
 
 @router.get("/students/progress", response_model=List[StudentProgressSummary])
-async def get_students_progress_summary(
+def get_students_progress_summary(
     skip: int = 0,
     limit: int = 50,
     group_id: Optional[int] = None,
@@ -687,7 +575,7 @@ async def get_students_progress_summary(
     return summaries
 
 @router.post("/reset-password/{user_id}")
-async def reset_user_password(
+def reset_user_password(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -711,7 +599,7 @@ async def reset_user_password(
     }
 
 @router.get("/groups", response_model=List[GroupSchema])
-async def get_all_groups(
+def get_all_groups(
     skip: int = 0,
     limit: int = 100,
     teacher_id: Optional[int] = None,
@@ -790,7 +678,7 @@ async def get_all_groups(
 # =============================================================================
 
 @router.post("/groups", response_model=GroupSchema)
-async def create_group(
+def create_group(
     group_data: CreateGroupRequest,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -868,7 +756,7 @@ async def create_group(
     return group_response
 
 @router.put("/groups/{group_id}", response_model=GroupSchema)
-async def update_group(
+def update_group(
     group_id: int,
     group_data: UpdateGroupRequest,
     db: Session = Depends(get_db),
@@ -1008,7 +896,7 @@ async def update_group(
     return group_response
 
 @router.delete("/groups/{group_id}")
-async def delete_group(
+def delete_group(
     group_id: int,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -1065,7 +953,7 @@ def parse_shorthand_python(text: str) -> List[dict]:
     return [{"day_of_week": d, "time_of_day": time_str} for d in days]
 
 @router.post("/groups/bulk-schedule-upload", response_model=BulkGroupScheduleUploadResponse)
-async def bulk_schedule_upload(
+def bulk_schedule_upload(
     request: BulkGroupScheduleUploadRequest,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -1437,7 +1325,7 @@ async def bulk_schedule_upload(
     return BulkGroupScheduleUploadResponse(created_groups=created_groups, failed_lines=failed_lines)
 
 @router.post("/groups/{group_id}/assign-teacher")
-async def assign_teacher_to_group(
+def assign_teacher_to_group(
     group_id: int,
     teacher_data: AssignTeacherRequest,
     db: Session = Depends(get_db),
@@ -1467,7 +1355,7 @@ async def assign_teacher_to_group(
 # =============================================================================
 
 @router.get("/users", response_model=UserListResponse)
-async def get_all_users(
+def get_all_users(
     skip: int = 0,
     limit: int = 50,
     role: Optional[str] = None,
@@ -1580,7 +1468,7 @@ async def get_all_users(
     )
 
 @router.put("/users/{user_id}", response_model=UserSchema)
-async def update_user(
+def update_user(
     user_id: int,
     user_data: UpdateUserRequest,
     db: Session = Depends(get_db),
@@ -1601,6 +1489,8 @@ async def update_user(
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered")
     
+    previous_email = user.email
+    
     # Update fields
     if user_data.name is not None:
         user.name = user_data.name
@@ -1619,6 +1509,7 @@ async def update_user(
     user.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(user)
+    invalidate_principal(user_id=user_id, email=previous_email)
     
     # Update user's groups - check the FINAL role after updates
     final_role = user_data.role if user_data.role is not None else user.role
@@ -1659,7 +1550,7 @@ async def update_user(
     return user_response
 
 @router.get("/users/{user_id}/groups")
-async def get_user_groups(
+def get_user_groups(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -1676,7 +1567,7 @@ async def get_user_groups(
     return {"user_id": user_id, "group_ids": group_ids}
 
 @router.delete("/users/{user_id}")
-async def deactivate_user(
+def deactivate_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -1694,11 +1585,12 @@ async def deactivate_user(
     user.refresh_token = None  # Invalidate sessions
     user.updated_at = datetime.utcnow()
     db.commit()
+    invalidate_principal(user_id=user_id, email=user.email)
     
     return {"detail": f"User '{user.name}' deactivated successfully"}
 
 @router.post("/users/{user_id}/assign-group")
-async def assign_user_to_group(
+def assign_user_to_group(
     user_id: int,
     group_data: AssignUserToGroupRequest,
     db: Session = Depends(get_db),
@@ -1732,7 +1624,7 @@ async def assign_user_to_group(
     return {"detail": f"User '{user.name}' assigned to group '{group.name}'"}
 
 @router.post("/users/bulk-assign-group")
-async def bulk_assign_users_to_group(
+def bulk_assign_users_to_group(
     bulk_data: BulkAssignUsersRequest,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -1768,7 +1660,7 @@ async def bulk_assign_users_to_group(
     return {"detail": f"{assigned_count} users assigned to group '{group.name}'"}
 
 @router.get("/dashboard", response_model=AdminDashboardResponse)
-async def get_admin_dashboard(
+def get_admin_dashboard(
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
 ):
@@ -1852,7 +1744,7 @@ async def get_admin_dashboard(
 # =============================================================================
 
 @router.get("/groups/{group_id}/students", response_model=GroupStudentsResponse)
-async def get_group_students(
+def get_group_students(
     group_id: int,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_teacher_or_admin_for_groups())
@@ -1888,7 +1780,7 @@ async def get_group_students(
     )
 
 @router.post("/groups/{group_id}/students", response_model=dict)
-async def add_student_to_group(
+def add_student_to_group(
     group_id: int,
     student_data: AddStudentToGroupRequest,
     db: Session = Depends(get_db),
@@ -1932,7 +1824,7 @@ async def add_student_to_group(
     return {"detail": f"Student '{student.name}' added to group '{group.name}'"}
 
 @router.delete("/groups/{group_id}/students/{student_id}", response_model=dict)
-async def remove_student_from_group(
+def remove_student_from_group(
     group_id: int,
     student_id: int,
     db: Session = Depends(get_db),
@@ -1971,7 +1863,7 @@ async def remove_student_from_group(
     return {"detail": f"Student '{student.name}' removed from group '{group.name}'"}
 
 @router.post("/groups/{group_id}/students/bulk", response_model=dict)
-async def bulk_add_students_to_group(
+def bulk_add_students_to_group(
     group_id: int,
     student_ids: List[int],
     db: Session = Depends(get_db),
@@ -2020,7 +1912,7 @@ async def bulk_add_students_to_group(
 # =============================================================================
 
 @router.get("/events", response_model=List[EventSchema])
-async def get_all_events(
+def get_all_events(
     skip: int = 0,
     limit: int = 100,
     event_type: Optional[str] = None,
@@ -2082,7 +1974,7 @@ async def get_all_events(
     return result
 
 @router.post("/events", response_model=EventSchema)
-async def create_event(
+def create_event(
     event_data: CreateEventRequest,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -2167,7 +2059,7 @@ async def create_event(
     return result
 
 @router.put("/events/{event_id}", response_model=EventSchema)
-async def update_event(
+def update_event(
     event_id: int,
     event_data: UpdateEventRequest,
     db: Session = Depends(get_db),
@@ -2248,7 +2140,7 @@ async def update_event(
     return result
 
 @router.delete("/events/{event_id}")
-async def delete_event(
+def delete_event(
     event_id: int,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -2268,7 +2160,7 @@ async def delete_event(
     return {"detail": "Event deleted successfully"}
 
 @router.post("/events/bulk-delete")
-async def bulk_delete_events(
+def bulk_delete_events(
     event_ids: List[int],
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -2290,7 +2182,7 @@ async def bulk_delete_events(
     return {"detail": f"Successfully deleted {len(event_ids)} events"}
 
 @router.post("/events/bulk", response_model=List[EventSchema])
-async def create_bulk_events(
+def create_bulk_events(
     events_data: List[CreateEventRequest],
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(require_admin())
@@ -2486,7 +2378,7 @@ class TeacherLessonsCountSchema(BaseModel):
     tags=["CRM"],
     summary="Count lessons conducted by a teacher in a given month",
 )
-async def get_teacher_lessons_count(
+def get_teacher_lessons_count(
     teacher_id: int,
     year: int = Query(..., ge=2020, le=2030, description="Year (Kazakhstan GMT+5)"),
     month: int = Query(..., ge=1, le=12, description="Month (1–12)"),
@@ -2562,7 +2454,7 @@ class TeacherLessonsDetailSchema(BaseModel):
     tags=["CRM"],
     summary="List lessons conducted by a teacher in a given month (for audit/reconciliation)",
 )
-async def get_teacher_lessons_detail(
+def get_teacher_lessons_detail(
     teacher_id: int,
     year: int = Query(..., ge=2020, le=2030, description="Year (Kazakhstan GMT+5)"),
     month: int = Query(..., ge=1, le=12, description="Month (1–12)"),
@@ -2627,7 +2519,7 @@ async def get_teacher_lessons_detail(
     tags=["CRM"],
     summary="Export all teachers' lessons count for a month as CSV",
 )
-async def export_teachers_lessons_count_csv(
+def export_teachers_lessons_count_csv(
     year: int = Query(..., ge=2020, le=2030, description="Year (Kazakhstan GMT+5)"),
     month: int = Query(..., ge=1, le=12, description="Month (1–12)"),
     db: Session = Depends(get_db),
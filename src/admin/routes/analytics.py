@@ -1,19 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import Response, StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_
-from typing import List, Optional, Dict, Any
+from sqlalchemy import func, desc, and_, or_, case
+from starlette.concurrency import run_in_threadpool
+from typing import Callable, List, Literal, Optional, Dict, Any
 from datetime import datetime, timedelta, date
 from io import BytesIO
 import json
 import logging
-import httpx
 import os
 import re
 from collections import defaultdict
 
 from src.config import get_db
-import asyncio
 from src.schemas.models import (
     StudentProgress, Course, Module, Lesson, Assignment, Enrollment, 
     UserInDB, AssignmentSubmission, StepProgress, Step, GroupStudent,
@@ -21,12 +21,21 @@ from src.schemas.models import (
 )
 from src.routes.auth import get_current_user_dependency
 from src.utils.permissions import check_course_access, check_student_access
-from src.services.excel_export_service import get_excel_export_service
+from src.services.analytics_export_service import (
+    iter_file_chunks, render_course_analytics_export, write_course_analytics_export,
+)
+from src.services.export_jobs import ExportTask, get_export_job_manager
+from src.services.pdf_report_service import write_all_students_report, write_group_report, write_student_report
+from src.services.student_analytics_service import build_students_analytics
+from src.services.quiz_answers import question_error_stats
+from src.services.quiz_content import get_compiled_quiz
+from src.services.summary_cache import get_course_analytics_cache
+from src.services.sat_service import SATService, SATAPIError
 
 router = APIRouter()
 
 @router.get("/student/{student_id}/detailed")
-async def get_detailed_student_analytics(
+def get_detailed_student_analytics(
     student_id: int,
     course_id: Optional[int] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -174,542 +183,513 @@ async def get_course_analytics_overview(
     if current_user.role not in ["teacher", "curator", "admin", "head_curator"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Check course access (now properly validates curator access via group students)
-    if not check_course_access(course_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Access denied to this course")
+    logger = logging.getLogger(__name__)
     
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-    
-    # Get students with progress in this course (via StepProgress - source of truth)
-    # This finds students who actually have learning activity, not just enrollment records
-    # Get students with progress in this course (via StepProgress - source of truth)
-    # This finds students who actually have learning activity, not just enrollment records
-    students_query = db.query(UserInDB).join(
-        StepProgress, StepProgress.user_id == UserInDB.id
-    ).join(
-        Step, StepProgress.step_id == Step.id
-    ).join(
-        Lesson, Step.lesson_id == Lesson.id
-    ).join(
-        Module, Lesson.module_id == Module.id
-    ).filter(
-        Module.course_id == course_id,
-        UserInDB.role == "student",
-        UserInDB.is_active == True
-    ).distinct()
+    def load_students():
+        # Check course access (now properly validates curator access via group students)
+        if not check_course_access(course_id, current_user, db):
+            raise HTTPException(status_code=403, detail="Access denied to this course")
     
-    students_with_progress = students_query.all()
+        course = db.query(Course).filter(Course.id == course_id).first()
+        if not course:
+            raise HTTPException(status_code=404, detail="Course not found")
     
-    # Log debug info
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.info(f"Analytics Debug - Course {course_id}: Found {len(students_with_progress)} students with progress")
+        # Structure and engagement totals come from the materialized cache
+        # (recalculated here only if it is missing or stale)
+        analytics_cache = get_course_analytics_cache(course_id, db)
+    
+        # Get students with progress in this course (via StepProgress - source of truth)
+        # This finds students who actually have learning activity, not just enrollment records
+        students_query = db.query(UserInDB).join(
+            StepProgress, StepProgress.user_id == UserInDB.id
+        ).join(
+            Step, StepProgress.step_id == Step.id
+        ).join(
+            Lesson, Step.lesson_id == Lesson.id
+        ).join(
+            Module, Lesson.module_id == Module.id
+        ).filter(
+            Module.course_id == course_id,
+            UserInDB.role == "student",
+            UserInDB.is_active == True
+        ).distinct()
     
-    # Also get students enrolled but without progress yet
-    enrolled_students_ids = db.query(Enrollment.user_id).filter(
-        Enrollment.course_id == course_id,
-        Enrollment.is_active == True
-    ).subquery()
+        students_with_progress = students_query.all()
     
-    enrolled_no_progress = db.query(UserInDB).filter(
-        UserInDB.id.in_(enrolled_students_ids),
-        UserInDB.role == "student",
-        UserInDB.is_active == True
-    ).all()
+        # Log debug info
+        logger.info(f"Analytics Debug - Course {course_id}: Found {len(students_with_progress)} students with progress")
+    
+        # Also get students enrolled but without progress yet
+        enrolled_students_ids = db.query(Enrollment.user_id).filter(
+            Enrollment.course_id == course_id,
+            Enrollment.is_active == True
+        ).subquery()
+    
+        enrolled_no_progress = db.query(UserInDB).filter(
+            UserInDB.id.in_(enrolled_students_ids),
+            UserInDB.role == "student",
+            UserInDB.is_active == True
+        ).all()
 
-    # also get students from GROUPS assigned to this course
-    # because they might not have explicit Enrollments yet
-    group_access_subquery = db.query(CourseGroupAccess.group_id).filter(
-        CourseGroupAccess.course_id == course_id,
-        CourseGroupAccess.is_active == True
-    ).subquery()
+        # also get students from GROUPS assigned to this course
+        # because they might not have explicit Enrollments yet
+        group_access_subquery = db.query(CourseGroupAccess.group_id).filter(
+            CourseGroupAccess.course_id == course_id,
+            CourseGroupAccess.is_active == True
+        ).subquery()
 
-    group_students_ids = db.query(GroupStudent.student_id).filter(
-        GroupStudent.group_id.in_(group_access_subquery)
-    ).subquery()
+        group_students_ids = db.query(GroupStudent.student_id).filter(
+            GroupStudent.group_id.in_(group_access_subquery)
+        ).subquery()
 
-    group_students_no_progress = db.query(UserInDB).filter(
-        UserInDB.id.in_(group_students_ids),
-        UserInDB.role == "student",
-        UserInDB.is_active == True
-    ).all()
+        group_students_no_progress = db.query(UserInDB).filter(
+            UserInDB.id.in_(group_students_ids),
+            UserInDB.role == "student",
+            UserInDB.is_active == True
+        ).all()
     
-    # Combine all lists (students with progress + enrolled + group members)
-    enrolled_students_set = {s.id: s for s in students_with_progress}
-    for student in enrolled_no_progress:
-        if student.id not in enrolled_students_set:
-            enrolled_students_set[student.id] = student
-            
-    for student in group_students_no_progress:
-        if student.id not in enrolled_students_set:
-            enrolled_students_set[student.id] = student
-    
-    enrolled_students = list(enrolled_students_set.values())
-    
-    # Privacy Filter: If teacher is not course owner, restrict to their own groups
-    # This prevents specialized teachers from seeing students outside their jurisdiction
-    if current_user.role == "teacher" and course.teacher_id != current_user.id:
-        teacher_group_ids = [g.id for g in db.query(Group.id).filter(Group.teacher_id == current_user.id).all()]
-        if teacher_group_ids:
-            # Find students in these groups
-            allowed_student_ids = [gs.student_id for gs in db.query(GroupStudent.student_id).filter(
-                GroupStudent.group_id.in_(teacher_group_ids)
-            ).all()]
-            allowed_student_ids_set = set(allowed_student_ids)
-            
-            # Filter the final list
-            enrolled_students = [s for s in enrolled_students if s.id in allowed_student_ids_set]
-        else:
-            # Teacher has no groups? Then they see no students.
-            enrolled_students = []
-    
-    # Get course structure
-    modules = db.query(Module).filter(Module.course_id == course_id).order_by(Module.order_index).all()
-    total_lessons = 0
-    total_steps = 0
-    
-    lesson_step_counts = {}
-    for module in modules:
-        lessons = db.query(Lesson).filter(Lesson.module_id == module.id).all()
-        total_lessons += len(lessons)
-        for lesson in lessons:
-            steps = db.query(Step).filter(Step.lesson_id == lesson.id).all()
-            total_steps += len(steps)
-            lesson_step_counts[lesson.id] = len(steps)
-    
-    # Calculate engagement metrics
-    step_progress_records = db.query(StepProgress).filter(
-        StepProgress.course_id == course_id
-    ).all()
+        # Combine all lists (students with progress + enrolled + group members)
+        enrolled_students_set = {s.id: s for s in students_with_progress}
+        for student in enrolled_no_progress:
+            if student.id not in enrolled_students_set:
+                enrolled_students_set[student.id] = student
+            
+        for student in group_students_no_progress:
+            if student.id not in enrolled_students_set:
+                enrolled_students_set[student.id] = student
+    
+        enrolled_students = list(enrolled_students_set.values())
+    
+        # Privacy Filter: If teacher is not course owner, restrict to their own groups
+        # This prevents specialized teachers from seeing students outside their jurisdiction
+        if current_user.role == "teacher" and course.teacher_id != current_user.id:
+            teacher_group_ids = [g.id for g in db.query(Group.id).filter(Group.teacher_id == current_user.id).all()]
+            if teacher_group_ids:
+                # Find students in these groups
+                allowed_student_ids = [gs.student_id for gs in db.query(GroupStudent.student_id).filter(
+                    GroupStudent.group_id.in_(teacher_group_ids)
+                ).all()]
+                allowed_student_ids_set = set(allowed_student_ids)
+            
+                # Filter the final list
+                enrolled_students = [s for s in enrolled_students if s.id in allowed_student_ids_set]
+            else:
+                # Teacher has no groups? Then they see no students.
+                enrolled_students = []
     
-    total_time_spent = sum(sp.time_spent_minutes for sp in step_progress_records)
-    completed_steps = len([sp for sp in step_progress_records if sp.status == "completed"])
-    
-    # Pre-fetch groups for students to avoid N+1
-    student_ids = [s.id for s in enrolled_students]
-    student_groups_map = {}
-    if student_ids:
-        # Get groups for these students
-        # Note: A student might be in multiple groups, we take the first found one for display
-        group_rows = db.query(GroupStudent.student_id, Group.name).join(
-            Group, GroupStudent.group_id == Group.id
-        ).filter(
-            GroupStudent.student_id.in_(student_ids)
-        ).all()
-        
-        for sid, gname in group_rows:
-            if sid not in student_groups_map:
-                student_groups_map[sid] = gname
+        return course, analytics_cache, enrolled_students
 
-    # Pre-fetch assignments
-    assignments = db.query(Assignment).join(Lesson).join(Module).filter(
-        Module.course_id == course_id
-    ).all()
+    course, analytics_cache, enrolled_students = await run_in_threadpool(load_students)
     
-    total_assignments_count = len(assignments)
-    logger.info(f"Course {course_id}: Found {total_assignments_count} assignments")
-
-    # Pre-fetch lesson titles to map lesson_id -> title
-    # We can get all lessons in the course via Module
-    lesson_titles = {}
-    course_lessons = db.query(Lesson.id, Lesson.title).join(Module).filter(
-        Module.course_id == course_id
-    ).all()
-    for lid, ltitle in course_lessons:
-        lesson_titles[lid] = ltitle
-
     # --- External SAT Data Fetching ---
-    # Fetch SAT scores for all students in parallel
-    # This is required because "Latest Test" refers to the external SAT system, not internal Quizzes
+    # "Latest Test" refers to the external SAT system, not internal Quizzes.
+    # The SAT gateway batches the lookup, falls back per email for anyone the
+    # batch missed, and caches results per email.
+    email_to_student = {s.email.lower(): s for s in enrolled_students}
+    batch_data = {}
+    if email_to_student:
+        batch_data = await SATService.fetch_batch_latest_test_details(list(email_to_student.keys()))
+    
+    def build_overview():
+        # Get course structure
+        total_steps = analytics_cache.total_steps or 0
+        lesson_step_counts = {
+            int(lid): count for lid, count in (analytics_cache.lesson_step_counts or {}).items()
+        }
     
-    api_key = os.getenv("MASTEREDU_API_KEY")
-    headers = {
-        "X-API-Key": api_key,
-        "Content-Type": "application/json"
-    }
+        # Calculate engagement metrics
+        total_time_spent = analytics_cache.total_time_spent_minutes or 0
+        completed_steps = analytics_cache.total_completed_steps or 0
+    
+        # Pre-fetch groups for students to avoid N+1
+        student_ids = [s.id for s in enrolled_students]
+        student_groups_map = {}
+    
+        # Per-student step aggregates, computed in SQL instead of loading every
+        # StepProgress row of the course
+        student_step_totals = {}  # student_id -> (completed_steps, time_spent)
+        student_latest_step = {}  # student_id -> (lesson_id, visited_at)
+        student_lesson_completed = {}  # student_id -> completed steps in latest lesson
+        if student_ids:
+            for sid, s_completed, s_time in db.query(
+                StepProgress.user_id,
+                func.sum(case((StepProgress.status == "completed", 1), else_=0)),
+                func.coalesce(func.sum(StepProgress.time_spent_minutes), 0)
+            ).filter(
+                StepProgress.course_id == course_id,
+                StepProgress.user_id.in_(student_ids)
+            ).group_by(StepProgress.user_id).all():
+                student_step_totals[sid] = (int(s_completed or 0), int(s_time or 0))
+        
+            ranked_steps = db.query(
+                StepProgress.user_id.label("user_id"),
+                StepProgress.lesson_id.label("lesson_id"),
+                StepProgress.visited_at.label("visited_at"),
+                func.row_number().over(
+                    partition_by=StepProgress.user_id,
+                    order_by=(StepProgress.visited_at.desc(), StepProgress.id.desc())
+                ).label("rn")
+            ).filter(
+                StepProgress.course_id == course_id,
+                StepProgress.user_id.in_(student_ids),
+                StepProgress.visited_at.isnot(None)
+            ).subquery()
+            latest_steps = db.query(ranked_steps).filter(ranked_steps.c.rn == 1).subquery()
+        
+            for sid, l_id, visited_at in db.query(
+                latest_steps.c.user_id, latest_steps.c.lesson_id, latest_steps.c.visited_at
+            ).all():
+                student_latest_step[sid] = (l_id, visited_at)
+        
+            student_lesson_completed = dict(
+                db.query(StepProgress.user_id, func.count(StepProgress.id)).join(
+                    latest_steps,
+                    and_(
+                        latest_steps.c.user_id == StepProgress.user_id,
+                        latest_steps.c.lesson_id == StepProgress.lesson_id
+                    )
+                ).filter(
+                    StepProgress.course_id == course_id,
+                    StepProgress.status == "completed"
+                ).group_by(StepProgress.user_id).all()
+            )
     
-    student_sat_map = {} # student_id -> latest_test_result
-    
-    # Main fetching logic
-    if enrolled_students:
-        email_to_student = {s.email.lower(): s for s in enrolled_students}
-        emails = list(email_to_student.keys())
-        
-        async def fetch_sat_for_student(student_obj, client_session):
-            """Helper for single student fetch (fallback)"""
-            email = student_obj.email.lower()
-            try:
-                # Try latest-test-details first (efficient)
-                url = f"https://api.mastereducation.kz/api/lms/students/{email}/latest-test-details"
-                response = await client_session.get(url, headers=headers, timeout=10.0)
-                if response.status_code == 200:
-                    data = response.json()
-                    if "error" not in data:
-                        return student_obj.id, data
-                    else:
-                        logger.warning(f"latest-test-details failed for {email}: {data.get('error')}")
-                
-                # If that failed or returned error, try full test-results (robust)
-                url_history = f"https://api.mastereducation.kz/api/lms/students/{email}/test-results"
-                response = await client_session.get(url_history, headers=headers, timeout=15.0)
-                if response.status_code == 200:
-                    data = response.json()
-                    # test-results returns { "testPairs": [...] }
-                    pairs = data.get("testPairs", [])
-                    if pairs and len(pairs) > 0:
-                        # Extract most recent pair and format it to look like latest-test-details
-                        latest = pairs[0]
-                        return student_obj.id, {
-                            "mathTest": latest.get("mathTest"),
-                            "verbalTest": latest.get("verbalTest"),
-                            "combinedScore": latest.get("combinedScore")
-                        }
-            except Exception as e:
-                logger.error(f"Fallback SAT fetch for {email} failed: {e}")
-            return student_obj.id, None
+        if student_ids:
+            # Get groups for these students
+            # Note: A student might be in multiple groups, we take the first found one for display
+            group_rows = db.query(GroupStudent.student_id, Group.name).join(
+                Group, GroupStudent.group_id == Group.id
+            ).filter(
+                GroupStudent.student_id.in_(student_ids)
+            ).all()
+        
+            for sid, gname in group_rows:
+                if sid not in student_groups_map:
+                    student_groups_map[sid] = gname
 
-        def parse_sat_data(student_obj_id, data):
-            """Helper to parse raw SAT data into our format"""
-            if not data: return None
-            
-            math_test = data.get("mathTest")
-            verbal_test = data.get("verbalTest")
-            total_sat_score = data.get("combinedScore") or 0
-            
-            # Fallback for combinedScore if missing but math/verbal exist
-            if not total_sat_score:
-                total_sat_score = (math_test.get("score") or 0) if math_test else 0
-                total_sat_score += (verbal_test.get("score") or 0) if verbal_test else 0
-
-            math_pct = 0
-            verbal_pct = 0
-            math_correct = 0
-            math_max = 0
-            verbal_correct = 0
-            verbal_max = 0
-            title = "SAT Practice"
-            
-            if math_test:
-                questions = math_test.get("questions", [])
-                math_q = [q for q in questions if q.get("questionType") == "Math"] or questions
-                math_correct = len([q for q in math_q if q.get("isCorrect")])
-                math_max = len(math_q)
-                math_pct = (math_correct / math_max * 100) if math_max > 0 else 0
-                title = math_test.get("testName") or title
-            
-            if verbal_test:
-                questions = verbal_test.get("questions", [])
-                verbal_q = [q for q in questions if q.get("questionType") == "Verbal"] or questions
-                verbal_correct = len([q for q in verbal_q if q.get("isCorrect")])
-                verbal_max = len(verbal_q)
-                verbal_pct = (verbal_correct / verbal_max * 100) if verbal_max > 0 else 0
-                if not math_test: title = verbal_test.get("testName") or title
-
-            if math_pct > 0 and verbal_pct > 0:
-                overall_pct = (math_pct + verbal_pct) / 2
-            else:
-                overall_pct = math_pct or verbal_pct or 0
-            
-            # Crucial: if we have NO scores yet date is missing, return None to avoid overwriting 
-            # legit internal quiz results with an empty SAT record
-            sat_date = (math_test.get("completedAt") or math_test.get("date")) if math_test else (verbal_test.get("completedAt") or verbal_test.get("date")) if verbal_test else None
-            if not sat_date and math_correct == 0 and verbal_correct == 0:
-                return None
-
-            return {
-                "title": title,
-                "score": total_sat_score,
-                "max_score": 1600,
-                "percentage": round(overall_pct, 1),
-                "type": "sat",
-                "math_percent": round(math_pct, 1),
-                "verbal_percent": round(verbal_pct, 1),
-                "math_score": math_correct,
-                "math_max": math_max,
-                "verbal_score": verbal_correct,
-                "verbal_max": verbal_max,
-                "date": sat_date
-            }
+        # Pre-fetch assignments
+        assignments = db.query(Assignment).join(Lesson).join(Module).filter(
+            Module.course_id == course_id
+        ).all()
+    
+        total_assignments_count = len(assignments)
+        logger.info(f"Course {course_id}: Found {total_assignments_count} assignments")
 
-        async with httpx.AsyncClient() as client:
-            batch_success = False
-            try:
-                batch_url = "https://api.mastereducation.kz/api/lms/students/latest-test-details"
-                response = await client.post(batch_url, headers=headers, json={"emails": emails, "limit": 100}, timeout=15.0)
-                
-                if response.status_code == 200:
-                    batch_data = response.json()
-                    # If batch failed globally (MasterEDU crash)
-                    if "error" in batch_data and not batch_data.get("results"):
-                        logger.warning(f"Batch SAT API returned global error: {batch_data['error']}")
-                    else:
-                        results = batch_data.get("results", [])
-                        for item in results:
-                            email = item.get("email", "").lower()
-                            data = item.get("data")
-                            student_obj = email_to_student.get(email)
-                            if student_obj and data:
-                                parsed = parse_sat_data(student_obj.id, data)
-                                if parsed: student_sat_map[student_obj.id] = parsed
-                        batch_success = True
-            except Exception as e:
-                logger.error(f"Batch SAT request failed: {e}")
-
-            # SURGICAL FALLBACK: Fetch individual results for anyone STILL missing
-            missing_students = [s for s in enrolled_students if s.id not in student_sat_map]
-            
-            # FAIL-FAST: If too many are missing, the batch API might be broken or we're stressing it
-            # Fetching 200+ individuals sequentially/parallelly is too slow and risky
-            if missing_students:
-                if len(missing_students) > 50:
-                    logger.warning(f"Surgical fallback skipped: {len(missing_students)} students missing SAT data. Batch API might be failing or data missing at source.")
+        # Pre-fetch lesson titles to map lesson_id -> title
+        # We can get all lessons in the course via Module
+        lesson_titles = {}
+        course_lessons = db.query(Lesson.id, Lesson.title).join(Module).filter(
+            Module.course_id == course_id
+        ).all()
+        for lid, ltitle in course_lessons:
+            lesson_titles[lid] = ltitle
+
+        # --- External SAT Data (fetched above, outside the threadpool) ---
+    
+        student_sat_map = {} # student_id -> latest_test_result
+    
+        if enrolled_students:
+            def parse_sat_data(student_obj_id, data):
+                """Helper to parse raw SAT data into our format"""
+                if not data: return None
+            
+                math_test = data.get("mathTest")
+                verbal_test = data.get("verbalTest")
+                total_sat_score = data.get("combinedScore") or 0
+            
+                # Fallback for combinedScore if missing but math/verbal exist
+                if not total_sat_score:
+                    total_sat_score = (math_test.get("score") or 0) if math_test else 0
+                    total_sat_score += (verbal_test.get("score") or 0) if verbal_test else 0
+
+                math_pct = 0
+                verbal_pct = 0
+                math_correct = 0
+                math_max = 0
+                verbal_correct = 0
+                verbal_max = 0
+                title = "SAT Practice"
+            
+                if math_test:
+                    questions = math_test.get("questions", [])
+                    math_q = [q for q in questions if q.get("questionType") == "Math"] or questions
+                    math_correct = len([q for q in math_q if q.get("isCorrect")])
+                    math_max = len(math_q)
+                    math_pct = (math_correct / math_max * 100) if math_max > 0 else 0
+                    title = math_test.get("testName") or title
+            
+                if verbal_test:
+                    questions = verbal_test.get("questions", [])
+                    verbal_q = [q for q in questions if q.get("questionType") == "Verbal"] or questions
+                    verbal_correct = len([q for q in verbal_q if q.get("isCorrect")])
+                    verbal_max = len(verbal_q)
+                    verbal_pct = (verbal_correct / verbal_max * 100) if verbal_max > 0 else 0
+                    if not math_test: title = verbal_test.get("testName") or title
+
+                if math_pct > 0 and verbal_pct > 0:
+                    overall_pct = (math_pct + verbal_pct) / 2
                 else:
-                    logger.info(f"Surgical fallback: Fetching individual SAT for {len(missing_students)} missing students")
-                    # Use semaphore to limit concurrency
-                    semaphore = asyncio.Semaphore(10)
-                    
-                    async def sem_fetch(student_obj):
-                        async with semaphore:
-                            return await fetch_sat_for_student(student_obj, client)
-                            
-                    tasks = [sem_fetch(s) for s in missing_students]
-                    individual_results = await asyncio.gather(*tasks)
-                    for sid, data in individual_results:
-                        if data:
-                            parsed = parse_sat_data(sid, data)
-                            if parsed: student_sat_map[sid] = parsed
-    # Pre-fetch Quiz Attempts (Internal) as fallback (optional, or remove if strictly separated)
-    # Keeping it compatible with previous logic but External overrides
-    quiz_attempts_query = db.query(QuizAttempt).filter(
-        QuizAttempt.course_id == course_id,
-        QuizAttempt.is_draft == False
-    ).all()
+                    overall_pct = math_pct or verbal_pct or 0
+            
+                # Crucial: if we have NO scores yet date is missing, return None to avoid overwriting 
+                # legit internal quiz results with an empty SAT record
+                sat_date = (math_test.get("completedAt") or math_test.get("date")) if math_test else (verbal_test.get("completedAt") or verbal_test.get("date")) if verbal_test else None
+                if not sat_date and math_correct == 0 and verbal_correct == 0:
+                    return None
+
+                return {
+                    "title": title,
+                    "score": total_sat_score,
+                    "max_score": 1600,
+                    "percentage": round(overall_pct, 1),
+                    "type": "sat",
+                    "math_percent": round(math_pct, 1),
+                    "verbal_percent": round(verbal_pct, 1),
+                    "math_score": math_correct,
+                    "math_max": math_max,
+                    "verbal_score": verbal_correct,
+                    "verbal_max": verbal_max,
+                    "date": sat_date
+                }
+
+            for item in batch_data.get("results", []):
+                student_obj = email_to_student.get(item["email"])
+                if student_obj:
+                    parsed = parse_sat_data(student_obj.id, item["data"])
+                    if parsed: student_sat_map[student_obj.id] = parsed
+        # Pre-fetch Quiz Attempts (Internal) as fallback (optional, or remove if strictly separated)
+        # Keeping it compatible with previous logic but External overrides
+        quiz_attempts_query = db.query(QuizAttempt).filter(
+            QuizAttempt.course_id == course_id,
+            QuizAttempt.is_draft == False
+        ).all()
     
-    # Map user_id -> list of attempts
-    student_quiz_attempts = {}
-    for attempt in quiz_attempts_query:
-        if attempt.user_id not in student_quiz_attempts:
-            student_quiz_attempts[attempt.user_id] = []
-        student_quiz_attempts[attempt.user_id].append(attempt)
+        # Map user_id -> list of attempts
+        student_quiz_attempts = {}
+        for attempt in quiz_attempts_query:
+            if attempt.user_id not in student_quiz_attempts:
+                student_quiz_attempts[attempt.user_id] = []
+            student_quiz_attempts[attempt.user_id].append(attempt)
 
-    # Student performance summary
-    student_performance = []
+        # Student performance summary
+        student_performance = []
     
-    # Bulk fetch student groups and group assignments to avoid N+1 in loop
-    student_group_ids_map = {} # student_id -> list of group_ids
-    all_group_ids = set()
+        # Bulk fetch student groups and group assignments to avoid N+1 in loop
+        student_group_ids_map = {} # student_id -> list of group_ids
+        all_group_ids = set()
     
-    if enrolled_students:
-        s_ids = [s.id for s in enrolled_students]
-        gs_rows = db.query(GroupStudent.student_id, GroupStudent.group_id).filter(
-            GroupStudent.student_id.in_(s_ids)
-        ).all()
-        for sid, gid in gs_rows:
-            if sid not in student_group_ids_map:
-                student_group_ids_map[sid] = []
-            student_group_ids_map[sid].append(gid)
-            all_group_ids.add(gid)
-            
-    group_assignments_map = {} # group_id -> list of assignments
-    if all_group_ids:
-        g_assignments = db.query(Assignment).filter(
-            Assignment.group_id.in_(list(all_group_ids)),
-            Assignment.is_active == True
-        ).all()
-        for asm in g_assignments:
-            if asm.group_id not in group_assignments_map:
-                group_assignments_map[asm.group_id] = []
-            group_assignments_map[asm.group_id].append(asm)
-
-    for student in enrolled_students:
-        student_steps = [sp for sp in step_progress_records if sp.user_id == student.id]
-        student_completed = len([sp for sp in student_steps if sp.status == "completed"])
-        student_time = sum(sp.time_spent_minutes for sp in student_steps)
-        
-        # Determine current lesson / last activity
-        last_activity = None
-        current_lesson_title = "Not started"
-        
-        # Sort by last_accessed descending to find most detailed activity
-        if student_steps:
-             active_steps = [s for s in student_steps if s.visited_at]
-             if active_steps:
-                 latest_step = max(active_steps, key=lambda x: x.visited_at)
-                 last_activity = latest_step.visited_at
-                 
-                 # Resolve lesson title
-                 if latest_step.lesson_id in lesson_titles:
-                     current_lesson_title = lesson_titles[latest_step.lesson_id]
-        
-        # Calculate progress in current lesson
-        current_lesson_progress = 0
-        if last_activity and latest_step:
-            c_lesson_id = latest_step.lesson_id
-            l_total_steps = lesson_step_counts.get(c_lesson_id, 0)
-            if l_total_steps > 0:
-                l_completed = len([sp for sp in student_steps 
-                                 if sp.lesson_id == c_lesson_id and sp.status == "completed"])
-                current_lesson_progress = (l_completed / l_total_steps) * 100
-                current_lesson_steps_completed = l_completed
-                current_lesson_steps_total = l_total_steps
+        if enrolled_students:
+            s_ids = [s.id for s in enrolled_students]
+            gs_rows = db.query(GroupStudent.student_id, GroupStudent.group_id).filter(
+                GroupStudent.student_id.in_(s_ids)
+            ).all()
+            for sid, gid in gs_rows:
+                if sid not in student_group_ids_map:
+                    student_group_ids_map[sid] = []
+                student_group_ids_map[sid].append(gid)
+                all_group_ids.add(gid)
+            
+        group_assignments_map = {} # group_id -> list of assignments
+        if all_group_ids:
+            g_assignments = db.query(Assignment).filter(
+                Assignment.group_id.in_(list(all_group_ids)),
+                Assignment.is_active == True
+            ).all()
+            for asm in g_assignments:
+                if asm.group_id not in group_assignments_map:
+                    group_assignments_map[asm.group_id] = []
+                group_assignments_map[asm.group_id].append(asm)
+    
+        # Bulk fetch submissions: (assignment_id, student_id) -> first submission
+        submissions_map = {}
+        group_assignment_ids = {a.id for asms in group_assignments_map.values() for a in asms}
+        if group_assignment_ids and enrolled_students:
+            for submission in db.query(AssignmentSubmission).filter(
+                AssignmentSubmission.assignment_id.in_(group_assignment_ids),
+                AssignmentSubmission.user_id.in_([s.id for s in enrolled_students])
+            ).order_by(AssignmentSubmission.id).all():
+                submissions_map.setdefault((submission.assignment_id, submission.user_id), submission)
+
+        for student in enrolled_students:
+            student_completed, student_time = student_step_totals.get(student.id, (0, 0))
+        
+            # Determine current lesson / last activity
+            last_activity = None
+            current_lesson_title = "Not started"
+        
+            latest_step = student_latest_step.get(student.id)
+            if latest_step:
+                c_lesson_id, last_activity = latest_step
+            
+                # Resolve lesson title
+                if c_lesson_id in lesson_titles:
+                    current_lesson_title = lesson_titles[c_lesson_id]
+        
+            # Calculate progress in current lesson
+            current_lesson_progress = 0
+            if last_activity and latest_step:
+                l_total_steps = lesson_step_counts.get(c_lesson_id, 0)
+                if l_total_steps > 0:
+                    l_completed = student_lesson_completed.get(student.id, 0)
+                    current_lesson_progress = (l_completed / l_total_steps) * 100
+                    current_lesson_steps_completed = l_completed
+                    current_lesson_steps_total = l_total_steps
+                else:
+                    current_lesson_steps_completed = 0
+                    current_lesson_steps_total = 0
             else:
                 current_lesson_steps_completed = 0
                 current_lesson_steps_total = 0
-        else:
-            current_lesson_steps_completed = 0
-            current_lesson_steps_total = 0
-        
-        # Get assignment performance for THIS STUDENT
-        # Use group-based assignments (teacher-assigned homework)
-        # Get assignment performance for THIS STUDENT
-        # Use bulk fetched data
-        current_s_group_ids = student_group_ids_map.get(student.id, [])
-        student_group_assignments = []
-        for gid in current_s_group_ids:
-            if gid in group_assignments_map:
-                student_group_assignments.extend(group_assignments_map[gid])
-        
-        # Deduplicate assignments by ID just in case
-        unique_assignments = {a.id: a for a in student_group_assignments}
-        student_group_assignments = list(unique_assignments.values())
-        
-        student_assignments_total = len(student_group_assignments)
-        student_assignments_completed = 0
-        total_score = 0
-        max_possible_score = 0
-        
-        last_test_res = None
-        last_submission_date = None
-        
-        for assignment in student_group_assignments:
-            submission = db.query(AssignmentSubmission).filter(
-                AssignmentSubmission.assignment_id == assignment.id,
-                AssignmentSubmission.user_id == student.id
-            ).first()
+        
+            # Get assignment performance for THIS STUDENT
+            # Use group-based assignments (teacher-assigned homework)
+            # Get assignment performance for THIS STUDENT
+            # Use bulk fetched data
+            current_s_group_ids = student_group_ids_map.get(student.id, [])
+            student_group_assignments = []
+            for gid in current_s_group_ids:
+                if gid in group_assignments_map:
+                    student_group_assignments.extend(group_assignments_map[gid])
+        
+            # Deduplicate assignments by ID just in case
+            unique_assignments = {a.id: a for a in student_group_assignments}
+            student_group_assignments = list(unique_assignments.values())
+        
+            student_assignments_total = len(student_group_assignments)
+            student_assignments_completed = 0
+            total_score = 0
+            max_possible_score = 0
+        
+            last_test_res = None
+            last_submission_date = None
+        
+            for assignment in student_group_assignments:
+                submission = submissions_map.get((assignment.id, student.id))
             
-            if submission:
-                if submission.is_graded:
-                     student_assignments_completed += 1
-                     if submission.score is not None:
-                        total_score += submission.score
-                        max_possible_score += assignment.max_score or 0
+                if submission:
+                    if submission.is_graded:
+                         student_assignments_completed += 1
+                         if submission.score is not None:
+                            total_score += submission.score
+                            max_possible_score += assignment.max_score or 0
                 
-                # Track last submission for "Last Test" column
-                # assuming submission.created_at is available or we use id if time missing, but created_at is better
-                # Check model: usually created_at or submitted_at
-                s_date = submission.submitted_at or submission.created_at
-                if s_date:
-                    if last_submission_date is None or s_date > last_submission_date:
-                        last_submission_date = s_date
-                        pct = (submission.score / assignment.max_score * 100) if (submission.score is not None and assignment.max_score) else 0
-                        last_test_res = {
-                            "title": assignment.title,
-                            "score": submission.score,
-                            "max_score": assignment.max_score,
-                            "percentage": round(pct, 1),
-                            "type": "assignment"
-                        }
-
-        # Check for Quiz Attempts (Step Quizzes)
-        if student.id in student_quiz_attempts:
-            for attempt in student_quiz_attempts[student.id]:
-                a_date = attempt.completed_at or attempt.created_at
-                if a_date:
-                    # If this is newer than the last assignment submission
-                    if last_submission_date is None or a_date > last_submission_date:
-                        last_submission_date = a_date
+                    # Track last submission for "Last Test" column
+                    # assuming submission.created_at is available or we use id if time missing, but created_at is better
+                    # Check model: usually created_at or submitted_at
+                    s_date = submission.submitted_at or submission.created_at
+                    if s_date:
+                        if last_submission_date is None or s_date > last_submission_date:
+                            last_submission_date = s_date
+                            pct = (submission.score / assignment.max_score * 100) if (submission.score is not None and assignment.max_score) else 0
+                            last_test_res = {
+                                "title": assignment.title,
+                                "score": submission.score,
+                                "max_score": assignment.max_score,
+                                "percentage": round(pct, 1),
+                                "type": "assignment"
+                            }
+
+            # Check for Quiz Attempts (Step Quizzes)
+            if student.id in student_quiz_attempts:
+                for attempt in student_quiz_attempts[student.id]:
+                    a_date = attempt.completed_at or attempt.created_at
+                    if a_date:
+                        # If this is newer than the last assignment submission
+                        if last_submission_date is None or a_date > last_submission_date:
+                            last_submission_date = a_date
                         
-                        # Determine if SAT Math or Verbal
-                        # Determine if SAT Math or Verbal
-                        title = attempt.quiz_title or "Quiz"
+                            # Determine if SAT Math or Verbal
+                            # Determine if SAT Math or Verbal
+                            title = attempt.quiz_title or "Quiz"
                         
-                        # Fallback or Augment with Lesson Title to catch "[Verbal]" or "[Math]" 
-                        # if the quiz title is generic (e.g. "Quiz")
-                        lesson_title = lesson_titles.get(attempt.lesson_id, "")
-                        full_title_check = title + " " + lesson_title
+                            # Fallback or Augment with Lesson Title to catch "[Verbal]" or "[Math]" 
+                            # if the quiz title is generic (e.g. "Quiz")
+                            lesson_title = lesson_titles.get(attempt.lesson_id, "")
+                            full_title_check = title + " " + lesson_title
                         
-                        is_verbal = "[Verbal]" in full_title_check
-                        is_math = "[Math]" in full_title_check
+                            is_verbal = "[Verbal]" in full_title_check
+                            is_math = "[Math]" in full_title_check
                         
-                        test_type = "quiz"
-                        result_math_pct = 0
-                        result_verbal_pct = 0
+                            test_type = "quiz"
+                            result_math_pct = 0
+                            result_verbal_pct = 0
                         
-                        if is_verbal:
-                            test_type = "sat_verbal"
-                            result_verbal_pct = round(attempt.score_percentage, 1)
-                        elif is_math:
-                            test_type = "sat_math"
-                            result_math_pct = round(attempt.score_percentage, 1)
+                            if is_verbal:
+                                test_type = "sat_verbal"
+                                result_verbal_pct = round(attempt.score_percentage, 1)
+                            elif is_math:
+                                test_type = "sat_math"
+                                result_math_pct = round(attempt.score_percentage, 1)
                         
-                        # Improve display title if generic
-                        display_title = title
-                        if title == "Quiz" and lesson_title:
-                             display_title = lesson_title
-
-                        last_test_res = {
-                            "title": display_title,
-                            "score": attempt.correct_answers,
-                            "max_score": attempt.total_questions,
-                            "percentage": round(attempt.score_percentage, 1),
-                            "type": test_type,
-                            "math_percent": result_math_pct,
-                            "verbal_percent": result_verbal_pct
-                        }
-        
-        # OVERRIDE with External SAT Data if available
-        # User explicitly stated "Latest Test" is from external system
-        if student.id in student_sat_map:
-             sat_res = student_sat_map[student.id]
-             # We could compare dates, but user said "Last Test IS NOT connected to lessons", 
-             # likely implying this column is reserved for SAT results.
-             # However, to be safe, let's prefer SAT result if it exists.
-             last_test_res = sat_res
-
-        student_performance.append({
-            "student_id": student.id,
-            "student_name": student.name,
-            "email": student.email,
-            "group_name": student.group_name if hasattr(student, 'group_name') else student_groups_map.get(student.id, "No Group"),
-            "completed_steps": student_completed,
-            "total_steps_available": total_steps,
-            "completion_percentage": (student_completed / total_steps * 100) if total_steps > 0 else 0,
-            "time_spent_minutes": student_time,
-            "completed_assignments": student_assignments_completed,
-            "total_assignments": student_assignments_total,
-            "assignment_score_percentage": (total_score / max_possible_score * 100) if max_possible_score > 0 else 0,
-            "last_activity": last_activity,
-            "current_lesson": current_lesson_title,
-            "current_lesson_progress": current_lesson_progress,
-            "current_lesson_steps_completed": current_lesson_steps_completed,
-            "current_lesson_steps_total": current_lesson_steps_total,
-            "last_test_result": last_test_res
-        })
+                            # Improve display title if generic
+                            display_title = title
+                            if title == "Quiz" and lesson_title:
+                                 display_title = lesson_title
+
+                            last_test_res = {
+                                "title": display_title,
+                                "score": attempt.correct_answers,
+                                "max_score": attempt.total_questions,
+                                "percentage": round(attempt.score_percentage, 1),
+                                "type": test_type,
+                                "math_percent": result_math_pct,
+                                "verbal_percent": result_verbal_pct
+                            }
+        
+            # OVERRIDE with External SAT Data if available
+            # User explicitly stated "Latest Test" is from external system
+            if student.id in student_sat_map:
+                 sat_res = student_sat_map[student.id]
+                 # We could compare dates, but user said "Last Test IS NOT connected to lessons", 
+                 # likely implying this column is reserved for SAT results.
+                 # However, to be safe, let's prefer SAT result if it exists.
+                 last_test_res = sat_res
+
+            student_performance.append({
+                "student_id": student.id,
+                "student_name": student.name,
+                "email": student.email,
+                "group_name": student.group_name if hasattr(student, 'group_name') else student_groups_map.get(student.id, "No Group"),
+                "completed_steps": student_completed,
+                "total_steps_available": total_steps,
+                "completion_percentage": (student_completed / total_steps * 100) if total_steps > 0 else 0,
+                "time_spent_minutes": student_time,
+                "completed_assignments": student_assignments_completed,
+                "total_assignments": student_assignments_total,
+                "assignment_score_percentage": (total_score / max_possible_score * 100) if max_possible_score > 0 else 0,
+                "last_activity": last_activity,
+                "current_lesson": current_lesson_title,
+                "current_lesson_progress": current_lesson_progress,
+                "current_lesson_steps_completed": current_lesson_steps_completed,
+                "current_lesson_steps_total": current_lesson_steps_total,
+                "last_test_result": last_test_res
+            })
     
-    return {
-        "course_info": {
-            "id": course.id,
-            "title": course.title,
-            "teacher_name": course.teacher.name if course.teacher else "Unknown"
-        },
-        "structure": {
-            "total_modules": len(modules),
-            "total_lessons": total_lessons,
-            "total_steps": total_steps
-        },
-        "engagement": {
-            "total_enrolled_students": len(enrolled_students),
-            "total_time_spent_minutes": total_time_spent,
-            "total_completed_steps": completed_steps,
-            "average_completion_rate": (completed_steps / (total_steps * len(enrolled_students)) * 100) if total_steps > 0 and enrolled_students else 0
-        },
-        "student_performance": student_performance
-    }
+        return {
+            "course_info": {
+                "id": course.id,
+                "title": course.title,
+                "teacher_name": course.teacher.name if course.teacher else "Unknown"
+            },
+            "structure": {
+                "total_modules": analytics_cache.total_modules or 0,
+                "total_lessons": analytics_cache.total_lessons or 0,
+                "total_steps": total_steps
+            },
+            "engagement": {
+                "total_enrolled_students": len(enrolled_students),
+                "total_time_spent_minutes": total_time_spent,
+                "total_completed_steps": completed_steps,
+                "average_completion_rate": (completed_steps / (total_steps * len(enrolled_students)) * 100) if total_steps > 0 and enrolled_students else 0
+            },
+            "student_performance": student_performance,
+            "last_calculated_at": analytics_cache.last_calculated_at
+        }
+
+    return await run_in_threadpool(build_overview)
 
 @router.get("/video-engagement/{course_id}")
-async def get_video_engagement_analytics(
+def get_video_engagement_analytics(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -764,7 +744,7 @@ async def get_video_engagement_analytics(
     }
 
 @router.get("/quiz-performance/{course_id}")
-async def get_quiz_performance_analytics(
+def get_quiz_performance_analytics(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -876,7 +856,7 @@ def extract_correct_answers_from_gaps(text: str, separator: str = ',') -> List[s
     return results
 
 @router.get("/course/{course_id}/quiz-errors")
-async def get_quiz_question_errors(
+def get_quiz_question_errors(
     course_id: int,
     group_id: Optional[int] = None,
     lesson_id: Optional[int] = None,
@@ -934,177 +914,36 @@ async def get_quiz_question_errors(
         ).subquery()
         query = query.filter(QuizAttempt.user_id.in_(group_student_ids))
     
-    # Aggregate by question_id
-    # key: (step_id, question_id)
-    from collections import defaultdict
-    error_stats = defaultdict(lambda: {"total": 0, "wrong": 0, "step_id": None, "lesson_id": None, "question_text": "", "lesson_title": ""})
-
-    # --- 1. Internal Quiz Attempts Processing ---
-    attempts = query.all()
-    
-    if not attempts:
+    total_attempts = query.count()
+    if not total_attempts:
         return {
             "course_id": course_id,
             "total_attempts_analyzed": 0,
             "questions": []
         }
 
-    # Pre-fetch all referenced steps to verify correct answers
-    step_ids = list(set(a.step_id for a in attempts))
-    steps = db.query(Step).filter(Step.id.in_(step_ids)).all()
-    
-    # helper to check if answer is correct
-    def get_answer_error_score(step_id, step_content, question_id, user_answer):
-        """Returns error score from 0.0 (perfect) to 1.0 (all wrong). None if unverifiable."""
-        try:
-            if not step_content: return None
-            questions = step_content.get("questions", [])
-            for q in questions:
-                if str(q.get("id")) == str(question_id):
-                    q_type = q.get("question_type")
-                    if q_type == "long_text":
-                        return None # Non-gradable
-                    
-                    # Try different possible keys for correct answer
-                    actual_correct = q.get("correct_answer")
-                    if actual_correct is None:
-                        actual_correct = q.get("correctAnswer")
-                    
-                    def norm_val(v):
-                        if v is None: return ""
-                        s = str(v).strip().lower()
-                        # Replace comma with dot for international numbers
-                        s = s.replace(",", ".")
-                        # Remove all whitespace to handle "1 / 16"
-                        s = "".join(s.split())
-                        if s.startswith("[") and s.endswith("]") and "," not in s:
-                            s = s[1:-1].strip()
-                        return s
-
-                    def to_float(s):
-                        try:
-                            if "/" in s:
-                                parts = s.split("/")
-                                if len(parts) == 2:
-                                    return float(parts[0]) / float(parts[1])
-                            return float(s)
-                        except:
-                            return None
-
-                    def check_match(u, a):
-                        u_norm = norm_val(u)
-                        a_str = str(a).strip().lower()
-                        # Support multiple options separated by |
-                        options = [norm_val(o) for o in a_str.split("|")]
-                        
-                        # Direct string match
-                        if u_norm in options:
-                            return True
-                            
-                        # Try numeric evaluation (e.g. 0.0625 == 1/16)
-                        u_float = to_float(u_norm)
-                        if u_float is not None:
-                            for opt in options:
-                                o_float = to_float(opt)
-                                if o_float is not None and abs(u_float - o_float) < 0.0001:
-                                    return True
-                        return False
-
-                    # CHECK IF VERIFIABLE
-                    if actual_correct is None: return None
-                    if isinstance(actual_correct, str) and not actual_correct.strip(): return None
-                    if isinstance(actual_correct, list) and len(actual_correct) == 0: return None
-                    if isinstance(actual_correct, list) and all(not norm_val(x) for x in actual_correct): return None
-
-                    # Handle lists (multiple gaps or multiple choice)
-                    if isinstance(actual_correct, list):
-                        u_list = user_answer if isinstance(user_answer, list) else [user_answer]
-                        
-                        # Partial credit: count how many are WRONG
-                        base_size = max(len(actual_correct), 1)
-                        mismatches = 0
-                        
-                        # For fill_blank, order matters strictly
-                        for i in range(len(actual_correct)):
-                            u_v = u_list[i] if i < len(u_list) else ""
-                            if not check_match(u_v, actual_correct[i]):
-                                mismatches += 1
-                        
-                        if len(u_list) > len(actual_correct):
-                            mismatches += (len(u_list) - len(actual_correct))
-                            
-                        return min(mismatches / base_size, 1.0)
-                    
-                    # Single value comparison
-                    u_val = user_answer
-                    if isinstance(user_answer, list) and len(user_answer) > 0:
-                        u_val = user_answer[0]
-                    
-                    is_correct = check_match(u_val, actual_correct)
-                    return 0.0 if is_correct else 1.0
-                    
-            return None # Question not matching this ID
-        except:
-            return None
-
-    step_data_cache = {}
-    for s in steps:
-        try:
-            step_data_cache[s.id] = json.loads(s.content_text) if s.content_text else {}
-        except:
-            step_data_cache[s.id] = {}
-
-    for attempt in attempts:
-        try:
-            answers_data = attempt.answers
-            if isinstance(answers_data, str):
-                answers_data = json.loads(answers_data)
-            
-            sid = attempt.step_id
-            s_content = step_data_cache.get(sid, {})
-            
-            def process_q_error(qid, val):
-                err = get_answer_error_score(sid, s_content, qid, val)
-                if err is not None:
-                    key = (sid, str(qid))
-                    error_stats[key]["step_id"] = sid
-                    error_stats[key]["lesson_id"] = attempt.lesson_id
-                    error_stats[key]["total"] += 1
-                    error_stats[key]["wrong"] += err
-
-            if isinstance(answers_data, list):
-                for ans in answers_data:
-                    if isinstance(ans, list) and len(ans) >= 2:
-                        process_q_error(ans[0], ans[1])
-            elif isinstance(answers_data, dict):
-                for q_id, val in answers_data.items():
-                    process_q_error(q_id, val)
-        except:
+    # Per-question error rates straight from the answer rows (see quiz_answers)
+    error_list = []
+    for step_id, q_id, answered, wrong, q_lesson_id in question_error_stats(db, query):
+        error_rate = (wrong / answered) * 100
+
+        # Filter negligible errors unless specifically viewing a lesson
+        if not lesson_id and error_rate < 5.0:
             continue
 
-    # Calculate error rates and sort
-    error_list = []
-    for (step_id, q_id), stats in error_stats.items():
-        if stats["total"] > 0:
-            error_rate = (stats["wrong"] / stats["total"]) * 100
-            
-            # Filter negligible errors unless specifically viewing a lesson
-            if not lesson_id and error_rate < 5.0:
-                continue
-                
-            error_list.append({
-                "step_id": step_id,
-                "lesson_id": stats.get("lesson_id"),
-                "question_id": q_id,
-                "total_attempts": stats["total"],
-                "wrong_answers": stats["wrong"],
-                "error_rate": round(error_rate, 1),
-                "question_text": "Question " + str(q_id),
-                "question_type": "unknown",
-                "lesson_title": "Internal",
-                "step_title": "Quiz"
-            })
-            
+        error_list.append({
+            "step_id": step_id,
+            "lesson_id": q_lesson_id,
+            "question_id": q_id,
+            "total_attempts": answered,
+            "wrong_answers": wrong,
+            "error_rate": round(error_rate, 1),
+            "question_text": "Question " + str(q_id),
+            "question_type": "unknown",
+            "lesson_title": "Internal",
+            "step_title": "Quiz"
+        })
+
     error_list.sort(key=lambda x: (-x["error_rate"], -x["total_attempts"]))
     error_list = error_list[:limit]
     
@@ -1125,52 +964,26 @@ async def get_quiz_question_errors(
             item["lesson_title"] = l_title
             
             # Since we filtered out quiz_total above, all items are individual questions
-            try:
-                content = json.loads(step.content_text) if step.content_text else {}
-                questions = content.get("questions", [])
-                
-                # Find the actual question text in the step content
-                found = False
-                for q in questions:
-                    if str(q.get("id")) == str(item["question_id"]):
-                        # Try multiple possible fields for text
-                        q_text = q.get("question_text") or q.get("text") or q.get("content")
-                        if q_text:
-                            item["question_text"] = q_text
-                            item["question_type"] = q.get("question_type") or "unknown"
-                            found = True
-                        break
-                
-                if not found and item["question_text"].startswith("Question "):
-                    # Fallback to make non-titled questions more descriptive
-                    item["question_text"] = f"{item['question_text']} (in {step.title})"
-            except:
-                pass
+            question = get_compiled_quiz(step).question(item["question_id"])
+            # Try multiple possible fields for text
+            q_text = question.text if question is not None else None
+            if q_text:
+                item["question_text"] = q_text
+                item["question_type"] = question.question_type or "unknown"
+            elif item["question_text"].startswith("Question "):
+                # Fallback to make non-titled questions more descriptive
+                item["question_text"] = f"{item['question_text']} (in {step.title})"
 
     return {
         "course_id": course_id,
         "group_id": group_id,
-        "total_attempts_analyzed": len(attempts),
+        "total_attempts_analyzed": total_attempts,
         "questions": error_list
     }
 
 
-@router.get("/students/all")
-async def get_all_students_analytics(
-    course_id: Optional[int] = None,
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
-):
-    """Получить аналитику по всем доступным студентам
-    
-    Args:
-        course_id: Опционально - ID курса для фильтрации последнего урока
-    """
-    
-    # Проверка прав доступа
-    if current_user.role not in ["teacher", "curator", "admin", "head_curator"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
+def visible_students_query(current_user: UserInDB, db: Session):
+    """Active students the user may see: teachers their groups and courses, curators their groups, admins all"""
     # Базовый запрос студентов
     students_query = db.query(UserInDB).filter(UserInDB.role == "student", UserInDB.is_active == True)
     
@@ -1198,161 +1011,29 @@ async def get_all_students_analytics(
         students_query = students_query.filter(UserInDB.id.in_(group_students))
     
     # Админ видит всех студентов (без дополнительной фильтрации)
+    return students_query
+
+
+@router.get("/students/all")
+def get_all_students_analytics(
+    course_id: Optional[int] = None,
+    current_user: UserInDB = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """Получить аналитику по всем доступным студентам
     
-    students = students_query.all()
+    Args:
+        course_id: Опционально - ID курса для фильтрации последнего урока
+    """
     
-    students_analytics = []
-    for student in students:
-        # Получаем группы студента
-        student_groups = db.query(Group).join(GroupStudent).filter(
-            GroupStudent.student_id == student.id
-        ).all()
-        
-        # Получаем ВСЕ курсы где есть прогресс студента для подсчета общего прогресса
-        all_courses_query = db.query(Course).join(
-            Module, Module.course_id == Course.id
-        ).join(
-            Lesson, Lesson.module_id == Module.id
-        ).join(
-            Step, Step.lesson_id == Lesson.id
-        ).join(
-            StepProgress, StepProgress.step_id == Step.id
-        ).filter(
-            StepProgress.user_id == student.id
-        )
-        
-        all_courses_with_progress = all_courses_query.distinct().all()
-        
-        # Если нет прогресса, пробуем через Enrollment для общего прогресса
-        if not all_courses_with_progress:
-            enrollment_query = db.query(Course).join(Enrollment).filter(
-                Enrollment.user_id == student.id,
-                Course.is_active == True
-            )
-            all_courses_with_progress = enrollment_query.all()
-        
-        active_courses = all_courses_with_progress
-        
-        # Получаем курсы для фильтрации last_lesson (если указан course_id)
-        last_lesson_courses = active_courses
-        if course_id:
-            last_lesson_courses = [c for c in active_courses if c.id == course_id]
-        
-        # Подсчитываем общий прогресс
-        total_steps = 0
-        completed_steps = 0
-        total_assignments = 0
-        completed_assignments = 0
-        total_assignment_score = 0
-        total_max_score = 0
-        
-        for course in active_courses:
-            # Подсчет шагов
-            course_steps = db.query(Step).join(Lesson).join(Module).filter(
-                Module.course_id == course.id
-            ).count()
-            total_steps += course_steps
-            
-            # Правильный подсчет завершенных шагов через JOIN (как в детальном прогрессе)
-            course_completed_steps = db.query(StepProgress).join(
-                Step, StepProgress.step_id == Step.id
-            ).join(
-                Lesson, Step.lesson_id == Lesson.id
-            ).join(
-                Module, Lesson.module_id == Module.id
-            ).filter(
-                StepProgress.user_id == student.id,
-                Module.course_id == course.id,
-                StepProgress.status == "completed"
-            ).count()
-            completed_steps += course_completed_steps
-            
-            # Подсчет заданий
-            course_assignments = db.query(Assignment).join(Lesson).join(Module).filter(
-                Module.course_id == course.id
-            ).all()
-            total_assignments += len(course_assignments)
-            
-            for assignment in course_assignments:
-                submission = db.query(AssignmentSubmission).filter(
-                    AssignmentSubmission.assignment_id == assignment.id,
-                    AssignmentSubmission.user_id == student.id
-                ).first()
-                
-                if submission and submission.is_graded:
-                    completed_assignments += 1
-                    total_assignment_score += submission.score or 0
-                    total_max_score += assignment.max_score or 0
-        
-        # Вычисляем проценты
-        completion_percentage = (completed_steps / total_steps * 100) if total_steps > 0 else 0
-        assignment_score_percentage = (total_assignment_score / total_max_score * 100) if total_max_score > 0 else 0
-        
-        # Получаем информацию о последнем уроке (фильтруем по курсу если указан)
-        last_lesson_info = None
-        
-        # Build query with optional course filter
-        step_progress_query = db.query(StepProgress).join(
-            Step, StepProgress.step_id == Step.id
-        ).join(
-            Lesson, Step.lesson_id == Lesson.id
-        ).join(
-            Module, Lesson.module_id == Module.id
-        ).filter(
-            StepProgress.user_id == student.id
-        )
-        
-        # Filter by course if provided
-        if course_id:
-            step_progress_query = step_progress_query.filter(Module.course_id == course_id)
-            
-        last_step_progress = step_progress_query.order_by(StepProgress.visited_at.desc()).first()
-        
-        if last_step_progress:
-            # Получаем информацию об уроке
-            lesson = db.query(Lesson).join(Step).filter(
-                Step.id == last_step_progress.step_id
-            ).first()
-            
-            if lesson:
-                # Считаем прогресс урока
-                total_lesson_steps = db.query(Step).filter(
-                    Step.lesson_id == lesson.id
-                ).count()
-                
-                completed_lesson_steps = db.query(StepProgress).join(Step).filter(
-                    StepProgress.user_id == student.id,
-                    Step.lesson_id == lesson.id,
-                    StepProgress.status == "completed"
-                ).count()
-                
-                lesson_progress_percentage = (completed_lesson_steps / total_lesson_steps * 100) if total_lesson_steps > 0 else 0
-                
-                last_lesson_info = {
-                    "lesson_title": lesson.title,
-                    "lesson_progress_percentage": round(lesson_progress_percentage, 1),
-                    "completed_steps": completed_lesson_steps,
-                    "total_steps": total_lesson_steps
-                }
-        
-        students_analytics.append({
-            "student_id": student.id,
-            "student_name": student.name,
-            "student_email": student.email,
-            "student_number": student.student_id,
-            "groups": [{"id": g.id, "name": g.name} for g in student_groups],
-            "active_courses_count": len(active_courses),
-            "total_steps": total_steps,
-            "completed_steps": completed_steps,
-            "completion_percentage": round(completion_percentage, 1),
-            "total_assignments": total_assignments,
-            "completed_assignments": completed_assignments,
-            "assignment_score_percentage": round(assignment_score_percentage, 1),
-            "total_study_time_minutes": student.total_study_time_minutes,
-            "daily_streak": student.daily_streak,
-            "last_activity_date": student.last_activity_date,
-            "last_lesson": last_lesson_info
-        })
+    # Проверка прав доступа
+    if current_user.role not in ["teacher", "curator", "admin", "head_curator"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    students_query = visible_students_query(current_user, db)
+    
+    # Все метрики считаются агрегирующими запросами по всему набору студентов
+    students_analytics = build_students_analytics(db, students_query, course_id)
     
     return {
         "students": students_analytics,
@@ -1360,7 +1041,7 @@ async def get_all_students_analytics(
     }
 
 @router.get("/groups")
-async def get_groups_analytics(
+def get_groups_analytics(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -1497,7 +1178,7 @@ async def get_groups_analytics(
     }
 
 @router.get("/course/{course_id}/groups")
-async def get_course_groups_analytics(
+def get_course_groups_analytics(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1617,7 +1298,7 @@ async def get_course_groups_analytics(
     }
 
 @router.get("/group/{group_id}/students")
-async def get_group_students_analytics(
+def get_group_students_analytics(
     group_id: int,
     course_id: Optional[int] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1815,7 +1496,7 @@ async def get_group_students_analytics(
     }
 
 @router.get("/student/{student_id}/progress-history")
-async def get_student_progress_history(
+def get_student_progress_history(
     student_id: int,
     course_id: Optional[int] = None,
     days: int = Query(30, description="Number of days to look back"),
@@ -1902,620 +1583,252 @@ async def get_student_progress_history(
         "history": history_data
     }
 
-async def generate_student_pdf_report(student_data: dict, progress_data: dict) -> bytes:
-    """Генерация PDF отчета для студента"""
-    try:
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.lib import colors
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-        
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Заголовок отчета
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=1  # Center alignment
-        )
-        
-        story.append(Paragraph("Отчет о прогрессе студента", title_style))
-        story.append(Spacer(1, 12))
-        
-        # Информация о студенте
-        student_info = [
-            ['Имя:', student_data.get('student_name', 'N/A')],
-            ['Email:', student_data.get('student_email', 'N/A')],
-            ['Номер студента:', student_data.get('student_number', 'N/A')],
-            ['Общий прогресс:', f"{student_data.get('completion_percentage', 0)}%"],
-            ['Время обучения:', f"{student_data.get('total_study_time_minutes', 0)} мин"],
-            ['Дневная серия:', f"{student_data.get('daily_streak', 0)} дней"],
-        ]
-        
-        student_table = Table(student_info, colWidths=[2*inch, 3*inch])
-        student_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('BACKGROUND', (1, 0), (1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(Paragraph("Информация о студенте", styles['Heading2']))
-        story.append(student_table)
-        story.append(Spacer(1, 12))
-        
-        # Прогресс по курсам
-        if progress_data and 'courses' in progress_data:
-            story.append(Paragraph("Прогресс по курсам", styles['Heading2']))
-            
-            for course in progress_data['courses']:
-                story.append(Paragraph(f"Курс: {course.get('course_title', 'N/A')}", styles['Heading3']))
-                
-                course_info = [
-                    ['Преподаватель:', course.get('teacher_name', 'N/A')],
-                    ['Модули:', str(len(course.get('modules', [])))],
-                ]
-                
-                course_table = Table(course_info, colWidths=[2*inch, 3*inch])
-                course_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ]))
-                
-                story.append(course_table)
-                story.append(Spacer(1, 12))
-        
-        # Статистика заданий
-        story.append(Paragraph("Статистика выполнения заданий", styles['Heading2']))
-        assignment_info = [
-            ['Всего заданий:', str(student_data.get('total_assignments', 0))],
-            ['Выполнено:', str(student_data.get('completed_assignments', 0))],
-            ['Средний балл:', f"{student_data.get('assignment_score_percentage', 0)}%"],
-        ]
-        
-        assignment_table = Table(assignment_info, colWidths=[2*inch, 3*inch])
-        assignment_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgreen),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ]))
-        
-        story.append(assignment_table)
-        story.append(Spacer(1, 12))
-        
-        # Дата генерации отчета
-        story.append(Paragraph(f"Отчет сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}", styles['Normal']))
-        
-        doc.build(story)
-        buffer.seek(0)
-        return buffer.getvalue()
-        
-    except ImportError:
-        # Если reportlab не установлен, возвращаем простой текстовый отчет
-        report_text = f"""
-ОТЧЕТ О ПРОГРЕССЕ СТУДЕНТА
-
-Имя: {student_data.get('student_name', 'N/A')}
-Email: {student_data.get('student_email', 'N/A')}
-Номер студента: {student_data.get('student_number', 'N/A')}
-
-ПРОГРЕСС:
-- Общий прогресс: {student_data.get('completion_percentage', 0)}%
-- Выполнено шагов: {student_data.get('completed_steps', 0)} из {student_data.get('total_steps', 0)}
-- Время обучения: {student_data.get('total_study_time_minutes', 0)} минут
-- Дневная серия: {student_data.get('daily_streak', 0)} дней
-
-ЗАДАНИЯ:
-- Всего заданий: {student_data.get('total_assignments', 0)}
-- Выполнено: {student_data.get('completed_assignments', 0)}
-- Средний балл: {student_data.get('assignment_score_percentage', 0)}%
-
-Отчет сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}
-        """
-        return report_text.encode('utf-8')
+EXCEL_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
-@router.post("/export/student/{student_id}")
-async def export_student_report(
-    student_id: int,
-    course_id: Optional[int] = None,
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
-):
-    """Экспорт PDF отчета по студенту"""
-    
-    # Проверка прав доступа
-    if current_user.role not in ["teacher", "curator", "admin", "head_curator"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    # Получаем данные студента (используем существующий эндпоинт)
-    try:
-        # Получаем базовые данные студента из эндпоинта all students
-        all_students_data = get_all_students_analytics(current_user, db)
-        student_data = None
-        
-        for student in all_students_data['students']:
-            if student['student_id'] == student_id:
-                student_data = student
-                break
-        
-        if not student_data:
-            raise HTTPException(status_code=404, detail="Student not found or access denied")
-        
-        # Получаем детальные данные прогресса
-        progress_data = get_detailed_student_analytics(student_id, course_id, current_user, db)
-        
-        # Генерируем PDF
-        pdf_content = generate_student_pdf_report(student_data, progress_data)
-        
-        # Формируем имя файла
-        filename = f"student_report_{student_data.get('student_number', student_id)}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
 
-@router.post("/export/group/{group_id}")
-async def export_group_report(
-    group_id: int,
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
-):
-    """Экспорт PDF отчета по группе"""
-    
-    # Проверка прав доступа
-    if current_user.role not in ["teacher", "curator", "admin", "head_curator"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    try:
-        # Получаем данные группы
-        group_data = get_group_students_analytics(group_id, current_user, db)
-        
-        # Генерируем PDF отчет для группы
-        try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.lib.units import inch
-            from reportlab.lib import colors
-            
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Заголовок
-            story.append(Paragraph(f"Отчет по группе: {group_data['group_info']['name']}", styles['Title']))
-            story.append(Spacer(1, 12))
-            
-            # Информация о группе
-            group_info = [
-                ['Название группы:', group_data['group_info']['name']],
-                ['Описание:', group_data['group_info']['description'] or 'N/A'],
-                ['Преподаватель:', group_data['group_info']['teacher_name'] or 'N/A'],
-                ['Куратор:', group_data['group_info']['curator_name'] or 'N/A'],
-                ['Количество студентов:', str(group_data['total_students'])],
-            ]
-            
-            group_table = Table(group_info, colWidths=[2*inch, 4*inch])
-            group_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ]))
-            
-            story.append(Paragraph("Информация о группе", styles['Heading2']))
-            story.append(group_table)
-            story.append(Spacer(1, 12))
-            
-            # Таблица студентов
-            if group_data['students']:
-                story.append(Paragraph("Студенты группы", styles['Heading2']))
-                
-                student_data = [['Имя', 'Email', 'Прогресс %', 'Время (мин)', 'Задания']]
-                
-                for student in group_data['students']:
-                    student_data.append([
-                        student['student_name'],
-                        student['student_email'],
-                        f"{student['completion_percentage']}%",
-                        str(student['total_study_time_minutes']),
-                        f"{student['completed_assignments']}/{student['total_assignments']}"
-                    ])
-                
-                students_table = Table(student_data, colWidths=[1.5*inch, 2*inch, 1*inch, 1*inch, 1*inch])
-                students_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                
-                story.append(students_table)
-            
-            story.append(Spacer(1, 12))
-            story.append(Paragraph(f"Отчет сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}", styles['Normal']))
-            
-            doc.build(story)
-            buffer.seek(0)
-            pdf_content = buffer.getvalue()
-            
-        except ImportError:
-            # Fallback к текстовому отчету
-            report_text = f"""
-ОТЧЕТ ПО ГРУППЕ: {group_data['group_info']['name']}
-
-ИНФОРМАЦИЯ О ГРУППЕ:
-- Описание: {group_data['group_info']['description'] or 'N/A'}
-- Преподаватель: {group_data['group_info']['teacher_name'] or 'N/A'}
-- Куратор: {group_data['group_info']['curator_name'] or 'N/A'}
-- Количество студентов: {group_data['total_students']}
-
-СТУДЕНТЫ:
-"""
-            for student in group_data['students']:
-                report_text += f"""
-- {student['student_name']} ({student['student_email']})
-  Прогресс: {student['completion_percentage']}%
-  Время обучения: {student['total_study_time_minutes']} мин
-  Задания: {student['completed_assignments']}/{student['total_assignments']}
-"""
-            
-            report_text += f"\nОтчет сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-            pdf_content = report_text.encode('utf-8')
-        
-        filename = f"group_report_{group_data['group_info']['name']}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate group report: {str(e)}")
+def _find_group_for_export(group_id: int, current_user: UserInDB, db: Session) -> Group:
+    group = db.query(Group).filter(Group.id == group_id).first()
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    if current_user.role == "teacher" and group.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied to this group")
+    elif current_user.role == "curator" and group.curator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied to this group")
+    return group
 
-@router.post("/export/all-students")
-async def export_all_students_report(
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
-):
-    """Экспорт PDF отчета по всем доступным студентам"""
-    
-    # Проверка прав доступа
+
+def prepare_export(
+    report: str,
+    current_user: UserInDB,
+    db: Session,
+    student_id: Optional[int] = None,
+    group_id: Optional[int] = None,
+    course_id: Optional[int] = None,
+) -> Callable[[Session], ExportTask]:
+    """
+    Check access to a report and return ``collect(db)``, which gathers its
+    data into an ExportTask. The collector runs later (possibly in an export
+    job thread), so it reloads the user in the Session it is given.
+    """
     if current_user.role not in ["teacher", "curator", "admin", "head_curator"]:
         raise HTTPException(status_code=403, detail="Access denied")
-    
-    try:
-        # Получаем данные всех студентов (дублируем логику из get_all_students_analytics)
-        students_query = db.query(UserInDB).filter(UserInDB.role == "student", UserInDB.is_active == True)
-        
-        # Фильтрация по ролям
-        if current_user.role == "teacher":
-            teacher_groups = db.query(Group.id).filter(Group.teacher_id == current_user.id).subquery()
-            teacher_courses = db.query(Course.id).filter(Course.teacher_id == current_user.id).subquery()
-            
-            group_students = db.query(GroupStudent.student_id).filter(GroupStudent.group_id.in_(teacher_groups)).subquery()
-            course_students = db.query(Enrollment.user_id).filter(Enrollment.course_id.in_(teacher_courses)).subquery()
-            
-            students_query = students_query.filter(
-                or_(
-                    UserInDB.id.in_(group_students),
-                    UserInDB.id.in_(course_students)
-                )
-            )
-        
-        elif current_user.role == "curator":
-            curator_groups = db.query(Group.id).filter(Group.curator_id == current_user.id).subquery()
-            group_students = db.query(GroupStudent.student_id).filter(GroupStudent.group_id.in_(curator_groups)).subquery()
-            
-            students_query = students_query.filter(UserInDB.id.in_(group_students))
-        
-        students = students_query.all()
-        
-        students_analytics = []
-        for student in students:
-            # Получаем группы студента
-            student_groups = db.query(Group).join(GroupStudent).filter(
-                GroupStudent.student_id == student.id
-            ).all()
-            
-            # Получаем ВСЕ курсы где есть прогресс студента (не через Enrollment!)
-            # Используем StepProgress чтобы найти курсы где студент действительно учится
-            courses_with_progress = db.query(Course).join(
-                Module, Module.course_id == Course.id
-            ).join(
-                Lesson, Lesson.module_id == Module.id
-            ).join(
-                Step, Step.lesson_id == Lesson.id
-            ).join(
-                StepProgress, StepProgress.step_id == Step.id
-            ).filter(
-                StepProgress.user_id == student.id
-            ).distinct().all()
-            
-            # Если нет прогресса, пробуем через Enrollment
-            if not courses_with_progress:
-                courses_with_progress = db.query(Course).join(Enrollment).filter(
-                    Enrollment.user_id == student.id,
-                    Course.is_active == True
-                ).all()
-            
-            active_courses = courses_with_progress
-            
-            # Подсчитываем общий прогресс
-            total_steps = 0
-            completed_steps = 0
-            total_assignments = 0
-            completed_assignments = 0
-            total_assignment_score = 0
-            total_max_score = 0
-            
-            for course in active_courses:
-                # Подсчет шагов
-                course_steps = db.query(Step).join(Lesson).join(Module).filter(
-                    Module.course_id == course.id
-                ).count()
-                total_steps += course_steps
-                
-                # Правильный подсчет завершенных шагов через JOIN (как в детальном прогрессе)
-                course_completed_steps = db.query(StepProgress).join(
-                    Step, StepProgress.step_id == Step.id
-                ).join(
-                    Lesson, Step.lesson_id == Lesson.id
-                ).join(
-                    Module, Lesson.module_id == Module.id
-                ).filter(
-                    StepProgress.user_id == student.id,
-                    Module.course_id == course.id,
-                    StepProgress.status == "completed"
-                ).count()
-                completed_steps += course_completed_steps
-                
-                # Подсчет заданий
-                course_assignments = db.query(Assignment).join(Lesson).join(Module).filter(
-                    Module.course_id == course.id
-                ).all()
-                total_assignments += len(course_assignments)
-                
-                for assignment in course_assignments:
-                    submission = db.query(AssignmentSubmission).filter(
-                        AssignmentSubmission.assignment_id == assignment.id,
-                        AssignmentSubmission.user_id == student.id
-                    ).first()
-                    
-                    if submission and submission.is_graded:
-                        completed_assignments += 1
-                        total_assignment_score += submission.score or 0
-                        total_max_score += assignment.max_score or 0
-            
-            # Вычисляем проценты
-            completion_percentage = (completed_steps / total_steps * 100) if total_steps > 0 else 0
-            assignment_score_percentage = (total_assignment_score / total_max_score * 100) if total_max_score > 0 else 0
-            
-            # Получаем информацию о последнем уроке
-            last_lesson_info = None
-            last_step_progress = db.query(StepProgress).filter(
-                StepProgress.user_id == student.id
-            ).order_by(StepProgress.visited_at.desc()).first()
-            
-            if last_step_progress:
-                # Получаем информацию об уроке
-                lesson = db.query(Lesson).join(Step).filter(
-                    Step.id == last_step_progress.step_id
-                ).first()
-                
-                if lesson:
-                    # Считаем прогресс урока
-                    total_lesson_steps = db.query(Step).filter(
-                        Step.lesson_id == lesson.id
-                    ).count()
-                    
-                    completed_lesson_steps = db.query(StepProgress).join(Step).filter(
-                        StepProgress.user_id == student.id,
-                        Step.lesson_id == lesson.id,
-                        StepProgress.status == "completed"
-                    ).count()
-                    
-                    lesson_progress_percentage = (completed_lesson_steps / total_lesson_steps * 100) if total_lesson_steps > 0 else 0
-                    
-                    last_lesson_info = {
-                        "lesson_title": lesson.title,
-                        "lesson_progress_percentage": round(lesson_progress_percentage, 1),
-                        "completed_steps": completed_lesson_steps,
-                        "total_steps": total_lesson_steps
-                    }
-            
-            students_analytics.append({
-                "student_id": student.id,
-                "student_name": student.name,
-                "student_email": student.email,
-                "student_number": student.student_id,
-                "groups": [{"id": g.id, "name": g.name} for g in student_groups],
-                "active_courses_count": len(active_courses),
-                "total_steps": total_steps,
-                "completed_steps": completed_steps,
-                "completion_percentage": round(completion_percentage, 1),
-                "total_assignments": total_assignments,
-                "completed_assignments": completed_assignments,
-                "assignment_score_percentage": round(assignment_score_percentage, 1),
-                "total_study_time_minutes": student.total_study_time_minutes,
-                "daily_streak": student.daily_streak,
-                "last_activity_date": student.last_activity_date,
-                "last_lesson": last_lesson_info
-            })
-        
-        all_students_data = {
-            "students": students_analytics,
-            "total_students": len(students_analytics)
-        }
-        
-        # Debug logging
-        print(f"DEBUG: Total students found: {len(students_analytics)}")
-        print(f"DEBUG: Students data: {students_analytics[:2] if students_analytics else 'No students'}")
-        
-        # Проверяем, есть ли данные
-        if len(students_analytics) == 0:
-            # Если нет студентов, возвращаем пустой отчет с сообщением
-            report_text = f"""
-NO STUDENTS FOUND
+    user_id = current_user.id
+    today = datetime.now().strftime('%Y%m%d')
 
-Your role: {current_user.role}
-User ID: {current_user.id}
+    if report == "student_pdf":
+        if student_id is None:
+            raise HTTPException(status_code=400, detail="student_id is required")
+        if not visible_students_query(current_user, db).filter(UserInDB.id == student_id).first():
+            raise HTTPException(status_code=404, detail="Student not found or access denied")
 
-No students are accessible with your current permissions.
+        def collect(db: Session) -> ExportTask:
+            user = db.query(UserInDB).filter(UserInDB.id == user_id).one()
+            student_query = visible_students_query(user, db).filter(UserInDB.id == student_id)
+            student_data = build_students_analytics(db, student_query, course_id)[0]
+            progress_data = get_detailed_student_analytics(
+                student_id=student_id, course_id=course_id, current_user=user, db=db
+            )
+            return ExportTask(
+                renderer=write_student_report,
+                args=(student_data, progress_data),
+                filename=f"student_report_{student_data.get('student_number') or student_id}_{today}.pdf",
+                media_type="application/pdf",
+            )
 
-Report generated: {datetime.now().strftime('%d.%m.%Y %H:%M')}
-"""
-            return Response(
-                content=report_text.encode('utf-8'),
-                media_type="text/plain",
-                headers={"Content-Disposition": f"attachment; filename=no_students_{datetime.now().strftime('%Y%m%d')}.txt"}
+    elif report == "group_pdf":
+        if group_id is None:
+            raise HTTPException(status_code=400, detail="group_id is required")
+        _find_group_for_export(group_id, current_user, db)
+
+        def collect(db: Session) -> ExportTask:
+            user = db.query(UserInDB).filter(UserInDB.id == user_id).one()
+            group_data = get_group_students_analytics(group_id=group_id, course_id=None, current_user=user, db=db)
+            return ExportTask(
+                renderer=write_group_report,
+                args=(group_data,),
+                filename=f"group_report_{group_data['group_info']['name']}_{today}.pdf",
+                media_type="application/pdf",
             )
-        
-        # Генерируем PDF отчет
-        try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.lib.units import inch
-            from reportlab.lib import colors
-            
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Title (English to avoid Cyrillic encoding issues)
-            story.append(Paragraph("All Students Report", styles['Title']))
-            story.append(Spacer(1, 12))
-            
-            # Overall Statistics
-            total_students = all_students_data['total_students']
-            avg_completion = sum(s['completion_percentage'] for s in all_students_data['students']) / total_students if total_students > 0 else 0
-            total_study_time = sum(s['total_study_time_minutes'] for s in all_students_data['students'])
-            
-            summary_info = [
-                ['Total Students:', str(total_students)],
-                ['Average Progress:', f"{avg_completion:.1f}%"],
-                ['Total Study Time:', f"{total_study_time} min ({total_study_time//60} h)"],
-            ]
-            
-            summary_table = Table(summary_info, colWidths=[2*inch, 3*inch])
-            summary_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ]))
-            
-            story.append(Paragraph("Overall Statistics", styles['Heading2']))
-            story.append(summary_table)
-            story.append(Spacer(1, 12))
-            
-            # Students Table
-            if all_students_data['students']:
-                story.append(Paragraph("Detailed Student Information", styles['Heading2']))
-                
-                student_data = [['Name', 'Groups', 'Progress %', 'Courses', 'Time (h)']]
-                
-                for student in all_students_data['students']:
-                    groups_str = ', '.join([g['name'] for g in student['groups']]) if student['groups'] else 'No group'
-                    student_data.append([
-                        student['student_name'],
-                        groups_str[:20] + '...' if len(groups_str) > 20 else groups_str,
-                        f"{student['completion_percentage']}%",
-                        str(student['active_courses_count']),
-                        str(student['total_study_time_minutes'] // 60)
-                    ])
-                
-                students_table = Table(student_data, colWidths=[1.5*inch, 1.5*inch, 1*inch, 0.8*inch, 1*inch])
-                students_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 8),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                
-                story.append(students_table)
-            
-            story.append(Spacer(1, 12))
-            story.append(Paragraph(f"Report generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
-            
-            doc.build(story)
-            buffer.seek(0)
-            pdf_content = buffer.getvalue()
-            
-        except ImportError:
-            # Fallback to text report
-            report_text = f"""
-ALL STUDENTS REPORT
-
-OVERALL STATISTICS:
-- Total Students: {all_students_data['total_students']}
-- Average Progress: {sum(s['completion_percentage'] for s in all_students_data['students']) / all_students_data['total_students'] if all_students_data['total_students'] > 0 else 0:.1f}%
-- Total Study Time: {sum(s['total_study_time_minutes'] for s in all_students_data['students'])} min
-
-STUDENTS:
-"""
-            for student in all_students_data['students']:
-                groups_str = ', '.join([g['name'] for g in student['groups']]) if student['groups'] else 'No group'
-                report_text += f"""
-- {student['student_name']} ({student['student_email']})
-  Groups: {groups_str}
-  Progress: {student['completion_percentage']}%
-  Active Courses: {student['active_courses_count']}
-  Study Time: {student['total_study_time_minutes']} min
-"""
-            
-            report_text += f"\nReport generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-            pdf_content = report_text.encode('utf-8')
-        
-        filename = f"all_students_report_{datetime.now().strftime('%Y%m%d')}.pdf"
-        
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
+
+    elif report == "all_students_pdf":
+        def collect(db: Session) -> ExportTask:
+            user = db.query(UserInDB).filter(UserInDB.id == user_id).one()
+            students = build_students_analytics(db, visible_students_query(user, db))
+            if not students:
+                raise HTTPException(status_code=404, detail="No students are accessible with your current permissions")
+            return ExportTask(
+                renderer=write_all_students_report,
+                args=(students,),
+                filename=f"all_students_report_{today}.pdf",
+                media_type="application/pdf",
+            )
+
+    elif report == "course_excel":
+        if course_id is None:
+            raise HTTPException(status_code=400, detail="course_id is required")
+        if not check_course_access(course_id, current_user, db):
+            raise HTTPException(status_code=403, detail="Access denied to this course")
+        course = db.query(Course).filter(Course.id == course_id).first()
+        if not course:
+            raise HTTPException(status_code=404, detail="Course not found")
+        title_suffix = ""
+        if group_id:
+            title_suffix = f" - {_find_group_for_export(group_id, current_user, db).name}"
+        filename = f"Analytics_{course.title.replace(' ', '_')}{title_suffix.replace(' ', '_')}_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
+
+        def collect(db: Session) -> ExportTask:
+            # The worker process reads the rows itself, batch by batch
+            return ExportTask(
+                renderer=render_course_analytics_export,
+                args=(course_id, group_id),
+                filename=filename,
+                media_type=EXCEL_MEDIA_TYPE,
+            )
+
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown report: {report}")
+
+    return collect
+
+
+def _render_export(collect: Callable[[Session], ExportTask], db: Session) -> Response:
+    """Collect and render a report inside the request (legacy export endpoints)"""
+    task = collect(db)
+    buffer = BytesIO()
+    task.renderer(buffer, *task.args)
+    return Response(
+        content=buffer.getvalue(),
+        media_type=task.media_type,
+        headers={"Content-Disposition": f"attachment; filename={task.filename}"}
+    )
+
+
+@router.post("/export/student/{student_id}")
+def export_student_report(
+    student_id: int,
+    course_id: Optional[int] = None,
+    current_user: UserInDB = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """Экспорт PDF отчета по студенту (для больших отчетов используйте /export-jobs)"""
+    collect = prepare_export("student_pdf", current_user, db, student_id=student_id, course_id=course_id)
+    try:
+        return _render_export(collect, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
+
+@router.post("/export/group/{group_id}")
+def export_group_report(
+    group_id: int,
+    current_user: UserInDB = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """Экспорт PDF отчета по группе (для больших отчетов используйте /export-jobs)"""
+    collect = prepare_export("group_pdf", current_user, db, group_id=group_id)
+    try:
+        return _render_export(collect, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate group report: {str(e)}")
+
+@router.post("/export/all-students")
+def export_all_students_report(
+    current_user: UserInDB = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """Экспорт PDF отчета по всем доступным студентам (для больших отчетов используйте /export-jobs)"""
+    collect = prepare_export("all_students_pdf", current_user, db)
+    try:
+        return _render_export(collect, db)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate all students report: {str(e)}")
 
+# =============================================================================
+# BACKGROUND EXPORT JOBS
+# =============================================================================
+
+class ExportJobCreateSchema(BaseModel):
+    report: Literal["student_pdf", "group_pdf", "all_students_pdf", "course_excel"]
+    student_id: Optional[int] = None
+    group_id: Optional[int] = None
+    course_id: Optional[int] = None
+
+
+def _export_job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    def timestamp(value):
+        return datetime.utcfromtimestamp(value).isoformat() if value else None
+
+    return {
+        "job_id": job["job_id"],
+        "report": job["report"],
+        "params": job["params"],
+        "status": job["status"],
+        "error": job["error"],
+        "filename": job["filename"],
+        "size": job["size"],
+        "created_at": timestamp(job["created_at"]),
+        "finished_at": timestamp(job["finished_at"]),
+        "expires_at": timestamp(job["expires_at"]),
+        "download_url": f"/analytics/export-jobs/{job['job_id']}/download" if job["status"] == "completed" else None,
+    }
+
+
+def _get_own_export_job(job_id: str, current_user: UserInDB) -> Dict[str, Any]:
+    job = get_export_job_manager().get(job_id)
+    if not job or job["owner_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Export job not found or expired")
+    return job
+
+
+@router.post("/export-jobs", status_code=202)
+def submit_export_job(
+    payload: ExportJobCreateSchema,
+    current_user: UserInDB = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Queue a PDF or Excel report. Poll GET /export-jobs/{job_id} until the
+    status is "completed", then download it. Identical requests made shortly
+    after each other return the same job.
+    """
+    params = payload.model_dump(exclude={"report"})
+    collect = prepare_export(payload.report, current_user, db, **params)
+    job = get_export_job_manager().submit(payload.report, current_user.id, params, collect)
+    return _export_job_response(job)
+
+
+@router.get("/export-jobs/{job_id}")
+def get_export_job(
+    job_id: str,
+    current_user: UserInDB = Depends(get_current_user_dependency)
+):
+    """Status of an export job: pending, running, completed or failed"""
+    return _export_job_response(_get_own_export_job(job_id, current_user))
+
+
+@router.get("/export-jobs/{job_id}/download")
+def download_export_job(
+    job_id: str,
+    current_user: UserInDB = Depends(get_current_user_dependency)
+):
+    """Download the file of a completed export job"""
+    job = _get_own_export_job(job_id, current_user)
+    path = get_export_job_manager().artifact_path(job)
+    if path is None:
+        raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+    return FileResponse(path, media_type=job["media_type"], filename=job["filename"])
+
 # =============================================================================
 # DETAILED STEP-BY-STEP PROGRESS TRACKING
 # =============================================================================
 
 @router.get("/student/{student_id}/detailed-progress")
-async def get_student_detailed_progress(
+def get_student_detailed_progress(
     student_id: int,
     course_id: Optional[int] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -2691,16 +2004,8 @@ async def get_student_detailed_progress(
                 
                 # Извлекаем конкретные ошибки из ответов, если возможно
                 try:
-                    import json
-                    step_content = json.loads(step.content_text) if step.content_text else {}
-                    questions = step_content.get("questions", [])
-                    user_answers = json.loads(attempt.answers) if attempt.answers else {}
-                    
-                    # Если answers в формате списка [[id, val], ...]
-                    if isinstance(user_answers, list):
-                        user_answers = {str(k): v for k, v in user_answers}
-                    
-                    for q in questions:
+                    for question in get_compiled_quiz(step).questions:
+                        q = question.data
                         q_id = q.get("id")
                         if not q_id or q_id in seen_question_ids:
                             continue
@@ -2854,7 +2159,7 @@ async def get_student_detailed_progress(
         raise HTTPException(status_code=500, detail=f"Failed to get detailed progress: {str(e)}")
 
 @router.get("/student/{student_id}/learning-path")
-async def get_student_learning_path(
+def get_student_learning_path(
     student_id: int,
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -2934,7 +2239,7 @@ async def get_student_learning_path(
         raise HTTPException(status_code=500, detail=f"Failed to get learning path: {str(e)}")
 
 @router.get("/export-excel")
-async def export_analytics_to_excel(
+def export_analytics_to_excel(
     course_id: int,
     group_id: Optional[int] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -2948,7 +2253,8 @@ async def export_analytics_to_excel(
         group_id: Optional group ID to filter students
     
     Returns:
-        Excel file (.xlsx) with detailed analytics and charts
+        Excel file (.xlsx) with detailed analytics and charts, streamed from
+        a spooled temporary file
     """
     
     # Check permissions
@@ -2965,394 +2271,28 @@ async def export_analytics_to_excel(
         if not course:
             raise HTTPException(status_code=404, detail="Course not found")
         
-        # Get course overview
-        course_overview_data = None
-        try:
-            # Reuse existing logic from get_course_analytics_overview
-            students_with_progress = db.query(UserInDB).join(
-                StepProgress, StepProgress.user_id == UserInDB.id
-            ).join(
-                Step, StepProgress.step_id == Step.id
-            ).join(
-                Lesson, Step.lesson_id == Lesson.id
-            ).join(
-                Module, Lesson.module_id == Module.id
-            ).filter(
-                Module.course_id == course_id,
-                UserInDB.role == "student",
-                UserInDB.is_active == True
-            ).distinct().all()
-            
-            enrolled_students_ids = db.query(Enrollment.user_id).filter(
-                Enrollment.course_id == course_id,
-                Enrollment.is_active == True
-            ).subquery()
-            
-            enrolled_no_progress = db.query(UserInDB).filter(
-                UserInDB.id.in_(enrolled_students_ids),
-                UserInDB.role == "student",
-                UserInDB.is_active == True
-            ).all()
-            
-            enrolled_students_set = {s.id: s for s in students_with_progress}
-            for student in enrolled_no_progress:
-                if student.id not in enrolled_students_set:
-                    enrolled_students_set[student.id] = student
-            
-            enrolled_students = list(enrolled_students_set.values())
-            
-            # Get course structure
-            modules = db.query(Module).filter(Module.course_id == course_id).all()
-            total_lessons = sum(len(db.query(Lesson).filter(Lesson.module_id == m.id).all()) for m in modules)
-            total_steps = sum(
-                len(db.query(Step).filter(Step.lesson_id == l.id).all())
-                for m in modules
-                for l in db.query(Lesson).filter(Lesson.module_id == m.id).all()
-            )
-            
-            # Calculate engagement metrics
-            total_time = sum(s.total_study_time_minutes for s in enrolled_students)
-            total_completed = db.query(StepProgress).join(
-                Step, StepProgress.step_id == Step.id
-            ).join(
-                Lesson, Step.lesson_id == Lesson.id
-            ).join(
-                Module, Lesson.module_id == Module.id
-            ).filter(
-                Module.course_id == course_id,
-                StepProgress.status == "completed"
-            ).count()
-            
-            avg_completion = 0
-            if enrolled_students and total_steps > 0:
-                total_completion = 0
-                for student in enrolled_students:
-                    completed = db.query(StepProgress).join(
-                        Step, StepProgress.step_id == Step.id
-                    ).join(
-                        Lesson, Step.lesson_id == Lesson.id
-                    ).join(
-                        Module, Lesson.module_id == Module.id
-                    ).filter(
-                        StepProgress.user_id == student.id,
-                        Module.course_id == course_id,
-                        StepProgress.status == "completed"
-                    ).count()
-                    total_completion += (completed / total_steps) * 100
-                avg_completion = total_completion / len(enrolled_students)
-            
-            course_overview_data = {
-                "course_info": {
-                    "id": course.id,
-                    "title": course.title,
-                    "teacher_name": course.teacher.name if course.teacher else "N/A"
-                },
-                "structure": {
-                    "total_modules": len(modules),
-                    "total_lessons": total_lessons,
-                    "total_steps": total_steps
-                },
-                "engagement": {
-                    "total_enrolled_students": len(enrolled_students),
-                    "total_time_spent_minutes": total_time,
-                    "total_completed_steps": total_completed,
-                    "average_completion_rate": avg_completion
-                }
-            }
-        except Exception as e:
-            print(f"Warning: Could not get course overview: {e}")
-        
-        # Get students data
+        group = None
+        title_suffix = ""
         if group_id:
             # Filter by group
-            group = db.query(Group).filter(Group.id == group_id).first()
-            if not group:
-                raise HTTPException(status_code=404, detail="Group not found")
-            
-            # Check group access
-            if current_user.role == "teacher" and group.teacher_id != current_user.id:
-                raise HTTPException(status_code=403, detail="Access denied to this group")
-            elif current_user.role == "curator" and group.curator_id != current_user.id:
-                raise HTTPException(status_code=403, detail="Access denied to this group")
-            
-            students = db.query(UserInDB).join(GroupStudent).filter(
-                GroupStudent.group_id == group_id,
-                UserInDB.is_active == True
-            ).all()
-            
+            group = _find_group_for_export(group_id, current_user, db)
             title_suffix = f" - {group.name}"
-        else:
-            students = enrolled_students
-            title_suffix = ""
-        
-        # Prepare students data
-        students_data = []
-        for student in students:
-            # Get courses with progress
-            courses_with_progress = db.query(Course).join(
-                Module, Module.course_id == Course.id
-            ).join(
-                Lesson, Lesson.module_id == Module.id
-            ).join(
-                Step, Step.lesson_id == Lesson.id
-            ).join(
-                StepProgress, StepProgress.step_id == Step.id
-            ).filter(
-                StepProgress.user_id == student.id
-            ).distinct().all()
-            
-            if not courses_with_progress:
-                courses_with_progress = db.query(Course).join(Enrollment).filter(
-                    Enrollment.user_id == student.id,
-                    Enrollment.is_active == True,
-                    Course.is_active == True
-                ).all()
-            
-            # Get student groups
-            student_groups = db.query(Group).join(GroupStudent).filter(
-                GroupStudent.student_id == student.id
-            ).all()
-            
-            # Calculate metrics
-            total_steps = 0
-            completed_steps = 0
-            total_assignments = 0
-            completed_assignments = 0
-            total_score = 0
-            max_score = 0
-            
-            for course in courses_with_progress:
-                course_steps = db.query(Step).join(Lesson).join(Module).filter(
-                    Module.course_id == course.id
-                ).count()
-                total_steps += course_steps
-                
-                course_completed = db.query(StepProgress).join(
-                    Step, StepProgress.step_id == Step.id
-                ).join(
-                    Lesson, Step.lesson_id == Lesson.id
-                ).join(
-                    Module, Lesson.module_id == Module.id
-                ).filter(
-                    StepProgress.user_id == student.id,
-                    Module.course_id == course.id,
-                    StepProgress.status == "completed"
-                ).count()
-                completed_steps += course_completed
-                
-                assignments = db.query(Assignment).join(Lesson).join(Module).filter(
-                    Module.course_id == course.id
-                ).all()
-                total_assignments += len(assignments)
-                
-                for assignment in assignments:
-                    submission = db.query(AssignmentSubmission).filter(
-                        AssignmentSubmission.assignment_id == assignment.id,
-                        AssignmentSubmission.user_id == student.id
-                    ).first()
-                    
-                    if submission and submission.is_graded:
-                        completed_assignments += 1
-                        total_score += submission.score or 0
-                        max_score += assignment.max_score or 0
-            
-            completion_pct = (completed_steps / total_steps * 100) if total_steps > 0 else 0
-            score_pct = (total_score / max_score * 100) if max_score > 0 else 0
-            
-            # Получаем информацию о последнем уроке
-            last_lesson_info = None
-            last_step_progress = db.query(StepProgress).filter(
-                StepProgress.user_id == student.id
-            ).order_by(StepProgress.visited_at.desc()).first()
-            
-            if last_step_progress:
-                # Получаем информацию об уроке
-                lesson = db.query(Lesson).join(Step).filter(
-                    Step.id == last_step_progress.step_id
-                ).first()
-                
-                if lesson:
-                    # Считаем прогресс урока
-                    total_lesson_steps = db.query(Step).filter(
-                        Step.lesson_id == lesson.id
-                    ).count()
-                    
-                    completed_lesson_steps = db.query(StepProgress).join(Step).filter(
-                        StepProgress.user_id == student.id,
-                        Step.lesson_id == lesson.id,
-                        StepProgress.status == "completed"
-                    ).count()
-                    
-                    lesson_progress_percentage = (completed_lesson_steps / total_lesson_steps * 100) if total_lesson_steps > 0 else 0
-                    
-                    last_lesson_info = {
-                        "lesson_title": lesson.title,
-                        "lesson_progress_percentage": round(lesson_progress_percentage, 1),
-                        "completed_steps": completed_lesson_steps,
-                        "total_steps": total_lesson_steps
-                    }
-            
-            students_data.append({
-                "student_id": student.id,
-                "student_name": student.name,
-                "student_email": student.email,
-                "student_number": student.student_id,
-                "groups": [{"id": g.id, "name": g.name} for g in student_groups],
-                "active_courses_count": len(courses_with_progress),
-                "total_steps": total_steps,
-                "completed_steps": completed_steps,
-                "completion_percentage": completion_pct,
-                "total_assignments": total_assignments,
-                "completed_assignments": completed_assignments,
-                "assignment_score_percentage": score_pct,
-                "total_study_time_minutes": student.total_study_time_minutes,
-                "daily_streak": student.daily_streak,
-                "last_activity_date": student.last_activity_date,
-                "last_lesson": last_lesson_info
-            })
-        
-        # Get groups data if no specific group filter
-        groups_data = None
-        if not group_id:
-            try:
-                groups_with_students = db.query(Group).join(
-                    GroupStudent, GroupStudent.group_id == Group.id
-                ).join(
-                    UserInDB, GroupStudent.student_id == UserInDB.id
-                ).join(
-                    StepProgress, StepProgress.user_id == UserInDB.id
-                ).join(
-                    Step, StepProgress.step_id == Step.id
-                ).join(
-                    Lesson, Step.lesson_id == Lesson.id
-                ).join(
-                    Module, Lesson.module_id == Module.id
-                ).filter(
-                    Module.course_id == course_id,
-                    Group.is_active == True
-                ).distinct().all()
-                
-                groups_data = []
-                for group in groups_with_students:
-                    group_students = db.query(UserInDB).join(GroupStudent).filter(
-                        GroupStudent.group_id == group.id,
-                        UserInDB.is_active == True
-                    ).all()
-                    
-                    total_completion = 0
-                    total_score = 0
-                    total_time = 0
-                    
-                    for st in group_students:
-                        completed = db.query(StepProgress).join(
-                            Step, StepProgress.step_id == Step.id
-                        ).join(
-                            Lesson, Step.lesson_id == Lesson.id
-                        ).join(
-                            Module, Lesson.module_id == Module.id
-                        ).filter(
-                            StepProgress.user_id == st.id,
-                            Module.course_id == course_id,
-                            StepProgress.status == "completed"
-                        ).count()
-                        
-                        if total_steps > 0:
-                            total_completion += (completed / total_steps) * 100
-                        
-                        total_time += st.total_study_time_minutes
-                    
-                    avg_completion = total_completion / len(group_students) if group_students else 0
-                    avg_time = total_time / len(group_students) if group_students else 0
-                    
-                    groups_data.append({
-                        "group_id": group.id,
-                        "group_name": group.name,
-                        "description": group.description,
-                        "teacher_name": group.teacher.name if group.teacher else None,
-                        "curator_name": group.curator.name if group.curator else None,
-                        "students_count": len(group_students),
-                        "average_completion_percentage": avg_completion,
-                        "average_assignment_score_percentage": 0,
-                        "average_study_time_minutes": avg_time,
-                        "created_at": group.created_at
-                    })
-            except Exception as e:
-                print(f"Warning: Could not get groups data: {e}")
-        
-        # Format data for Excel export
-        formatted_students_data = []
-        for student_dict in students_data:
-            last_lesson = student_dict.get("last_lesson")
-            last_lesson_str = "N/A"
-            if last_lesson:
-                last_lesson_str = f"{last_lesson['lesson_title']} ({last_lesson['lesson_progress_percentage']}%)"
-            
-            formatted_students_data.append({
-                "student_id": student_dict.get("student_id"),
-                "student_name": student_dict.get("student_name", "N/A"),
-                "email": student_dict.get("student_email", "N/A"),
-                "groups": [g["name"] for g in student_dict.get("groups", [])],
-                "progress_percentage": student_dict.get("completion_percentage", 0),
-                "completed_steps": student_dict.get("completed_steps", 0),
-                "total_steps": student_dict.get("total_steps", 0),
-                "assignments_completed": student_dict.get("completed_assignments", 0),
-                "total_assignments": student_dict.get("total_assignments", 0),
-                "average_score": student_dict.get("assignment_score_percentage", 0),
-                "total_study_time": student_dict.get("total_study_time_minutes", 0),
-                "current_streak": student_dict.get("daily_streak", 0),
-                "last_activity": str(student_dict.get("last_activity_date", "Never")),
-                "current_lesson": last_lesson_str
-            })
-        
-        # Format course overview
-        formatted_course_overview = None
-        if course_overview_data:
-            formatted_course_overview = {
-                "course_name": course.title,
-                "total_students": len(students),
-                "average_progress": course_overview_data.get("engagement", {}).get("average_completion_rate", 0),
-                "total_modules": course_overview_data.get("structure", {}).get("total_modules", 0),
-                "total_lessons": course_overview_data.get("structure", {}).get("total_lessons", 0),
-                "total_steps": course_overview_data.get("structure", {}).get("total_steps", 0),
-                "total_assignments": 0,  # Can add this if needed
-                "active_students": len([s for s in formatted_students_data if s["progress_percentage"] > 0]),
-                "students_above_50": len([s for s in formatted_students_data if s["progress_percentage"] >= 50]),
-                "students_above_80": len([s for s in formatted_students_data if s["progress_percentage"] >= 80]),
-                "average_study_time": sum(s["total_study_time"] for s in formatted_students_data) / len(formatted_students_data) if formatted_students_data else 0
-            }
-        
-        # Format groups data
-        formatted_groups_data = None
-        if groups_data:
-            formatted_groups_data = []
-            for group_dict in groups_data:
-                formatted_groups_data.append({
-                    "group_name": group_dict.get("group_name", "N/A"),
-                    "student_count": group_dict.get("students_count", 0),
-                    "average_progress": group_dict.get("average_completion_percentage", 0),
-                    "teacher_name": group_dict.get("teacher_name"),
-                    "curator_name": group_dict.get("curator_name"),
-                    "active_students": len([s for s in formatted_students_data if any(g in [grp for grp in s["groups"]] for g in [group_dict.get("group_name")])])
-                })
-        
-        # Create Excel file
-        excel_service = get_excel_export_service()
         
-        excel_buffer = excel_service.create_analytics_workbook(
-            course_name=course.title,
-            students_data=formatted_students_data,
-            course_overview=formatted_course_overview,
-            groups_data=formatted_groups_data
-        )
+        export_file = write_course_analytics_export(db, course, group)
+        size = export_file.seek(0, os.SEEK_END)
+        export_file.seek(0)
         
         # Generate filename
         filename = f"Analytics_{course.title.replace(' ', '_')}{title_suffix.replace(' ', '_')}_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
         
         # Return as streaming response
         return StreamingResponse(
-            excel_buffer,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            iter_file_chunks(export_file),
+            media_type=EXCEL_MEDIA_TYPE,
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}",
+                "Content-Length": str(size),
+            }
         )
         
     except HTTPException:
@@ -3429,70 +2369,62 @@ async def get_student_sat_scores(
     if current_user.role not in ["teacher", "curator", "admin", "head_curator"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Verify student exists
-    student = db.query(UserInDB).filter(
-        UserInDB.id == student_id, 
-        UserInDB.role == "student"
-    ).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
+    def load_student_email():
+        # Verify student exists
+        student = db.query(UserInDB).filter(
+            UserInDB.id == student_id, 
+            UserInDB.role == "student"
+        ).first()
+        if not student:
+            raise HTTPException(status_code=404, detail="Student not found")
+        
+        # Check access rights based on role using centralized permission check
+        if current_user.role != "admin" and not check_student_access(student_id, current_user, db):
+            raise HTTPException(status_code=403, detail="Access denied to this student")
+        return student.email
     
-    # Check access rights based on role using centralized permission check
-    if current_user.role != "admin" and not check_student_access(student_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Access denied to this student")
+    student_email = await run_in_threadpool(load_student_email)
+    
+    logger = logging.getLogger(__name__)
     
-    # External API Call
-    api_key = os.getenv("MASTEREDU_API_KEY")
-    url = f"https://api.mastereducation.kz/api/lms/students/{student.email}/test-results"
+    try:
+        logger.info(f"Fetching SAT scores for {student_email}")
+        data = await SATService.fetch_student_test_results(student_email)
+    except SATAPIError:
+        # Return empty list on error to avoid breaking the page
+        return {"testResults": [], "error": "External API error"}
+    except Exception as e:
+        logger.error(f"Error fetching SAT scores: {str(e)}")
+        return {"testResults": [], "error": str(e)}
     
-    headers = {
-        "X-API-Key": api_key,
-        "Content-Type": "application/json"
-    }
+    if not data:
+        return {"testResults": []}
     
-    logger = logging.getLogger(__name__)
+    # Copy so the normalization below does not mutate the cached response
+    data = dict(data)
     
-    async with httpx.AsyncClient() as client:
-        try:
-            logger.info(f"Fetching SAT scores for {student.email}")
-            response = await client.get(url, headers=headers, timeout=30.0)
-            
-            if response.status_code == 404:
-                return {"testResults": []}
-            
-            if response.status_code != 200:
-                logger.error(f"SAT API Error: {response.status_code} {response.text}")
-                # Return empty list on error to avoid breaking the page
-                return {"testResults": [], "error": "External API error"}
-            
-            data = response.json()
-            
-            # Normalize for frontend if using the new format
-            # Can be at top level or in testPairs list
-            if ("mathTest" in data or "verbalTest" in data or "testPairs" in data) and "testResults" not in data:
-                data["testResults"] = []
-                
-                # Case 1: Wrapped in testPairs (array of pairs)
-                if "testPairs" in data:
-                    for pair in data["testPairs"]:
-                        combined = merge_sat_pair(pair)
-                        if combined:
-                            data["testResults"].append(combined)
-                
-                # Case 2: Top level (single pair)
-                elif "mathTest" in data or "verbalTest" in data:
-                    combined = merge_sat_pair(data)
-                    if combined:
-                        data["testResults"].append(combined)
-            
-            return data
-            
-        except Exception as e:
-            logger.error(f"Error fetching SAT scores: {str(e)}")
-            return {"testResults": [], "error": str(e)}
+    # Normalize for frontend if using the new format
+    # Can be at top level or in testPairs list
+    if ("mathTest" in data or "verbalTest" in data or "testPairs" in data) and "testResults" not in data:
+        data["testResults"] = []
+        
+        # Case 1: Wrapped in testPairs (array of pairs)
+        if "testPairs" in data:
+            for pair in data["testPairs"]:
+                combined = merge_sat_pair(pair)
+                if combined:
+                    data["testResults"].append(combined)
+        
+        # Case 2: Top level (single pair)
+        elif "mathTest" in data or "verbalTest" in data:
+            combined = merge_sat_pair(data)
+            if combined:
+                data["testResults"].append(combined)
+    
+    return data
 
 @router.get("/course/{course_id}/progress-history")
-async def get_course_progress_history(
+def get_course_progress_history(
     course_id: int,
     group_id: Optional[int] = Query(None),
     range_type: str = Query("all", alias="range"),
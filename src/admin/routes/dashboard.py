@@ -18,7 +18,7 @@ from src.services.attendance_service import AttendanceService
 router = APIRouter()
 
 @router.get("/stats", response_model=DashboardStatsSchema)
-async def get_dashboard_stats(
+def get_dashboard_stats(
     group_id: Optional[int] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -1349,7 +1349,7 @@ def get_admin_dashboard_stats(user: UserInDB, db: Session) -> DashboardStatsSche
     )
 
 @router.get("/curator/homework-by-group")
-async def get_curator_homework_by_group(
+def get_curator_homework_by_group(
     group_id: Optional[int] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1542,7 +1542,7 @@ async def get_curator_homework_by_group(
 
 
 @router.get("/curator/{curator_id}")
-async def get_curator_details(
+def get_curator_details(
     curator_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1881,7 +1881,7 @@ async def get_curator_details(
     }
 
 @router.get("/my-courses", response_model=List[CourseProgressSchema])
-async def get_my_courses(
+def get_my_courses(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -1984,7 +1984,7 @@ async def get_my_courses(
     return courses_with_progress
 
 @router.get("/recent-activity")
-async def get_recent_activity(
+def get_recent_activity(
     limit: int = 10,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -2019,7 +2019,7 @@ async def get_recent_activity(
     return {"recent_activities": activities}
 
 @router.post("/update-study-time")
-async def update_study_time(
+def update_study_time(
     minutes_studied: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -2038,7 +2038,7 @@ async def update_study_time(
     }
 
 @router.get("/teacher/pending-submissions")
-async def get_teacher_pending_submissions(
+def get_teacher_pending_submissions(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -2148,7 +2148,7 @@ async def get_teacher_pending_submissions(
     return {"pending_submissions": submissions_data}
 
 @router.get("/teacher/recent-submissions")
-async def get_teacher_recent_submissions(
+def get_teacher_recent_submissions(
     limit: int = 10,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -2266,7 +2266,7 @@ async def get_teacher_recent_submissions(
     return {"recent_submissions": submissions_data}
 
 @router.get("/teacher/students-progress")
-async def get_teacher_students_progress(
+def get_teacher_students_progress(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
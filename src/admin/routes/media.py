@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import re
@@ -6,12 +6,14 @@ import os
 import json
 from pathlib import Path
 from datetime import datetime
-import aiofiles
 
 from src.config import get_db
 from src.schemas.models import UserInDB, LessonMaterial, Lesson, Module, Course, Assignment, Group
 from src.routes.auth import get_current_user_dependency
 from src.utils.permissions import require_teacher_or_admin
+from src.services import blob_store, media_storage
+from src.services.blob_store import QuotaExceeded
+from src.services.media_storage import UploadTooLarge, write_upload
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -50,7 +52,7 @@ class ThumbnailUrlSchema(BaseModel):
 
 
 @router.post("/courses/{course_id}/thumbnail")
-async def upload_course_thumbnail(
+def upload_course_thumbnail(
     course_id: int,
     file: UploadFile = File(...),
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -82,12 +84,8 @@ async def upload_course_thumbnail(
     safe_filename = f"course_{course_id}_thumb.{ext}"
     file_path = upload_dir / safe_filename
 
-    try:
-        async with aiofiles.open(file_path, "wb") as buffer:
-            content = await file.read()
-            await buffer.write(content)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save thumbnail: {str(e)}")
+    stored = store_upload(file, file_path, db, current_user, error_detail="Failed to save thumbnail")
+    blob_store.attach(db, stored, "course_thumbnail", course_id, uploaded_by=current_user.id)
 
     public_url = f"/uploads/courses/thumbnails/{safe_filename}"
 
@@ -100,7 +98,7 @@ async def upload_course_thumbnail(
 
 
 @router.post("/upload")
-async def upload_file(
+def upload_file(
     file: UploadFile = File(...),
     file_type: str = Form(...),
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -134,12 +132,9 @@ async def upload_file(
     safe_filename = f"{file_type}_{timestamp}_{current_user.id}_{file.filename}"
     file_path = upload_dir / safe_filename
     
-    try:
-        content = await file.read()
-        async with aiofiles.open(file_path, "wb") as buffer:
-            await buffer.write(content)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    stored = store_upload(file, file_path, db, current_user)
+    blob_store.attach(db, stored, file_type, uploaded_by=current_user.id)
+    db.commit()
     
     public_url = f"/uploads/{file_type}/{safe_filename}"
     
@@ -147,11 +142,11 @@ async def upload_file(
         "file_url": public_url,
         "filename": safe_filename,
         "original_filename": file.filename,
-        "file_size": len(content)
+        "file_size": stored.size
     }
 
 @router.post("/steps/{step_id}/attachments")
-async def upload_step_attachment(
+def upload_step_attachment(
     step_id: int,
     file: UploadFile = File(...),
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -205,15 +200,9 @@ async def upload_step_attachment(
     file_path = upload_dir / safe_filename
     
     # Save file
-    try:
-        content = await file.read()
-        async with aiofiles.open(file_path, "wb") as buffer:
-            await buffer.write(content)
-        
-        file_size = len(content)
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    stored = store_upload(file, file_path, db, current_user)
+    blob_store.attach(db, stored, "step", step_id, uploaded_by=current_user.id)
+    file_size = stored.size
     
     # Update step attachments
     import json
@@ -243,7 +232,7 @@ async def upload_step_attachment(
     }
 
 @router.delete("/steps/{step_id}/attachments/{attachment_id}")
-async def delete_step_attachment(
+def delete_step_attachment(
     step_id: int,
     attachment_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -278,13 +267,14 @@ async def delete_step_attachment(
     if not attachment_to_remove:
         raise HTTPException(status_code=404, detail="Attachment not found")
     
-    # Delete file from disk
+    # Delete file from disk (its blob is collected once nothing references it)
     try:
         file_path = Path(f".{attachment_to_remove['file_url']}")
         if file_path.exists():
             file_path.unlink()
     except Exception as e:
         print(f"Warning: Could not delete file {attachment_to_remove['file_url']}: {e}")
+    blob_store.detach(db, attachment_to_remove['file_url'])
     
     # Update step attachments
     step.attachments = json.dumps(current_attachments)
@@ -292,7 +282,7 @@ async def delete_step_attachment(
     
     return {"detail": "Attachment deleted successfully"}
 @router.put("/courses/{course_id}/thumbnail-url")
-async def set_course_thumbnail_url(
+def set_course_thumbnail_url(
     course_id: int,
     data: ThumbnailUrlSchema,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -322,7 +312,7 @@ async def set_course_thumbnail_url(
 # =============================================================================
 
 @router.post("/videos/youtube", response_model=VideoUploadResponse)
-async def add_youtube_video(
+def add_youtube_video(
     video_data: YouTubeVideoSchema,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -351,7 +341,7 @@ async def add_youtube_video(
     return response
 
 @router.get("/videos/youtube/validate")
-async def validate_youtube_url(url: str):
+def validate_youtube_url(url: str):
     """Валидировать YouTube ссылку и получить информацию о видео"""
     
     video_info = validate_and_extract_youtube_info(url)
@@ -369,7 +359,7 @@ async def validate_youtube_url(url: str):
     }
 
 @router.put("/lessons/{lesson_id}/video")
-async def update_lesson_video(
+def update_lesson_video(
     lesson_id: int,
     video_data: YouTubeVideoSchema,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -416,7 +406,7 @@ async def update_lesson_video(
 # =============================================================================
 
 @router.post("/materials/upload", response_model=MaterialUploadResponse)
-async def upload_lesson_material(
+def upload_lesson_material(
     lesson_id: int = Form(...),
     title: str = Form(...),
     file: UploadFile = File(...),
@@ -466,15 +456,8 @@ async def upload_lesson_material(
     file_path = upload_dir / safe_filename
     
     # Сохраняем файл
-    try:
-        content = await file.read()
-        async with aiofiles.open(file_path, "wb") as buffer:
-            await buffer.write(content)
-        
-        file_size = len(content)
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    stored = store_upload(file, file_path, db, current_user)
+    file_size = stored.size
     
     # Создаем запись в базе данных
     material = LessonMaterial(
@@ -486,6 +469,8 @@ async def upload_lesson_material(
     )
     
     db.add(material)
+    db.flush()
+    blob_store.attach(db, stored, "material", material.id, uploaded_by=current_user.id)
     db.commit()
     db.refresh(material)
     
@@ -498,7 +483,7 @@ async def upload_lesson_material(
     )
 
 @router.get("/materials/{material_id}")
-async def get_material_info(
+def get_material_info(
     material_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -530,7 +515,7 @@ async def get_material_info(
     }
 
 @router.delete("/materials/{material_id}")
-async def delete_material(
+def delete_material(
     material_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -549,13 +534,14 @@ async def delete_material(
     if current_user.role != "admin" and course.teacher_id != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Удаляем файл с диска
+    # Удаляем файл с диска (blob удалится, когда на него не останется ссылок)
     try:
         file_path = Path(f".{material.file_url}")
         if file_path.exists():
             file_path.unlink()
     except Exception as e:
         print(f"Warning: Could not delete file {material.file_url}: {e}")
+    blob_store.detach(db, material.file_url)
     
     # Удаляем запись из БД
     db.delete(material)
@@ -568,7 +554,7 @@ async def delete_material(
 # =============================================================================
 
 @router.get("/library")
-async def get_media_library(
+def get_media_library(
     lesson_id: Optional[int] = None,
     file_type: Optional[str] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -648,12 +634,32 @@ async def get_media_library(
     
     return {"library": library}
 
+@router.get("/storage/report")
+def get_storage_report(
+    current_user: UserInDB = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Использование хранилища: свое (и квота) для всех,
+    итоги по хранилищу и крупнейшие загрузчики для админа
+    """
+    quota = blob_store.quota_for(current_user)
+    used = blob_store.usage_of(db, current_user.id)
+    report = {
+        "bytes_used": used,
+        "quota_bytes": quota,
+        "remaining_bytes": None if quota is None else max(0, quota - used),
+    }
+    if current_user.role == "admin":
+        report["storage"] = blob_store.storage_report(db)
+    return report
+
 # =============================================================================
 # ASSIGNMENT FILE UPLOAD
 # =============================================================================
 
 @router.post("/assignments/upload")
-async def upload_assignment_file(
+def upload_assignment_file(
     assignment_id: int = Form(...),
     file: UploadFile = File(...),
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -708,13 +714,8 @@ async def upload_assignment_file(
     file_path = upload_dir / safe_filename
     
     # Сохраняем файл
-    try:
-        content = await file.read()
-        async with aiofiles.open(file_path, "wb") as buffer:
-            await buffer.write(content)
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    stored = store_upload(file, file_path, db, current_user)
+    blob_store.attach(db, stored, "assignment", assignment_id, uploaded_by=current_user.id)
     
     # Обновляем задание
     assignment.file_url = f"/uploads/assignments/{safe_filename}"
@@ -728,7 +729,7 @@ async def upload_assignment_file(
     }
 
 @router.post("/submissions/upload")
-async def upload_submission_file(
+def upload_submission_file(
     assignment_id: int = Form(...),
     file: UploadFile = File(...),
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -779,13 +780,13 @@ async def upload_submission_file(
             detail=f"File type {file_extension} not allowed. Allowed: {allowed_types}"
         )
     
-    # Проверяем размер файла
-    content = await file.read()
-    file_size_mb = len(content) / (1024 * 1024)
-    if file_size_mb > assignment.max_file_size_mb:
+    # Проверяем размер файла (по ходу записи, если клиент не передал размер)
+    max_bytes = int(assignment.max_file_size_mb * 1024 * 1024)
+    size_error = f"exceeds maximum allowed size of {assignment.max_file_size_mb}MB"
+    if file.size is not None and file.size > max_bytes:
         raise HTTPException(
             status_code=400, 
-            detail=f"File size {file_size_mb:.1f}MB exceeds maximum allowed size of {assignment.max_file_size_mb}MB"
+            detail=f"File size {file.size / (1024 * 1024):.1f}MB {size_error}"
         )
     
     # Создаем директорию для загрузок
@@ -797,12 +798,16 @@ async def upload_submission_file(
     file_path = upload_dir / safe_filename
     
     # Сохраняем файл
+    check_upload_quota(db, current_user, file.size, file_path)
     try:
-        async with aiofiles.open(file_path, "wb") as buffer:
-            await buffer.write(content)
-        
+        stored = write_upload(file, file_path, max_bytes=max_bytes)
+    except UploadTooLarge:
+        raise HTTPException(status_code=400, detail=f"File {size_error}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    # Owned by the submission that stores its URL; released if none does (see services.blob_store)
+    blob_store.attach(db, stored, "submission", uploaded_by=current_user.id)
+    db.commit()
     
     # Just return the file URL without creating a submission record
     # The submission will be created when the assignment is actually submitted
@@ -813,114 +818,146 @@ async def upload_submission_file(
     }
 
 @router.get("/files/{file_type}/{filename:path}")
-async def download_file(
+def download_file(
     file_type: str,
     filename: str,
+    request: Request,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
     """
     Скачать файл с проверкой прав доступа
     file_type: assignments, submissions, materials
+    Поддерживает Range (перемотка видео/PDF) и If-None-Match
     """
+    from src.schemas.models import AssignmentSubmission, GroupStudent
+    from src.utils.permissions import check_course_access
     
-    from fastapi.responses import FileResponse
-    from pathlib import Path
-    
-    file_path = Path(f"uploads/{file_type}/{filename}")
-    
-    if not file_path.exists():
+    file_path = media_storage.resolve_under(media_storage.MEDIA_UPLOAD_ROOT, f"{file_type}/{filename}")
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    # Uploads whose own file is gone are served from their blob
+    upload_url = f"/uploads/{file_path.relative_to(Path(media_storage.MEDIA_UPLOAD_ROOT).resolve()).as_posix()}"
+    stored_path = file_path if file_path.is_file() else blob_store.resolve_reference(db, upload_url)
+    if stored_path is None:
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Проверяем права доступа в зависимости от типа файла
-    if file_type == "assignments":
-        # Извлекаем assignment_id из имени файла
-        assignment_id = int(filename.split('_')[1])
-        from src.schemas.models import Assignment
-        
-        assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
-        if not assignment:
-            raise HTTPException(status_code=404, detail="Assignment not found")
-        
-        # Проверяем доступ к заданию
-        if assignment.lesson_id:
-            lesson = db.query(Lesson).filter(Lesson.id == assignment.lesson_id).first()
-            module = db.query(Module).filter(Module.id == lesson.module_id).first()
-            
-            from src.utils.permissions import check_course_access
-            if not check_course_access(module.course_id, current_user, db):
-                raise HTTPException(status_code=403, detail="Access denied")
-        elif assignment.group_id:
-            if current_user.role == "student":
-                from src.schemas.models import GroupStudent
-                group_member = db.query(GroupStudent).filter(
-                    GroupStudent.group_id == assignment.group_id,
+    try:
+        parts = filename.split('_')
+        # Проверяем права доступа в зависимости от типа файла (одним запросом на тип)
+        if file_type == "assignments":
+            # Извлекаем assignment_id из имени файла
+            assignment_id = int(parts[1])
+            row = db.query(
+                Assignment.lesson_id,
+                Assignment.group_id,
+                Module.course_id,
+                Group.teacher_id,
+                db.query(GroupStudent.id).filter(
+                    GroupStudent.group_id == Assignment.group_id,
                     GroupStudent.student_id == current_user.id
-                ).first()
-                if not group_member:
+                ).exists()
+            ).outerjoin(Lesson, Lesson.id == Assignment.lesson_id).outerjoin(
+                Module, Module.id == Lesson.module_id
+            ).outerjoin(Group, Group.id == Assignment.group_id).filter(
+                Assignment.id == assignment_id
+            ).first()
+            if not row:
+                raise HTTPException(status_code=404, detail="Assignment not found")
+            lesson_id, group_id, course_id, group_teacher_id, is_group_member = row
+            
+            # Проверяем доступ к заданию
+            if lesson_id:
+                if not check_course_access(course_id, current_user, db):
                     raise HTTPException(status_code=403, detail="Access denied")
-            elif current_user.role == "teacher":
-                group = db.query(Group).filter(Group.id == assignment.group_id).first()
-                if group.teacher_id != current_user.id:
+            elif group_id:
+                if current_user.role == "student" and not is_group_member:
+                    raise HTTPException(status_code=403, detail="Access denied")
+                if current_user.role == "teacher" and group_teacher_id != current_user.id:
                     raise HTTPException(status_code=403, detail="Access denied")
-    
-    elif file_type == "submissions":
-        # Извлекаем assignment_id и user_id из имени файла
-        parts = filename.split('_')
-        assignment_id = int(parts[1])
-        user_id = int(parts[2])
-        
-        from src.schemas.models import Assignment, AssignmentSubmission
-        
-        # Проверяем, что это submission пользователя или учитель имеет доступ
-        submission = db.query(AssignmentSubmission).filter(
-            AssignmentSubmission.assignment_id == assignment_id,
-            AssignmentSubmission.user_id == user_id
-        ).first()
-        
-        if not submission:
-            raise HTTPException(status_code=404, detail="Submission not found")
-        
-        # Студенты могут скачивать только свои файлы
-        if current_user.role == "student" and submission.user_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Access denied")
         
-        # Учителя могут скачивать файлы своих студентов
-        if current_user.role == "teacher":
-            assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
-            if assignment.lesson_id:
-                lesson = db.query(Lesson).filter(Lesson.id == assignment.lesson_id).first()
-                module = db.query(Module).filter(Module.id == lesson.module_id).first()
-                course = db.query(Course).filter(Course.id == module.course_id).first()
-                if course.teacher_id != current_user.id:
+        elif file_type == "submissions":
+            # Извлекаем assignment_id и user_id из имени файла
+            assignment_id = int(parts[1])
+            user_id = int(parts[2])
+            
+            # Проверяем, что это submission пользователя или учитель имеет доступ
+            row = db.query(
+                AssignmentSubmission.user_id,
+                Assignment.lesson_id,
+                Assignment.group_id,
+                Course.teacher_id,
+                Group.teacher_id
+            ).join(Assignment, Assignment.id == AssignmentSubmission.assignment_id).outerjoin(
+                Lesson, Lesson.id == Assignment.lesson_id
+            ).outerjoin(Module, Module.id == Lesson.module_id).outerjoin(
+                Course, Course.id == Module.course_id
+            ).outerjoin(Group, Group.id == Assignment.group_id).filter(
+                AssignmentSubmission.assignment_id == assignment_id,
+                AssignmentSubmission.user_id == user_id
+            ).first()
+            
+            if not row:
+                raise HTTPException(status_code=404, detail="Submission not found")
+            submission_user_id, lesson_id, group_id, course_teacher_id, group_teacher_id = row
+            
+            # Студенты могут скачивать только свои файлы
+            if current_user.role == "student" and submission_user_id != current_user.id:
+                raise HTTPException(status_code=403, detail="Access denied")
+            
+            # Учителя могут скачивать файлы своих студентов
+            if current_user.role == "teacher":
+                if lesson_id and course_teacher_id != current_user.id:
                     raise HTTPException(status_code=403, detail="Access denied")
-            elif assignment.group_id:
-                group = db.query(Group).filter(Group.id == assignment.group_id).first()
-                if group.teacher_id != current_user.id:
+                if not lesson_id and group_id and group_teacher_id != current_user.id:
                     raise HTTPException(status_code=403, detail="Access denied")
-    
-    elif file_type == "materials":
-        # Используем существующую логику для материалов
-        material_id = int(filename.split('_')[1])
-        from src.schemas.models import LessonMaterial
-        
-        material = db.query(LessonMaterial).filter(LessonMaterial.id == material_id).first()
-        if not material:
-            raise HTTPException(status_code=404, detail="Material not found")
         
-        lesson = db.query(Lesson).filter(Lesson.id == material.lesson_id).first()
-        module = db.query(Module).filter(Module.id == lesson.module_id).first()
-        
-        from src.utils.permissions import check_course_access
-        if not check_course_access(module.course_id, current_user, db):
-            raise HTTPException(status_code=403, detail="Access denied")
+        elif file_type == "materials":
+            # Материал по его file_url (имя файла начинается с lesson_id, а не material_id)
+            course_id = db.query(Module.course_id).join(
+                Lesson, Lesson.module_id == Module.id
+            ).join(LessonMaterial, LessonMaterial.lesson_id == Lesson.id).filter(
+                LessonMaterial.file_url == f"/uploads/materials/{filename}"
+            ).scalar()
+            if course_id is None:
+                raise HTTPException(status_code=404, detail="Material not found")
+            
+            if not check_course_access(course_id, current_user, db):
+                raise HTTPException(status_code=403, detail="Access denied")
+    except (ValueError, IndexError):
+        raise HTTPException(status_code=404, detail="File not found")
     
-    return FileResponse(file_path, filename=filename)
+    return media_storage.file_response(request, stored_path, filename=file_path.name)
 
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
 
+def check_upload_quota(db: Session, current_user: UserInDB, size: Optional[int], file_path: Path):
+    """413 if the upload would take the user past their storage quota (see services.blob_store)"""
+    try:
+        blob_store.check_quota(db, current_user, size, replacing=file_path)
+    except QuotaExceeded as e:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Storage quota exceeded: {e.used // (1024 * 1024)}MB of {e.quota // (1024 * 1024)}MB used"
+        )
+
+def store_upload(file: UploadFile, file_path: Path, db: Session, current_user: UserInDB,
+                 error_detail: str = "Failed to save file"):
+    """
+    Stream an upload to ``file_path`` (see services.media_storage) after
+    checking the uploader's quota; 413 past the size limit or the quota.
+    Blocking: the upload handlers are plain ``def`` and run in the threadpool
+    """
+    check_upload_quota(db, current_user, file.size, file_path)
+    try:
+        return write_upload(file, file_path, max_bytes=media_storage.MEDIA_MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=f"File is larger than {e.limit // (1024 * 1024)}MB")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"{error_detail}: {str(e)}")
+
 def validate_and_extract_youtube_info(url: str) -> dict:
     """
     Валидировать YouTube ссылку и извлечь информацию о видео
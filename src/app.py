@@ -9,8 +9,9 @@ from dotenv import load_dotenv
 import logging
 import os
 
-from src.config import init_db
+from src.config import init_db, configure_threadpool, dispose_async_engine
 from src.routes import register_routes
+from src.services.http_client import integration_metrics
 
 load_dotenv()
 
@@ -93,6 +94,7 @@ def health_check():
             "status": "healthy",
             "timestamp": datetime.utcnow().isoformat(),
             "version": "1.99.7",
+            "integrations": integration_metrics(),
         }
     )
 
@@ -135,6 +137,36 @@ try:
 except Exception as e:
     logging.error(f"Failed to initialize curator task scheduler: {e}")
 
+try:
+    from src.services.course_analytics_refresher import start_course_analytics_refresher
+    disable_scheduler = os.getenv('DISABLE_SCHEDULER', 'false').lower() == 'true'
+    if disable_scheduler:
+        logging.info("Course analytics refresher disabled (DISABLE_SCHEDULER=true)")
+    else:
+        start_course_analytics_refresher()
+        logging.info("Course analytics refresher initialized")
+except Exception as e:
+    logging.error(f"Failed to initialize course analytics refresher: {e}")
+
+try:
+    from src.services.blob_store import start_blob_collector
+    disable_scheduler = os.getenv('DISABLE_SCHEDULER', 'false').lower() == 'true'
+    if disable_scheduler:
+        logging.info("Blob collector disabled (DISABLE_SCHEDULER=true)")
+    else:
+        start_blob_collector()
+        logging.info("Blob collector initialized")
+except Exception as e:
+    logging.error(f"Failed to initialize blob collector: {e}")
+
+# Not a scheduler: every worker buffers its own step visits, so this always runs
+try:
+    from src.services.step_visit_aggregator import start_step_visit_aggregator
+    start_step_visit_aggregator()
+    logging.info("Step visit aggregator initialized")
+except Exception as e:
+    logging.error(f"Failed to initialize step visit aggregator: {e}")
+
 
 @app.exception_handler(404)
 def not_found_handler(request, exc):
@@ -155,4 +187,35 @@ def unauthorized_handler(request, exc):
     return JSONResponse(
         status_code=401,
         content={"error": "Unauthorized", "message": "Authentication required", "status_code": 401}
-    )
\ No newline at end of file
+    )
+
+
+@app.on_event("startup")
+async def limit_threadpool():
+    # Sync route handlers and dependencies share this bounded pool
+    configure_threadpool()
+
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    from src.services.http_client import close_integrations
+    await close_integrations()
+    await dispose_async_engine()
+
+
+@app.on_event("shutdown")
+def flush_step_visits():
+    from src.services.step_visit_aggregator import stop_step_visit_aggregator
+    stop_step_visit_aggregator()
+
+
+@app.on_event("shutdown")
+def stop_export_job_workers():
+    from src.services.export_jobs import stop_export_jobs
+    stop_export_jobs()
+
+
+@app.on_event("shutdown")
+def stop_password_hashing_pool():
+    from src.services.bulk_user_import import stop_hash_pool
+    stop_hash_pool()
@@ -23,7 +23,7 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # =============================================================================
 
 @router.get("/status")
-async def get_assignment_zero_status(
+def get_assignment_zero_status(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -67,7 +67,7 @@ async def get_assignment_zero_status(
     }
 
 @router.get("/my-submission", response_model=AssignmentZeroSubmissionSchema)
-async def get_my_assignment_zero_submission(
+def get_my_assignment_zero_submission(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -82,7 +82,7 @@ async def get_my_assignment_zero_submission(
     return AssignmentZeroSubmissionSchema.model_validate(submission)
 
 @router.post("/save-progress", response_model=AssignmentZeroSubmissionSchema)
-async def save_assignment_zero_progress(
+def save_assignment_zero_progress(
     data: AssignmentZeroSaveProgressSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -187,7 +187,7 @@ async def save_assignment_zero_progress(
         return AssignmentZeroSubmissionSchema.model_validate(draft)
 
 @router.post("/submit", response_model=AssignmentZeroSubmissionSchema)
-async def submit_assignment_zero(
+def submit_assignment_zero(
     data: AssignmentZeroSubmitSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -359,7 +359,7 @@ async def submit_assignment_zero(
     return AssignmentZeroSubmissionSchema.model_validate(submission)
 
 @router.post("/upload-screenshot")
-async def upload_screenshot(
+def upload_screenshot(
     file: UploadFile = File(...),
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -374,7 +374,7 @@ async def upload_screenshot(
         raise HTTPException(status_code=400, detail="Only image files are allowed (JPEG, PNG, GIF, WEBP)")
     
     # Validate file size (max 10MB)
-    contents = await file.read()
+    contents = file.file.read()
     if len(contents) > 10 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="File size must be less than 10MB")
     
@@ -397,7 +397,7 @@ async def upload_screenshot(
 # =============================================================================
 
 @router.get("/submissions", response_model=list[AssignmentZeroSubmissionSchema])
-async def get_all_submissions(
+def get_all_submissions(
     group_name: str | None = None,
     skip: int = 0,
     limit: int = 100,
@@ -418,7 +418,7 @@ async def get_all_submissions(
     return [AssignmentZeroSubmissionSchema.model_validate(s) for s in submissions]
 
 @router.get("/submissions/{user_id}", response_model=AssignmentZeroSubmissionSchema)
-async def get_submission_by_user(
+def get_submission_by_user(
     user_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc, and_, select
 from typing import List, Optional, Dict, Any
@@ -19,7 +20,7 @@ from src.utils.assignment_checker import check_assignment_answers
 from src.services.email_service import send_homework_notification
 from src.schemas.models import GroupStudent
 from src.services.event_service import EventService
-from src.routes.gamification import award_points
+from src.gamification.routes.gamification import award_points
 
 def _to_enriched_schema(assignment: Assignment) -> AssignmentSchema:
     schema = AssignmentSchema.from_orm(assignment)
@@ -44,7 +45,7 @@ def to_naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
 # =============================================================================
 
 @router.get("/", response_model=List[AssignmentSchema])
-async def get_assignments(
+def get_assignments(
     lesson_id: Optional[str] = None,
     course_id: Optional[int] = None,
     group_id: Optional[int] = None,
@@ -153,7 +154,7 @@ async def get_assignments(
     return [_to_enriched_schema(a) for a in assignments]
 
 @router.patch("/{assignment_id}/toggle-visibility", response_model=AssignmentSchema)
-async def toggle_assignment_visibility(
+def toggle_assignment_visibility(
     assignment_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -191,7 +192,7 @@ async def toggle_assignment_visibility(
     return _to_enriched_schema(assignment)
 
 @router.get("/assigned-lessons/{course_id}")
-async def get_assigned_lessons_for_course(
+def get_assigned_lessons_for_course(
     course_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -265,7 +266,7 @@ async def get_assigned_lessons_for_course(
 
 
 @router.post("/", response_model=AssignmentSchema)
-async def create_assignment(
+def create_assignment(
     assignment_data: AssignmentCreateSchema,
     lesson_id: Optional[int] = None,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -507,7 +508,7 @@ async def create_assignment(
     return result_assignment
 
 @router.get("/{assignment_id}", response_model=AssignmentSchema)
-async def get_assignment(
+def get_assignment(
     assignment_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -567,7 +568,7 @@ async def get_assignment(
     return assignment_data
 
 @router.put("/{assignment_id}", response_model=AssignmentSchema)
-async def update_assignment(
+def update_assignment(
     assignment_id: int,
     assignment_data: AssignmentCreateSchema,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -694,7 +695,7 @@ async def update_assignment(
     return result_assignment
 
 @router.delete("/{assignment_id}")
-async def delete_assignment(
+def delete_assignment(
     assignment_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -724,7 +725,7 @@ async def delete_assignment(
 # =============================================================================
 
 @router.post("/{assignment_id}/submit", response_model=AssignmentSubmissionSchema)
-async def submit_assignment(
+def submit_assignment(
     assignment_id: int,
     submission_data: SubmitAssignmentSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -943,7 +944,9 @@ async def submit_assignment(
     # Award points for completion
     try:
         award_points(db, current_user.id, 10, 'homework', f'Completed assignment: {assignment.title}')
+        db.commit()
     except Exception as e:
+        db.rollback()
         print(f"Failed to award points: {e}") # Non-blocking error
     
     print(f"Submission created successfully: {submission.id}")
@@ -957,7 +960,7 @@ async def submit_assignment(
 
 
 @router.get("/{assignment_id}/submissions", response_model=List[AssignmentSubmissionSchema])
-async def get_assignment_submissions(
+def get_assignment_submissions(
     assignment_id: int,
     user_id: Optional[int] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1055,7 +1058,7 @@ async def get_assignment_submissions(
     return result
 
 @router.get("/{assignment_id}/submissions/{submission_id}", response_model=AssignmentSubmissionSchema)
-async def get_submission(
+def get_submission(
     assignment_id: int,
     submission_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1139,7 +1142,7 @@ async def get_submission(
     return submission_data
 
 @router.get("/submissions/my", response_model=List[AssignmentSubmissionSchema])
-async def get_my_submissions(
+def get_my_submissions(
     course_id: Optional[int] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, le=1000),
@@ -1163,7 +1166,7 @@ async def get_my_submissions(
     return [AssignmentSubmissionSchema.from_orm(submission) for submission in submissions]
 
 @router.get("/submissions/unseen-graded-count")
-async def get_unseen_graded_count(
+def get_unseen_graded_count(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -1186,20 +1189,23 @@ async def mark_submission_seen(
     db: Session = Depends(get_db)
 ):
     """Mark a graded submission as seen by student"""
-    submission = db.query(AssignmentSubmission).filter(
-        AssignmentSubmission.id == submission_id,
-        AssignmentSubmission.user_id == current_user.id
-    ).first()
-    
-    if not submission:
-        raise HTTPException(status_code=404, detail="Submission not found")
+    def mark():
+        submission = db.query(AssignmentSubmission).filter(
+            AssignmentSubmission.id == submission_id,
+            AssignmentSubmission.user_id == current_user.id
+        ).first()
+        
+        if not submission:
+            raise HTTPException(status_code=404, detail="Submission not found")
+        
+        submission.seen_by_student = True
+        db.commit()
     
-    submission.seen_by_student = True
-    db.commit()
+    await run_in_threadpool(mark)
     
     # Notify student (self) to update badge
     try:
-        from src.routes.socket_messages import emit_unseen_graded_update
+        from src.messages.routes.socket_messages import emit_unseen_graded_update
         await emit_unseen_graded_update(current_user.id)
     except Exception as e:
         print(f"Failed to emit socket update: {e}")
@@ -1207,7 +1213,7 @@ async def mark_submission_seen(
     return {"success": True}
 
 @router.put("/submissions/{submission_id}/allow-resubmit")
-async def allow_resubmission(
+def allow_resubmission(
     submission_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1240,177 +1246,186 @@ async def grade_submission(
     db: Session = Depends(get_db)
 ):
     """Grade a submission (teachers, curators, and admins)"""
-    # Check role
-    if current_user.role not in ["teacher", "curator", "admin", "head_curator"]:
-        raise HTTPException(status_code=403, detail="Only teachers, curators, and admins can grade submissions")
-    
-    # Check if assignment exists
-    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
-    if not assignment:
-        raise HTTPException(status_code=404, detail="Assignment not found")
-    
-    # Check if submission exists
-    submission = db.query(AssignmentSubmission).filter(
-        AssignmentSubmission.id == submission_id,
-        AssignmentSubmission.assignment_id == assignment_id
-    ).first()
-    if not submission:
-        raise HTTPException(status_code=404, detail="Submission not found")
+    def grade():
+        # Check role
+        if current_user.role not in ["teacher", "curator", "admin", "head_curator"]:
+            raise HTTPException(status_code=403, detail="Only teachers, curators, and admins can grade submissions")
+    
+        # Check if assignment exists
+        assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+        if not assignment:
+            raise HTTPException(status_code=404, detail="Assignment not found")
+    
+        # Check if submission exists
+        submission = db.query(AssignmentSubmission).filter(
+            AssignmentSubmission.id == submission_id,
+            AssignmentSubmission.assignment_id == assignment_id
+        ).first()
+        if not submission:
+            raise HTTPException(status_code=404, detail="Submission not found")
     
-    # Check permissions
-    has_access = False
+        # Check permissions
+        has_access = False
     
-    if current_user.role == "admin":
-        has_access = True
+        if current_user.role == "admin":
+            has_access = True
     
-    # Check course access if assignment is linked to lesson
-    if assignment.lesson_id and not has_access:
-        lesson = db.query(Lesson).filter(Lesson.id == assignment.lesson_id).first()
-        if lesson:
-            module = db.query(Module).filter(Module.id == lesson.module_id).first()
-            if module and check_course_access(module.course_id, current_user, db):
-                has_access = True
+        # Check course access if assignment is linked to lesson
+        if assignment.lesson_id and not has_access:
+            lesson = db.query(Lesson).filter(Lesson.id == assignment.lesson_id).first()
+            if lesson:
+                module = db.query(Module).filter(Module.id == lesson.module_id).first()
+                if module and check_course_access(module.course_id, current_user, db):
+                    has_access = True
     
-    # Check group access if assignment is linked to group
-    if assignment.group_id and not has_access:
-        from src.schemas.models import Group
-        group = db.query(Group).filter(Group.id == assignment.group_id).first()
-        if group:
-            if current_user.role == "teacher" and group.teacher_id == current_user.id:
-                has_access = True
-            elif current_user.role == "curator" and group.curator_id == current_user.id:
-                has_access = True
+        # Check group access if assignment is linked to group
+        if assignment.group_id and not has_access:
+            from src.schemas.models import Group
+            group = db.query(Group).filter(Group.id == assignment.group_id).first()
+            if group:
+                if current_user.role == "teacher" and group.teacher_id == current_user.id:
+                    has_access = True
+                elif current_user.role == "curator" and group.curator_id == current_user.id:
+                    has_access = True
     
-    # For curators: check if the student is in their group
-    if current_user.role == "curator" and not has_access:
-        from src.schemas.models import Group, GroupStudent
-        curator_groups = db.query(Group).filter(Group.curator_id == current_user.id).all()
-        curator_group_ids = [g.id for g in curator_groups]
+        # For curators: check if the student is in their group
+        if current_user.role == "curator" and not has_access:
+            from src.schemas.models import Group, GroupStudent
+            curator_groups = db.query(Group).filter(Group.curator_id == current_user.id).all()
+            curator_group_ids = [g.id for g in curator_groups]
         
-        # Check if the student who submitted is in curator's group
-        student_in_group = db.query(GroupStudent).filter(
-            GroupStudent.group_id.in_(curator_group_ids),
-            GroupStudent.student_id == submission.user_id
-        ).first()
+            # Check if the student who submitted is in curator's group
+            student_in_group = db.query(GroupStudent).filter(
+                GroupStudent.group_id.in_(curator_group_ids),
+                GroupStudent.student_id == submission.user_id
+            ).first()
         
-        if student_in_group:
-            has_access = True
+            if student_in_group:
+                has_access = True
     
-    if not has_access:
-        raise HTTPException(status_code=403, detail="Access denied to this assignment")
+        if not has_access:
+            raise HTTPException(status_code=403, detail="Access denied to this assignment")
     
-    # Validate score
-    if grade_data.score < 0 or grade_data.score > assignment.max_score:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Score must be between 0 and {assignment.max_score}"
-        )
+        # Validate score
+        if grade_data.score < 0 or grade_data.score > assignment.max_score:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Score must be between 0 and {assignment.max_score}"
+            )
     
-    # Update submission
-    submission.score = grade_data.score
-    submission.feedback = grade_data.feedback
-    submission.graded_by = current_user.id
-    submission.is_graded = True
-    submission.graded_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        # Update submission
+        submission.score = grade_data.score
+        submission.feedback = grade_data.feedback
+        submission.graded_by = current_user.id
+        submission.is_graded = True
+        submission.graded_at = datetime.now(timezone.utc).replace(tzinfo=None)
     
-    db.commit()
-    db.refresh(submission)
+        db.commit()
+        db.refresh(submission)
+        return assignment, submission
+
+    assignment, submission = await run_in_threadpool(grade)
     
     # Notify student about graded submission
     try:
-        from src.routes.socket_messages import emit_unseen_graded_update
+        from src.messages.routes.socket_messages import emit_unseen_graded_update
         await emit_unseen_graded_update(submission.user_id)
     except Exception as e:
         print(f"Failed to emit socket update: {e}")
     
-    # Send email notification to student
-    try:
-        from src.services.email_service import send_submission_graded_notification
+    def notify_and_award():
+        # Send email notification to student
+        try:
+            from src.services.email_service import send_submission_graded_notification
         
-        # Get student email
-        student = db.query(UserInDB).filter(UserInDB.id == submission.user_id).first()
-        if student and student.email:
-            # Resolve course name
-            course_name = "Course"
+            # Get student email
+            student = db.query(UserInDB).filter(UserInDB.id == submission.user_id).first()
+            if student and student.email:
+                # Resolve course name
+                course_name = "Course"
             
-            # Try via lesson -> module -> course
-            if assignment.lesson_id:
-                lesson = db.query(Lesson).filter(Lesson.id == assignment.lesson_id).first()
-                if lesson:
-                    module = db.query(Module).filter(Module.id == lesson.module_id).first()
-                    if module:
-                        course = db.query(Course).filter(Course.id == module.course_id).first()
-                        if course:
-                            course_name = course.title
+                # Try via lesson -> module -> course
+                if assignment.lesson_id:
+                    lesson = db.query(Lesson).filter(Lesson.id == assignment.lesson_id).first()
+                    if lesson:
+                        module = db.query(Module).filter(Module.id == lesson.module_id).first()
+                        if module:
+                            course = db.query(Course).filter(Course.id == module.course_id).first()
+                            if course:
+                                course_name = course.title
             
-            # Fallback: try via group -> CourseGroupAccess
-            if course_name == "Course" and assignment.group_id:
-                from src.schemas.models import CourseGroupAccess
-                cga = db.query(CourseGroupAccess).filter(
-                    CourseGroupAccess.group_id == assignment.group_id,
-                    CourseGroupAccess.is_active == True
-                ).first()
-                if cga:
-                    linked_course = db.query(Course).filter(Course.id == cga.course_id).first()
-                    if linked_course:
-                        course_name = linked_course.title
+                # Fallback: try via group -> CourseGroupAccess
+                if course_name == "Course" and assignment.group_id:
+                    from src.schemas.models import CourseGroupAccess, Group
+                    cga = db.query(CourseGroupAccess).filter(
+                        CourseGroupAccess.group_id == assignment.group_id,
+                        CourseGroupAccess.is_active == True
+                    ).first()
+                    if cga:
+                        linked_course = db.query(Course).filter(Course.id == cga.course_id).first()
+                        if linked_course:
+                            course_name = linked_course.title
                 
-                # Final fallback: use group name
-                if course_name == "Course":
-                    group = db.query(Group).filter(Group.id == assignment.group_id).first()
-                    if group:
-                        course_name = group.name
+                    # Final fallback: use group name
+                    if course_name == "Course":
+                        group = db.query(Group).filter(Group.id == assignment.group_id).first()
+                        if group:
+                            course_name = group.name
             
-            send_submission_graded_notification(
-                student_email=student.email,
-                assignment_title=assignment.title,
-                course_name=course_name,
-                score=grade_data.score,
-                max_score=assignment.max_score,
-                feedback=grade_data.feedback
-            )
-    except Exception as e:
-        print(f"Failed to send grading email notification: {e}")
+                send_submission_graded_notification(
+                    student_email=student.email,
+                    assignment_title=assignment.title,
+                    course_name=course_name,
+                    score=grade_data.score,
+                    max_score=assignment.max_score,
+                    feedback=grade_data.feedback
+                )
+        except Exception as e:
+            print(f"Failed to send grading email notification: {e}")
     
-    # Award points based on score
-    try:
-        # Calculate points based on score percentage
-        # Award points proportional to the score received
-        score_percentage = (grade_data.score / assignment.max_score) * 100 if assignment.max_score > 0 else 0
+        # Award points based on score
+        try:
+            # Calculate points based on score percentage
+            # Award points proportional to the score received
+            score_percentage = (grade_data.score / assignment.max_score) * 100 if assignment.max_score > 0 else 0
         
-        # Base points for completing the assignment (minimum)
-        base_points = 10
+            # Base points for completing the assignment (minimum)
+            base_points = 10
         
-        # Bonus points based on score (up to 40 more points for perfect score)
-        bonus_points = int((score_percentage / 100) * 40)
+            # Bonus points based on score (up to 40 more points for perfect score)
+            bonus_points = int((score_percentage / 100) * 40)
         
-        total_points = base_points + bonus_points
+            total_points = base_points + bonus_points
         
-        award_points(
-            db, 
-            submission.user_id, 
-            total_points, 
-            'assignment', 
-            f'Graded assignment: {assignment.title} ({grade_data.score}/{assignment.max_score})'
-        )
-    except Exception as e:
-        print(f"Failed to award points: {e}")
+            award_points(
+                db, 
+                submission.user_id, 
+                total_points, 
+                'assignment', 
+                f'Graded assignment: {assignment.title} ({grade_data.score}/{assignment.max_score})'
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Failed to award points: {e}")
     
-    # Enhance submission with names
-    submission_data = AssignmentSubmissionSchema.from_orm(submission)
+        # Enhance submission with names
+        submission_data = AssignmentSubmissionSchema.from_orm(submission)
     
-    # Get user name
-    user = db.query(UserInDB).filter(UserInDB.id == submission.user_id).first()
-    if user:
-        submission_data.user_name = user.name
+        # Get user name
+        user = db.query(UserInDB).filter(UserInDB.id == submission.user_id).first()
+        if user:
+            submission_data.user_name = user.name
     
-    # Get grader name
-    submission_data.grader_name = current_user.name
+        # Get grader name
+        submission_data.grader_name = current_user.name
     
-    return submission_data
+        return submission_data
+
+    return await run_in_threadpool(notify_and_award)
 
 @router.patch("/{assignment_id}/submissions/{submission_id}/toggle-visibility", response_model=AssignmentSubmissionSchema)
-async def toggle_submission_visibility(
+def toggle_submission_visibility(
     assignment_id: int,
     submission_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -1478,7 +1493,7 @@ async def toggle_submission_visibility(
 # =============================================================================
 
 @router.get("/{assignment_id}/student-progress", response_model=Dict[str, Any])
-async def get_assignment_student_progress(
+def get_assignment_student_progress(
     assignment_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1713,7 +1728,7 @@ async def get_assignment_student_progress(
     }
 
 @router.get("/{assignment_id}/status", response_model=Dict[str, Any])
-async def get_assignment_status_for_student(
+def get_assignment_status_for_student(
     assignment_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1964,7 +1979,7 @@ def update_student_progress(assignment: Assignment, user_id: int, score: Optiona
 # =============================================================================
 
 @router.get("/types")
-async def get_assignment_types():
+def get_assignment_types():
     """Get supported assignment types and their schemas"""
     return {
         "supported_types": [
@@ -2115,7 +2130,7 @@ def sync_assignment_linked_lessons(assignment: Assignment, db: Session):
 # =============================================================================
 
 @router.post("/{assignment_id}/extensions", response_model=AssignmentExtensionSchema)
-async def grant_extension(
+def grant_extension(
     assignment_id: int,
     extension_data: GrantExtensionSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -2176,7 +2191,7 @@ async def grant_extension(
     return result
 
 @router.get("/{assignment_id}/extensions", response_model=List[AssignmentExtensionSchema])
-async def get_assignment_extensions(
+def get_assignment_extensions(
     assignment_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -2208,7 +2223,7 @@ async def get_assignment_extensions(
     return result
 
 @router.delete("/{assignment_id}/extensions/{student_id}")
-async def revoke_extension(
+def revoke_extension(
     assignment_id: int,
     student_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -2232,7 +2247,7 @@ async def revoke_extension(
     return {"message": "Extension revoked successfully"}
 
 @router.get("/{assignment_id}/my-extension", response_model=Optional[AssignmentExtensionSchema])
-async def get_my_extension(
+def get_my_extension(
     assignment_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, BigInteger, Float, DateTime, Date, Boolean, ForeignKey, Text, Index
+from sqlalchemy import Column, String, Integer, BigInteger, Float, DateTime, Date, Boolean, ForeignKey, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone, date
 from typing import List
@@ -30,6 +30,8 @@ class UserInDB(Base):
     last_activity_date = Column(Date, nullable=True)
     activity_points = Column(BigInteger, default=0, nullable=False)
     no_substitutions = Column(Boolean, default=False, nullable=False)
+    # Version of the last Central Auth event applied by the RabbitMQ consumer
+    sync_version = Column(BigInteger, nullable=True)
 
     groups = relationship("GroupStudent", back_populates="student", cascade="all, delete-orphan")
     enrollments = relationship("Enrollment", back_populates="user", cascade="all, delete-orphan")
@@ -41,9 +43,14 @@ class UserInDB(Base):
     favorite_flashcards = relationship("FavoriteFlashcard", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
     step_progress = relationship("StepProgress", back_populates="user", cascade="all, delete-orphan")
     notifications = relationship("Notification", back_populates="user", cascade="all, delete-orphan")
-    point_history = relationship("PointHistory", back_populates="user", cascade="all, delete-orphan")
+    point_history = relationship("PointHistory", foreign_keys="PointHistory.user_id", back_populates="user", cascade="all, delete-orphan")
     managed_courses = relationship("Course", secondary="course_head_teachers", back_populates="head_teachers")
 
+    __table_args__ = (
+        # All-time leaderboard and rank: students ordered by points
+        Index('ix_users_role_activity_points', 'role', 'activity_points'),
+    )
+
     @property
     def course_ids(self) -> List[int]:
         return [c.id for c in self.managed_courses] if self.managed_courses else []
@@ -57,10 +64,36 @@ class PointHistory(Base):
     amount = Column(Integer, nullable=False)
     reason = Column(String, nullable=False)
     description = Column(String, nullable=True)
+    # Teacher who gave a teacher_bonus (weekly allowance is counted per giver)
+    awarded_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
 
-    user = relationship("UserInDB", back_populates="point_history")
+    user = relationship("UserInDB", foreign_keys=[user_id], back_populates="point_history")
 
     __table_args__ = (
         Index('ix_point_history_user_created', 'user_id', 'created_at'),
+        Index('ix_point_history_awarded_by_created', 'awarded_by', 'created_at'),
+    )
+
+
+class PointTotal(Base):
+    """A user's points per week / month, kept in step with PointHistory (see services.points_ledger)."""
+    __tablename__ = "point_totals"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    period = Column(String(8), nullable=False)  # 'week' or 'month'
+    period_start = Column(Date, nullable=False)
+    points = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'period', 'period_start', name='uq_point_total_user_period'),
+        Index('ix_point_totals_period_points', 'period', 'period_start', 'points'),
     )
+
+
+class CacheGeneration(Base):
+    """Generation counter of a per-process cache, bumped by writers (see services.cache_generations)."""
+    __tablename__ = "cache_generations"
+    name = Column(String(64), primary_key=True)
+    generation = Column(BigInteger, default=0, nullable=False)
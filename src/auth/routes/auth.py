@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
 from src.utils.auth_utils import (
     hash_password, 
     verify_password, 
@@ -9,7 +11,8 @@ from src.utils.auth_utils import (
     verify_token, 
     create_refresh_token
 )
-from src.config import get_db
+from src.config import get_db, get_async_db
+from src.services.principal_cache import get_principal
 from src.schemas.models import UserInDB, Token, UserSchema
 import logging
 from pydantic import BaseModel
@@ -32,14 +35,20 @@ class UserLogin(BaseModel):
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
+async def _find_user_by_email(db: AsyncSession, email: str, *options):
+    """Find user by email (case-insensitive)"""
+    result = await db.execute(
+        select(UserInDB).where(func.lower(UserInDB.email) == email.lower()).options(*options)
+    )
+    return result.scalars().first()
+
 @router.post("/login", response_model=Token)
-async def login(user: UserLogin, response: Response, db: Session = Depends(get_db)):
+async def login(user: UserLogin, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Simple login with email and password"""
     try:
         logger.info(f"Attempting login for email: {user.email}")
         
-        # Find user by email (case-insensitive)
-        db_user = db.query(UserInDB).filter(func.lower(UserInDB.email) == user.email.lower()).first()
+        db_user = await _find_user_by_email(db, user.email)
         if not db_user:
             logger.warning(f"User not found: {user.email}")
             raise HTTPException(status_code=400, detail="Invalid credentials")
@@ -50,7 +59,8 @@ async def login(user: UserLogin, response: Response, db: Session = Depends(get_d
             raise HTTPException(status_code=400, detail="Account is inactive")
         
         # Verify password
-        if not verify_password(user.password, db_user.hashed_password):
+        # bcrypt is CPU-bound; keep it off the event loop
+        if not await run_in_threadpool(verify_password, user.password, db_user.hashed_password):
             logger.warning(f"Password verification failed for user: {user.email}")
             raise HTTPException(status_code=400, detail="Invalid credentials")
         
@@ -66,7 +76,7 @@ async def login(user: UserLogin, response: Response, db: Session = Depends(get_d
         
         # Store refresh token in database
         db_user.refresh_token = refresh_token
-        db.commit()
+        await db.commit()
         
         # Determine if we're in production (HTTPS) or development (HTTP)
         is_production = os.getenv("ENVIRONMENT", "development") == "production"
@@ -107,7 +117,7 @@ async def login(user: UserLogin, response: Response, db: Session = Depends(get_d
         raise HTTPException(status_code=500, detail="Login failed")
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(request: RefreshTokenRequest, response: Response, db: Session = Depends(get_db)):
+async def refresh_token(request: RefreshTokenRequest, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Refresh access token using refresh token"""
     try:
         token = request.refresh_token
@@ -116,8 +126,7 @@ async def refresh_token(request: RefreshTokenRequest, response: Response, db: Se
             raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
             
         user_email = payload.get("sub")
-        # Find user by email (case-insensitive)
-        user = db.query(UserInDB).filter(func.lower(UserInDB.email) == user_email.lower()).first()
+        user = await _find_user_by_email(db, user_email)
 
         if not user or user.refresh_token != token or not user.is_active:
             raise HTTPException(status_code=401, detail="Invalid refresh token")
@@ -132,7 +141,7 @@ async def refresh_token(request: RefreshTokenRequest, response: Response, db: Se
         
         # Update user's refresh token
         user.refresh_token = new_refresh_token
-        db.commit()
+        await db.commit()
         
         # Determine environment
         is_production = os.getenv("ENVIRONMENT", "development") == "production"
@@ -171,15 +180,15 @@ async def refresh_token(request: RefreshTokenRequest, response: Response, db: Se
         raise HTTPException(status_code=500, detail="Could not refresh token")
 
 @router.get("/me", response_model=UserSchema)
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """Get current user information"""
     payload = verify_token(token)
     if payload is None:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     
     user_email = payload.get("sub")
-    # Find user by email (case-insensitive)
-    user = db.query(UserInDB).filter(func.lower(UserInDB.email) == user_email.lower()).first()
+    # course_ids is read from managed_courses; lazy loads are not possible here
+    user = await _find_user_by_email(db, user_email, selectinload(UserInDB.managed_courses))
     
     if user is None or not user.is_active:
         raise HTTPException(status_code=404, detail="User not found")
@@ -187,19 +196,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     return user
 
 @router.post("/logout")
-async def logout(response: Response, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def logout(response: Response, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """Logout user by invalidating refresh token"""
     payload = verify_token(token)
     if payload is None:
         raise HTTPException(status_code=401, detail="Invalid token")
 
     user_email = payload.get("sub")
-    # Find user by email (case-insensitive)
-    user = db.query(UserInDB).filter(func.lower(UserInDB.email) == user_email.lower()).first()
+    user = await _find_user_by_email(db, user_email)
 
     if user:
         user.refresh_token = None
-        db.commit()
+        await db.commit()
     
     # Clear cookies
     response.delete_cookie(key="access_token", path="/")
@@ -208,15 +216,32 @@ async def logout(response: Response, token: str = Depends(oauth2_scheme), db: Se
     return {"detail": "Logged out successfully"}
 
 # Dependency for getting current user
-async def get_current_user_dependency(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserInDB:
+# Declared sync so FastAPI resolves it in the threadpool instead of blocking
+# the event loop on a cache miss.
+def get_current_user_dependency(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserInDB:
     """Dependency to get current authenticated user"""
     payload = verify_token(token)
     if payload is None:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     
-    user_email = payload.get("sub")
-    # Find user by email (case-insensitive)
-    user = db.query(UserInDB).filter(func.lower(UserInDB.email) == user_email.lower()).first()
+    # Served from the per-process principal cache when possible
+    user = get_principal(payload, db)
+    
+    if user is None or not user.is_active:
+        raise HTTPException(status_code=401, detail="User not found or inactive")
+    
+    return user
+
+# Async variant for handlers using get_async_db. The user is bound to the
+# AsyncSession; columns outside the principal snapshot must be loaded inside
+# db.run_sync() or with an explicit select.
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> UserInDB:
+    """Dependency to get current authenticated user (async session)"""
+    payload = verify_token(token)
+    if payload is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    
+    user = await db.run_sync(lambda session: get_principal(payload, session))
     
     if user is None or not user.is_active:
         raise HTTPException(status_code=401, detail="User not found or inactive")
@@ -13,6 +13,7 @@ from datetime import datetime
 from src.schemas.models import UserInDB, UserSchema, Group, GroupStudent, GroupSchema
 from src.config import get_db
 from src.utils.auth_utils import verify_token
+from src.services.principal_cache import invalidate_principal
 from fastapi.security import OAuth2PasswordBearer
 
 router = APIRouter()
@@ -37,7 +38,7 @@ class UserUpdate(BaseModel):
 
 
 @router.get("/users/{user_id}", response_model=UserSchema)
-async def get_user_by_id(user_id: int, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def get_user_by_id(user_id: int, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     payload = verify_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
@@ -51,7 +52,7 @@ async def get_user_by_id(user_id: int, db: Session = Depends(get_db), token: str
 
 
 @router.get("/groups/me", response_model=List[GroupSchema])
-async def get_my_groups(
+def get_my_groups(
     db: Session = Depends(get_db),
     user: UserInDB = Depends(get_current_user),
 ):
@@ -107,7 +108,7 @@ async def get_my_groups(
 
 
 @router.put("/{user_id}", response_model=UserSchema)
-async def update_profile(
+def update_profile(
     user_id: int,
     update: UserUpdate,
     db: Session = Depends(get_db),
@@ -124,11 +125,12 @@ async def update_profile(
         user.hashed_password = hash_password(update.password)
     db.commit()
     db.refresh(user)
+    invalidate_principal(user_id=user.id, email=user.email)
     return user 
 
 
 @router.post("/complete-onboarding", response_model=UserSchema)
-async def complete_onboarding(
+def complete_onboarding(
     db: Session = Depends(get_db),
     user: UserInDB = Depends(get_current_user),
 ):
@@ -151,7 +153,7 @@ class PushTokenRequest(BaseModel):
 
 
 @router.post("/push-token")
-async def register_push_token(
+def register_push_token(
     token_data: PushTokenRequest,
     db: Session = Depends(get_db),
     user: UserInDB = Depends(get_current_user),
@@ -164,7 +166,7 @@ async def register_push_token(
 
 
 @router.delete("/push-token")
-async def remove_push_token(
+def remove_push_token(
     db: Session = Depends(get_db),
     user: UserInDB = Depends(get_current_user),
 ):
@@ -1,9 +1,13 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+import anyio
 import os
 import logging
 from dotenv import load_dotenv
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from src.schemas.models import Base, UserInDB, Course, Module, Lesson, Group, Enrollment, StudentProgress, Assignment, AssignmentSubmission, Message, LessonMaterial
 from passlib.context import CryptContext
 
@@ -41,6 +45,99 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+# Async database setup (asyncpg). Created lazily so that tools importing this
+# module (alembic, scripts) do not need the async driver.
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "10"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
+
+# Worker threads for sync route handlers, sync dependencies and run_sync_db.
+# Kept at the sync pool capacity so threads never queue on pool checkout.
+SYNC_THREADPOOL_SIZE = int(os.getenv("SYNC_THREADPOOL_SIZE", "30"))
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def _async_url():
+    """Translate POSTGRES_URL into its async driver equivalent."""
+    url = make_url(POSTGRES_URL)
+    connect_args = {}
+    if url.get_backend_name() == "postgresql":
+        # asyncpg takes ``ssl`` instead of libpq's ``sslmode``
+        sslmode = url.query.get("sslmode")
+        if sslmode:
+            connect_args["ssl"] = sslmode
+            url = url.difference_update_query(["sslmode"])
+        url = url.set(drivername="postgresql+asyncpg")
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url, connect_args
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        url, connect_args = _async_url()
+        pool_args = {}
+        if url.get_backend_name() == "postgresql":
+            pool_args = dict(
+                pool_size=ASYNC_DB_POOL_SIZE,
+                max_overflow=ASYNC_DB_MAX_OVERFLOW,
+                pool_pre_ping=True,
+                pool_recycle=3600,
+            )
+        _async_engine = create_async_engine(url, connect_args=connect_args, **pool_args)
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        _async_sessionmaker = async_sessionmaker(
+            bind=get_async_engine(),
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _async_sessionmaker()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Async counterpart of get_db. Queries do not block the event loop.
+
+    Legacy helpers written against a sync Session can be called through
+    ``await db.run_sync(lambda session: helper(..., session))``.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def configure_threadpool():
+    """Bound the threadpool used for sync handlers (call on startup)."""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = SYNC_THREADPOOL_SIZE
+
+
+async def run_sync_db(fn, *args, **kwargs):
+    """
+    Run ``fn(db, *args, **kwargs)`` with its own sync Session in the bounded
+    threadpool, for blocking code called from async handlers.
+    """
+    def call():
+        db = SessionLocal()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+    return await run_in_threadpool(call)
+
+
+async def dispose_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_sessionmaker = None
+
 def init_db():
     """Initialize the database and create tables if they don't exist."""
     logger.info("Initializing the database...")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, UniqueConstraint
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, ForeignKey, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 
@@ -42,3 +42,87 @@ class QuestionErrorReport(Base):
     user = relationship("UserInDB", foreign_keys=[user_id])
     step = relationship("Step", foreign_keys=[step_id])
     resolver = relationship("UserInDB", foreign_keys=[resolved_by])
+
+
+class DictionaryLookup(Base):
+    """Cached /ai-tools/lookup result for a normalized word in a given context."""
+    __tablename__ = "dictionary_lookups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # sha256 of the normalized word and the context fingerprint
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)
+    word = Column(String(100), nullable=False, index=True)
+    context_fingerprint = Column(String(64), nullable=True)
+    result = Column(Text, nullable=False)  # JSON dictionary entry
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class StoredBlob(Base):
+    """One stored file content, by sha256 (see services.blob_store)."""
+    __tablename__ = "stored_blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False, unique=True)
+    size_bytes = Column(BigInteger, nullable=False)
+    # Number of file_references rows pointing here
+    ref_count = Column(Integer, default=0, nullable=False)
+    # Set when ref_count drops to 0; the collector deletes blobs unreferenced for long enough
+    unreferenced_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    __table_args__ = (
+        Index('ix_stored_blobs_unreferenced', 'ref_count', 'unreferenced_at'),
+    )
+
+
+class FileReference(Base):
+    """A public upload path (``/uploads/<path>``) and what it belongs to."""
+    __tablename__ = "file_references"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Relative to the uploads root, e.g. "materials/lesson_3_1_notes.pdf"
+    path = Column(String, nullable=False, unique=True)
+    blob_id = Column(Integer, ForeignKey("stored_blobs.id"), nullable=False, index=True)
+    size_bytes = Column(BigInteger, nullable=False)
+    # step, material, submission, assignment, course_thumbnail or the generic upload type
+    owner_type = Column(String(32), nullable=False)
+    owner_id = Column(Integer, nullable=True)
+    uploaded_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    blob = relationship("StoredBlob")
+
+    __table_args__ = (
+        Index('ix_file_references_owner', 'owner_type', 'owner_id'),
+    )
+
+
+class UserBlobUsage(Base):
+    """How many of a user's uploads point at a blob; the user is charged for the blob once."""
+    __tablename__ = "user_blob_usage"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    blob_id = Column(Integer, ForeignKey("stored_blobs.id"), primary_key=True, index=True)
+    ref_count = Column(Integer, default=0, nullable=False)
+
+
+class UserStorageUsage(Base):
+    """Bytes of distinct uploads per uploader, kept with file_references (quota and report)."""
+    __tablename__ = "user_storage_usage"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    bytes_used = Column(BigInteger, default=0, nullable=False, index=True)
+    file_count = Column(Integer, default=0, nullable=False)
+
+
+class StorageTotals(Base):
+    """Single row (id=1) of store-wide counters for the storage report."""
+    __tablename__ = "storage_totals"
+
+    id = Column(Integer, primary_key=True)
+    # Sum of file_references sizes: what the uploads would take without dedupe
+    logical_bytes = Column(BigInteger, default=0, nullable=False)
+    reference_count = Column(Integer, default=0, nullable=False)
+    # Sum of stored_blobs sizes: what is on disk
+    physical_bytes = Column(BigInteger, default=0, nullable=False)
+    blob_count = Column(Integer, default=0, nullable=False)
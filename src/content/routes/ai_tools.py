@@ -6,10 +6,12 @@ from typing import Optional, List
 import google.generativeai as genai
 import json
 import os
+from starlette.concurrency import run_in_threadpool
 
 from src.schemas.models import UserInDB
 from src.routes.auth import get_current_user_dependency
 from src.config import get_db
+from src.services.dictionary_lookup_cache import DictionaryLookupCache, get_dictionary_lookup_cache
 
 router = APIRouter()
 
@@ -44,12 +46,33 @@ class LookupResponse(BaseModel):
 # =============================================================================
 
 class GeminiLookupService:
-    def __init__(self):
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
-    
+    def __init__(self, model=None, cache: Optional[DictionaryLookupCache] = None):
+        self.model = model or genai.GenerativeModel('gemini-2.0-flash')
+        self._cache = cache
+
+    @property
+    def cache(self) -> DictionaryLookupCache:
+        return self._cache or get_dictionary_lookup_cache()
+
     async def lookup_word(self, text: str, context: Optional[str] = None) -> dict:
-        """Look up a word/phrase using Gemini to generate dictionary-like response."""
-        
+        """Look up a word/phrase, from the dictionary cache when possible."""
+        try:
+            return await self.cache.lookup(text, context, self._generate)
+        except json.JSONDecodeError as e:
+            print(f"JSON parse error: {e}")
+            # Return a basic fallback (not cached, the next lookup asks again)
+            return {
+                "word": text,
+                "definition_en": "Definition not available",
+                "translation_ru": "Перевод недоступен",
+                "synonyms": []
+            }
+        except Exception as e:
+            print(f"Gemini lookup error: {e}")
+            raise
+
+    async def _generate(self, text: str, context: Optional[str] = None) -> dict:
+        """Generate a dictionary-like response with Gemini."""
         context_hint = ""
         if context:
             context_hint = f'\nThe word appears in this context: "{context}"'
@@ -71,37 +94,23 @@ Return a JSON object with these fields:
 Return ONLY valid JSON, no markdown formatting.
 """
         
-        try:
-            response = self.model.generate_content(prompt)
-            
-            if not response or not response.text:
-                raise Exception("No response from Gemini")
-            
-            # Clean response
-            text_response = response.text.strip()
-            if text_response.startswith("```json"):
-                text_response = text_response[7:]
-            if text_response.startswith("```"):
-                text_response = text_response[3:]
-            if text_response.endswith("```"):
-                text_response = text_response[:-3]
-            text_response = text_response.strip()
-            
-            result = json.loads(text_response)
-            return result
-            
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error: {e}")
-            # Return a basic fallback
-            return {
-                "word": text,
-                "definition_en": "Definition not available",
-                "translation_ru": "Перевод недоступен",
-                "synonyms": []
-            }
-        except Exception as e:
-            print(f"Gemini lookup error: {e}")
-            raise
+        # generate_content blocks for the whole round trip
+        response = await run_in_threadpool(self.model.generate_content, prompt)
+        
+        if not response or not response.text:
+            raise Exception("No response from Gemini")
+        
+        # Clean response
+        text_response = response.text.strip()
+        if text_response.startswith("```json"):
+            text_response = text_response[7:]
+        if text_response.startswith("```"):
+            text_response = text_response[3:]
+        if text_response.endswith("```"):
+            text_response = text_response[:-3]
+        text_response = text_response.strip()
+        
+        return json.loads(text_response)
 
 
 lookup_service = GeminiLookupService()
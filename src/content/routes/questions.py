@@ -8,6 +8,7 @@ import json
 from src.config import get_db
 from src.schemas.models import UserInDB, QuestionErrorReport, Step, Lesson, Module, Course
 from src.routes.auth import get_current_user
+from src.services.quiz_content import get_compiled_quiz
 from src.services.telegram_service import notify_admins_about_error_report
 
 router = APIRouter(prefix="/questions", tags=["Questions"])
@@ -33,7 +34,7 @@ class UpdateQuestionRequest(BaseModel):
 
 
 @router.post("/report-error", response_model=ReportErrorResponse)
-async def report_question_error(
+def report_question_error(
     request: ReportErrorRequest,
     background_tasks: BackgroundTasks,
     current_user: UserInDB = Depends(get_current_user),
@@ -74,19 +75,12 @@ async def report_question_error(
             step_title = step.title
             
             # Try to get question text from step content
-            if step.content_text:
-                try:
-                    content = json.loads(step.content_text)
-                    questions = content.get("questions", [])
-                    for q in questions:
-                        if str(q.get("id")) == str(request.question_id):
-                            question_text = q.get("question_text", "Question")
-                            # Strip HTML tags for cleaner Telegram message
-                            import re
-                            question_text = re.sub(r'<[^>]+>', '', question_text)
-                            break
-                except (json.JSONDecodeError, TypeError):
-                    pass
+            question = get_compiled_quiz(step).question(request.question_id)
+            if question is not None:
+                question_text = question.data.get("question_text", "Question")
+                # Strip HTML tags for cleaner Telegram message
+                import re
+                question_text = re.sub(r'<[^>]+>', '', question_text)
             
             if step.lesson:
                 lesson_title = step.lesson.title
@@ -117,7 +111,7 @@ async def report_question_error(
 
 
 @router.get("/error-reports")
-async def get_error_reports(
+def get_error_reports(
     status: Optional[str] = None,
     current_user: UserInDB = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -178,17 +172,9 @@ async def get_error_reports(
                 }
             
             # Parse quiz content to find the question
-            if report.step.content_text:
-                try:
-                    content = json.loads(report.step.content_text)
-                    questions = content.get("questions", [])
-                    for q in questions:
-                        # Compare as strings since question IDs in JSON are strings
-                        if str(q.get("id")) == str(report.question_id):
-                            question_data = q
-                            break
-                except (json.JSONDecodeError, TypeError):
-                    pass
+            question = get_compiled_quiz(report.step).question(report.question_id)
+            if question is not None:
+                question_data = question.data
         
         result.append({
             "id": report.id,
@@ -213,7 +199,7 @@ async def get_error_reports(
 
 
 @router.get("/error-reports/{report_id}")
-async def get_error_report_detail(
+def get_error_report_detail(
     report_id: int,
     current_user: UserInDB = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -239,8 +225,9 @@ async def get_error_report_detail(
     quiz_settings = {}
     
     if report.step and report.step.content_text:
-        try:
-            content = json.loads(report.step.content_text)
+        quiz = get_compiled_quiz(report.step)
+        if quiz.content:
+            content = quiz.content
             all_questions = content.get("questions", [])
             quiz_settings = {
                 "title": content.get("title"),
@@ -248,13 +235,9 @@ async def get_error_report_detail(
                 "time_limit": content.get("time_limit"),
                 "passing_score": content.get("passing_score"),
             }
-            for q in all_questions:
-                # Compare as strings since question IDs in JSON are strings
-                if str(q.get("id")) == str(report.question_id):
-                    question_data = q
-                    break
-        except (json.JSONDecodeError, TypeError):
-            pass
+            question = quiz.question(report.question_id)
+            if question is not None:
+                question_data = question.data
     
     # Get course hierarchy
     course_info = None
@@ -320,7 +303,7 @@ async def get_error_report_detail(
 
 
 @router.patch("/error-reports/{report_id}")
-async def update_error_report(
+def update_error_report(
     report_id: int,
     status: str,
     current_user: UserInDB = Depends(get_current_user),
@@ -348,7 +331,7 @@ async def update_error_report(
 
 
 @router.put("/update-question/{step_id}/{question_id}")
-async def update_question(
+def update_question(
     step_id: int,
     question_id: str,
     request: UpdateQuestionRequest,
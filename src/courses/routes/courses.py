@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session, joinedload, noload
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import func, desc, and_
 from typing import List, Optional
 import os
@@ -21,6 +22,7 @@ from src.schemas.models import (
 )
 from src.routes.auth import get_current_user_dependency
 from src.utils.permissions import require_teacher_or_admin, require_admin, check_course_access
+from src.utils.access_index import get_access_index
 from src.services.azure_openai_service import AzureOpenAIService
 from src.utils.duration_calculator import update_course_duration
 
@@ -31,7 +33,7 @@ router = APIRouter()
 # =============================================================================
 
 @router.get("/", response_model=List[CourseSchema])
-async def get_courses(
+def get_courses(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, le=1000),
     teacher_id: Optional[int] = None,
@@ -74,45 +76,13 @@ async def get_courses(
         
     elif current_user.role == "teacher":
         # Teachers see their own courses AND courses their groups have access to AND courses with direct access
-        from src.schemas.models import Group, CourseGroupAccess, CourseTeacherAccess
-        
-        # Get teacher's own courses
-        own_courses = db.query(Course.id).filter(Course.teacher_id == current_user.id).subquery()
-        
-        # Get courses accessible via groups
-        teacher_groups = db.query(Group.id).filter(Group.teacher_id == current_user.id).subquery()
-        group_courses = db.query(CourseGroupAccess.course_id).filter(
-            CourseGroupAccess.group_id.in_(teacher_groups),
-            CourseGroupAccess.is_active == True
-        ).subquery()
-        
-        # Get courses with direct access
-        direct_access_courses = db.query(CourseTeacherAccess.course_id).filter(
-            CourseTeacherAccess.teacher_id == current_user.id,
-            CourseTeacherAccess.is_active == True
-        ).subquery()
-        
-        # Combine all
-        from sqlalchemy import union
-        combined_course_ids = db.query(union(
-            own_courses.select(),
-            group_courses.select(),
-            direct_access_courses.select()
-        ).alias('course_id')).subquery()
-        
-        query = query.filter(Course.id.in_(combined_course_ids))
+        access_index = get_access_index(current_user, db)
+        query = query.filter(Course.id.in_(access_index.course_ids))
         
     elif current_user.role == "curator":
         # Curators see courses their groups have access to
-        from src.schemas.models import Group, CourseGroupAccess
-        
-        curator_groups = db.query(Group.id).filter(Group.curator_id == current_user.id).subquery()
-        group_courses = db.query(CourseGroupAccess.course_id).filter(
-            CourseGroupAccess.group_id.in_(curator_groups),
-            CourseGroupAccess.is_active == True
-        ).subquery()
-        
-        query = query.filter(Course.id.in_(group_courses), Course.is_active == True)
+        access_index = get_access_index(current_user, db)
+        query = query.filter(Course.id.in_(access_index.course_ids), Course.is_active == True)
     
     # Apply filters
     if teacher_id is not None:
@@ -154,7 +124,7 @@ async def get_courses(
     return courses_data
 
 @router.get("/my-courses", response_model=List[CourseSchema])
-async def get_my_courses(
+def get_my_courses(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -224,7 +194,7 @@ async def get_my_courses(
     return courses_data
 
 @router.post("/", response_model=CourseSchema)
-async def create_course(
+def create_course(
     course_data: CourseCreateSchema,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -257,7 +227,7 @@ async def create_course(
     return course_response
 
 @router.get("/{course_id}", response_model=CourseSchema)
-async def get_course(
+def get_course(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -288,7 +258,7 @@ async def get_course(
     return course_response
 
 @router.put("/{course_id}", response_model=CourseSchema)
-async def update_course(
+def update_course(
     course_id: int,
     course_data: CourseCreateSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -323,7 +293,7 @@ async def update_course(
     return course_response
 
 @router.post("/{course_id}/recalculate-duration")
-async def recalculate_course_duration(
+def recalculate_course_duration(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -347,7 +317,7 @@ async def recalculate_course_duration(
     }
 
 @router.post("/{course_id}/publish")
-async def publish_course(
+def publish_course(
     course_id: int,
     current_user: UserInDB = Depends(require_admin()),
     db: Session = Depends(get_db)
@@ -376,7 +346,7 @@ async def publish_course(
     }
 
 @router.post("/{course_id}/unpublish")
-async def unpublish_course(
+def unpublish_course(
     course_id: int,
     current_user: UserInDB = Depends(require_admin()),
     db: Session = Depends(get_db)
@@ -405,7 +375,7 @@ async def unpublish_course(
     }
 
 @router.delete("/{course_id}")
-async def delete_course(
+def delete_course(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -431,7 +401,7 @@ async def delete_course(
 # =============================================================================
 
 @router.get("/{course_id}/modules", response_model=List[ModuleSchema])
-async def get_course_modules(
+def get_course_modules(
     course_id: int,
     include_lessons: bool = Query(False, description="Include lessons for each module"),
     student_id: Optional[int] = Query(None, description="Get progress for specific student (teacher/admin only)"),
@@ -713,7 +683,7 @@ async def get_course_modules(
     return modules_data
 
 @router.post("/{course_id}/modules", response_model=ModuleSchema)
-async def create_module(
+def create_module(
     course_id: int,
     module_data: ModuleCreateSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -745,7 +715,7 @@ async def create_module(
     return module_response
 
 @router.put("/{course_id}/modules/{module_id}", response_model=ModuleSchema)
-async def update_module(
+def update_module(
     course_id: int,
     module_id: int,
     module_data: ModuleCreateSchema,
@@ -782,7 +752,7 @@ async def update_module(
     return module_response
 
 @router.delete("/{course_id}/modules/{module_id}")
-async def delete_module(
+def delete_module(
     course_id: int,
     module_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -855,7 +825,7 @@ async def delete_module(
 # =============================================================================
 
 @router.get("/{course_id}/modules/{module_id}/lessons", response_model=List[LessonSchema])
-async def get_module_lessons(
+def get_module_lessons(
     course_id: int,
     module_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -888,7 +858,7 @@ async def get_module_lessons(
     return lessons_data
 
 @router.get("/{course_id}/lessons", response_model=List[LessonSchema])
-async def get_course_lessons(
+def get_course_lessons(
     course_id: int,
     lightweight: bool = False,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -932,7 +902,7 @@ async def get_course_lessons(
 
 
 @router.post("/{course_id}/modules/{module_id}/lessons", response_model=LessonSchema)
-async def create_lesson(
+def create_lesson(
     course_id: int,
     module_id: int,
     lesson_data: LessonCreateSchema,
@@ -987,7 +957,7 @@ async def create_lesson(
     return lesson_schema
 
 @router.get("/lessons/{lesson_id}", response_model=LessonSchema)
-async def get_lesson(
+def get_lesson(
     lesson_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1021,7 +991,7 @@ async def get_lesson(
 
 
 @router.get("/lessons/{lesson_id}/check-access")
-async def check_lesson_access(
+def check_lesson_access(
     lesson_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1219,7 +1189,7 @@ async def check_lesson_access(
 
 
 @router.put("/lessons/{lesson_id}", response_model=LessonSchema)
-async def update_lesson(
+def update_lesson(
     lesson_id: int,
     lesson_data: LessonCreateSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1269,7 +1239,7 @@ async def update_lesson(
     return lesson_schema
 
 @router.delete("/lessons/{lesson_id}")
-async def delete_lesson(
+def delete_lesson(
     lesson_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1338,7 +1308,7 @@ async def delete_lesson(
 # =============================================================================
 
 @router.get("/lessons/{lesson_id}/steps", response_model=List[StepSchema])
-async def get_lesson_steps(
+def get_lesson_steps(
     lesson_id: int,
     include_content: bool = Query(True, description="Include full step content (text, video, attachments)"),
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1393,7 +1363,7 @@ async def get_lesson_steps(
         ]
 
 @router.post("/lessons/{lesson_id}/steps", response_model=StepSchema)
-async def create_step(
+def create_step(
     lesson_id: int,
     step_data: StepCreateSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1455,7 +1425,7 @@ async def create_step(
     return StepSchema.from_orm(new_step)
 
 @router.get("/steps/{step_id}", response_model=StepSchema)
-async def get_step(
+def get_step(
     step_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1480,7 +1450,7 @@ async def get_step(
     return StepSchema.from_orm(step)
 
 @router.put("/steps/{step_id}", response_model=StepSchema)
-async def update_step(
+def update_step(
     step_id: int,
     step_data: StepCreateSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1540,7 +1510,7 @@ async def update_step(
     return StepSchema.from_orm(step)
 
 @router.post("/lessons/{lesson_id}/reorder-steps")
-async def reorder_steps(
+def reorder_steps(
     lesson_id: int,
     step_orders: dict,  # Expected format: {"step_ids": [1, 3, 2, 4]}
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1587,7 +1557,7 @@ async def reorder_steps(
     return {"message": "Steps reordered successfully", "step_ids": step_ids}
 
 @router.post("/courses/{course_id}/lessons/{lesson_id}/split")
-async def split_lesson(
+def split_lesson(
     course_id: int,
     lesson_id: int,
     split_data: dict,  # Expected format: {"after_step_index": <int>}
@@ -1684,7 +1654,7 @@ async def split_lesson(
     }
 
 @router.delete("/steps/{step_id}")
-async def delete_step(
+def delete_step(
     step_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1726,7 +1696,7 @@ async def delete_step(
     return {"detail": "Step deleted successfully"}
 
 @router.post("/{course_id}/fix-lesson-order")
-async def fix_lesson_order(
+def fix_lesson_order(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1764,7 +1734,7 @@ async def fix_lesson_order(
 # =============================================================================
 
 @router.get("/lessons/{lesson_id}/materials", response_model=List[LessonMaterialSchema])
-async def get_lesson_materials(
+def get_lesson_materials(
     lesson_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1790,7 +1760,7 @@ async def get_lesson_materials(
 # =============================================================================
 
 @router.post("/{course_id}/enroll")
-async def enroll_student(
+def enroll_student(
     course_id: int,
     student_id: Optional[int] = None,  # For admin/teacher to enroll specific student
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1832,7 +1802,7 @@ async def enroll_student(
     return {"detail": "Successfully enrolled in course"}
 
 @router.post("/{course_id}/auto-enroll-students")
-async def auto_enroll_students(
+def auto_enroll_students(
     course_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -1903,7 +1873,7 @@ async def auto_enroll_students(
     }
 
 @router.delete("/{course_id}/enroll")
-async def unenroll_student(
+def unenroll_student(
     course_id: int,
     student_id: Optional[int] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1932,7 +1902,7 @@ async def unenroll_student(
 # =============================================================================
 
 @router.get("/{course_id}/groups", response_model=List[CourseGroupAccessSchema])
-async def get_course_groups(
+def get_course_groups(
     course_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -1973,7 +1943,7 @@ async def get_course_groups(
     return result
 
 @router.post("/{course_id}/grant-group-access/{group_id}")
-async def grant_course_access_to_group(
+def grant_course_access_to_group(
     course_id: int,
     group_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -2025,7 +1995,7 @@ async def grant_course_access_to_group(
     }
 
 @router.delete("/{course_id}/revoke-group-access/{group_id}")
-async def revoke_course_access_from_group(
+def revoke_course_access_from_group(
     course_id: int,
     group_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
@@ -2061,7 +2031,7 @@ async def revoke_course_access_from_group(
     return {"detail": f"Access revoked from group '{group_name}'"}
 
 @router.get("/{course_id}/group-access-status")
-async def get_course_group_access_status(
+def get_course_group_access_status(
     course_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -2095,7 +2065,7 @@ async def get_course_group_access_status(
 # =============================================================================
 
 @router.get("/{course_id}/teacher-access", response_model=List[CourseTeacherAccessSchema])
-async def get_course_teacher_access(
+def get_course_teacher_access(
     course_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -2131,7 +2101,7 @@ async def get_course_teacher_access(
     return result
 
 @router.post("/{course_id}/grant-teacher-access/{teacher_id}")
-async def grant_course_access_to_teacher(
+def grant_course_access_to_teacher(
     course_id: int,
     teacher_id: int,
     current_user: UserInDB = Depends(require_admin()),
@@ -2190,7 +2160,7 @@ async def grant_course_access_to_teacher(
     }
 
 @router.delete("/{course_id}/revoke-teacher-access/{teacher_id}")
-async def revoke_course_access_from_teacher(
+def revoke_course_access_from_teacher(
     course_id: int,
     teacher_id: int,
     current_user: UserInDB = Depends(require_admin()),
@@ -2252,8 +2222,10 @@ async def analyze_sat_image(
         # Use Gemini Parser
         from src.services.parser import parser_service
         
-        # Analyze the file
-        questions = await parser_service.parse_file(file_path, mime_type=image.content_type, correct_answers=correct_answers)
+        # Analyze the file (the Gemini client blocks, so it runs in the threadpool)
+        questions = await run_in_threadpool(
+            parser_service.parse_file, file_path, mime_type=image.content_type, correct_answers=correct_answers
+        )
         
         # If we got multiple questions, return the first one for now as the frontend expects a single result structure
         # OR update frontend to handle multiple. 
@@ -2314,7 +2286,7 @@ async def analyze_sat_image(
         raise HTTPException(status_code=500, detail=f"Error analyzing file: {str(e)}")
 
 @router.post("/{course_id}/add-summary-steps")
-async def add_summary_steps_to_course(
+def add_summary_steps_to_course(
     course_id: int,
     current_user: UserInDB = Depends(require_teacher_or_admin),
     db: Session = Depends(get_db)
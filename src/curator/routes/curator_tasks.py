@@ -109,7 +109,7 @@ def _calc_total_weeks(group: Group) -> Optional[int]:
 # ============================================================================
 
 @router.get("/my-tasks", summary="Get current curator's tasks")
-async def get_my_tasks(
+def get_my_tasks(
     status: Optional[str] = Query(None, description="Filter by status: pending, in_progress, completed, overdue"),
     task_type: Optional[str] = Query(None, description="Filter by type: onboarding, weekly, renewal"),
     student_id: Optional[int] = Query(None),
@@ -159,7 +159,7 @@ async def get_my_tasks(
 
 
 @router.get("/my-tasks/summary", summary="Get counts per status for current curator")
-async def get_my_tasks_summary(
+def get_my_tasks_summary(
     current_user: UserInDB = Depends(require_role(["curator", "head_curator", "admin"])),
     db: Session = Depends(get_db),
 ):
@@ -181,7 +181,7 @@ async def get_my_tasks_summary(
 
 
 @router.get("/my-groups", summary="Get groups for current curator with program week info")
-async def get_my_groups(
+def get_my_groups(
     current_user: UserInDB = Depends(require_role(["curator", "head_curator", "admin"])),
     db: Session = Depends(get_db),
 ):
@@ -212,7 +212,7 @@ class BulkTaskUpdateSchema(BaseModel):
 
 
 @router.patch("/my-tasks/bulk", summary="Bulk update task status (e.g. mark multiple as completed)")
-async def bulk_update_my_tasks(
+def bulk_update_my_tasks(
     data: BulkTaskUpdateSchema = Body(...),
     current_user: UserInDB = Depends(require_role(["curator", "head_curator", "admin"])),
     db: Session = Depends(get_db),
@@ -240,7 +240,7 @@ async def bulk_update_my_tasks(
 
 
 @router.patch("/my-tasks/{task_id}", summary="Update task status / result")
-async def update_my_task(
+def update_my_task(
     task_id: int,
     data: CuratorTaskInstanceUpdateSchema,
     current_user: UserInDB = Depends(require_role(["curator", "head_curator", "admin"])),
@@ -299,7 +299,7 @@ async def update_my_task(
 # ============================================================================
 
 @router.get("/all-tasks", summary="[Head Curator / Admin] View all curator tasks")
-async def get_all_tasks(
+def get_all_tasks(
     curator_id: Optional[int] = Query(None, description="Filter by specific curator"),
     status: Optional[str] = Query(None),
     task_type: Optional[str] = Query(None),
@@ -345,7 +345,7 @@ async def get_all_tasks(
 
 
 @router.get("/curators-summary", summary="[Head Curator / Admin] Stats per curator")
-async def get_curators_summary(
+def get_curators_summary(
     week: Optional[str] = Query(None),
     current_user: UserInDB = Depends(require_role(["head_curator", "admin"])),
     db: Session = Depends(get_db),
@@ -412,7 +412,7 @@ def _ensure_custom_template(db: Session) -> None:
 
 
 @router.get("/templates", summary="List task templates")
-async def list_templates(
+def list_templates(
     task_type: Optional[str] = Query(None),
     current_user: UserInDB = Depends(require_role(["admin", "head_curator"])),
     db: Session = Depends(get_db),
@@ -426,7 +426,7 @@ async def list_templates(
 
 
 @router.post("/templates", summary="Create a task template")
-async def create_template(
+def create_template(
     data: CuratorTaskTemplateCreateSchema,
     current_user: UserInDB = Depends(require_role(["admin"])),
     db: Session = Depends(get_db),
@@ -447,7 +447,7 @@ async def create_template(
 
 
 @router.put("/templates/{template_id}", summary="Update a task template")
-async def update_template(
+def update_template(
     template_id: int,
     data: CuratorTaskTemplateCreateSchema,
     current_user: UserInDB = Depends(require_role(["admin"])),
@@ -470,7 +470,7 @@ async def update_template(
 
 
 @router.delete("/templates/{template_id}", summary="Delete a task template")
-async def delete_template(
+def delete_template(
     template_id: int,
     current_user: UserInDB = Depends(require_role(["admin"])),
     db: Session = Depends(get_db),
@@ -488,7 +488,7 @@ async def delete_template(
 # ============================================================================
 
 @router.post("/create-instance", summary="Manually create a task instance for a curator")
-async def create_task_instance(
+def create_task_instance(
     template_id: int = Query(...),
     curator_id: int = Query(...),
     student_id: Optional[int] = Query(None),
@@ -544,7 +544,7 @@ async def create_task_instance(
 # ============================================================================
 
 @router.post("/trigger-onboarding/{student_id}", summary="Create onboarding tasks for a new student")
-async def trigger_onboarding(
+def trigger_onboarding(
     student_id: int,
     current_user: UserInDB = Depends(require_role(["admin", "head_curator"])),
     db: Session = Depends(get_db),
@@ -603,7 +603,7 @@ async def trigger_onboarding(
 # ============================================================================
 
 @router.post("/seed-templates", summary="[Admin] Seed default task templates from specification")
-async def seed_templates(
+def seed_templates(
     current_user: UserInDB = Depends(require_role(["admin"])),
     db: Session = Depends(get_db),
 ):
@@ -790,7 +790,7 @@ async def seed_templates(
 # ============================================================================
 
 @router.post("/generate-weekly", summary="Generate weekly tasks for current curator's groups for a given week")
-async def generate_weekly_tasks(
+def generate_weekly_tasks(
     week: Optional[str] = Query(None, description="ISO week reference e.g. 2026-W08. Defaults to current week."),
     group_id: Optional[int] = Query(None, description="Generate for a specific group only"),
     current_user: UserInDB = Depends(require_role(["curator", "head_curator", "admin"])),
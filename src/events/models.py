@@ -186,3 +186,30 @@ class Attendance(Base):
             name='ck_attendance_event_or_schedule'
         ),
     )
+
+
+class NotificationOutbox(Base):
+    """
+    One scheduled notification of an event (lesson reminder, missing
+    attendance, ...). The unique key makes each one go out once, whichever
+    worker runs the scheduler and however often it restarts.
+    """
+    __tablename__ = "notification_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(50), nullable=False)  # lesson_reminder | missing_attendance
+    # Event start/end the notification is for; a rescheduled event gets a new one
+    occurrence = Column(DateTime, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending | sending | sent | skipped | failed | expired
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    sent_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        UniqueConstraint('event_id', 'kind', 'occurrence', name='uq_notification_outbox_event_kind'),
+        Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, desc, and_, or_, select
 from typing import List, Optional
@@ -13,6 +13,7 @@ from src.schemas.models import (
 )
 from src.routes.auth import get_current_user_dependency
 from src.utils.permissions import require_role, require_teacher_or_admin, require_teacher_curator_or_admin
+from src.services.calendar_feed_cache import ADMIN_TAG, CALENDAR_TAG, FeedTags, feed_response
 from src.services.attendance_service import (
     AttendanceService,
     attendance_status_to_ui,
@@ -22,7 +23,8 @@ from src.services.attendance_service import (
 router = APIRouter()
 
 @router.get("/my", response_model=List[EventSchema])
-async def get_my_events(
+def get_my_events(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, le=1000),
     event_type: Optional[str] = Query(None),
@@ -33,8 +35,25 @@ async def get_my_events(
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(get_current_user_dependency)
 ):
-    """Get events for current user based on their groups"""
-    
+    """Get events for current user based on their groups (cached, ETag-aware)"""
+    key = ("my", current_user.id, skip, limit, event_type, group_id, start_date, end_date, upcoming_only)
+    return feed_response(request, db, key, lambda feed: _build_my_events(
+        feed, db, current_user, skip, limit, event_type, group_id, start_date, end_date, upcoming_only
+    ))
+
+
+def _build_my_events(
+    feed: FeedTags,
+    db: Session,
+    current_user: UserInDB,
+    skip: int,
+    limit: int,
+    event_type: Optional[str],
+    group_id: Optional[int],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    upcoming_only: bool,
+) -> List[EventSchema]:
     # Get user's groups and courses
     user_group_ids = []
     user_course_ids = []
@@ -80,6 +99,11 @@ async def get_my_events(
         # Admins see all events
         user_group_ids = [g.id for g in db.query(Group).all()]
         user_course_ids = [c.id for c in db.query(Course).all()]
+        feed.add(ADMIN_TAG)
+
+    feed.user(current_user.id)
+    feed.groups(user_group_ids)
+    feed.courses(user_course_ids)
     
     if not user_group_ids and not user_course_ids:
         return []
@@ -362,17 +386,25 @@ async def get_my_events(
             
     # Sort and limit result if mixed
     result.sort(key=lambda x: x.start_datetime)
+    if upcoming_only and result:
+        # The feed changes once its first item is no longer upcoming
+        feed.expire_at(result[0].start_datetime)
     return result[:limit]
 
 @router.get("/calendar", response_model=List[EventSchema])
-async def get_calendar_events(
+def get_calendar_events(
+    request: Request,
     year: int = Query(..., ge=2020, le=2030),
     month: int = Query(..., ge=1, le=12),
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(get_current_user_dependency)
 ):
-    """Get events for calendar view by month"""
-    
+    """Get events for calendar view by month (cached, ETag-aware)"""
+    key = ("calendar", current_user.id, year, month)
+    return feed_response(request, db, key, lambda feed: _build_calendar_events(feed, db, current_user, year, month))
+
+
+def _build_calendar_events(feed: FeedTags, db: Session, current_user: UserInDB, year: int, month: int) -> List[EventSchema]:
     # Calculate month boundaries
     start_date = datetime(year, month, 1)
     if month == 12:
@@ -414,6 +446,12 @@ async def get_calendar_events(
     elif current_user.role == "admin":
         user_group_ids = [g.id for g in db.query(Group).all()]
         user_course_ids = [c.id for c in db.query(Course).all()]
+        feed.add(ADMIN_TAG)
+
+    feed.user(current_user.id)
+    feed.groups(user_group_ids)
+    feed.courses(user_course_ids)
+    feed.add(CALENDAR_TAG)
     
     if not user_group_ids and not user_course_ids:
         print(f"DEBUG: No groups or courses for user {current_user.id}")
@@ -721,7 +759,7 @@ async def get_calendar_events(
     return result
 
 @router.get("/upcoming", response_model=List[EventSchema])
-async def get_upcoming_events(
+def get_upcoming_events(
     limit: int = Query(10, le=50),
     days_ahead: int = Query(7, ge=1, le=30),
     db: Session = Depends(get_db),
@@ -914,7 +952,7 @@ async def get_upcoming_events(
     return result[:limit]
 
 @router.get("/group/{group_id}/classes", response_model=List[EventSchema])
-async def get_group_class_events(
+def get_group_class_events(
     group_id: int,
     weeks_back: int = Query(1, ge=0, le=52),
     weeks_ahead: int = Query(8, ge=0, le=52),
@@ -966,7 +1004,7 @@ async def get_group_class_events(
     return events
 
 @router.get("/{event_id}", response_model=EventSchema)
-async def get_event_details(
+def get_event_details(
     event_id: int,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(get_current_user_dependency)
@@ -1053,7 +1091,7 @@ async def get_event_details(
     return event_data
 
 @router.post("/{event_id}/register")
-async def register_for_event(
+def register_for_event(
     event_id: int,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(get_current_user_dependency)
@@ -1110,7 +1148,7 @@ async def register_for_event(
     return {"detail": "Successfully registered for event"}
 
 @router.delete("/{event_id}/register")
-async def unregister_from_event(
+def unregister_from_event(
     event_id: int,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(get_current_user_dependency)
@@ -1131,7 +1169,7 @@ async def unregister_from_event(
     return {"detail": "Successfully unregistered from event"}
 
 @router.post("/curator/create", response_model=EventSchema)
-async def create_curator_event(
+def create_curator_event(
     event_data: CreateEventRequest,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(get_current_user_dependency)
@@ -1228,7 +1266,7 @@ async def create_curator_event(
     
     return result
 @router.get("/{event_id}/participants", response_model=List[EventStudentSchema])
-async def get_event_participants(
+def get_event_participants(
     event_id: int,
     group_id: Optional[int] = Query(None),
     db: Session = Depends(get_db),
@@ -1273,7 +1311,7 @@ async def get_event_participants(
     return results
 
 @router.post("/{event_id}/attendance")
-async def update_event_attendance(
+def update_event_attendance(
     event_id: int,
     data: AttendanceBulkUpdateSchema,
     db: Session = Depends(get_db),
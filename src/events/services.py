@@ -1,10 +1,10 @@
 from datetime import datetime, timedelta, date, timezone
-import calendar as cal_module
 from typing import List, Optional
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_
 
 from src.schemas.models import Event, EventGroup, EventCourse, LessonSchedule
+from src.services.recurrence import EventOccurrence, expand_occurrences, find_occurrence
 
 class EventService:
     @staticmethod
@@ -16,7 +16,7 @@ class EventService:
         course_ids: List[int] = [],
         parent_events: Optional[List[Event]] = None,
         skip_class_events: bool = True  # Skip class events - use LessonSchedule instead
-    ) -> List[Event]:
+    ) -> List[EventOccurrence]:
         """
         Generates virtual event instances for recurring events within a date range.
         For event_type='class', we skip expansion because LessonSchedule provides better data.
@@ -54,79 +54,9 @@ class EventService:
                 joinedload(Event.event_courses).joinedload(EventCourse.course)
             ).all()
 
-        generated_events = []
+        # Fast-forwarded, memoized starts; occurrences share the parent's fields
+        return expand_occurrences(parent_events, start_date, end_date)
 
-        for parent in parent_events:
-            current_start = parent.start_datetime
-            current_end = parent.end_datetime
-            duration = current_end - current_start
-            
-            original_start_day = parent.start_datetime.day
-            
-            # Pre-extract group IDs from parent (relationships don't work on transient objects)
-            parent_group_ids = [eg.group_id for eg in parent.event_groups] if parent.event_groups else []
-            
-            # Instance counter for this recurring event
-            instance_counter = 1
-            
-            # Simple iteration (TODO: Optimize fast-forward if needed)
-            while current_start <= end_date:
-                # Check intersection
-                if current_start >= start_date and current_start <= end_date:
-                    # Create virtual event
-                    # Check for collisions or override logic if needed
-                    
-                    # Generate pseudo-ID
-                    pseudo_id = int(f"{parent.id}{int(current_start.timestamp())}") % 2147483647
-                    
-                    virtual_event = Event(
-                        id=pseudo_id,
-                        title=parent.title,
-                        description=parent.description,
-                        event_type=parent.event_type,
-                        start_datetime=current_start,
-                        end_datetime=current_start + duration,
-                        location=parent.location,
-                        is_online=parent.is_online,
-                        meeting_url=parent.meeting_url,
-                        created_by=parent.created_by,
-                        is_recurring=True,
-                        recurrence_pattern=parent.recurrence_pattern,
-                        max_participants=parent.max_participants,
-                        creator=parent.creator,
-                        event_groups=parent.event_groups,  # Keep for first instance
-                        created_at=parent.created_at,
-                        updated_at=parent.updated_at,
-                        is_active=True
-                    )
-                    # Store group_ids directly for deduplication (relationships don't copy to transient objects)
-                    virtual_event._group_ids = parent_group_ids
-                    # Store instance number
-                    virtual_event._instance_number = instance_counter
-                    
-                    generated_events.append(virtual_event)
-                    instance_counter += 1  # Increment after each generated event
-                
-                # Increment
-                if parent.recurrence_pattern == "daily":
-                    current_start += timedelta(days=1)
-                elif parent.recurrence_pattern == "weekly":
-                    current_start += timedelta(weeks=1)
-                elif parent.recurrence_pattern == "biweekly":
-                    current_start += timedelta(weeks=2)
-                elif parent.recurrence_pattern == "monthly":
-                    year = current_start.year + (current_start.month // 12)
-                    month = (current_start.month % 12) + 1
-                    day = min(original_start_day, cal_module.monthrange(year, month)[1])
-                    current_start = current_start.replace(year=year, month=month, day=day)
-                else:
-                    break
-                
-                # Check end date
-                if parent.recurrence_end_date and current_start.date() > parent.recurrence_end_date:
-                    break
-                    
-        return generated_events
     @staticmethod
     def materialize_virtual_event(db: Session, pseudo_id: int) -> Optional[int]:
         """
@@ -140,49 +70,13 @@ class EventService:
         ).all()
         
         # 2. Search for the instance in a reasonable window (e.g. 3 months back, 6 months forward)
-        now = datetime.now(timezone.utc)
+        # Event times are stored as naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
         start_date = now - timedelta(days=90)
         end_date = now + timedelta(days=180)
         
-        target_instance = None
-        target_parent = None
-        
-        for parent in recurring_parents:
-            # We don't need to load relationships for searching
-            current_start = parent.start_datetime
-            duration = parent.end_datetime - parent.start_datetime
-            original_start_day = parent.start_datetime.day
-            
-            while current_start <= end_date:
-                if current_start >= start_date:
-                    # Check pseudo_id
-                    p_id = int(f"{parent.id}{int(current_start.timestamp())}") % 2147483647
-                    if p_id == pseudo_id:
-                        target_instance = current_start
-                        target_parent = parent
-                        break
-                
-                # Increment
-                if parent.recurrence_pattern == "daily":
-                    current_start += timedelta(days=1)
-                elif parent.recurrence_pattern == "weekly":
-                    current_start += timedelta(weeks=1)
-                elif parent.recurrence_pattern == "biweekly":
-                    current_start += timedelta(weeks=2)
-                elif parent.recurrence_pattern == "monthly":
-                    year = current_start.year + (current_start.month // 12)
-                    month = (current_start.month % 12) + 1
-                    day = min(original_start_day, cal_module.monthrange(year, month)[1])
-                    current_start = current_start.replace(year=year, month=month, day=day)
-                else:
-                    break
-                
-                if parent.recurrence_end_date and current_start.date() > parent.recurrence_end_date:
-                    break
-            
-            if target_instance:
-                break
-                
+        target_parent, target_instance = find_occurrence(recurring_parents, pseudo_id, start_date, end_date)
+
         if not target_instance:
             return None
             
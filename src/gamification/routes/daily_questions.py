@@ -10,6 +10,7 @@ import logging
 from src.config import get_db
 from src.schemas.models import UserInDB, DailyQuestionCompletion
 from src.routes.auth import get_current_user_dependency
+from src.services.http_client import get_integration
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -62,7 +63,7 @@ class CompleteDailyQuestionsRequest(BaseModel):
 # =============================================================================
 
 @router.get("/status")
-async def get_daily_questions_status(
+def get_daily_questions_status(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -95,127 +96,109 @@ async def get_daily_question_recommendations(
 
     logger.info(f"Fetching recommendations for {current_user.email}")
     
-    # Retry logic with increased timeout
-    max_retries = 2
-    timeout = 30.0  # Increased from 15 to 30 seconds
-    
-    for attempt in range(max_retries):
-        try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                logger.info(f"Making request to {MASTER_ED_API_URL} (attempt {attempt + 1}/{max_retries})")
-                response = await client.post(
-                    MASTER_ED_API_URL,
-                    json={"email": current_user.email},
-                    headers={
-                        "Content-Type": "application/json",
-                        "X-API-Key": MASTER_ED_API_KEY
-                    }
-                )
-                logger.info(f"Response status: {response.status_code}")
-
-            if response.status_code != 200:
-                logger.error(f"External API error: {response.status_code} - {response.text}")
-                
-                # Handle specific error cases
-                if response.status_code == 404:
-                    error_detail = response.json().get("error", "Student not found")
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"No recommendations available: {error_detail}. Please complete your assessment tests first."
-                    )
-                
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Failed to fetch recommendations from external service: {response.text}"
-                )
-
-            data = response.json()
-
-            # Debug logging - show raw response structure
-            logger.info(f"DEBUG - Raw API response for {current_user.email}:")
-            logger.info(f"Response keys: {list(data.keys())}")
-            logger.info(f"Email: {data.get('email')}")
-            logger.info(f"Student name: {data.get('studentName')}")
-            logger.info(f"Math test ID: {data.get('mathTestId')}")
-            logger.info(f"Verbal test ID: {data.get('verbalTestId')}")
-            
-            # Log math recommendations
-            if data.get('mathRecommendations'):
-                math_questions = data['mathRecommendations'].get('questions', [])
-                logger.info(f"Math recommendations: {len(math_questions)} questions")
-                logger.info(f"Math reasoning: {data['mathRecommendations'].get('reasoning')}")
-                for idx, q in enumerate(math_questions[:2]):  # Show first 2 questions
-                    logger.info(f"  Math Q{idx+1}: ID={q.get('questionId')}, text='{q.get('text')[:50]}...', imageUrl={q.get('imageUrl')}")
-            
-            # Log verbal recommendations
-            if data.get('verbalRecommendations'):
-                verbal_questions = data['verbalRecommendations'].get('questions', [])
-                logger.info(f"Verbal recommendations: {len(verbal_questions)} questions")
-                logger.info(f"Verbal reasoning: {data['verbalRecommendations'].get('reasoning')}")
-                for idx, q in enumerate(verbal_questions[:2]):  # Show first 2 questions
-                    logger.info(f"  Verbal Q{idx+1}: ID={q.get('questionId')}, text='{q.get('text')[:50]}...', imageUrl={q.get('imageUrl')}")
-
-            # Prepend base URL to image URLs and clean up None values
-            if data.get("mathRecommendations") and data["mathRecommendations"].get("questions"):
-                for q in data["mathRecommendations"]["questions"]:
-                    if q.get("imageUrl") and q["imageUrl"] != "None":
-                        q["imageUrl"] = f"{MASTER_ED_BASE_URL}{q['imageUrl']}"
-                    else:
-                        q["imageUrl"] = None  # Convert string "None" to actual None
-
-            if data.get("verbalRecommendations") and data["verbalRecommendations"].get("questions"):
-                for q in data["verbalRecommendations"]["questions"]:
-                    if q.get("imageUrl") and q["imageUrl"] != "None":
-                        q["imageUrl"] = f"{MASTER_ED_BASE_URL}{q['imageUrl']}"
-                    else:
-                        q["imageUrl"] = None  # Convert string "None" to actual None
-
-            # Log final processed data
-            logger.info(f"DEBUG - After URL processing for {current_user.email}:")
-            if data.get("mathRecommendations") and data["mathRecommendations"].get("questions"):
-                logger.info(f"Math questions count: {len(data['mathRecommendations']['questions'])}")
-                for idx, q in enumerate(data["mathRecommendations"]["questions"][:2]):
-                    logger.info(f"  Processed Math Q{idx+1}: imageUrl='{q.get('imageUrl')}'")
-            
-            if data.get("verbalRecommendations") and data["verbalRecommendations"].get("questions"):
-                logger.info(f"Verbal questions count: {len(data['verbalRecommendations']['questions'])}")
-                for idx, q in enumerate(data["verbalRecommendations"]["questions"][:2]):
-                    logger.info(f"  Processed Verbal Q{idx+1}: imageUrl='{q.get('imageUrl')}'")
-
-            # Success - return data
-            logger.info(f"Successfully fetched recommendations for {current_user.email}")
-            logger.info(f"Returning data with keys: {list(data.keys())}")
-            return data
-
-        except httpx.ReadTimeout:
-            logger.warning(f"Timeout on attempt {attempt + 1}/{max_retries} for {current_user.email}")
-            if attempt < max_retries - 1:
-                logger.info(f"Retrying...")
-                continue
-            else:
-                logger.error(f"All {max_retries} attempts failed due to timeout")
-                raise HTTPException(
-                    status_code=504,
-                    detail="The recommendations service is taking too long to respond. Please try again later."
-                )
-
-        except httpx.RequestError as e:
-            logger.error(f"Request error fetching recommendations: {type(e).__name__}: {str(e)}")
-            logger.error(f"Full error details: {repr(e)}")
+    try:
+        # Only reads recommendations, so timed out calls are retried as well
+        response = await get_integration("mastered").apost(
+            MASTER_ED_API_URL,
+            json={"email": current_user.email},
+            headers={
+                "Content-Type": "application/json",
+                "X-API-Key": MASTER_ED_API_KEY
+            },
+            retry_unsafe=True,
+        )
+        logger.info(f"Response status: {response.status_code}")
+    except httpx.TimeoutException:
+        logger.error(f"Recommendations request timed out for {current_user.email}")
+        raise HTTPException(
+            status_code=504,
+            detail="The recommendations service is taking too long to respond. Please try again later."
+        )
+    except httpx.RequestError as e:
+        logger.error(f"Request error fetching recommendations: {type(e).__name__}: {str(e)}")
+        logger.error(f"Full error details: {repr(e)}")
+        raise HTTPException(
+            status_code=502,
+            detail=f"Could not connect to recommendations service: {str(e)}"
+        )
+
+    if response.status_code != 200:
+        logger.error(f"External API error: {response.status_code} - {response.text}")
+
+        # Handle specific error cases
+        if response.status_code == 404:
+            error_detail = response.json().get("error", "Student not found")
             raise HTTPException(
-                status_code=502,
-                detail=f"Could not connect to recommendations service: {str(e)}"
+                status_code=404,
+                detail=f"No recommendations available: {error_detail}. Please complete your assessment tests first."
             )
 
-    # This should never be reached due to the loop logic, but for safety:
-    raise HTTPException(
-        status_code=500,
-        detail="Internal error: retry loop exited unexpectedly"
-    )
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to fetch recommendations from external service: {response.text}"
+        )
+
+    data = response.json()
+
+    # Debug logging - show raw response structure
+    logger.info(f"DEBUG - Raw API response for {current_user.email}:")
+    logger.info(f"Response keys: {list(data.keys())}")
+    logger.info(f"Email: {data.get('email')}")
+    logger.info(f"Student name: {data.get('studentName')}")
+    logger.info(f"Math test ID: {data.get('mathTestId')}")
+    logger.info(f"Verbal test ID: {data.get('verbalTestId')}")
+
+    # Log math recommendations
+    if data.get('mathRecommendations'):
+        math_questions = data['mathRecommendations'].get('questions', [])
+        logger.info(f"Math recommendations: {len(math_questions)} questions")
+        logger.info(f"Math reasoning: {data['mathRecommendations'].get('reasoning')}")
+        for idx, q in enumerate(math_questions[:2]):  # Show first 2 questions
+            logger.info(f"  Math Q{idx+1}: ID={q.get('questionId')}, text='{q.get('text')[:50]}...', imageUrl={q.get('imageUrl')}")
+
+    # Log verbal recommendations
+    if data.get('verbalRecommendations'):
+        verbal_questions = data['verbalRecommendations'].get('questions', [])
+        logger.info(f"Verbal recommendations: {len(verbal_questions)} questions")
+        logger.info(f"Verbal reasoning: {data['verbalRecommendations'].get('reasoning')}")
+        for idx, q in enumerate(verbal_questions[:2]):  # Show first 2 questions
+            logger.info(f"  Verbal Q{idx+1}: ID={q.get('questionId')}, text='{q.get('text')[:50]}...', imageUrl={q.get('imageUrl')}")
+
+    # Prepend base URL to image URLs and clean up None values
+    if data.get("mathRecommendations") and data["mathRecommendations"].get("questions"):
+        for q in data["mathRecommendations"]["questions"]:
+            if q.get("imageUrl") and q["imageUrl"] != "None":
+                q["imageUrl"] = f"{MASTER_ED_BASE_URL}{q['imageUrl']}"
+            else:
+                q["imageUrl"] = None  # Convert string "None" to actual None
+
+    if data.get("verbalRecommendations") and data["verbalRecommendations"].get("questions"):
+        for q in data["verbalRecommendations"]["questions"]:
+            if q.get("imageUrl") and q["imageUrl"] != "None":
+                q["imageUrl"] = f"{MASTER_ED_BASE_URL}{q['imageUrl']}"
+            else:
+                q["imageUrl"] = None  # Convert string "None" to actual None
+
+    # Log final processed data
+    logger.info(f"DEBUG - After URL processing for {current_user.email}:")
+    if data.get("mathRecommendations") and data["mathRecommendations"].get("questions"):
+        logger.info(f"Math questions count: {len(data['mathRecommendations']['questions'])}")
+        for idx, q in enumerate(data["mathRecommendations"]["questions"][:2]):
+            logger.info(f"  Processed Math Q{idx+1}: imageUrl='{q.get('imageUrl')}'")
+
+    if data.get("verbalRecommendations") and data["verbalRecommendations"].get("questions"):
+        logger.info(f"Verbal questions count: {len(data['verbalRecommendations']['questions'])}")
+        for idx, q in enumerate(data["verbalRecommendations"]["questions"][:2]):
+            logger.info(f"  Processed Verbal Q{idx+1}: imageUrl='{q.get('imageUrl')}'")
+
+    # Success - return data
+    logger.info(f"Successfully fetched recommendations for {current_user.email}")
+    logger.info(f"Returning data with keys: {list(data.keys())}")
+    return data
 
 
 @router.post("/complete")
-async def complete_daily_questions(
+def complete_daily_questions(
     request: CompleteDailyQuestionsRequest,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
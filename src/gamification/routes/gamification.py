@@ -1,9 +1,9 @@
 """Gamification routes for points, leaderboard, and teacher bonuses."""
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import func
 from typing import List, Optional
-from datetime import datetime, date, timedelta, timezone
+from datetime import datetime, date, timezone
 from pydantic import BaseModel
 
 from src.schemas.models import (
@@ -15,6 +15,8 @@ from src.schemas.models import (
 )
 from src.routes.auth import get_current_user_dependency
 from src.config import get_db
+from src.services import points_ledger
+from src.services.points_ledger import PERIOD_MONTH, PERIOD_WEEK
 
 router = APIRouter()
 
@@ -51,6 +53,8 @@ class LeaderboardResponse(BaseModel):
     end_date: Optional[date] = None
     total_participants: int
     entries: List[LeaderboardEntry]
+    my_points: Optional[int] = None
+    my_rank: Optional[int] = None
 
 
 # =============================================================================
@@ -59,8 +63,13 @@ class LeaderboardResponse(BaseModel):
 
 from src.routes.progress import calculate_streak_multiplier
 
-def award_points(db: Session, user_id: int, amount: int, reason: str, description: str = None):
-    """Award points to a user and record in history."""
+def award_points(db: Session, user_id: int, amount: int, reason: str, description: str = None,
+                 awarded_by: int = None):
+    """
+    Award points to a user: history row, total points and the user's weekly
+    and monthly totals. Does not commit - the caller commits the award with
+    its own changes.
+    """
     # Update user's total points
     user = db.query(UserInDB).filter(UserInDB.id == user_id).first()
     if not user:
@@ -82,44 +91,37 @@ def award_points(db: Session, user_id: int, amount: int, reason: str, descriptio
         else:
             final_description = multiplier_info.strip()
 
+    now = datetime.now(timezone.utc)
     history_entry = PointHistory(
         user_id=user_id,
         amount=final_amount,
         reason=reason,
-        description=final_description
+        description=final_description,
+        awarded_by=awarded_by,
+        created_at=now
     )
     db.add(history_entry)
-    db.commit()
+    points_ledger.record_points(db, user_id, final_amount, now)
     
     return history_entry
 
 
 def get_monthly_points(db: Session, user_id: int, year: int = None, month: int = None) -> int:
     """Get total points for a user in a specific month."""
-    if year is None:
-        year = datetime.now(timezone.utc).year
-    if month is None:
-        month = datetime.now(timezone.utc).month
-    
-    result = db.query(func.coalesce(func.sum(PointHistory.amount), 0)).filter(
-        PointHistory.user_id == user_id,
-        extract('year', PointHistory.created_at) == year,
-        extract('month', PointHistory.created_at) == month
-    ).scalar()
-    
-    return int(result) if result else 0
+    now = datetime.now(timezone.utc)
+    moment = datetime(year or now.year, month or now.month, 1)
+    return points_ledger.user_points(db, user_id, PERIOD_MONTH, moment)
 
 
 def get_teacher_weekly_bonus_given(db: Session, teacher_id: int, group_id: int = None) -> int:
     """Get how many bonus points a teacher has given this week, optionally filtered by group."""
     # Get start of current week (Monday)
-    today = date.today()
-    start_of_week = today - timedelta(days=today.weekday())
+    start_of_week, _ = points_ledger.period_bounds(PERIOD_WEEK)
     
     query = db.query(func.coalesce(func.sum(PointHistory.amount), 0)).filter(
-        PointHistory.reason == 'teacher_bonus',
-        PointHistory.description.like(f'%teacher:{teacher_id}%'),
-        PointHistory.created_at >= datetime.combine(start_of_week, datetime.min.time())
+        PointHistory.awarded_by == teacher_id,
+        PointHistory.created_at >= datetime.combine(start_of_week, datetime.min.time()),
+        PointHistory.reason == 'teacher_bonus'
     )
     
     if group_id:
@@ -141,29 +143,15 @@ def get_teacher_weekly_bonus_given(db: Session, teacher_id: int, group_id: int =
 # =============================================================================
 
 @router.get("/status", response_model=GamificationStatsResponse)
-async def get_gamification_status(
+def get_gamification_status(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
     """Get current user's gamification stats."""
     monthly_points = get_monthly_points(db, current_user.id)
     
-    # Calculate rank this month
-    now = datetime.now(timezone.utc)
-    subquery = db.query(
-        PointHistory.user_id,
-        func.sum(PointHistory.amount).label('total')
-    ).filter(
-        extract('year', PointHistory.created_at) == now.year,
-        extract('month', PointHistory.created_at) == now.month
-    ).group_by(PointHistory.user_id).subquery()
-    
-    # Count users with more points
-    users_ahead = db.query(func.count()).select_from(subquery).filter(
-        subquery.c.total > monthly_points
-    ).scalar()
-    
-    rank = (users_ahead or 0) + 1
+    # Rank this month: users with more points, from the monthly totals
+    rank = points_ledger.rank_of(db, PERIOD_MONTH, monthly_points)
     
     return GamificationStatsResponse(
         activity_points=current_user.activity_points or 0,
@@ -174,7 +162,7 @@ async def get_gamification_status(
 
 
 @router.get("/bonus-allowance", response_model=dict)
-async def get_bonus_allowance(
+def get_bonus_allowance(
     group_id: Optional[int] = Query(None, description="Optional group ID to check limit for"),
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -198,7 +186,7 @@ async def get_bonus_allowance(
 
 
 @router.post("/bonus")
-async def give_teacher_bonus(
+def give_teacher_bonus(
     request: TeacherBonusRequest,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -251,7 +239,9 @@ async def give_teacher_bonus(
     
     # Award the bonus
     description = f"teacher:{current_user.id}|{request.reason or 'Good activity'}"
-    entry = award_points(db, request.student_id, request.amount, 'teacher_bonus', description)
+    entry = award_points(db, request.student_id, request.amount, 'teacher_bonus', description,
+                         awarded_by=current_user.id)
+    db.commit()
     
     return {
         "success": True,
@@ -261,86 +251,36 @@ async def give_teacher_bonus(
 
 
 @router.get("/leaderboard", response_model=LeaderboardResponse)
-async def get_leaderboard(
+def get_leaderboard(
     period: str = Query("monthly", description="'monthly' or 'all_time'"),
     group_id: Optional[int] = Query(None, description="Filter by group ID"),
     limit: int = Query(50, le=100),
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
-    """Get leaderboard rankings."""
-    now = datetime.now(timezone.utc)
+    """Get leaderboard rankings, with the current user's points and rank."""
+    student_ids = None
+    if group_id:
+        student_ids = db.query(GroupStudent.student_id).filter(
+            GroupStudent.group_id == group_id
+        ).subquery()
     
-    if period == "monthly":
-        # Monthly leaderboard from PointHistory
-        start_date = date(now.year, now.month, 1)
-        if now.month == 12:
-            end_date = date(now.year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end_date = date(now.year, now.month + 1, 1) - timedelta(days=1)
-        
-        # Base query for monthly points
-        query = db.query(
-            PointHistory.user_id,
-            func.sum(PointHistory.amount).label('total_points')
-        ).filter(
-            extract('year', PointHistory.created_at) == now.year,
-            extract('month', PointHistory.created_at) == now.month
-        )
-        
-        # Filter by group if specified
-        if group_id:
-            student_ids = db.query(GroupStudent.student_id).filter(
-                GroupStudent.group_id == group_id
-            ).subquery()
-            query = query.filter(PointHistory.user_id.in_(student_ids))
-        
-        results = query.group_by(PointHistory.user_id).order_by(
-            func.sum(PointHistory.amount).desc()
-        ).limit(limit).all()
-        
-        
-    elif period == "weekly":
-        # Weekly leaderboard (starts Monday)
-        today = date.today()
-        start_date = today - timedelta(days=today.weekday())
-        end_date = start_date + timedelta(days=6)
-        
-        # Base query for weekly points
-        query = db.query(
-            PointHistory.user_id,
-            func.sum(PointHistory.amount).label('total_points')
-        ).filter(
-            PointHistory.created_at >= datetime.combine(start_date, datetime.min.time()),
-            PointHistory.created_at <= datetime.combine(end_date, datetime.max.time())
-        )
-        
-        # Filter by group if specified
-        if group_id:
-            student_ids = db.query(GroupStudent.student_id).filter(
-                GroupStudent.group_id == group_id
-            ).subquery()
-            query = query.filter(PointHistory.user_id.in_(student_ids))
-        
-        results = query.group_by(PointHistory.user_id).order_by(
-            func.sum(PointHistory.amount).desc()
-        ).limit(limit).all()
+    if period in ("monthly", "weekly"):
+        # Period leaderboards from the weekly / monthly point totals
+        ledger_period = PERIOD_MONTH if period == "monthly" else PERIOD_WEEK
+        start_date, end_date = points_ledger.period_bounds(ledger_period)
+        results = points_ledger.top_users(db, ledger_period, limit, user_ids=student_ids)
+        my_points = points_ledger.user_points(db, current_user.id, ledger_period)
+        my_rank = points_ledger.rank_of(db, ledger_period, my_points, user_ids=student_ids)
         
     else:
         # All-time leaderboard from User.activity_points
         start_date = None
         end_date = None
         
-        query = db.query(UserInDB).filter(UserInDB.role == 'student')
-        
-        if group_id:
-            student_ids = db.query(GroupStudent.student_id).filter(
-                GroupStudent.group_id == group_id
-            ).subquery()
-            query = query.filter(UserInDB.id.in_(student_ids))
-        
-        users = query.order_by(UserInDB.activity_points.desc()).limit(limit).all()
-        results = [(u.id, u.activity_points or 0) for u in users]
+        results = points_ledger.top_students_all_time(db, limit, user_ids=student_ids)
+        my_points = current_user.activity_points or 0
+        my_rank = points_ledger.rank_all_time(db, my_points, user_ids=student_ids)
     
     # Build response with user details
     entries = []
@@ -372,12 +312,14 @@ async def get_leaderboard(
         start_date=start_date,
         end_date=end_date,
         total_participants=total_participants,
-        entries=entries
+        entries=entries,
+        my_points=my_points,
+        my_rank=my_rank
     )
 
 
 @router.get("/history", response_model=List[PointHistorySchema])
-async def get_point_history(
+def get_point_history(
     limit: int = Query(50, le=100),
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, or_
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, date, timedelta
 
 from src.config import get_db
@@ -13,17 +13,21 @@ from src.schemas.models import (
     CourseGroupAccess, CourseHeadTeacher, Event, EventGroup, EventParticipant
 )
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from src.routes.auth import get_current_user_dependency
 from src.services.attendance_service import (
     AttendanceService,
     attendance_status_to_ui,
     ep_status_to_attendance_status,
 )
+from src.services.leaderboard_engine import (
+    DEFAULT_CONFIG, WeekBoard, get_group_weeks, get_week_board,
+)
 
 router = APIRouter()
 
 @router.get("/curator/groups", response_model=List[GroupSchema])
-async def get_curator_groups(
+def get_curator_groups(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -142,17 +146,7 @@ async def get_curator_groups(
         ))
     return result
 
-@router.get("/curator/leaderboard/{group_id}", response_model=List[dict])
-async def get_group_leaderboard(
-    group_id: int,
-    week_number: int = Query(..., ge=1, le=52),
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
-):
-    """
-    Get leaderboard data for a specific group and week.
-    Uses Events for schedule data (not LessonSchedule).
-    """
+def _authorize_group_leaderboard(db: Session, current_user: UserInDB, group_id: int):
     if current_user.role == "curator":
         group = db.query(Group).filter(Group.id == group_id, Group.curator_id == current_user.id).first()
         if not group:
@@ -162,227 +156,121 @@ async def get_group_leaderboard(
     else:
         raise HTTPException(status_code=403, detail="Only curators and admins can access leaderboard")
 
-    # 1. Get all students in the group
-    group_students = db.query(GroupStudent).filter(GroupStudent.group_id == group_id).all()
-    student_ids = [gs.student_id for gs in group_students]
-    
-    if not student_ids:
-        return []
-        
-    students = db.query(UserInDB).filter(UserInDB.id.in_(student_ids)).all()
-    students_map = {s.id: s for s in students}
-
-    # 2. Get Events for this group (class type, active)
-    from src.schemas.models import Event, EventGroup
-    
-    all_events = db.query(Event).join(EventGroup).filter(
-        EventGroup.group_id == group_id,
-        Event.event_type == 'class',
-        Event.is_active == True
-    ).order_by(Event.start_datetime.asc()).all()
-    
-    if not all_events:
-        # No events - return empty leaderboard with students
-        result = []
-        for student_id in student_ids:
-            student = students_map.get(student_id)
-            if not student:
-                continue
-            row = {
-                "student_id": student.id,
-                "student_name": student.name,
-                "avatar_url": student.avatar_url,
-                "hw_lesson_1": None, "hw_lesson_2": None, "hw_lesson_3": None,
-                "hw_lesson_4": None, "hw_lesson_5": None,
-                "lesson_1": 0, "lesson_2": 0, "lesson_3": 0, "lesson_4": 0, "lesson_5": 0,
-                "curator_hour": 0, "mock_exam": 0, "study_buddy": 0,
-                "self_reflection_journal": 0, "weekly_evaluation": 0, "extra_points": 0,
-            }
-            result.append(row)
-        result.sort(key=lambda x: x["student_name"])
-        return result
-
-    # 3. Calculate week boundaries based on first event
-    first_event_date = all_events[0].start_datetime.date()
-    start_of_week1 = first_event_date - timedelta(days=first_event_date.weekday())
-    
-    week_start_date = start_of_week1 + timedelta(weeks=week_number - 1)
-    week_end_date = week_start_date + timedelta(days=7)
-    week_start_dt = datetime.combine(week_start_date, datetime.min.time())
-    week_end_dt = datetime.combine(week_end_date, datetime.min.time())
-    
-    # 4. Get events for this specific week
-    week_events = [e for e in all_events 
-                   if week_start_dt <= e.start_datetime < week_end_dt]
-    week_events.sort(key=lambda e: e.start_datetime)
-    
-    # Map event_id -> lesson index (1-5) within the week
-    event_to_index = {}
-    for idx, event in enumerate(week_events[:5]):  # Max 5 lessons per week
-        event_to_index[event.id] = idx + 1
-    
-    # 5. Get Homework data
-    # Strategy: 
-    #   a) First try to find assignments linked to events via event_id
-    #   b) Fallback: find assignments for this group with due_date in this week
-    homework_data = {}  # {student_id: {lesson_index: score}}
-    
-    event_ids = [e.id for e in week_events[:5]]
-    
-    # Method A: Assignments linked to events via event_id
-    event_linked_assignments = []
-    if event_ids:
-        event_linked_assignments = db.query(Assignment).filter(
-            Assignment.event_id.in_(event_ids),
-            Assignment.is_active == True
-        ).all()
-    
-    # Method B: Assignments for this group with due_date in this week (fallback)
-    # This covers assignments created before event linking was implemented
-    group_assignments = db.query(Assignment).filter(
-        Assignment.group_id == group_id,
-        Assignment.is_active == True,
-        Assignment.due_date >= week_start_dt,
-        Assignment.due_date < week_end_dt
-    ).order_by(Assignment.due_date).all()
-    
-    # Combine and dedupe by assignment ID
-    all_week_assignments = {a.id: a for a in event_linked_assignments}
-    for a in group_assignments:
-        if a.id not in all_week_assignments:
-            all_week_assignments[a.id] = a
-    
-    assignments = list(all_week_assignments.values())
-    assignments.sort(key=lambda a: a.due_date if a.due_date else datetime.max)
-    
-    # Create assignment -> lesson index mapping
-    # Priority: event_id mapping, then by due_date order
-    assignment_to_index = {}
-    used_indices = set()
-    
-    # First, map assignments with event_id
-    for a in assignments:
-        if a.event_id and a.event_id in event_to_index:
-            idx = event_to_index[a.event_id]
-            assignment_to_index[a.id] = idx
-            used_indices.add(idx)
-    
-    # Then, map remaining assignments by due_date order to unused indices
-    next_idx = 1
-    for a in assignments:
-        if a.id not in assignment_to_index:
-            while next_idx in used_indices and next_idx <= 5:
-                next_idx += 1
-            if next_idx <= 5:
-                assignment_to_index[a.id] = next_idx
-                used_indices.add(next_idx)
-                next_idx += 1
-    
-    assignment_ids = list(assignment_to_index.keys())
-    
-    if assignment_ids:
-        submissions = db.query(AssignmentSubmission).filter(
-            AssignmentSubmission.assignment_id.in_(assignment_ids),
-            AssignmentSubmission.user_id.in_(student_ids),
-            AssignmentSubmission.is_graded == True
-        ).all()
-        
-        for sub in submissions:
-            lesson_idx = assignment_to_index.get(sub.assignment_id, 0)
-            if lesson_idx > 0:
-                if sub.user_id not in homework_data:
-                    homework_data[sub.user_id] = {}
-                homework_data[sub.user_id][lesson_idx] = sub.score
-    
-    # 6. Get Attendance data - from Attendance (single source of truth)
-    attendance_data = {}  # {student_id: {lesson_index: score}}
-
-    if event_ids:
-        att_map = AttendanceService.get_attendance_map_for_events(db, event_ids, student_ids)
-        for (uid, eid), att in att_map.items():
-            lesson_idx = event_to_index.get(eid, 0)
-            if lesson_idx > 0:
-                if uid not in attendance_data:
-                    attendance_data[uid] = {}
-                score = 1 if att["status"] in ("present", "late") else 0
-                attendance_data[uid][lesson_idx] = score
-
-    # 7. Get Manual Leaderboard Entries
-    entries = db.query(LeaderboardEntry).filter(
-        LeaderboardEntry.group_id == group_id,
-        LeaderboardEntry.week_number == week_number
-    ).all()
-    entries_map = {e.user_id: e for e in entries}
 
-    # 8. FETCH SAT DATA
+async def _sat_percentages(boards: List[WeekBoard]) -> Dict[int, Dict[int, float]]:
+    """SAT mock exam percentage per week and student, fetched once for all weeks."""
     from src.services.sat_service import SATService
-    sat_results_map = {}
-    
-    emails = [s.email.lower() for s in students if s.email]
-    if emails:
-        batch_data = await SATService.fetch_batch_test_results(emails)
-        results = batch_data.get("results", [])
-        email_to_id = {s.email.lower(): s.id for s in students if s.email}
-        for res in results:
-            email = res.get("email", "").lower()
-            sid = email_to_id.get(email)
-            if sid and res.get("data"):
-                pct = SATService.get_percentage_for_week(res["data"], week_start_dt, week_end_dt)
-                if pct is not None:
-                    sat_results_map[sid] = pct
-
-    # 9. Construct Response
-    result = []
-    
-    for student_id in student_ids:
-        student = students_map.get(student_id)
-        if not student: 
+
+    boards = [board for board in boards if board.has_events and board.students]
+    if not boards:
+        return {}
+    email_to_id = {s[3].lower(): s[0] for s in boards[0].students if s[3]}
+    if not email_to_id:
+        return {}
+
+    batch_data = await SATService.fetch_batch_test_results(list(email_to_id))
+    percentages: Dict[int, Dict[int, float]] = {}
+    for res in batch_data.get("results", []):
+        sid = email_to_id.get(res.get("email", "").lower())
+        if not sid or not res.get("data"):
             continue
-            
-        entry = entries_map.get(student_id)
-        hw_scores = homework_data.get(student_id, {})
-        att_scores = attendance_data.get(student_id, {})
-        
-        # Priority for mock_exam: SAT Platform data > Manual Entry
-        sat_score = sat_results_map.get(student_id)
-        mock_exam_score = sat_score if sat_score is not None else (entry.mock_exam if entry else 0)
+        for board in boards:
+            pct = SATService.get_percentage_for_week(res["data"], board.week_start, board.week_end)
+            if pct is not None:
+                percentages.setdefault(board.week_number, {})[sid] = pct
+    return percentages
+
+
+def _leaderboard_rows(board: WeekBoard, sat_results_map: Dict[int, float]) -> List[dict]:
+    rows = board.rows()
+    # Priority for mock_exam: SAT Platform data > Manual Entry
+    for row in rows:
+        sat_score = sat_results_map.get(row["student_id"])
+        if sat_score is not None:
+            row["mock_exam"] = sat_score
+    return rows
+
+
+def _full_leaderboard_week(board: WeekBoard, rows: List[dict], week_start: datetime, config: dict) -> dict:
+    """Structured week of the leaderboard-full and season views."""
+    formatted_students = []
+    for row in rows:
+        student_lessons = {}
 
-        # Manual scores defaults
-        manual = {
-            "curator_hour": entry.curator_hour if entry else 0,
-            "mock_exam": mock_exam_score,
-            "study_buddy": entry.study_buddy if entry else 0,
-            "self_reflection_journal": entry.self_reflection_journal if entry else 0,
-            "weekly_evaluation": entry.weekly_evaluation if entry else 0,
-            "extra_points": entry.extra_points if entry else 0,
-        }
-        
-        # Lesson scores from attendance
-        lesson_scores = {}
         for i in range(1, 6):
-            lesson_scores[f"lesson_{i}"] = att_scores.get(i, 0)
-        
-        row = {
-            "student_id": student.id,
-            "student_name": student.name,
-            "avatar_url": student.avatar_url,
-            "hw_lesson_1": hw_scores.get(1, None),
-            "hw_lesson_2": hw_scores.get(2, None),
-            "hw_lesson_3": hw_scores.get(3, None),
-            "hw_lesson_4": hw_scores.get(4, None),
-            "hw_lesson_5": hw_scores.get(5, None),
-            **lesson_scores,
-            **manual
-        }
-        result.append(row)
+            hw_score = row.get(f"hw_lesson_{i}")
+            att_score = row.get(f"lesson_{i}", 0)
+
+            # Determine attendance status
+            if att_score >= 1:
+                attendance_status = "attended"
+            elif att_score > 0:
+                attendance_status = "late"
+            else:
+                attendance_status = "missed"
+
+            student_lessons[str(i)] = {
+                "event_id": board.event_ids[i - 1] if i <= len(board.event_ids) else 0,
+                "attendance_status": attendance_status,
+                "homework_status": {
+                    "submitted": hw_score is not None,
+                    "score": hw_score
+                } if hw_score is not None else None
+            }
+
+        formatted_students.append({
+            "student_id": row["student_id"],
+            "student_name": row["student_name"],
+            "avatar_url": row["avatar_url"],
+            "lessons": student_lessons,
+            "curator_hour": row["curator_hour"],
+            "mock_exam": row["mock_exam"],
+            "study_buddy": row["study_buddy"],
+            "self_reflection_journal": row["self_reflection_journal"],
+            "weekly_evaluation": row["weekly_evaluation"],
+            "extra_points": row["extra_points"]
+        })
+
+    return {
+        "week_number": board.week_number,
+        "week_start": week_start.isoformat(),
+        "lessons": board.lessons,
+        "students": formatted_students,
+        "config": config,
+    }
+
+
+def _fallback_week_start(group: Group, week_number: int) -> datetime:
+    # No events - use group creation date as fallback
+    group_base_date = group.created_at or datetime.utcnow()
+    week1_start = group_base_date - timedelta(days=group_base_date.weekday())
+    return week1_start + timedelta(weeks=week_number - 1)
 
-    # Sort by name
-    result.sort(key=lambda x: x["student_name"])
-    
-    return result
+
+@router.get("/curator/leaderboard/{group_id}", response_model=List[dict])
+async def get_group_leaderboard(
+    group_id: int,
+    week_number: int = Query(..., ge=1, le=52),
+    current_user: UserInDB = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Get leaderboard data for a specific group and week.
+    Uses Events for schedule data (not LessonSchedule).
+    """
+    def load():
+        _authorize_group_leaderboard(db, current_user, group_id)
+        return get_week_board(db, group_id, week_number)
+
+    board = await run_in_threadpool(load)
+    if not board.students:
+        return []
+
+    sat_results = await _sat_percentages([board])
+    return _leaderboard_rows(board, sat_results.get(week_number, {}))
 
 @router.post("/config", response_model=LeaderboardConfigSchema)
-async def update_leaderboard_config(
+def update_leaderboard_config(
     payload: LeaderboardConfigUpdateSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -761,7 +649,7 @@ async def get_weekly_lessons_with_hw_status(
     }
 
 @router.get("/curator/full-attendance/{group_id}")
-async def get_group_full_attendance_matrix(
+def get_group_full_attendance_matrix(
     group_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -916,7 +804,7 @@ async def get_group_full_attendance_matrix(
     }
 
 @router.post("/curator/leaderboard")
-async def update_leaderboard_entry(
+def update_leaderboard_entry(
     data: LeaderboardEntryCreateSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -977,167 +865,73 @@ async def get_weekly_lessons_with_hw_status(
     if current_user.role not in ["curator", "admin", "head_curator"]:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    # 1. Get Group
-    group = db.query(Group).filter(Group.id == group_id).first()
-    if not group:
-        raise HTTPException(status_code=404, detail="Group not found")
-
-    # 2. Get all Events for this group
-    all_events = db.query(Event).join(EventGroup).filter(
-        EventGroup.group_id == group_id,
-        Event.event_type == 'class',
-        Event.is_active == True
-    ).order_by(Event.start_datetime.asc()).all()
-    
-    lessons_meta = []
-    week_start = None
-    week_events = []
-    
-    if all_events:
-        # Calculate week boundaries based on first event
-        first_event_date = all_events[0].start_datetime.date()
-        start_of_week1 = first_event_date - timedelta(days=first_event_date.weekday())
-        
-        week_start_date = start_of_week1 + timedelta(weeks=week_number - 1)
-        week_end_date = week_start_date + timedelta(days=7)
-        week_start_dt = datetime.combine(week_start_date, datetime.min.time())
-        week_end_dt = datetime.combine(week_end_date, datetime.min.time())
-        week_start = week_start_dt
-        
-        # Get events for this specific week
-        week_events = [e for e in all_events 
-                       if week_start_dt <= e.start_datetime < week_end_dt]
-        week_events.sort(key=lambda e: e.start_datetime)
-        
-        # Get homework for this week (by group_id and due_date)
-        week_assignments = db.query(Assignment).filter(
-            Assignment.group_id == group_id,
-            Assignment.is_active == True,
-            Assignment.due_date >= week_start_dt,
-            Assignment.due_date < week_end_dt
-        ).order_by(Assignment.due_date).all()
-        
-        # Also check assignments linked to events via event_id
-        event_ids = [e.id for e in week_events]
-        if event_ids:
-            event_linked_assignments = db.query(Assignment).filter(
-                Assignment.event_id.in_(event_ids),
-                Assignment.is_active == True
-            ).all()
-            # Merge
-            existing_ids = {a.id for a in week_assignments}
-            for a in event_linked_assignments:
-                if a.id not in existing_ids:
-                    week_assignments.append(a)
-            week_assignments.sort(key=lambda a: a.due_date if a.due_date else datetime.max)
-        
-        # Create assignment lookup by event_id or by index
-        assignment_by_event = {a.event_id: a for a in week_assignments if a.event_id}
-        assignments_without_event = [a for a in week_assignments if not a.event_id]
-        
-        for idx, event in enumerate(week_events[:5]):
-            # Find homework for this lesson
-            # Priority: assignment linked to this event, then by order
-            assignment = assignment_by_event.get(event.id)
-            if not assignment and idx < len(assignments_without_event):
-                assignment = assignments_without_event[idx]
-            
-            lessons_meta.append({
-                "lesson_number": idx + 1,
-                "event_id": event.id,
-                "title": event.title,
-                "start_datetime": event.start_datetime.isoformat(),
-                "homework": {
-                    "id": assignment.id,
-                    "title": assignment.title
-                } if assignment else None
-            })
-    else:
-        # No events - use group creation date as fallback
-        group_base_date = group.created_at or datetime.utcnow()
-        week1_start = group_base_date - timedelta(days=group_base_date.weekday())
-        week_start = week1_start + timedelta(weeks=week_number - 1)
-
-    # 2. Get Student Rows (re-use existing function)
-    students_data = await get_group_leaderboard(group_id, week_number, current_user, db)
-    
-    # 3. Format students for the frontend expected structure
-    formatted_students = []
-    for row in students_data:
-        student_lessons = {}
-        
-        for i in range(1, 6):
-            hw_score = row.get(f"hw_lesson_{i}")
-            att_score = row.get(f"lesson_{i}", 0)
-            
-            # Determine attendance status
-            if att_score >= 1:
-                attendance_status = "attended"
-            elif att_score > 0:
-                attendance_status = "late"
-            else:
-                attendance_status = "missed"
-            
-            # Get event_id for this lesson
-            event_id = 0
-            if i <= len(week_events):
-                event_id = week_events[i-1].id
-
-            student_lessons[str(i)] = {
-                "event_id": event_id,
-                "attendance_status": attendance_status,
-                "homework_status": {
-                    "submitted": hw_score is not None,
-                    "score": hw_score
-                } if hw_score is not None else None
-            }
+    def load():
+        group = db.query(Group).filter(Group.id == group_id).first()
+        if not group:
+            raise HTTPException(status_code=404, detail="Group not found")
+        _authorize_group_leaderboard(db, current_user, group_id)
+        board = get_week_board(db, group_id, week_number)
+
+        config = board.config
+        if config is None:
+            # Get/Create Config
+            row = LeaderboardConfig(group_id=group_id, week_number=week_number)
+            db.add(row)
+            db.commit()
+            db.refresh(row)
+            config = {field: getattr(row, field) for field in DEFAULT_CONFIG}
+
+        week_start = board.week_start if board.has_events else _fallback_week_start(group, week_number)
+        return board, week_start, config
+
+    board, week_start, config = await run_in_threadpool(load)
+    sat_results = await _sat_percentages([board])
+    rows = _leaderboard_rows(board, sat_results.get(week_number, {}))
+    return _full_leaderboard_week(board, rows, week_start, config)
+
+
+@router.get("/curator/leaderboard-season/{group_id}")
+async def get_group_leaderboard_season(
+    group_id: int,
+    current_user: UserInDB = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Every leaderboard week of a group, from the week of its first class event
+    to the week of its last one, in the leaderboard-full format.
+    Weeks without a stored config report the default column settings.
+    """
+    if current_user.role not in ["curator", "admin", "head_curator"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
 
-        formatted_students.append({
-            "student_id": row["student_id"],
-            "student_name": row["student_name"],
-            "avatar_url": row["avatar_url"],
-            "lessons": student_lessons,
-            "curator_hour": row["curator_hour"],
-            "mock_exam": row["mock_exam"],
-            "study_buddy": row["study_buddy"],
-            "self_reflection_journal": row["self_reflection_journal"],
-            "weekly_evaluation": row["weekly_evaluation"],
-            "extra_points": row["extra_points"]
-        })
+    def load():
+        group = db.query(Group).filter(Group.id == group_id).first()
+        if not group:
+            raise HTTPException(status_code=404, detail="Group not found")
+        _authorize_group_leaderboard(db, current_user, group_id)
+        return get_group_weeks(db, group_id)
 
-    # 4. Get/Create Config
-    config = db.query(LeaderboardConfig).filter(
-        LeaderboardConfig.group_id == group_id,
-        LeaderboardConfig.week_number == week_number
-    ).first()
-    
-    if not config:
-        config = LeaderboardConfig(
-            group_id=group_id,
-            week_number=week_number
-        )
-        db.add(config)
-        db.commit()
-        db.refresh(config)
+    layout, boards = await run_in_threadpool(load)
+    weeks = [boards[week_number] for week_number in sorted(boards)]
+    sat_results = await _sat_percentages(weeks)
 
     return {
-        "week_number": week_number,
-        "week_start": week_start.isoformat(),
-        "lessons": lessons_meta,
-        "students": formatted_students,
-        "config": {
-            "curator_hour_enabled": config.curator_hour_enabled,
-            "study_buddy_enabled": config.study_buddy_enabled,
-            "self_reflection_journal_enabled": config.self_reflection_journal_enabled,
-            "weekly_evaluation_enabled": config.weekly_evaluation_enabled,
-            "extra_points_enabled": config.extra_points_enabled,
-            "curator_hour_date": config.curator_hour_date
-        }
+        "group_id": group_id,
+        "weeks_count": layout.weeks_count,
+        "weeks": [
+            _full_leaderboard_week(
+                board,
+                _leaderboard_rows(board, sat_results.get(board.week_number, {})),
+                board.week_start,
+                board.config or dict(DEFAULT_CONFIG),
+            )
+            for board in weeks
+        ],
     }
 
 
 @router.post("/curator/leaderboard-config")
-async def update_leaderboard_config(
+def update_leaderboard_config(
     data: LeaderboardConfigUpdateSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1177,7 +971,7 @@ class BulkAttendanceInputSchema(BaseModel):
     updates: List[AttendanceInputSchema]
 
 @router.post("/curator/attendance/bulk")
-async def update_attendance_bulk(
+def update_attendance_bulk(
     data: BulkAttendanceInputSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1256,7 +1050,7 @@ async def update_attendance_bulk(
     return {"status": "success", "updated_count": updated_count}
 
 @router.post("/curator/attendance")
-async def update_attendance(
+def update_attendance(
     data: AttendanceInputSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1383,7 +1177,7 @@ class GroupScheduleResponse(BaseModel):
 
 
 @router.post("/curator/schedule/generate")
-async def generate_schedule(
+def generate_schedule(
     data: ScheduleGenerationSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1519,7 +1313,7 @@ async def generate_schedule(
     return {"message": f"Schedule generated successfully. Created {lessons_created} individual lessons."}
 
 @router.get("/curator/schedule/{group_id}", response_model=GroupScheduleResponse)
-async def get_group_schedule(
+def get_group_schedule(
     group_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1602,7 +1396,7 @@ from src.schemas.models import StepProgress
 from datetime import timedelta
 
 @router.get("/student/my-ranking")
-async def get_student_ranking(
+def get_student_ranking(
     period: str = Query("all_time", regex="^(all_time|this_week|this_month)$"),
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1764,7 +1558,7 @@ async def get_student_ranking(
 
 
 @router.get("/group-schedules/{group_id}")
-async def get_group_schedules(
+def get_group_schedules(
     group_id: int,
     weeks_back: int = Query(default=4, ge=0, le=12),
     weeks_ahead: int = Query(default=8, ge=0, le=24),
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, DateTime, Boolean, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 
@@ -17,6 +17,12 @@ class Message(Base):
     sender = relationship("UserInDB", foreign_keys=[from_user_id], back_populates="sent_messages")
     recipient = relationship("UserInDB", foreign_keys=[to_user_id], back_populates="received_messages")
 
+    __table_args__ = (
+        # Conversation index: received / sent messages per partner, newest first
+        Index('idx_messages_to_from_created', 'to_user_id', 'from_user_id', 'created_at'),
+        Index('idx_messages_from_to_created', 'from_user_id', 'to_user_id', 'created_at'),
+    )
+
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -1,19 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, or_, and_
+from sqlalchemy import desc, or_, and_, func, select, update
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
-from datetime import datetime
 import logging
 
-from src.config import get_db
+from src.config import get_db, get_async_db
 from src.schemas.models import (
     Message, UserInDB, Course, Enrollment,
     MessageSchema, SendMessageSchema
 )
-from src.routes.auth import get_current_user_dependency
+from src.routes.auth import get_current_user_dependency, get_current_user_async
 from src.utils.permissions import check_student_access
 from src.schemas.models import GroupStudent
 from src.utils.push_notifications import send_message_notification
+from src.messages.services import get_conversation_summaries
+from src.messages.routes.socket_messages import emit_message_new, emit_message_read, emit_messages_read
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -28,8 +32,8 @@ async def get_messages(
     course_id: Optional[int] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, le=200),
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
+    current_user: UserInDB = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Получить сообщения для текущего пользователя
@@ -39,7 +43,7 @@ async def get_messages(
     - Админы могут общаться со всеми
     """
     
-    query = db.query(Message).filter(
+    query = select(Message).where(
         or_(
             Message.from_user_id == current_user.id,
             Message.to_user_id == current_user.id
@@ -49,10 +53,11 @@ async def get_messages(
     # Фильтр по конкретному пользователю
     if with_user_id:
         # Проверим права доступа к этому пользователю
-        if not can_communicate_with_user(current_user, with_user_id, db):
+        allowed = await db.run_sync(lambda session: can_communicate_with_user(current_user, with_user_id, session))
+        if not allowed:
             raise HTTPException(status_code=403, detail="Cannot communicate with this user")
         
-        query = query.filter(
+        query = query.where(
             or_(
                 and_(Message.from_user_id == current_user.id, Message.to_user_id == with_user_id),
                 and_(Message.from_user_id == with_user_id, Message.to_user_id == current_user.id)
@@ -62,29 +67,33 @@ async def get_messages(
     # Фильтр по курсу (для учителей - показать сообщения с учениками этого курса)
     if course_id and current_user.role in ["teacher", "curator"]:
         # Получить учеников курса
-        student_ids = db.query(Enrollment.user_id).filter(
+        student_ids = select(Enrollment.user_id).where(
             Enrollment.course_id == course_id,
             Enrollment.is_active == True
         )
         
-        query = query.filter(
+        query = query.where(
             or_(
                 and_(Message.from_user_id == current_user.id, Message.to_user_id.in_(student_ids)),
                 and_(Message.from_user_id.in_(student_ids), Message.to_user_id == current_user.id)
             )
         )
     
-    messages = query.order_by(desc(Message.created_at)).offset(skip).limit(limit).all()
+    result = await db.execute(query.order_by(desc(Message.created_at)).offset(skip).limit(limit))
+    messages = result.scalars().all()
+    
+    # Добавляем имена отправителей и получателей (одним запросом)
+    user_ids = {m.from_user_id for m in messages} | {m.to_user_id for m in messages}
+    names = {}
+    if user_ids:
+        rows = await db.execute(select(UserInDB.id, UserInDB.name).where(UserInDB.id.in_(user_ids)))
+        names = dict(rows.all())
     
-    # Добавляем имена отправителей и получателей
     enriched_messages = []
     for message in messages:
-        sender = db.query(UserInDB).filter(UserInDB.id == message.from_user_id).first()
-        recipient = db.query(UserInDB).filter(UserInDB.id == message.to_user_id).first()
-        
         message_data = MessageSchema.from_orm(message)
-        message_data.sender_name = sender.name if sender else "Unknown"
-        message_data.recipient_name = recipient.name if recipient else "Unknown"
+        message_data.sender_name = names.get(message.from_user_id, "Unknown")
+        message_data.recipient_name = names.get(message.to_user_id, "Unknown")
         
         enriched_messages.append(message_data)
     
@@ -93,18 +102,19 @@ async def get_messages(
 @router.post("/", response_model=MessageSchema)
 async def send_message(
     message_data: SendMessageSchema,
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
+    current_user: UserInDB = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Отправить сообщение другому пользователю"""
     
     # Проверить, что получатель существует
-    recipient = db.query(UserInDB).filter(UserInDB.id == message_data.to_user_id).first()
+    recipient = await db.get(UserInDB, message_data.to_user_id)
     if not recipient:
         raise HTTPException(status_code=404, detail="Recipient not found")
     
     # Проверить права на отправку сообщений этому пользователю
-    if not can_communicate_with_user(current_user, message_data.to_user_id, db):
+    allowed = await db.run_sync(lambda session: can_communicate_with_user(current_user, message_data.to_user_id, session))
+    if not allowed:
         raise HTTPException(status_code=403, detail="Cannot send message to this user")
     
     # Создать сообщение
@@ -115,8 +125,8 @@ async def send_message(
     )
     
     db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
+    await db.commit()
+    await db.refresh(new_message)
     
     # Возвращаем с именами
     message_response = MessageSchema.from_orm(new_message)
@@ -126,7 +136,8 @@ async def send_message(
     # Send push notification to recipient if they have a push token
     if recipient.push_token:
         try:
-            send_message_notification(
+            await run_in_threadpool(
+                send_message_notification,
                 push_token=recipient.push_token,
                 sender_name=current_user.name,
                 message_preview=message_data.content.strip(),
@@ -137,19 +148,22 @@ async def send_message(
             logger.error(f"Failed to send push notification: {str(e)}")
     
     # Создать уведомление для получателя
-    create_message_notification(new_message, db)
+    await db.run_sync(lambda session: create_message_notification(new_message, session))
+    
+    # Доставить сообщение открытым сокетам обоих пользователей
+    await emit_message_new(jsonable_encoder(message_response))
     
     return message_response
 
 @router.put("/{message_id}/read")
 async def mark_message_as_read(
     message_id: int,
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
+    current_user: UserInDB = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Отметить сообщение как прочитанное"""
     
-    message = db.query(Message).filter(Message.id == message_id).first()
+    message = await db.get(Message, message_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     
@@ -157,122 +171,82 @@ async def mark_message_as_read(
     if message.to_user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
+    was_read = message.is_read
     message.is_read = True
-    db.commit()
+    await db.commit()
+    
+    if not was_read:
+        await emit_message_read(jsonable_encoder(MessageSchema.from_orm(message)))
     
     return {"detail": "Message marked as read"}
 
 @router.put("/mark-all-read/{partner_id}")
 async def mark_all_messages_as_read(
     partner_id: int,
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
+    current_user: UserInDB = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Отметить все сообщения от конкретного пользователя как прочитанные"""
     
     # Проверить права доступа к этому пользователю
-    if not can_communicate_with_user(current_user, partner_id, db):
+    allowed = await db.run_sync(lambda session: can_communicate_with_user(current_user, partner_id, session))
+    if not allowed:
         raise HTTPException(status_code=403, detail="Cannot access messages from this user")
     
     # Отметить все непрочитанные сообщения от этого пользователя как прочитанные
-    unread_messages = db.query(Message).filter(
-        Message.from_user_id == partner_id,
-        Message.to_user_id == current_user.id,
-        Message.is_read == False
-    ).all()
-    
-    for message in unread_messages:
-        message.is_read = True
+    result = await db.execute(
+        update(Message)
+        .where(
+            Message.from_user_id == partner_id,
+            Message.to_user_id == current_user.id,
+            Message.is_read == False
+        )
+        .values(is_read=True)
+        .returning(Message.id)
+        .execution_options(synchronize_session=False)
+    )
+    message_ids = list(result.scalars().all())
+    await db.commit()
     
-    db.commit()
+    if message_ids:
+        await emit_messages_read(current_user.id, partner_id, message_ids)
     
-    return {"detail": f"Marked {len(unread_messages)} messages as read"}
+    return {"detail": f"Marked {len(message_ids)} messages as read"}
 
 @router.get("/conversations", response_model=List[dict])
 async def get_conversations(
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
+    current_user: UserInDB = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Получить список всех разговоров (чатов) пользователя
     Возвращает список пользователей, с которыми ведется переписка
     """
     
-    # Получить все сообщения пользователя
-    user_messages = db.query(Message).filter(
-        or_(
-            Message.from_user_id == current_user.id,
-            Message.to_user_id == current_user.id
-        )
-    ).all()
-    
-    # Собрать уникальных собеседников
-    conversation_partners = set()
-    for message in user_messages:
-        if message.from_user_id == current_user.id:
-            conversation_partners.add(message.to_user_id)
-        else:
-            conversation_partners.add(message.from_user_id)
-    
-    # Подготовить данные о разговорах
-    conversations = []
-    for partner_id in conversation_partners:
-        partner = db.query(UserInDB).filter(UserInDB.id == partner_id).first()
-        if not partner:
-            continue
-        
-        # Последнее сообщение в разговоре
-        last_message = db.query(Message).filter(
-            or_(
-                and_(Message.from_user_id == current_user.id, Message.to_user_id == partner_id),
-                and_(Message.from_user_id == partner_id, Message.to_user_id == current_user.id)
-            )
-        ).order_by(desc(Message.created_at)).first()
-        
-        # Количество непрочитанных сообщений от этого партнера
-        unread_count = db.query(Message).filter(
-            Message.from_user_id == partner_id,
-            Message.to_user_id == current_user.id,
-            Message.is_read == False
-        ).count()
-        
-        conversations.append({
-            "partner_id": partner_id,
-            "partner_name": partner.name,
-            "partner_role": partner.role,
-            "partner_avatar": partner.avatar_url,
-            "last_message": {
-                "content": last_message.content if last_message else "",
-                "created_at": last_message.created_at if last_message else None,
-                "from_me": last_message.from_user_id == current_user.id if last_message else False
-            },
-            "unread_count": unread_count
-        })
-    
-    # Сортируем по времени последнего сообщения
-    conversations.sort(
-        key=lambda x: x["last_message"]["created_at"] or datetime.min,
-        reverse=True
-    )
+    # Собеседники, последнее сообщение и число непрочитанных одним запросом
+    user_id = current_user.id
+    conversations = await db.run_sync(lambda session: get_conversation_summaries(user_id, session))
     
     return conversations
 
 @router.get("/unread-count")
 async def get_unread_message_count(
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
+    current_user: UserInDB = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить количество непрочитанных сообщений"""
     
-    unread_count = db.query(Message).filter(
-        Message.to_user_id == current_user.id,
-        Message.is_read == False
-    ).count()
+    unread_count = await db.scalar(
+        select(func.count(Message.id)).where(
+            Message.to_user_id == current_user.id,
+            Message.is_read == False
+        )
+    )
     
     return {"unread_count": unread_count}
 
 @router.get("/available-contacts")
-async def get_available_contacts(
+def get_available_contacts(
     role_filter: Optional[str] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
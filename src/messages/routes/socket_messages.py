@@ -1,25 +1,29 @@
 import socketio
 from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, or_, and_
+from sqlalchemy import desc, or_, and_, func, select, update
 from typing import List, Optional
-from datetime import datetime
 import logging
 
-from src.config import get_db
+from src.config import AsyncSessionLocal, run_sync_db
 from src.schemas.models import (
     Message, UserInDB, Course, Enrollment,
     MessageSchema, SendMessageSchema
 )
 from src.routes.auth import verify_token
 from src.routes.messages import can_communicate_with_user, create_message_notification
-from src.schemas.models import GroupStudent
+from src.schemas.models import Group, GroupStudent
+from src.messages.services import get_conversation_summaries
+from src.services.socketio_manager import create_client_manager
 
 logger = logging.getLogger(__name__)
 
-# Create Socket.IO server
+# Create Socket.IO server. The client manager relays emits between workers
+# (see src.services.socketio_manager).
 sio = socketio.AsyncServer(
     async_mode='asgi',
+    client_manager=create_client_manager(),
     cors_allowed_origins=["http://localhost:3000", "http://localhost:5174", "http://localhost:5173", "https://mastereducation.kz", "https://lms.mastereducation.kz", "https://lms-master.vercel.app"],
     logger=False,
     engineio_logger=False,
@@ -82,7 +86,7 @@ def _get_user_id_from_environ(environ, auth=None) -> int | None:
     except (TypeError, ValueError):
         return None
 
-def _resolve_user_id(session_data, db: Session) -> int | None:
+async def _resolve_user_id(session_data, db: AsyncSession) -> int | None:
     raw = session_data.get('user_id') if session_data else None
     if isinstance(raw, int):
         return raw
@@ -92,10 +96,16 @@ def _resolve_user_id(session_data, db: Session) -> int | None:
             return int(raw)
         except ValueError:
             # Try treat as email
-            user = db.query(UserInDB).filter(UserInDB.email == raw).first()
-            return user.id if user else None
+            return await db.scalar(select(UserInDB.id).where(UserInDB.email == raw))
     return None
 
+async def _user_names(db: AsyncSession, user_ids) -> dict:
+    """Map user id -> name for a set of ids in one query"""
+    if not user_ids:
+        return {}
+    rows = await db.execute(select(UserInDB.id, UserInDB.name).where(UserInDB.id.in_(set(user_ids))))
+    return dict(rows.all())
+
 async def _emit_threads_update(user_id: int):
     """Emit threads update to user's room"""
     await sio.emit('threads:update', to=f"{USER_ROOM_PREFIX}{user_id}")
@@ -108,6 +118,39 @@ async def emit_unseen_graded_update(user_id: int):
     """Emit unseen graded count update to user's room"""
     await sio.emit('unseen_graded:update', to=f"{USER_ROOM_PREFIX}{user_id}")
 
+async def emit_message_new(message_data: dict):
+    """Push a new message to both participants and refresh their threads"""
+    from_user_id = message_data['from_user_id']
+    to_user_id = message_data['to_user_id']
+    await sio.emit('message:new', message_data, to=f"{USER_ROOM_PREFIX}{from_user_id}")
+    await sio.emit('message:new', message_data, to=f"{USER_ROOM_PREFIX}{to_user_id}")
+    
+    # Update threads for both users
+    await _emit_threads_update(from_user_id)
+    await _emit_threads_update(to_user_id)
+    
+    # Update unread count for recipient
+    await _emit_unread_update(to_user_id)
+
+async def emit_message_read(message_data: dict):
+    """Push a message marked read by its recipient to both participants"""
+    await sio.emit('message:updated', message_data, to=f"{USER_ROOM_PREFIX}{message_data['from_user_id']}")
+    await sio.emit('message:updated', message_data, to=f"{USER_ROOM_PREFIX}{message_data['to_user_id']}")
+    
+    # Update unread count for reader
+    await _emit_unread_update(message_data['to_user_id'])
+
+async def emit_messages_read(user_id: int, partner_id: int, message_ids: List[int]):
+    """Push messages from partner_id that user_id marked read"""
+    await sio.emit('message:bulk-updated', { 'message_ids': message_ids }, to=f"{USER_ROOM_PREFIX}{user_id}")
+    await sio.emit('message:bulk-updated', { 'message_ids': message_ids }, to=f"{USER_ROOM_PREFIX}{partner_id}")
+    
+    # Update unread count and threads for both users
+    await _emit_unread_update(user_id)
+    await _emit_unread_update(partner_id)
+    await _emit_threads_update(user_id)
+    await _emit_threads_update(partner_id)
+
 # Socket.IO Events
 @sio.event
 async def connect(sid, environ, auth):
@@ -131,261 +174,183 @@ async def disconnect(sid):
 @sio.on('message:send')
 async def handle_message_send(sid, data):
     session = await sio.get_session(sid)
-    db: Session = next(get_db())
-    from_user_id = _resolve_user_id(session, db)
-    to_user_id = int(data.get('to_user_id')) if data and data.get('to_user_id') is not None else None
-    content = (data.get('content') or '').strip()
-    if not from_user_id or not to_user_id or not content:
-        await sio.emit('message:error', { 'detail': 'Invalid payload' }, to=sid)
-        return
-    try:
-        # Authorization
-        current_user = db.query(UserInDB).filter(UserInDB.id == from_user_id).first()
-        if not current_user or not can_communicate_with_user(current_user, to_user_id, db):
-            await sio.emit('message:error', { 'detail': 'Access denied' }, to=sid)
+    async with AsyncSessionLocal() as db:
+        from_user_id = await _resolve_user_id(session, db)
+        to_user_id = int(data.get('to_user_id')) if data and data.get('to_user_id') is not None else None
+        content = (data.get('content') or '').strip()
+        if not from_user_id or not to_user_id or not content:
+            await sio.emit('message:error', { 'detail': 'Invalid payload' }, to=sid)
             return
-        
-        # Create message
-        new_message = Message(
-            from_user_id=from_user_id,
-            to_user_id=to_user_id,
-            content=content
-        )
-        db.add(new_message)
-        db.commit()
-        db.refresh(new_message)
-        
-        # Enrich with names
-        sender = db.query(UserInDB).filter(UserInDB.id == from_user_id).first()
-        recipient = db.query(UserInDB).filter(UserInDB.id == to_user_id).first()
-        
-        message_data = {
-            'id': new_message.id,
-            'from_user_id': new_message.from_user_id,
-            'to_user_id': new_message.to_user_id,
-            'content': new_message.content,
-            'is_read': new_message.is_read,
-            'created_at': new_message.created_at.isoformat(),
-            'sender_name': sender.name if sender else 'Unknown',
-            'recipient_name': recipient.name if recipient else 'Unknown'
-        }
-        
-        # Emit to both users
-        await sio.emit('message:new', message_data, to=f"{USER_ROOM_PREFIX}{from_user_id}")
-        await sio.emit('message:new', message_data, to=f"{USER_ROOM_PREFIX}{to_user_id}")
-        
-        # Update threads for both users
-        await _emit_threads_update(from_user_id)
-        await _emit_threads_update(to_user_id)
-        
-        # Update unread count for recipient
-        await _emit_unread_update(to_user_id)
-        
-        # Create notification
-        create_message_notification(new_message, db)
-        
-    except Exception as e:
-        logger.error(f"Error sending message: {e}")
-        await sio.emit('message:error', { 'detail': 'Internal server error' }, to=sid)
-    finally:
-        db.close()
+        try:
+            # Authorization
+            current_user = await db.get(UserInDB, from_user_id)
+            if not current_user or not await db.run_sync(
+                lambda s: can_communicate_with_user(current_user, to_user_id, s)
+            ):
+                await sio.emit('message:error', { 'detail': 'Access denied' }, to=sid)
+                return
+            
+            # Create message
+            new_message = Message(
+                from_user_id=from_user_id,
+                to_user_id=to_user_id,
+                content=content
+            )
+            db.add(new_message)
+            await db.commit()
+            await db.refresh(new_message)
+            
+            # Enrich with names
+            names = await _user_names(db, [from_user_id, to_user_id])
+            
+            message_data = {
+                'id': new_message.id,
+                'from_user_id': new_message.from_user_id,
+                'to_user_id': new_message.to_user_id,
+                'content': new_message.content,
+                'is_read': new_message.is_read,
+                'created_at': new_message.created_at.isoformat(),
+                'sender_name': names.get(from_user_id, 'Unknown'),
+                'recipient_name': names.get(to_user_id, 'Unknown')
+            }
+            
+            # Emit to both users
+            await emit_message_new(message_data)
+            
+            # Create notification
+            await db.run_sync(lambda s: create_message_notification(new_message, s))
+            
+        except Exception as e:
+            logger.error(f"Error sending message: {e}")
+            await sio.emit('message:error', { 'detail': 'Internal server error' }, to=sid)
 
 @sio.on('message:read')
 async def handle_message_read(sid, data):
     session = await sio.get_session(sid)
-    db: Session = next(get_db())
-    user_id = _resolve_user_id(session, db)
-    message_id = int(data.get('message_id')) if data and data.get('message_id') is not None else None
-    if not user_id or not message_id:
-        return
-    try:
-        msg = db.query(Message).filter(Message.id == message_id).first()
-        if not msg or msg.to_user_id != user_id:
+    async with AsyncSessionLocal() as db:
+        user_id = await _resolve_user_id(session, db)
+        message_id = int(data.get('message_id')) if data and data.get('message_id') is not None else None
+        if not user_id or not message_id:
             return
-        if not msg.is_read:
-            msg.is_read = True
-            db.commit()
-            
-            # Emit update to both users
-            message_data = {
-                'id': msg.id,
-                'from_user_id': msg.from_user_id,
-                'to_user_id': msg.to_user_id,
-                'content': msg.content,
-                'is_read': msg.is_read,
-                'created_at': msg.created_at.isoformat()
-            }
-            await sio.emit('message:updated', message_data, to=f"{USER_ROOM_PREFIX}{msg.from_user_id}")
-            await sio.emit('message:updated', message_data, to=f"{USER_ROOM_PREFIX}{msg.to_user_id}")
-            
-            # Update unread count for reader
-            await _emit_unread_update(user_id)
-    except Exception as e:
-        logger.error(f"Error marking message as read: {e}")
-    finally:
-        db.close()
+        try:
+            msg = await db.get(Message, message_id)
+            if not msg or msg.to_user_id != user_id:
+                return
+            if not msg.is_read:
+                msg.is_read = True
+                await db.commit()
+                
+                # Emit update to both users
+                message_data = {
+                    'id': msg.id,
+                    'from_user_id': msg.from_user_id,
+                    'to_user_id': msg.to_user_id,
+                    'content': msg.content,
+                    'is_read': msg.is_read,
+                    'created_at': msg.created_at.isoformat()
+                }
+                await emit_message_read(message_data)
+        except Exception as e:
+            logger.error(f"Error marking message as read: {e}")
 
 @sio.on('message:read-all')
 async def handle_message_read_all(sid, data):
     session = await sio.get_session(sid)
-    db: Session = next(get_db())
-    user_id = _resolve_user_id(session, db)
-    partner_id = int(data.get('partner_id')) if data and data.get('partner_id') is not None else None
-    if not user_id or not partner_id:
-        return
-    try:
-        msgs = db.query(Message).filter(
-            Message.from_user_id == partner_id,
-            Message.to_user_id == user_id,
-            Message.is_read == False
-        ).all()
-        
-        if msgs:
-            for m in msgs:
-                m.is_read = True
-            db.commit()
-            
-            # Emit bulk update to both users
-            message_ids = [msg.id for msg in msgs]
-            await sio.emit('message:bulk-updated', { 'message_ids': message_ids }, to=f"{USER_ROOM_PREFIX}{user_id}")
-            await sio.emit('message:bulk-updated', { 'message_ids': message_ids }, to=f"{USER_ROOM_PREFIX}{partner_id}")
+    async with AsyncSessionLocal() as db:
+        user_id = await _resolve_user_id(session, db)
+        partner_id = int(data.get('partner_id')) if data and data.get('partner_id') is not None else None
+        if not user_id or not partner_id:
+            return
+        try:
+            result = await db.execute(
+                update(Message)
+                .where(
+                    Message.from_user_id == partner_id,
+                    Message.to_user_id == user_id,
+                    Message.is_read == False
+                )
+                .values(is_read=True)
+                .returning(Message.id)
+                .execution_options(synchronize_session=False)
+            )
+            message_ids = list(result.scalars().all())
+            await db.commit()
             
-            # Update unread count and threads for both users
-            await _emit_unread_update(user_id)
-            await _emit_unread_update(partner_id)
-            await _emit_threads_update(user_id)
-            await _emit_threads_update(partner_id)
-    except Exception as e:
-        logger.error(f"Error marking all messages as read: {e}")
-    finally:
-        db.close()
+            if message_ids:
+                # Emit bulk update to both users
+                await emit_messages_read(user_id, partner_id, message_ids)
+        except Exception as e:
+            logger.error(f"Error marking all messages as read: {e}")
 
 @sio.on('threads:get')
 async def handle_threads_get(sid):
     session = await sio.get_session(sid)
-    db: Session = next(get_db())
-    user_id = _resolve_user_id(session, db)
-    if not user_id:
-        return []
-    try:
-        # Fetch messages involving the user
-        user_messages = db.query(Message).filter(
-            (Message.from_user_id == user_id) | (Message.to_user_id == user_id)
-        ).all()
-        
-        # Collect unique conversation partners
-        conversation_partners = set()
-        for message in user_messages:
-            if message.from_user_id == user_id:
-                conversation_partners.add(message.to_user_id)
-            else:
-                conversation_partners.add(message.from_user_id)
-        
-        # Prepare conversation data
-        conversations = []
-        for partner_id in conversation_partners:
-            partner = db.query(UserInDB).filter(UserInDB.id == partner_id).first()
-            if not partner:
-                continue
-            
-            # Last message in conversation
-            last_message = db.query(Message).filter(
-                or_(
-                    and_(Message.from_user_id == user_id, Message.to_user_id == partner_id),
-                    and_(Message.from_user_id == partner_id, Message.to_user_id == user_id)
-                )
-            ).order_by(desc(Message.created_at)).first()
-            
-            # Unread count from this partner
-            unread_count = db.query(Message).filter(
-                Message.from_user_id == partner_id,
-                Message.to_user_id == user_id,
-                Message.is_read == False
-            ).count()
+    async with AsyncSessionLocal() as db:
+        user_id = await _resolve_user_id(session, db)
+        if not user_id:
+            return []
+        try:
+            conversations = await db.run_sync(lambda s: get_conversation_summaries(user_id, s))
+            for conversation in conversations:
+                created_at = conversation["last_message"]["created_at"]
+                conversation["last_message"]["created_at"] = created_at.isoformat() if created_at else None
             
-            conversations.append({
-                "partner_id": partner_id,
-                "partner_name": partner.name,
-                "partner_role": partner.role,
-                "partner_avatar": partner.avatar_url,
-                "last_message": {
-                    "content": last_message.content if last_message else "",
-                    "created_at": last_message.created_at.isoformat() if last_message else None,
-                    "from_me": last_message.from_user_id == user_id if last_message else False
-                },
-                "unread_count": unread_count
-            })
-        
-        # Sort by last message time
-        conversations.sort(
-            key=lambda x: x["last_message"]["created_at"] or datetime.min.isoformat(),
-            reverse=True
-        )
-        
-        return conversations
-    except Exception as e:
-        logger.error(f"Error getting threads: {e}")
-        return []
-    finally:
-        db.close()
+            return conversations
+        except Exception as e:
+            logger.error(f"Error getting threads: {e}")
+            return []
 
 @sio.on('messages:get')
 async def handle_messages_get(sid, data):
     session = await sio.get_session(sid)
-    db: Session = next(get_db())
-    current_user_id = _resolve_user_id(session, db)
-    partner_id = int(data.get('with_user_id')) if data and data.get('with_user_id') is not None else None
-    if not current_user_id:
-        return []
-    try:
-        query = db.query(Message).filter(
-            (Message.from_user_id == current_user_id) | (Message.to_user_id == current_user_id)
-        )
-        if partner_id:
-            current_user = db.get(UserInDB, current_user_id)
-            if not can_communicate_with_user(current_user, partner_id, db):
-                return []
-            query = query.filter(
-                or_(
-                    and_(Message.from_user_id == current_user_id, Message.to_user_id == partner_id),
-                    and_(Message.from_user_id == partner_id, Message.to_user_id == current_user_id)
+    async with AsyncSessionLocal() as db:
+        current_user_id = await _resolve_user_id(session, db)
+        partner_id = int(data.get('with_user_id')) if data and data.get('with_user_id') is not None else None
+        if not current_user_id:
+            return []
+        try:
+            query = select(Message).where(
+                (Message.from_user_id == current_user_id) | (Message.to_user_id == current_user_id)
+            )
+            if partner_id:
+                current_user = await db.get(UserInDB, current_user_id)
+                if not await db.run_sync(lambda s: can_communicate_with_user(current_user, partner_id, s)):
+                    return []
+                query = query.where(
+                    or_(
+                        and_(Message.from_user_id == current_user_id, Message.to_user_id == partner_id),
+                        and_(Message.from_user_id == partner_id, Message.to_user_id == current_user_id)
+                    )
                 )
+            
+            result = await db.execute(query.order_by(desc(Message.created_at)).limit(50))
+            messages = result.scalars().all()
+            
+            # Enrich with names
+            names = await _user_names(
+                db, [m.from_user_id for m in messages] + [m.to_user_id for m in messages]
             )
-        
-        messages = query.order_by(desc(Message.created_at)).limit(50).all()
-        
-        # Enrich with names
-        enriched_messages = []
-        for message in messages:
-            sender = db.query(UserInDB).filter(UserInDB.id == message.from_user_id).first()
-            recipient = db.query(UserInDB).filter(UserInDB.id == message.to_user_id).first()
+            enriched_messages = []
+            for message in messages:
+                message_data = {
+                    'id': message.id,
+                    'from_user_id': message.from_user_id,
+                    'to_user_id': message.to_user_id,
+                    'content': message.content,
+                    'is_read': message.is_read,
+                    'created_at': message.created_at.isoformat(),
+                    'sender_name': names.get(message.from_user_id, 'Unknown'),
+                    'recipient_name': names.get(message.to_user_id, 'Unknown')
+                }
+                enriched_messages.append(message_data)
             
-            message_data = {
-                'id': message.id,
-                'from_user_id': message.from_user_id,
-                'to_user_id': message.to_user_id,
-                'content': message.content,
-                'is_read': message.is_read,
-                'created_at': message.created_at.isoformat(),
-                'sender_name': sender.name if sender else 'Unknown',
-                'recipient_name': recipient.name if recipient else 'Unknown'
-            }
-            enriched_messages.append(message_data)
-        
-        return enriched_messages
-    except Exception as e:
-        logger.error(f"Error getting messages: {e}")
-        return []
-    finally:
-        db.close()
+            return enriched_messages
+        except Exception as e:
+            logger.error(f"Error getting messages: {e}")
+            return []
 
-@sio.on('contacts:get')
-async def handle_contacts_get(sid, data=None):
-    session = await sio.get_session(sid)
-    db: Session = next(get_db())
-    current_user_id = _resolve_user_id(session, db)
-    if not current_user_id:
-        return []
+def _get_available_contacts(db: Session, current_user_id: int):
+    """Contacts the user may start a chat with (runs in the threadpool)"""
     try:
         current_user = db.query(UserInDB).filter(UserInDB.id == current_user_id).first()
         if not current_user:
@@ -583,28 +548,35 @@ async def handle_contacts_get(sid, data=None):
     except Exception as e:
         logger.error(f"Error getting contacts: {e}")
         return {"available_contacts": []}
-    finally:
-        db.close()
+
+@sio.on('contacts:get')
+async def handle_contacts_get(sid, data=None):
+    session = await sio.get_session(sid)
+    async with AsyncSessionLocal() as db:
+        current_user_id = await _resolve_user_id(session, db)
+    if not current_user_id:
+        return []
+    return await run_sync_db(_get_available_contacts, current_user_id)
 
 @sio.on('unread:count')
 async def handle_unread_count(sid):
     session = await sio.get_session(sid)
-    db: Session = next(get_db())
-    user_id = _resolve_user_id(session, db)
-    if not user_id:
-        return {"unread_count": 0}
-    try:
-        unread_count = db.query(Message).filter(
-            Message.to_user_id == user_id,
-            Message.is_read == False
-        ).count()
-        
-        return {"unread_count": unread_count}
-    except Exception as e:
-        logger.error(f"Error getting unread count: {e}")
-        return {"unread_count": 0}
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        user_id = await _resolve_user_id(session, db)
+        if not user_id:
+            return {"unread_count": 0}
+        try:
+            unread_count = await db.scalar(
+                select(func.count(Message.id)).where(
+                    Message.to_user_id == user_id,
+                    Message.is_read == False
+                )
+            )
+            
+            return {"unread_count": unread_count}
+        except Exception as e:
+            logger.error(f"Error getting unread count: {e}")
+            return {"unread_count": 0}
 
 def create_socket_app(app: FastAPI):
     """Create Socket.IO app wrapper"""
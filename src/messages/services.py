@@ -0,0 +1,93 @@
+"""
+Conversation index for the chat.
+
+The thread list used to load every message of the user and then run a user
+lookup, a "last message" query and an unread count per partner. Here the
+whole list comes from one windowed query: messages are tagged with the
+partner id, ``row_number()`` picks the newest message per partner and a
+windowed ``sum()`` counts unread ones. Both arms are served by the
+``(to_user_id, from_user_id, created_at)`` / ``(from_user_id, to_user_id,
+created_at)`` indexes on ``messages``.
+"""
+from typing import Any, Dict, List
+
+from sqlalchemy import case, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from src.schemas.models import Message, UserInDB
+
+
+def get_conversation_summaries(user_id: int, db: Session) -> List[Dict[str, Any]]:
+    """
+    Return one entry per conversation partner of ``user_id``, newest first.
+
+    ``last_message.created_at`` is a datetime; callers serialize it as needed.
+    """
+    sent = select(
+        Message.id,
+        Message.content,
+        Message.created_at,
+        Message.to_user_id.label("partner_id"),
+        literal(True).label("from_me"),
+        literal(0).label("unread"),
+    ).where(Message.from_user_id == user_id)
+
+    received = select(
+        Message.id,
+        Message.content,
+        Message.created_at,
+        Message.from_user_id.label("partner_id"),
+        literal(False).label("from_me"),
+        case((Message.is_read == False, 1), else_=0).label("unread"),
+    ).where(
+        Message.to_user_id == user_id,
+        Message.from_user_id != user_id,
+    )
+
+    user_messages = union_all(sent, received).subquery()
+
+    ranked = select(
+        user_messages.c.partner_id,
+        user_messages.c.content,
+        user_messages.c.created_at,
+        user_messages.c.from_me,
+        func.row_number().over(
+            partition_by=user_messages.c.partner_id,
+            order_by=(user_messages.c.created_at.desc(), user_messages.c.id.desc()),
+        ).label("rn"),
+        func.sum(user_messages.c.unread).over(
+            partition_by=user_messages.c.partner_id
+        ).label("unread_count"),
+    ).subquery()
+
+    rows = db.execute(
+        select(
+            ranked.c.partner_id,
+            ranked.c.content,
+            ranked.c.created_at,
+            ranked.c.from_me,
+            ranked.c.unread_count,
+            UserInDB.name,
+            UserInDB.role,
+            UserInDB.avatar_url,
+        )
+        .join(UserInDB, UserInDB.id == ranked.c.partner_id)
+        .where(ranked.c.rn == 1)
+        .order_by(ranked.c.created_at.desc().nulls_last())
+    ).all()
+
+    return [
+        {
+            "partner_id": row.partner_id,
+            "partner_name": row.name,
+            "partner_role": row.role,
+            "partner_avatar": row.avatar_url,
+            "last_message": {
+                "content": row.content,
+                "created_at": row.created_at,
+                "from_me": bool(row.from_me),
+            },
+            "unread_count": int(row.unread_count or 0),
+        }
+        for row in rows
+    ]
@@ -1,6 +1,6 @@
 from src.models.base import Base
 
-from src.auth.models import UserInDB, PointHistory
+from src.auth.models import UserInDB, PointHistory, PointTotal, CacheGeneration
 from src.courses.models import (
     Group, GroupStudent, Step, Course, CourseHeadTeacher,
     CourseGroupAccess, CourseTeacherAccess, Module, Lesson,
@@ -12,37 +12,41 @@ from src.assignments.models import (
 )
 from src.progress.models import (
     StudentProgress, StepProgress, ProgressSnapshot,
-    StudentCourseSummary, CourseAnalyticsCache, QuizAttempt,
+    StudentCourseSummary, CourseAnalyticsCache, QuizAttempt, QuizAttemptAnswer,
 )
 from src.events.models import (
     Event, EventGroup, EventCourse, EventParticipant,
-    MissedAttendanceLog, LessonSchedule, Attendance,
+    MissedAttendanceLog, LessonSchedule, Attendance, NotificationOutbox,
 )
 from src.messages.models import Message, Notification
 from src.gamification.models import (
     LeaderboardEntry, LeaderboardConfig, CuratorRating,
     DailyQuestionCompletion,
 )
-from src.content.models import FavoriteFlashcard, QuestionErrorReport
+from src.content.models import (
+    FavoriteFlashcard, QuestionErrorReport, DictionaryLookup,
+    StoredBlob, FileReference, UserBlobUsage, UserStorageUsage, StorageTotals,
+)
 from src.curator.models import CuratorTaskTemplate, CuratorTaskInstance
 from src.lesson_requests.models import LessonRequest
 
 __all__ = [
     "Base",
-    "UserInDB", "PointHistory",
+    "UserInDB", "PointHistory", "PointTotal", "CacheGeneration",
     "Group", "GroupStudent", "Step", "Course", "CourseHeadTeacher",
     "CourseGroupAccess", "CourseTeacherAccess", "Module", "Lesson",
     "LessonMaterial", "Enrollment", "ManualLessonUnlock",
     "Assignment", "AssignmentSubmission", "AssignmentLinkedLesson",
     "AssignmentExtension", "GroupAssignment", "AssignmentZeroSubmission",
     "StudentProgress", "StepProgress", "ProgressSnapshot",
-    "StudentCourseSummary", "CourseAnalyticsCache", "QuizAttempt",
+    "StudentCourseSummary", "CourseAnalyticsCache", "QuizAttempt", "QuizAttemptAnswer",
     "Event", "EventGroup", "EventCourse", "EventParticipant",
-    "MissedAttendanceLog", "LessonSchedule", "Attendance",
+    "MissedAttendanceLog", "LessonSchedule", "Attendance", "NotificationOutbox",
     "Message", "Notification",
     "LeaderboardEntry", "LeaderboardConfig", "CuratorRating",
     "DailyQuestionCompletion",
-    "FavoriteFlashcard", "QuestionErrorReport",
+    "FavoriteFlashcard", "QuestionErrorReport", "DictionaryLookup",
+    "StoredBlob", "FileReference", "UserBlobUsage", "UserStorageUsage", "StorageTotals",
     "CuratorTaskTemplate", "CuratorTaskInstance",
     "LessonRequest",
 ]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, Date, Boolean, ForeignKey, Text, UniqueConstraint, Index
+from sqlalchemy import Column, String, Integer, Float, DateTime, Date, Boolean, ForeignKey, Text, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, date, timezone
 
@@ -44,6 +44,7 @@ class StepProgress(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'step_id', name='uq_user_step_progress'),
+        Index('idx_step_progress_course_status', 'course_id', 'status'),
     )
 
 
@@ -115,6 +116,12 @@ class CourseAnalyticsCache(Base):
     total_lessons = Column(Integer, default=0)
     total_steps = Column(Integer, default=0)
     total_assignments = Column(Integer, default=0)
+    # Engagement totals, incremented on step visits and reconciled periodically
+    total_completed_steps = Column(Integer, default=0)
+    total_time_spent_minutes = Column(Integer, default=0)
+    # lesson_id (as string) -> number of steps
+    lesson_step_counts = Column(JSON, nullable=True)
+    # NULL means the row must be recalculated before it is served
     last_calculated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
@@ -150,3 +157,20 @@ class QuizAttempt(Base):
     course = relationship("Course")
     lesson = relationship("Lesson")
     grader = relationship("UserInDB", foreign_keys=[graded_by])
+
+
+class QuizAttemptAnswer(Base):
+    """One answered question of a finished quiz attempt, scored against the step's answer key"""
+    __tablename__ = "quiz_attempt_answers"
+    id = Column(Integer, primary_key=True, index=True)
+    attempt_id = Column(Integer, ForeignKey("quiz_attempts.id", ondelete="CASCADE"), nullable=False, index=True)
+    step_id = Column(Integer, ForeignKey("steps.id", ondelete="CASCADE"), nullable=False)
+    question_id = Column(String, nullable=False)
+    user_answer = Column(Text, nullable=True)  # JSON of the answer as submitted
+    is_correct = Column(Boolean, nullable=True)  # NULL when the question can't be auto-graded
+    error_score = Column(Float, nullable=True)  # 0.0 correct .. 1.0 wrong, partial for multi-gap answers
+    content_hash = Column(String(64), nullable=True)  # Step.content_hash the row was scored against
+
+    __table_args__ = (
+        Index('idx_quiz_attempt_answers_step_question', 'step_id', 'question_id'),
+    )
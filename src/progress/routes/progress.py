@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, desc, and_, select
+from sqlalchemy import func, desc, and_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta, date, timezone
 
-from src.config import get_db
+from src.config import get_db, get_async_db
 from src.schemas.models import (
     UserInDB, StudentProgress, Course, Module, Lesson, Step, 
     StepProgress, StepProgressSchema, StepProgressCreateSchema,
@@ -15,9 +18,12 @@ from src.schemas.models import (
     ManualLessonUnlock, ManualLessonUnlockSchema, ManualLessonUnlockCreateSchema,
     Group
 )
-from src.routes.auth import get_current_user_dependency
+from src.routes.auth import get_current_user_dependency, get_current_user_async
 from src.utils.permissions import check_course_access, check_student_access, require_teacher_or_admin
-from src.services.summary_cache import update_student_course_summary, update_summary_for_assignment
+from src.services.quiz_answers import record_attempt_answers
+from src.services.quiz_content import get_compiled_quiz, iter_answers
+from src.services.summary_cache import update_summary_for_assignment
+from src.services.step_visit_aggregator import emit_step_visit
 
 
 router = APIRouter()
@@ -26,7 +32,7 @@ router = APIRouter()
 # DAILY STREAK HELPER FUNCTIONS
 # =============================================================================
 
-def update_daily_streak(user: UserInDB, db: Session):
+def update_daily_streak(user: UserInDB, db: Session, activity_date: Optional[date] = None):
     """
     Update user's daily streak based on current activity.
     
@@ -34,12 +40,15 @@ def update_daily_streak(user: UserInDB, db: Session):
     - If user is active today and was active yesterday: increment streak
     - If user is active today but wasn't active yesterday: reset streak to 1
     - If user hasn't been active today yet: start/continue streak
+    
+    activity_date defaults to today; the step visit aggregator passes the day
+    the visit happened, which may be yesterday for a batch flushed after midnight.
     """
-    today = date.today()
+    today = activity_date or date.today()
     yesterday = today - timedelta(days=1)
     
-    # If user was already active today, don't update again
-    if user.last_activity_date == today:
+    # If user was already active today (or later), don't update again
+    if user.last_activity_date is not None and user.last_activity_date >= today:
         return
     
     # Calculate new streak based on previous last_activity_date
@@ -210,7 +219,7 @@ def create_progress_snapshot(user_id: int, course_id: int, db: Session):
 # =============================================================================
 
 @router.get("/my", response_model=List[ProgressSchema])
-async def get_my_progress(
+def get_my_progress(
     course_id: Optional[int] = None,
     lesson_id: Optional[int] = None,
     skip: int = Query(0, ge=0),
@@ -233,7 +242,7 @@ async def get_my_progress(
     return [ProgressSchema.from_orm(record) for record in progress_records]
 
 @router.get("/course/{course_id}")
-async def get_course_progress(
+def get_course_progress(
     course_id: int,
     student_id: Optional[int] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -351,7 +360,7 @@ async def get_course_progress(
     return course_progress
 
 @router.post("/lesson/{lesson_id}/complete")
-async def mark_lesson_complete(
+def mark_lesson_complete(
     lesson_id: int,
     time_spent: int = 0,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -406,7 +415,7 @@ async def mark_lesson_complete(
     return {"detail": "Lesson marked as complete", "time_spent": time_spent}
 
 @router.post("/lesson/{lesson_id}/start")
-async def start_lesson(
+def start_lesson(
     lesson_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -453,7 +462,7 @@ async def start_lesson(
     return {"detail": "Lesson started"}
 
 @router.get("/students", response_model=List[Dict[str, Any]])
-async def get_students_progress(
+def get_students_progress(
     course_id: Optional[int] = None,
     group_id: Optional[int] = None,
     skip: int = Query(0, ge=0),
@@ -576,7 +585,7 @@ async def get_students_progress(
     return students_progress
 
 @router.get("/analytics")
-async def get_progress_analytics(
+def get_progress_analytics(
     course_id: Optional[int] = None,
     time_range: int = Query(30, description="Days to analyze"),
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -696,7 +705,7 @@ async def get_progress_analytics(
     return analytics
 
 @router.get("/student/overview")
-async def get_student_progress_overview(
+def get_student_progress_overview(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -868,7 +877,7 @@ def get_student_group_teachers(student_id: int, db: Session) -> List[Dict[str, A
     return teachers
 
 @router.get("/student/{student_id}/overview")
-async def get_student_progress_overview_by_id(
+def get_student_progress_overview_by_id(
     student_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1034,7 +1043,7 @@ async def get_student_progress_overview_by_id(
 # =============================================================================
 
 @router.post("/step/{step_id}/start", response_model=StepProgressSchema)
-async def mark_step_started(
+def mark_step_started(
     step_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1099,14 +1108,33 @@ async def mark_step_started(
 async def mark_step_visited(
     step_id: int,
     step_data: StepProgressCreateSchema,
-    current_user: UserInDB = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
+    current_user: UserInDB = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Отметить шаг как посещенный"""
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Only students can mark steps as visited")
     
-    # Получаем информацию о шаге
+    # The access check is written against a sync Session; run_sync keeps its
+    # queries on the async connection instead of blocking the event loop
+    step_progress = await db.run_sync(
+        lambda session: record_step_visit(session, current_user, step_id, step_data)
+    )
+    
+    return StepProgressSchema.from_orm(step_progress)
+
+def record_step_visit(
+    db: Session,
+    current_user: UserInDB,
+    step_id: int,
+    step_data: StepProgressCreateSchema
+) -> StepProgress:
+    """
+    Mark the step completed for the student.
+    
+    Only the StepProgress row is written here. Streak, study time, course
+    summaries and snapshots are applied in batches by the step visit aggregator.
+    """
     # Получаем информацию о шаге, уроке и модуле одним запросом
     step = db.query(Step).options(
         joinedload(Step.lesson).joinedload(Lesson.module)
@@ -1127,73 +1155,77 @@ async def mark_step_visited(
     if not check_course_access(module.course_id, current_user, db):
         raise HTTPException(status_code=403, detail="Access denied to this step")
     
-    # Находим или создаем запись прогресса шага
-    step_progress = db.query(StepProgress).filter(
-        StepProgress.user_id == current_user.id,
-        StepProgress.step_id == step_id
-    ).first()
+    now = datetime.now(timezone.utc)
+    time_spent = step_data.time_spent_minutes or 0
     
-    if not step_progress:
-        # Создаем новую запись прогресса (если шаг завершается без предварительного старта)
-        step_progress = StepProgress(
-            user_id=current_user.id,
-            course_id=module.course_id,
-            lesson_id=lesson.id,
-            step_id=step_id,
-            status="completed",
-            started_at=datetime.now(timezone.utc),  # Устанавливаем время начала равным времени завершения
-            visited_at=datetime.now(timezone.utc),
-            completed_at=datetime.now(timezone.utc),
-            time_spent_minutes=step_data.time_spent_minutes
-        )
-        db.add(step_progress)
-    else:
-        # Обновляем существующую запись
-        step_progress.status = "completed"
-        step_progress.visited_at = datetime.now(timezone.utc)
-        step_progress.completed_at = datetime.now(timezone.utc)
-        
-        # Если не было времени начала, устанавливаем его
-        if step_progress.started_at is None:
-            step_progress.started_at = datetime.now(timezone.utc)
-        
-        if step_progress.time_spent_minutes is None:
-            step_progress.time_spent_minutes = 0
-        step_progress.time_spent_minutes += step_data.time_spent_minutes
-    
-    # Обновляем общее время изучения пользователя
-    if current_user.total_study_time_minutes is None:
-        current_user.total_study_time_minutes = 0
-    current_user.total_study_time_minutes += (step_data.time_spent_minutes or 0)
-    
-    # Обновляем daily streak при посещении шага
-    update_daily_streak(current_user, db)
-    
-    # Обновляем общий прогресс студента по курсу
-    # Обновляем общий прогресс в кэше (быстрее)
-    update_student_course_summary(
+    # Создаем запись или переводим существующую в "completed" (ON CONFLICT по
+    # uq_user_step_progress). Строка возвращается только если шаг завершен впервые.
+    insert_stmt = _dialect_insert(db)(StepProgress).values(
         user_id=current_user.id,
         course_id=module.course_id,
-        db=db,
-        step_completed=True,
-        time_spent_delta=step_data.time_spent_minutes,
         lesson_id=lesson.id,
-        lesson_title=lesson.title
+        step_id=step_id,
+        status="completed",
+        started_at=now,
+        visited_at=now,
+        completed_at=now,
+        time_spent_minutes=time_spent
     )
-    
-    # Обновляем старый StudentProgress для совместимости (пока не мигрировали всё)
-    update_student_progress(current_user.id, module.course_id, db)
-    
-    # Создаем снимок прогресса (если еще нет на сегодня)
-    create_progress_snapshot(current_user.id, module.course_id, db)
+    upsert = insert_stmt.on_conflict_do_update(
+        index_elements=[StepProgress.user_id, StepProgress.step_id],
+        set_={
+            "status": "completed",
+            "started_at": func.coalesce(StepProgress.started_at, insert_stmt.excluded.started_at),
+            "visited_at": insert_stmt.excluded.visited_at,
+            "completed_at": insert_stmt.excluded.completed_at,
+            "time_spent_minutes": func.coalesce(StepProgress.time_spent_minutes, 0) + time_spent,
+        },
+        where=StepProgress.status != "completed"
+    ).returning(StepProgress)
+    step_progress = db.scalars(
+        upsert, execution_options={"populate_existing": True}
+    ).first()
+    newly_completed = step_progress is not None
+    
+    if step_progress is None:
+        # Шаг уже был завершен - обновляем время посещения
+        step_progress = db.scalars(
+            update(StepProgress)
+            .where(
+                StepProgress.user_id == current_user.id,
+                StepProgress.step_id == step_id
+            )
+            .values(
+                visited_at=now,
+                completed_at=now,
+                time_spent_minutes=func.coalesce(StepProgress.time_spent_minutes, 0) + time_spent
+            )
+            .returning(StepProgress),
+            execution_options={"populate_existing": True}
+        ).first()
     
     db.commit()
-    db.refresh(step_progress)
     
-    return StepProgressSchema.from_orm(step_progress)
+    emit_step_visit(
+        user_id=current_user.id,
+        course_id=module.course_id,
+        lesson_id=lesson.id,
+        lesson_title=lesson.title,
+        time_spent_minutes=time_spent,
+        step_completed=newly_completed,
+        activity_date=date.today()
+    )
+    
+    return step_progress
+
+def _dialect_insert(db: Session):
+    """INSERT construct with ON CONFLICT support for the session's database"""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert
+    return pg_insert
 
 @router.get("/step/{step_id}", response_model=StepProgressSchema)
-async def get_step_progress(
+def get_step_progress(
     step_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1243,7 +1275,7 @@ async def get_step_progress(
     return StepProgressSchema.from_orm(step_progress)
 
 @router.get("/lesson/{lesson_id}/steps", response_model=List[StepProgressSchema])
-async def get_lesson_steps_progress(
+def get_lesson_steps_progress(
     lesson_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1317,7 +1349,7 @@ async def get_lesson_steps_progress(
     return steps_progress
 
 @router.get("/course/{course_id}/students/steps")
-async def get_course_students_steps_progress(
+def get_course_students_steps_progress(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1437,7 +1469,7 @@ def calculate_streak_multiplier(streak: int) -> float:
 
 
 @router.get("/my-streak")
-async def get_my_daily_streak(
+def get_my_daily_streak(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -1498,7 +1530,7 @@ async def get_my_daily_streak(
 # =============================================================================
 
 @router.post("/initialize-progress")
-async def initialize_progress(
+def initialize_progress(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
@@ -1550,7 +1582,7 @@ async def initialize_progress(
         raise HTTPException(status_code=500, detail=f"Failed to initialize progress: {str(e)}")
 
 @router.post("/recalculate-progress/{course_id}")
-async def recalculate_course_progress(
+def recalculate_course_progress(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1599,7 +1631,7 @@ async def recalculate_course_progress(
 # =============================================================================
 
 @router.post("/quiz-attempt", response_model=QuizAttemptSchema)
-async def create_quiz_attempt(
+def create_quiz_attempt(
     attempt_data: QuizAttemptCreateSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1650,6 +1682,7 @@ async def create_quiz_attempt(
                 existing_draft.completed_at = datetime.now(timezone.utc)
                 
                 # Points are awarded only for assignments, not quizzes
+                record_attempt_answers(db, existing_draft, replace=False)
             
             db.commit()
             db.refresh(existing_draft)
@@ -1676,6 +1709,9 @@ async def create_quiz_attempt(
         )
         
         db.add(quiz_attempt)
+        if not quiz_attempt.is_draft:
+            db.flush()
+            record_attempt_answers(db, quiz_attempt, replace=False)
         db.commit()
         db.refresh(quiz_attempt)
 
@@ -1689,7 +1725,7 @@ async def create_quiz_attempt(
 
 
 @router.patch("/quiz-attempts/{attempt_id}", response_model=QuizAttemptSchema)
-async def update_quiz_attempt(
+def update_quiz_attempt(
     attempt_id: int,
     update_data: QuizAttemptUpdateSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1729,6 +1765,8 @@ async def update_quiz_attempt(
                 attempt.is_graded = update_data.is_graded
         
         attempt.updated_at = datetime.now(timezone.utc)
+        if update_data.answers is not None or update_data.is_draft is False:
+            record_attempt_answers(db, attempt)
         db.commit()
         db.refresh(attempt)
         
@@ -1740,7 +1778,7 @@ async def update_quiz_attempt(
 
 
 @router.put("/quiz-attempts/{attempt_id}/grade", response_model=QuizAttemptSchema)
-async def grade_quiz_attempt(
+def grade_quiz_attempt(
     attempt_id: int,
     grade_data: QuizAttemptGradeSchema,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1776,7 +1814,7 @@ async def grade_quiz_attempt(
 
 
 @router.delete("/quiz-attempts/{attempt_id}")
-async def delete_quiz_attempt(
+def delete_quiz_attempt(
     attempt_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1804,7 +1842,7 @@ async def delete_quiz_attempt(
 
 
 @router.get("/quiz-attempts/step/{step_id}", response_model=List[QuizAttemptSchema])
-async def get_step_quiz_attempts(
+def get_step_quiz_attempts(
     step_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1819,7 +1857,7 @@ async def get_step_quiz_attempts(
 
 
 @router.get("/quiz-attempts/course/{course_id}", response_model=List[QuizAttemptSchema])
-async def get_course_quiz_attempts(
+def get_course_quiz_attempts(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1837,7 +1875,7 @@ async def get_course_quiz_attempts(
 
 
 @router.get("/quiz-attempts/analytics/course/{course_id}")
-async def get_course_quiz_analytics(
+def get_course_quiz_analytics(
     course_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -1909,7 +1947,7 @@ async def get_course_quiz_analytics(
 
 
 @router.get("/quiz-attempts/analytics/student/{student_id}")
-async def get_student_quiz_analytics(
+def get_student_quiz_analytics(
     student_id: int,
     course_id: Optional[int] = None,
     current_user: UserInDB = Depends(get_current_user_dependency),
@@ -1975,7 +2013,7 @@ async def get_student_quiz_analytics(
 
 
 @router.get("/lessons/{lesson_id}/quiz-summary")
-async def get_lesson_quiz_summary(
+def get_lesson_quiz_summary(
     lesson_id: int,
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
@@ -2028,14 +2066,9 @@ async def get_lesson_quiz_summary(
         
         # Parse quiz data to get title
         quiz_title = step.title
-        if step.content_text:
-            try:
-                import json
-                quiz_data = json.loads(step.content_text)
-                if 'title' in quiz_data:
-                    quiz_title = quiz_data['title']
-            except:
-                pass
+        quiz_data = get_compiled_quiz(step).content
+        if 'title' in quiz_data:
+            quiz_title = quiz_data['title']
         
         quiz_item = {
             "step_id": step.id,
@@ -2073,7 +2106,7 @@ async def get_lesson_quiz_summary(
 
 
 @router.get("/quiz-attempts/ungraded")
-async def get_ungraded_attempts(
+def get_ungraded_attempts(
     current_user: UserInDB = Depends(get_current_user_dependency),
     db: Session = Depends(get_db),
     graded: Optional[bool] = None  # None = ungraded only (default), True = graded only, False = ungraded only
@@ -2158,119 +2191,55 @@ async def get_ungraded_attempts(
         has_long_text = False
         
         if step and step.content_text:
-            import json
-            try:
-                content = json.loads(step.content_text) if isinstance(step.content_text, str) else step.content_text
-                questions = content.get('questions', [])
-                
-                # Check for global passage (for text_based quizzes)
-                global_passage = ''
-                if content.get('quiz_type') == 'text_based' or content.get('quiz_media_type') == 'text':
-                    global_passage = content.get('quiz_media_url', '')
-                
-                # Parse saved answers
-                answers_map = {}
-                if attempt.answers:
-                    try:
-                        parsed_answers = json.loads(attempt.answers) if isinstance(attempt.answers, str) else attempt.answers
-                        # Handle both array [[id, value], ...] and object {id: value} formats
-                        if isinstance(parsed_answers, list):
-                            answers_map = {str(item[0]): item[1] for item in parsed_answers if isinstance(item, list) and len(item) >= 2}
-                        elif isinstance(parsed_answers, dict):
-                            answers_map = {str(k): v for k, v in parsed_answers.items()}
-                    except Exception as e:
-                        print(f"Error parsing answers: {e}")
-                
-                # Process all questions
-                for q in questions:
-                    try:
-                        q_id = str(q.get('id', ''))
-                        q_type = q.get('question_type', 'single_choice')
-                        raw_answer = answers_map.get(q_id, '')
-                        
-                        student_answer_text = str(raw_answer)
-                        is_correct = False
-                        correct_answer_text = ""
-                        
-                        # Flag if this attempts has long text that needs grading
-                        if q_type == 'long_text':
-                            has_long_text = True
-                        
-                        # Resolve answer text for choice questions
-                        if q_type in ['single_choice', 'multiple_choice', 'media_question']:
-                            options = q.get('options', []) or []
-                            
-                            # Get correct answer text
-                            correct_idx = q.get('correct_answer')
-                            if isinstance(correct_idx, int) and 0 <= correct_idx < len(options):
-                                correct_answer_text = options[correct_idx].get('text', '')
-                            elif isinstance(correct_idx, list):
-                                correct_texts = []
-                                for idx in correct_idx:
-                                    if isinstance(idx, int) and 0 <= idx < len(options):
-                                        correct_texts.append(options[idx].get('text', ''))
-                                correct_answer_text = ", ".join(correct_texts)
-                                
-                            # Resolve student answer text and check correctness
-                            try:
-                                if q_type == 'multiple_choice':
-                                    # Answer might be list of indices
-                                    if isinstance(raw_answer, list):
-                                        selected_texts = []
-                                        for idx in raw_answer:
-                                            if isinstance(idx, int) and 0 <= idx < len(options):
-                                                selected_texts.append(options[idx].get('text', ''))
-                                        student_answer_text = ", ".join(selected_texts) if selected_texts else "No answer"
-                                        
-                                        if isinstance(correct_idx, list):
-                                            # Convert both to sets of integers for comparison to handle potential mixed types
-                                            raw_set = {int(x) for x in raw_answer if str(x).isdigit()}
-                                            correct_set = {int(x) for x in correct_idx if str(x).isdigit()}
-                                            is_correct = raw_set == correct_set
-                                else:
-                                    # Single choice, answer is index
-                                    idx = int(raw_answer) if str(raw_answer).isdigit() else -1
-                                    if 0 <= idx < len(options):
-                                        student_answer_text = options[idx].get('text', '')
-                                        is_correct = (idx == correct_idx)
-                                    else:
-                                        student_answer_text = "No answer" if not raw_answer else str(raw_answer)
-                            except Exception as e:
-                                print(f"Error resolving answer for Q {q_id}: {e}")
-                        
-                        elif q_type in ['short_answer', 'fill_blank', 'text_completion']:
-                            # Simple string comparison
-                             correct = q.get('correct_answer', '')
-                             correct_answer_text = str(correct)
-                             if isinstance(correct, list):
-                                 is_correct = str(raw_answer).strip().lower() in [str(a).strip().lower() for a in correct]
-                                 correct_answer_text = ", ".join([str(a) for a in correct])
-                             else:
-                                 is_correct = str(raw_answer).strip().lower() == str(correct).strip().lower()
-
-                        # Determine content text (passage)
-                        passage = q.get('content_text', '')
-                        if not passage and global_passage:
-                            passage = global_passage
-                            
-                        quiz_answers.append({
-                            "question_id": q_id,
-                            "question_text": q.get('question_text', 'No question text'),
-                            "question_type": q_type,
-                            "content_text": passage,  # Passage if exists
-                            "student_answer": student_answer_text,
-                            "is_correct": is_correct,
-                            "correct_answer": correct_answer_text,
-                            "max_points": q.get('points', 1)
-                        })
-                    except Exception as e:
-                        import traceback
-                        traceback.print_exc()
-                        print(f"Error parsing question {q.get('id')} in step {step.id}: {e}")
-                        # Continue to next question instead of failing entire quiz
-            except Exception as e:
-                print(f"Error parsing step content: {e}")
-        
+            quiz = get_compiled_quiz(step)
+            content = quiz.content
+            global_passage = quiz.global_passage
+
+            # Parse saved answers
+            answers_map = {}
+            if attempt.answers:
+                try:
+                    # Handle both array [[id, value], ...] and object {id: value} formats
+                    answers_map = {str(q_id): value for q_id, value in iter_answers(attempt.answers)}
+                except Exception as e:
+                    print(f"Error parsing answers: {e}")
+
+            # Process all questions
+            for question in quiz.questions:
+                try:
+                    q = question.data
+                    q_id = question.id if 'id' in q else ''
+                    q_type = q.get('question_type', 'single_choice')
+                    raw_answer = answers_map.get(q_id, '')
+
+                    # Flag if this attempts has long text that needs grading
+                    if q_type == 'long_text':
+                        has_long_text = True
+
+                    # Resolve answer text and correctness against the compiled key
+                    student_answer_text, is_correct = question.review(raw_answer)
+
+                    # Determine content text (passage)
+                    passage = q.get('content_text', '')
+                    if not passage and global_passage:
+                        passage = global_passage
+
+                    quiz_answers.append({
+                        "question_id": q_id,
+                        "question_text": q.get('question_text', 'No question text'),
+                        "question_type": q_type,
+                        "content_text": passage,  # Passage if exists
+                        "student_answer": student_answer_text,
+                        "is_correct": is_correct,
+                        "correct_answer": question.correct_answer_text,
+                        "max_points": q.get('points', 1)
+                    })
+                except Exception as e:
+                    import traceback
+                    traceback.print_exc()
+                    print(f"Error parsing question {q.get('id')} in step {step.id}: {e}")
+                    # Continue to next question instead of failing entire quiz
+
         # Only include attempts that need grading (have long text answers)
         # BUT return full context
         if has_long_text:
@@ -2299,7 +2268,7 @@ async def get_ungraded_attempts(
     return results
 
 @router.post("/manual-unlock", response_model=List[ManualLessonUnlockSchema])
-async def manual_unlock_lesson(
+def manual_unlock_lesson(
     unlock_data: ManualLessonUnlockCreateSchema,
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -2382,7 +2351,7 @@ async def manual_unlock_lesson(
     return results
 
 @router.post("/manual-lock")
-async def manual_lock_lesson(
+def manual_lock_lesson(
     lock_data: ManualLessonUnlockCreateSchema, # Reuse schema, but ignoring unlock_all
     current_user: UserInDB = Depends(require_teacher_or_admin()),
     db: Session = Depends(get_db)
@@ -2423,7 +2392,7 @@ async def manual_lock_lesson(
     return {"detail": "No manual unlock found"}
 
 @router.get("/manual-unlocks", response_model=List[ManualLessonUnlockSchema])
-async def get_manual_unlocks(
+def get_manual_unlocks(
     lesson_id: Optional[int] = None,
     user_id: Optional[int] = None,
     group_id: Optional[int] = None,
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session, joinedload, noload
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import func, desc, and_
 from typing import List, Optional
 import os
@@ -2252,8 +2253,10 @@ async def analyze_sat_image(
         # Use Gemini Parser
         from src.services.parser import parser_service
         
-        # Analyze the file
-        questions = await parser_service.parse_file(file_path, mime_type=image.content_type, correct_answers=correct_answers)
+        # Analyze the file (the Gemini client blocks, so it runs in the threadpool)
+        questions = await run_in_threadpool(
+            parser_service.parse_file, file_path, mime_type=image.content_type, correct_answers=correct_answers
+        )
         
         # If we got multiple questions, return the first one for now as the frontend expects a single result structure
         # OR update frontend to handle multiple. 
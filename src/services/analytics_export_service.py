@@ -0,0 +1,287 @@
+"""
+Streaming Excel export of course analytics.
+
+The export used to load every student, run per-student and per-assignment
+queries, build the whole workbook in memory and save it into a BytesIO, so a
+large course held a worker for tens of seconds and memory grew with the
+number of students.
+
+Here the course overview and group summaries come from a handful of
+aggregate queries, student ids are read with a server-side cursor
+(``yield_per``) and their metrics computed batch by batch with the set-based
+student analytics queries, and rows go straight into a write-only workbook
+saved to a spooled temporary file. Memory stays flat regardless of how many
+students the export covers.
+"""
+import os
+import tempfile
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+from sqlalchemy import distinct, func, or_, select
+from sqlalchemy.orm import Query, Session, aliased
+
+from src.config import SessionLocal
+from src.schemas.models import (
+    Course, Enrollment, Group, GroupStudent, Lesson, Module, Step, StepProgress, UserInDB,
+)
+from src.services.excel_export_service import get_excel_export_service
+from src.services.student_analytics_service import build_students_analytics
+
+# Students whose metrics are computed together
+EXCEL_EXPORT_BATCH_SIZE = int(os.getenv("EXCEL_EXPORT_BATCH_SIZE", "500"))
+# Exports up to this size stay in memory, larger ones roll over to disk
+EXCEL_EXPORT_SPOOL_MAX_BYTES = int(os.getenv("EXCEL_EXPORT_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+EXCEL_EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _course_step_user_ids(course_id: int, completed_only: bool = False):
+    query = select(StepProgress.user_id).join(
+        Step, StepProgress.step_id == Step.id
+    ).join(
+        Lesson, Step.lesson_id == Lesson.id
+    ).join(
+        Module, Lesson.module_id == Module.id
+    ).where(Module.course_id == course_id)
+    if completed_only:
+        query = query.where(StepProgress.status == "completed")
+    return query
+
+
+def course_students_query(db: Session, course_id: int) -> Query:
+    """Active students with progress in the course or an active enrollment"""
+    enrolled_ids = select(Enrollment.user_id).where(
+        Enrollment.course_id == course_id,
+        Enrollment.is_active == True
+    )
+    return db.query(UserInDB).filter(
+        UserInDB.role == "student",
+        UserInDB.is_active == True,
+        or_(UserInDB.id.in_(_course_step_user_ids(course_id)), UserInDB.id.in_(enrolled_ids))
+    )
+
+
+def group_students_query(db: Session, group_id: int) -> Query:
+    """Active members of a group"""
+    return db.query(UserInDB).join(GroupStudent, GroupStudent.student_id == UserInDB.id).filter(
+        GroupStudent.group_id == group_id,
+        UserInDB.is_active == True
+    )
+
+
+def course_structure(db: Session, course_id: int) -> Dict[str, int]:
+    """Module, lesson and step totals of a course in one round trip"""
+    course_modules = select(Module.id).where(Module.course_id == course_id)
+    course_lessons = select(Lesson.id).where(Lesson.module_id.in_(course_modules))
+    total_modules, total_lessons, total_steps = db.execute(select(
+        select(func.count(Module.id)).where(Module.course_id == course_id).scalar_subquery(),
+        select(func.count(Lesson.id)).where(Lesson.module_id.in_(course_modules)).scalar_subquery(),
+        select(func.count(Step.id)).where(Step.lesson_id.in_(course_lessons)).scalar_subquery(),
+    )).one()
+    return {"total_modules": total_modules, "total_lessons": total_lessons, "total_steps": total_steps}
+
+
+def course_overview(db: Session, course: Course, structure: Dict[str, int]) -> Dict[str, Any]:
+    """Course-level part of the overview sheet; student totals are added while rows stream"""
+    total_steps = structure["total_steps"]
+    enrolled_ids = course_students_query(db, course.id).with_entities(UserInDB.id).subquery()
+    enrolled_count, completed = db.execute(select(
+        select(func.count()).select_from(enrolled_ids).scalar_subquery(),
+        select(func.count(StepProgress.id)).join(
+            Step, StepProgress.step_id == Step.id
+        ).join(
+            Lesson, Step.lesson_id == Lesson.id
+        ).join(
+            Module, Lesson.module_id == Module.id
+        ).where(
+            Module.course_id == course.id,
+            StepProgress.status == "completed",
+            StepProgress.user_id.in_(select(enrolled_ids.c.id))
+        ).scalar_subquery(),
+    )).one()
+
+    # Mean over enrolled students of their completion percentage in the course
+    average_progress = 0
+    if enrolled_count and total_steps > 0:
+        average_progress = completed / total_steps * 100 / enrolled_count
+
+    return {
+        "course_name": course.title,
+        "average_progress": average_progress,
+        "total_modules": structure["total_modules"],
+        "total_lessons": structure["total_lessons"],
+        "total_steps": total_steps,
+        "total_assignments": 0,  # Can add this if needed
+    }
+
+
+def course_groups_summary(db: Session, course_id: int, total_steps: int) -> List[Dict[str, Any]]:
+    """Active groups with progress in the course and their average completion"""
+    teacher = aliased(UserInDB)
+    curator = aliased(UserInDB)
+    groups = db.query(Group.id, Group.name, teacher.name, curator.name).outerjoin(
+        teacher, teacher.id == Group.teacher_id
+    ).outerjoin(
+        curator, curator.id == Group.curator_id
+    ).filter(
+        Group.is_active == True,
+        Group.id.in_(
+            select(GroupStudent.group_id).where(GroupStudent.student_id.in_(_course_step_user_ids(course_id)))
+        )
+    ).order_by(Group.id).all()
+    if not groups:
+        return []
+
+    group_ids = [group_id for group_id, *_ in groups]
+    members = dict(
+        db.query(GroupStudent.group_id, func.count(distinct(UserInDB.id))).join(
+            UserInDB, UserInDB.id == GroupStudent.student_id
+        ).filter(
+            GroupStudent.group_id.in_(group_ids),
+            UserInDB.is_active == True
+        ).group_by(GroupStudent.group_id).all()
+    )
+    completed = dict(
+        db.query(GroupStudent.group_id, func.count(StepProgress.id)).join(
+            UserInDB, UserInDB.id == GroupStudent.student_id
+        ).join(
+            StepProgress, StepProgress.user_id == UserInDB.id
+        ).join(
+            Step, StepProgress.step_id == Step.id
+        ).join(
+            Lesson, Step.lesson_id == Lesson.id
+        ).join(
+            Module, Lesson.module_id == Module.id
+        ).filter(
+            GroupStudent.group_id.in_(group_ids),
+            UserInDB.is_active == True,
+            Module.course_id == course_id,
+            StepProgress.status == "completed"
+        ).group_by(GroupStudent.group_id).all()
+    )
+
+    summary = []
+    for group_id, group_name, teacher_name, curator_name in groups:
+        students_count = members.get(group_id, 0)
+        average_progress = 0
+        if students_count and total_steps > 0:
+            average_progress = completed.get(group_id, 0) / total_steps * 100 / students_count
+        summary.append({
+            "group_name": group_name,
+            "student_count": students_count,
+            "average_progress": average_progress,
+            "teacher_name": teacher_name,
+            "curator_name": curator_name,
+        })
+    return summary
+
+
+def iter_export_student_rows(
+    db: Session, students_query: Query, batch_size: int = EXCEL_EXPORT_BATCH_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """
+    Student rows of the progress sheet, ordered by name.
+
+    Ids are streamed from a server-side cursor; each batch of ids gets its
+    metrics from the set-based analytics queries and is released before the
+    next one is read.
+    """
+    ids = students_query.with_entities(UserInDB.id).order_by(None).order_by(
+        UserInDB.name, UserInDB.id
+    ).yield_per(batch_size)
+
+    batch: List[int] = []
+    for (student_id,) in ids:
+        batch.append(student_id)
+        if len(batch) >= batch_size:
+            yield from _format_batch(db, batch)
+            batch = []
+    if batch:
+        yield from _format_batch(db, batch)
+
+
+def _format_batch(db: Session, student_ids: List[int]) -> Iterator[Dict[str, Any]]:
+    batch_query = db.query(UserInDB).filter(UserInDB.id.in_(student_ids)).order_by(UserInDB.name, UserInDB.id)
+    for student in build_students_analytics(db, batch_query, include_last_lesson=False):
+        last_activity = student.get("last_activity_date")
+        yield {
+            "student_id": student["student_id"],
+            "student_name": student.get("student_name") or "N/A",
+            "email": student.get("student_email") or "N/A",
+            "groups": [g["name"] for g in student.get("groups", [])],
+            "progress_percentage": student.get("completion_percentage", 0),
+            "completed_steps": student.get("completed_steps", 0),
+            "total_steps": student.get("total_steps", 0),
+            "assignments_completed": student.get("completed_assignments", 0),
+            "total_assignments": student.get("total_assignments", 0),
+            "average_score": student.get("assignment_score_percentage", 0),
+            "total_study_time": student.get("total_study_time_minutes") or 0,
+            "current_streak": student.get("daily_streak") or 0,
+            "last_activity": str(last_activity) if last_activity else "Never",
+        }
+
+
+def write_course_analytics_workbook(
+    target: BinaryIO,
+    db: Session,
+    course: Course,
+    group: Optional[Group] = None,
+) -> int:
+    """Write the analytics workbook of a course (optionally one group) into ``target``"""
+    structure = course_structure(db, course.id)
+    overview = course_overview(db, course, structure)
+    if group is not None:
+        students_query = group_students_query(db, group.id)
+        groups_data = None
+    else:
+        students_query = course_students_query(db, course.id)
+        groups_data = course_groups_summary(db, course.id, structure["total_steps"])
+
+    return get_excel_export_service().write_streaming_analytics_workbook(
+        target,
+        course_name=course.title,
+        students_data=iter_export_student_rows(db, students_query, EXCEL_EXPORT_BATCH_SIZE),
+        course_overview=overview,
+        groups_data=groups_data,
+    )
+
+
+def write_course_analytics_export(
+    db: Session,
+    course: Course,
+    group: Optional[Group] = None,
+) -> tempfile.SpooledTemporaryFile:
+    """
+    Write the analytics workbook of a course (optionally one group) into a
+    spooled temporary file positioned at its start. The caller closes it.
+    """
+    target = tempfile.SpooledTemporaryFile(max_size=EXCEL_EXPORT_SPOOL_MAX_BYTES)
+    try:
+        write_course_analytics_workbook(target, db, course, group)
+        target.seek(0)
+    except Exception:
+        target.close()
+        raise
+    return target
+
+
+def render_course_analytics_export(target: BinaryIO, course_id: int, group_id: Optional[int] = None):
+    """Export job renderer: opens its own Session, so it can run in a worker process"""
+    db = SessionLocal()
+    try:
+        course = db.query(Course).filter(Course.id == course_id).one()
+        group = db.query(Group).filter(Group.id == group_id).one() if group_id else None
+        write_course_analytics_workbook(target, db, course, group)
+    finally:
+        db.close()
+
+
+def iter_file_chunks(fileobj, chunk_size: int = EXCEL_EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Read a file for a StreamingResponse and close it when done"""
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
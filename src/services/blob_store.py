@@ -0,0 +1,518 @@
+"""
+Blob Store
+Reference-counted, content-addressed uploads with per-user quotas.
+
+media_storage keeps each distinct upload once on disk (``.blobs/<sha256>``)
+and links the public path to it, but nothing recorded who used which blob:
+a blob stayed on disk after its last upload was deleted, students could
+resubmit without limit, and the only way to see how much space uploads
+take was to walk the tree. Now:
+
+- every stored upload gets a ``file_references`` row (public path, blob,
+  owner: step, material, submission, ...; uploader) and its blob's
+  ``ref_count`` goes up
+- the rows that use uploads (steps, materials, assignments, submissions,
+  course thumbnails) take ownership of the references their URLs point at
+  and drop them when a URL is replaced or the row is deleted, including
+  rows deleted by an ORM cascade (mapper events below)
+- a user is charged once per distinct blob (``user_blob_usage``), so
+  resubmitting the same file under new names does not use up the quota;
+  ``user_storage_usage`` and the single ``storage_totals`` row are kept in
+  the same transaction, so quotas and the storage report are primary-key
+  reads instead of a filesystem walk
+- uploads that would take a user past their quota are refused before
+  anything is written
+- ``BlobCollector`` (one leader process) releases submission uploads no
+  submission took within PENDING_UPLOAD_TTL_SECONDS, deletes blobs that
+  have been unreferenced for BLOB_GC_GRACE_SECONDS, plus blob and temp
+  files no row knows about, which are left behind by uploads that failed
+  before commit
+
+Old URLs keep working: the public path is still a file, and when it is
+missing ``resolve_reference`` maps it to its blob. ``adopt_file`` brings
+files stored before the blob store into it (scripts/migrate_uploads_to_blob_store.py).
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Union
+
+from sqlalchemy import Connection, and_, delete, event, inspect, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.config import SessionLocal
+from src.schemas.models import (
+    Assignment, AssignmentSubmission, Course, FileReference, LessonMaterial, Step, StorageTotals, StoredBlob,
+    UserBlobUsage, UserInDB, UserStorageUsage,
+)
+from src.services import media_storage
+from src.services.leader_lock import LeaderLock
+from src.services.media_storage import StoredFile
+
+logger = logging.getLogger(__name__)
+
+# Bytes of uploads a user may reference; 0 means unlimited. Admins have no quota.
+MEDIA_STUDENT_QUOTA_BYTES = int(os.getenv("MEDIA_STUDENT_QUOTA_BYTES", str(500 * 1024 * 1024)))
+MEDIA_STAFF_QUOTA_BYTES = int(os.getenv("MEDIA_STAFF_QUOTA_BYTES", str(5 * 1024 * 1024 * 1024)))
+BLOB_GC_INTERVAL = int(os.getenv("BLOB_GC_INTERVAL", "3600"))
+# Covers uploads between writing their blob and committing their reference
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "86400"))
+# Submission uploads no submission has taken by then are released
+PENDING_UPLOAD_TTL_SECONDS = int(os.getenv("PENDING_UPLOAD_TTL_SECONDS", str(7 * 86400)))
+BLOB_GC_BATCH_SIZE = 500
+
+_TOTALS_ID = 1
+
+
+class QuotaExceeded(Exception):
+    """The upload would take the user past their storage quota"""
+
+    def __init__(self, used: int, quota: int, incoming: int):
+        super().__init__(f"Storage quota exceeded: {used} + {incoming} > {quota} bytes")
+        self.used = used
+        self.quota = quota
+        self.incoming = incoming
+
+
+def _dialect_insert(db: Union[Session, Connection]):
+    dialect = db.dialect if isinstance(db, Connection) else db.get_bind().dialect
+    if dialect.name == "sqlite":
+        return sqlite_insert
+    return pg_insert
+
+
+def _reference_path(path: Union[str, Path]) -> str:
+    """Uploads-relative path of a filesystem path or ``/uploads/...`` URL"""
+    path = str(path)
+    if path.startswith("/uploads/"):
+        return path[len("/uploads/"):]
+    return media_storage.relative_upload_path(path)
+
+
+# --- Counters ---------------------------------------------------------------
+
+def _bump_totals(db: Session, logical: int = 0, references: int = 0, physical: int = 0, blobs: int = 0) -> None:
+    stmt = _dialect_insert(db)(StorageTotals).values(
+        id=_TOTALS_ID, logical_bytes=logical, reference_count=references, physical_bytes=physical, blob_count=blobs
+    )
+    db.execute(stmt.on_conflict_do_update(index_elements=["id"], set_={
+        "logical_bytes": StorageTotals.logical_bytes + logical,
+        "reference_count": StorageTotals.reference_count + references,
+        "physical_bytes": StorageTotals.physical_bytes + physical,
+        "blob_count": StorageTotals.blob_count + blobs,
+    }))
+
+
+def _bump_usage(db: Session, user_id: Optional[int], size: int, files: int) -> None:
+    if user_id is None:
+        return
+    stmt = _dialect_insert(db)(UserStorageUsage).values(user_id=user_id, bytes_used=size, file_count=files)
+    db.execute(stmt.on_conflict_do_update(index_elements=["user_id"], set_={
+        "bytes_used": UserStorageUsage.bytes_used + size,
+        "file_count": UserStorageUsage.file_count + files,
+    }))
+
+
+def _hold_blob(db: Session, user_id: Optional[int], blob_id: int, size: int) -> None:
+    """Count an upload of ``user_id`` pointing at a blob; the first one charges its size"""
+    if user_id is None:
+        return
+    stmt = _dialect_insert(db)(UserBlobUsage).values(user_id=user_id, blob_id=blob_id, ref_count=1)
+    db.execute(stmt.on_conflict_do_update(index_elements=["user_id", "blob_id"], set_={
+        "ref_count": UserBlobUsage.ref_count + 1,
+    }))
+    held = db.execute(select(UserBlobUsage.ref_count).where(
+        UserBlobUsage.user_id == user_id, UserBlobUsage.blob_id == blob_id
+    )).scalar()
+    _bump_usage(db, user_id, size if held == 1 else 0, 1)
+
+
+def _drop_hold(db: Session, user_id: Optional[int], blob_id: int, size: int) -> None:
+    """Undo ``_hold_blob``; the last upload pointing at the blob gives its size back"""
+    if user_id is None:
+        return
+    held = (UserBlobUsage.user_id == user_id, UserBlobUsage.blob_id == blob_id)
+    db.execute(update(UserBlobUsage).where(*held).values(ref_count=UserBlobUsage.ref_count - 1))
+    released = db.execute(delete(UserBlobUsage).where(*held, UserBlobUsage.ref_count <= 0)).rowcount
+    _bump_usage(db, user_id, -size if released else 0, -1)
+
+
+# --- Quota ------------------------------------------------------------------
+
+def quota_for(user: UserInDB) -> Optional[int]:
+    """Quota in bytes, or None when unlimited"""
+    if user.role == "admin":
+        return None
+    quota = MEDIA_STUDENT_QUOTA_BYTES if user.role == "student" else MEDIA_STAFF_QUOTA_BYTES
+    return quota or None
+
+
+def usage_of(db: Session, user_id: int) -> int:
+    used = db.query(UserStorageUsage.bytes_used).filter(UserStorageUsage.user_id == user_id).scalar()
+    return int(used or 0)
+
+
+def check_quota(db: Session, user: UserInDB, incoming: Optional[int], replacing: Union[str, Path, None] = None) -> None:
+    """
+    Raise QuotaExceeded if ``incoming`` more bytes would pass the user's
+    quota; an upload at ``replacing`` that the user owns is not counted
+    twice (unless another of their uploads shares its blob)
+    """
+    quota = quota_for(user)
+    if quota is None or incoming is None:
+        return
+    used = usage_of(db, user.id)
+    if replacing is not None:
+        used -= db.query(FileReference.size_bytes).join(UserBlobUsage, and_(
+            UserBlobUsage.user_id == FileReference.uploaded_by, UserBlobUsage.blob_id == FileReference.blob_id
+        )).filter(
+            FileReference.path == _reference_path(replacing), FileReference.uploaded_by == user.id,
+            UserBlobUsage.ref_count == 1,
+        ).scalar() or 0
+    if used + incoming > quota:
+        raise QuotaExceeded(used, quota, incoming)
+
+
+# --- References -------------------------------------------------------------
+
+def _acquire_blob(db: Session, digest: str, size: int) -> int:
+    """Take a reference on the blob row for ``digest``, creating it if needed; returns its id"""
+    for _ in range(2):
+        inserted = db.execute(
+            _dialect_insert(db)(StoredBlob).values(
+                sha256=digest, size_bytes=size, ref_count=0, created_at=datetime.now(timezone.utc)
+            ).on_conflict_do_nothing(index_elements=["sha256"])
+        ).rowcount
+        if inserted:
+            _bump_totals(db, physical=size, blobs=1)
+        # The collector may delete the row between the two statements; then insert again
+        if db.execute(
+            update(StoredBlob).where(StoredBlob.sha256 == digest).values(
+                ref_count=StoredBlob.ref_count + 1, unreferenced_at=None
+            )
+        ).rowcount:
+            return db.execute(select(StoredBlob.id).where(StoredBlob.sha256 == digest)).scalar()
+    raise RuntimeError(f"Could not reference blob {digest}")
+
+
+def _release_blob(db: Session, blob_id: int) -> None:
+    db.execute(update(StoredBlob).where(StoredBlob.id == blob_id).values(ref_count=StoredBlob.ref_count - 1))
+    db.execute(update(StoredBlob).where(StoredBlob.id == blob_id, StoredBlob.ref_count <= 0).values(
+        ref_count=0, unreferenced_at=datetime.now(timezone.utc)
+    ))
+
+
+def attach(db: Session, stored: StoredFile, owner_type: str, owner_id: Optional[int] = None,
+           uploaded_by: Optional[int] = None) -> None:
+    """
+    Record the upload at ``stored.path`` (replacing any earlier reference to
+    that path, whose owner it keeps). Without ``owner_id`` the reference goes
+    to the first row that stores its URL. Does not commit.
+    """
+    path = _reference_path(stored.path)
+    if owner_id is None:
+        # Re-uploading a path a row already uses (e.g. a resubmitted file name): that
+        # row's URL does not change, so nothing would claim the new reference back
+        owner = db.execute(select(FileReference.owner_type, FileReference.owner_id).where(
+            FileReference.path == path, FileReference.owner_id.isnot(None)
+        )).first()
+        if owner is not None:
+            owner_type, owner_id = owner
+    _detach_where(db, FileReference.path == path)
+    blob_id = _acquire_blob(db, stored.sha256, stored.size)
+    db.execute(insert(FileReference).values(path=path, blob_id=blob_id, size_bytes=stored.size,
+                                            owner_type=owner_type, owner_id=owner_id, uploaded_by=uploaded_by))
+    _hold_blob(db, uploaded_by, blob_id, stored.size)
+    _bump_totals(db, logical=stored.size, references=1)
+    # The blob file may have been collected while its row was unreferenced
+    media_storage.ensure_blob(stored.path, stored.sha256)
+
+
+def detach(db: Session, path: Union[str, Path]) -> bool:
+    """Drop the reference for an upload path or ``/uploads/...`` URL. Does not commit."""
+    return bool(_detach_where(db, FileReference.path == _reference_path(path)))
+
+
+def _detach_where(db: Union[Session, Connection], *criteria) -> List[str]:
+    """Drop the references matching ``criteria``; returns their paths"""
+    rows = db.execute(select(
+        FileReference.id, FileReference.path, FileReference.blob_id, FileReference.size_bytes,
+        FileReference.uploaded_by,
+    ).where(*criteria)).all()
+    if not rows:
+        return []
+    db.execute(delete(FileReference).where(FileReference.id.in_([row.id for row in rows])))
+    for row in rows:
+        _release_blob(db, row.blob_id)
+        _drop_hold(db, row.uploaded_by, row.blob_id, row.size_bytes)
+    _bump_totals(db, logical=-sum(row.size_bytes for row in rows), references=-len(rows))
+    return [row.path for row in rows]
+
+
+def resolve_reference(db: Session, path: Union[str, Path]) -> Optional[Path]:
+    """The blob file behind an upload path whose own file is gone, if any"""
+    digest = db.query(StoredBlob.sha256).join(FileReference, FileReference.blob_id == StoredBlob.id).filter(
+        FileReference.path == _reference_path(path)
+    ).scalar()
+    if digest is None:
+        return None
+    blob = media_storage.blob_path(digest)
+    return blob if blob.is_file() else None
+
+
+def adopt_file(db: Session, path: Union[str, Path], owner_type: str, owner_id: Optional[int] = None,
+               uploaded_by: Optional[int] = None) -> None:
+    """Move an existing upload into the blob store and reference it (for files stored before it)"""
+    path = Path(path)
+    hasher = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(media_storage.MEDIA_UPLOAD_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+    blob = media_storage.blob_path(digest)
+    if blob.exists():
+        if not blob.samefile(path):
+            media_storage.link_into_place(blob, path)
+    else:
+        media_storage.ensure_blob(path, digest)
+    attach(db, StoredFile(path, path.stat().st_size, digest, True), owner_type, owner_id, uploaded_by)
+
+
+# --- Owners -----------------------------------------------------------------
+# Uploads are stored before the row using them exists (and submissions are
+# uploaded before they are submitted), so rows take their references when
+# they are written. Mapper events run inside the flush, for rows deleted by
+# an ORM cascade too.
+
+_UPLOAD_URL = re.compile(r"/uploads/([^\s\"'<>?#]+)")
+
+# Model -> (owner type, columns that may hold upload URLs)
+_OWNERS = {
+    Step: ("step", ("attachments",)),
+    LessonMaterial: ("material", ("file_url",)),
+    Assignment: ("assignment", ("file_url",)),
+    AssignmentSubmission: ("submission", ("file_url", "answers")),
+    Course: ("course_thumbnail", ("cover_image_url",)),
+}
+
+
+def _paths_in(values: Iterable) -> Set[str]:
+    return {path for value in values if isinstance(value, str) for path in _UPLOAD_URL.findall(value)}
+
+
+def _claim(connection: Connection, owner_type: str, owner_id: int, paths: Set[str]) -> None:
+    """Give the unowned references at ``paths`` to the row now using them"""
+    if paths:
+        connection.execute(update(FileReference).where(
+            FileReference.path.in_(paths), FileReference.owner_id.is_(None)
+        ).values(owner_type=owner_type, owner_id=owner_id))
+
+
+def _claim_on_insert(mapper, connection, target):
+    owner_type, columns = _OWNERS[mapper.class_]
+    _claim(connection, owner_type, target.id, _paths_in(getattr(target, column) for column in columns))
+
+
+def _swap_on_update(mapper, connection, target):
+    owner_type, columns = _OWNERS[mapper.class_]
+    state = inspect(target)
+    histories = [state.attrs[column].history for column in columns]
+    if not any(history.has_changes() for history in histories):
+        return
+    # The old values are not in the history when the row was expired before the change
+    current = _paths_in(getattr(target, column) for column in columns)
+    _claim(connection, owner_type, target.id, current)
+    _detach_where(connection, FileReference.owner_type == owner_type, FileReference.owner_id == target.id,
+                  FileReference.path.notin_(current))
+
+
+def _detach_on_delete(mapper, connection, target):
+    owner_type, _ = _OWNERS[mapper.class_]
+    _detach_where(connection, FileReference.owner_type == owner_type, FileReference.owner_id == target.id)
+
+
+def _claim_submitted(db: Session, reference_ids: List[int]) -> None:
+    """Give unowned submission uploads a submission still points at to that submission"""
+    for reference_id, path in db.execute(select(FileReference.id, FileReference.path).where(
+            FileReference.id.in_(reference_ids))).all():
+        url = f"/uploads/{path}"
+        submission_id = db.execute(select(AssignmentSubmission.id).where(or_(
+            AssignmentSubmission.file_url == url, AssignmentSubmission.answers.contains(url)
+        )).order_by(AssignmentSubmission.id).limit(1)).scalar()
+        if submission_id is not None:
+            db.execute(update(FileReference).where(
+                FileReference.id == reference_id, FileReference.owner_id.is_(None)
+            ).values(owner_type="submission", owner_id=submission_id))
+
+
+for _model in _OWNERS:
+    event.listen(_model, "after_insert", _claim_on_insert)
+    event.listen(_model, "after_update", _swap_on_update)
+    event.listen(_model, "after_delete", _detach_on_delete)
+
+
+# --- Report -----------------------------------------------------------------
+
+def storage_report(db: Session, top: int = 10) -> dict:
+    """Store-wide totals and the largest uploaders"""
+    totals = db.get(StorageTotals, _TOTALS_ID)
+    logical = int(totals.logical_bytes) if totals else 0
+    physical = int(totals.physical_bytes) if totals else 0
+    uploaders = db.query(UserStorageUsage.user_id, UserInDB.name, UserStorageUsage.bytes_used,
+                         UserStorageUsage.file_count).join(
+        UserInDB, UserInDB.id == UserStorageUsage.user_id
+    ).order_by(UserStorageUsage.bytes_used.desc()).limit(top).all()
+    return {
+        "logical_bytes": logical,
+        "physical_bytes": physical,
+        "saved_bytes": logical - physical,
+        "reference_count": int(totals.reference_count) if totals else 0,
+        "blob_count": int(totals.blob_count) if totals else 0,
+        "top_uploaders": [
+            {"user_id": user_id, "name": name, "bytes_used": int(used), "file_count": count}
+            for user_id, name, used, count in uploaders
+        ],
+    }
+
+
+# --- Garbage collection -----------------------------------------------------
+
+class BlobCollector:
+    """Background job releasing abandoned uploads and deleting blobs nothing references"""
+
+    def __init__(self, check_interval: int = BLOB_GC_INTERVAL, grace_seconds: int = BLOB_GC_GRACE_SECONDS,
+                 session_factory=SessionLocal, pending_ttl: int = PENDING_UPLOAD_TTL_SECONDS):
+        self.check_interval = check_interval
+        self.grace_seconds = grace_seconds
+        self.pending_ttl = pending_ttl
+        self.session_factory = session_factory
+        self.leader = LeaderLock("blob_collector")
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            logger.warning("Blob collector is already running")
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info("Blob collector started")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.leader.release()
+        logger.info("Blob collector stopped")
+
+    def _run(self):
+        logger.info(f"[BLOBS] Blob collector started (interval: {self.check_interval}s)")
+        while self.running:
+            try:
+                if self.leader.is_leader():
+                    self.collect()
+            except Exception as e:
+                logger.error(f"[BLOBS] Error collecting blobs: {e}", exc_info=True)
+            time.sleep(self.check_interval)
+
+    def collect(self) -> int:
+        """Delete unreferenced blobs and stray files older than the grace period. Returns how many."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace_seconds)
+        db = self.session_factory()
+        removed = 0
+        try:
+            released = self._release_pending_uploads(db)
+            if released:
+                logger.info(f"[BLOBS] Released {released} submission uploads nothing submitted")
+            while True:
+                rows = db.query(StoredBlob.id, StoredBlob.sha256, StoredBlob.size_bytes).filter(
+                    StoredBlob.ref_count == 0, StoredBlob.unreferenced_at < cutoff
+                ).limit(BLOB_GC_BATCH_SIZE).all()
+                if not rows:
+                    break
+                collected = []
+                for blob_id, digest, size in rows:
+                    # Skipped if an upload took a reference since the query
+                    if db.query(StoredBlob).filter(StoredBlob.id == blob_id, StoredBlob.ref_count == 0).delete(
+                            synchronize_session=False):
+                        _bump_totals(db, physical=-size, blobs=-1)
+                        collected.append(digest)
+                db.commit()
+                for digest in collected:
+                    media_storage.remove_blob(digest)
+                removed += len(collected)
+                if len(rows) < BLOB_GC_BATCH_SIZE:
+                    break
+            removed += self._remove_stray_files(db, cutoff.timestamp())
+        finally:
+            db.close()
+        if removed:
+            logger.info(f"[BLOBS] Removed {removed} unreferenced blobs")
+        return removed
+
+    def _release_pending_uploads(self, db: Session) -> int:
+        """Drop submission uploads no submission took within pending_ttl, with their public files"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.pending_ttl)
+        pending = (FileReference.owner_type == "submission", FileReference.owner_id.is_(None))
+        released = 0
+        while True:
+            ids = db.execute(select(FileReference.id).where(*pending, FileReference.created_at < cutoff).limit(
+                BLOB_GC_BATCH_SIZE)).scalars().all()
+            if not ids:
+                break
+            _claim_submitted(db, ids)
+            # Skipped if a submission took it since the query
+            paths = _detach_where(db, FileReference.id.in_(ids), *pending)
+            db.commit()
+            for path in paths:
+                (Path(media_storage.MEDIA_UPLOAD_ROOT) / path).unlink(missing_ok=True)
+            released += len(paths)
+            if len(ids) < BLOB_GC_BATCH_SIZE:
+                break
+        return released
+
+    def _remove_stray_files(self, db: Session, older_than: float) -> int:
+        stale, removed = {}, 0
+        for digest, path, mtime in media_storage.iter_blob_files():
+            if mtime >= older_than:
+                continue
+            if digest is None:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                stale[digest] = path
+        digests = list(stale)
+        for start in range(0, len(digests), BLOB_GC_BATCH_SIZE):
+            batch = digests[start:start + BLOB_GC_BATCH_SIZE]
+            known = {d for (d,) in db.query(StoredBlob.sha256).filter(StoredBlob.sha256.in_(batch))}
+            for digest in batch:
+                if digest not in known:
+                    stale[digest].unlink(missing_ok=True)
+                    removed += 1
+        return removed
+
+
+_collector: Optional[BlobCollector] = None
+
+
+def get_collector() -> BlobCollector:
+    global _collector
+    if _collector is None:
+        _collector = BlobCollector()
+    return _collector
+
+
+def start_blob_collector():
+    get_collector().start()
+
+
+def stop_blob_collector():
+    get_collector().stop()
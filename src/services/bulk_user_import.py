@@ -0,0 +1,287 @@
+"""
+Bulk User Import
+Creates a batch of users with a handful of statements.
+
+The bulk endpoints used to create users one at a time: an email lookup, a
+bcrypt hash (~250 ms of CPU) on the request thread, a student id uniqueness
+loop and per-group lookups for every row. A batch now:
+
+- looks up taken emails, student ids and the target groups in one query each
+- hashes all passwords across a process pool
+- inserts the users with INSERT ... RETURNING and their group memberships
+  with one executemany INSERT, inside a savepoint
+
+Rows that cannot be created are reported as before, as {"email", "error"}.
+If the batch insert hits a unique constraint (a user registered since the
+lookups), the savepoint is rolled back and the batch is inserted row by row,
+so only the rows that collide are reported.
+"""
+import logging
+import multiprocessing
+import os
+import secrets
+import string
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.schemas.models import Group, GroupStudent, UserInDB
+from src.utils.auth_utils import hash_password
+
+logger = logging.getLogger(__name__)
+
+BULK_IMPORT_HASH_PROCESSES = int(os.getenv("BULK_IMPORT_HASH_PROCESSES", str(os.cpu_count() or 2)))
+# Smaller batches are hashed in the calling thread
+BULK_IMPORT_MIN_POOL_BATCH = int(os.getenv("BULK_IMPORT_MIN_POOL_BATCH", "4"))
+# Inserts tried per row after a batch conflict (a generated student id is redrawn)
+_ROW_ATTEMPTS = 3
+
+EMAIL_TAKEN = "Email already registered"
+STUDENT_ID_TAKEN = "Student ID already registered"
+
+
+def generate_password(length: int = 8) -> str:
+    """Generate a random password"""
+    characters = string.ascii_letters + string.digits
+    return ''.join(secrets.choice(characters) for _ in range(length))
+
+
+def generate_student_id() -> str:
+    """Generate a unique student ID"""
+    return f"STU{secrets.randbelow(100000):05d}"
+
+
+class ImportRow:
+    """One user of a bulk import"""
+
+    __slots__ = (
+        "email", "name", "password", "generated_password", "role", "student_id",
+        "is_active", "onboarding_completed", "group_ids", "student_id_generated",
+    )
+
+    def __init__(
+        self,
+        email: str,
+        name: str,
+        password: Optional[str] = None,
+        role: str = "student",
+        student_id: Optional[str] = None,
+        is_active: bool = True,
+        onboarding_completed: bool = False,
+        group_ids: Optional[List[int]] = None,
+        return_password: bool = True,
+    ):
+        self.email = email.lower()
+        self.name = name
+        # Rows without a password get a random one, returned only if asked for
+        self.password = password or generate_password()
+        self.generated_password = self.password if not password and return_password else None
+        self.role = role
+        self.student_id = student_id
+        self.student_id_generated = False
+        self.is_active = is_active
+        self.onboarding_completed = onboarding_completed
+        self.group_ids = group_ids or []
+
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(
+                max_workers=BULK_IMPORT_HASH_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _hash_pool
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """bcrypt-hash passwords in parallel, in input order"""
+    if len(passwords) < BULK_IMPORT_MIN_POOL_BATCH:
+        return [hash_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (BULK_IMPORT_HASH_PROCESSES * 4))
+    return list(_get_hash_pool().map(hash_password, passwords, chunksize=chunksize))
+
+
+def stop_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+def _assign_student_ids(db: Session, rows: List[ImportRow]) -> Dict[int, str]:
+    """
+    Give students without an id a free one. Returns the rows (by index) whose
+    explicit id is already taken.
+    """
+    explicit = [(index, row) for index, row in enumerate(rows) if row.student_id]
+    generated = [row for row in rows if row.role == "student" and not row.student_id]
+    # Distinct within the batch, so only ids already in the database cost another lookup
+    drawn: Set[str] = {row.student_id for _, row in explicit}
+
+    def draw() -> str:
+        student_id = generate_student_id()
+        while student_id in drawn:
+            student_id = generate_student_id()
+        drawn.add(student_id)
+        return student_id
+
+    for row in generated:
+        row.student_id = draw()
+        row.student_id_generated = True
+
+    taken: Set[str] = set()
+    candidates = [row.student_id for _, row in explicit] + [row.student_id for row in generated]
+    if candidates:
+        taken = set(db.scalars(select(UserInDB.student_id).where(UserInDB.student_id.in_(candidates))))
+
+    failed: Dict[int, str] = {}
+    used: Set[str] = set()
+    for index, row in explicit:
+        if row.student_id in taken or row.student_id in used:
+            failed[index] = STUDENT_ID_TAKEN
+        else:
+            used.add(row.student_id)
+
+    # Regenerate colliding ids until every generated one is free
+    pending = generated
+    while pending:
+        retry = []
+        for row in pending:
+            if row.student_id in taken or row.student_id in used:
+                row.student_id = draw()
+                retry.append(row)
+            else:
+                used.add(row.student_id)
+        if retry:
+            taken |= set(db.scalars(
+                select(UserInDB.student_id).where(UserInDB.student_id.in_([row.student_id for row in retry]))
+            ))
+        pending = retry
+    return failed
+
+
+def import_users(db: Session, rows: List[ImportRow]) -> Tuple[List[Tuple[UserInDB, Optional[str]]], List[dict]]:
+    """
+    Create users and their group memberships in the current transaction.
+
+    Returns ``(created, failed)``: ``(user, generated_password)`` pairs in
+    input order and ``{"email", "error"}`` for rows that were skipped. The
+    caller commits.
+    """
+    failed: List[dict] = []
+    if not rows:
+        return [], failed
+
+    taken_emails = set(db.scalars(select(UserInDB.email).where(UserInDB.email.in_({row.email for row in rows}))))
+    accepted: List[ImportRow] = []
+    for row in rows:
+        if row.email in taken_emails:
+            failed.append({"email": row.email, "error": EMAIL_TAKEN})
+            continue
+        taken_emails.add(row.email)
+        accepted.append(row)
+
+    student_id_errors = _assign_student_ids(db, accepted)
+    for index, error in student_id_errors.items():
+        failed.append({"email": accepted[index].email, "error": error})
+    accepted = [row for index, row in enumerate(accepted) if index not in student_id_errors]
+    if not accepted:
+        return [], failed
+
+    requested_groups = {group_id for row in accepted if row.role == "student" for group_id in row.group_ids}
+    existing_groups: Set[int] = set()
+    if requested_groups:
+        existing_groups = set(db.scalars(select(Group.id).where(Group.id.in_(requested_groups))))
+
+    hashes = hash_passwords([row.password for row in accepted])
+
+    values = [
+        {
+            "email": row.email,
+            "name": row.name,
+            "hashed_password": hashed,
+            "role": row.role,
+            "student_id": row.student_id,
+            "is_active": row.is_active,
+            "onboarding_completed": row.onboarding_completed,
+        }
+        for row, hashed in zip(accepted, hashes)
+    ]
+
+    try:
+        with db.begin_nested():
+            users = _insert_batch(db, accepted, values, existing_groups)
+    except IntegrityError as e:
+        # Someone registered one of the emails or ids since the lookups above
+        logger.warning(f"[ADMIN] Bulk user import of {len(accepted)} rows conflicted, inserting row by row: {e.orig}")
+        accepted, users = _insert_row_by_row(db, accepted, values, existing_groups, failed)
+
+    for user in users:
+        # New users manage no courses; spares UserSchema a lazy load per user
+        set_committed_value(user, "managed_courses", [])
+    return [(user, row.generated_password) for row, user in zip(accepted, users)], failed
+
+
+def _insert_batch(db: Session, rows: List[ImportRow], values: List[dict], existing_groups: Set[int]) -> List[UserInDB]:
+    """Insert users and their memberships; returns the users in row order"""
+    # RETURNING order is not guaranteed for batched inserts; emails are unique
+    by_email = {user.email: user for user in db.scalars(insert(UserInDB).returning(UserInDB), values)}
+    users = [by_email[value["email"]] for value in values]
+
+    memberships = [
+        {"group_id": group_id, "student_id": user.id}
+        for row, user in zip(rows, users)
+        if row.role == "student"
+        for group_id in dict.fromkeys(row.group_ids)
+        if group_id in existing_groups
+    ]
+    if memberships:
+        db.execute(insert(GroupStudent), memberships)
+    return users
+
+
+def _insert_row_by_row(
+    db: Session, rows: List[ImportRow], values: List[dict], existing_groups: Set[int], failed: List[dict],
+) -> Tuple[List[ImportRow], List[UserInDB]]:
+    """Insert each row in its own savepoint; rows that collide go to ``failed``"""
+    created_rows: List[ImportRow] = []
+    users: List[UserInDB] = []
+    for row, value in zip(rows, values):
+        for attempt in range(_ROW_ATTEMPTS):
+            try:
+                with db.begin_nested():
+                    users.extend(_insert_batch(db, [row], [value], existing_groups))
+                created_rows.append(row)
+                break
+            except IntegrityError:
+                error = _conflict_error(db, row)
+                # A generated student id that was taken meanwhile is drawn again
+                if error == STUDENT_ID_TAKEN and row.student_id_generated and attempt + 1 < _ROW_ATTEMPTS:
+                    row.student_id = value["student_id"] = generate_student_id()
+                    continue
+                failed.append({"email": row.email, "error": error})
+                break
+    return created_rows, users
+
+
+def _conflict_error(db: Session, row: ImportRow) -> str:
+    """Which unique value of ``row`` is taken, as reported to the caller"""
+    if db.scalar(select(UserInDB.id).where(UserInDB.email == row.email).limit(1)) is not None:
+        return EMAIL_TAKEN
+    if row.student_id and db.scalar(
+        select(UserInDB.id).where(UserInDB.student_id == row.student_id).limit(1)
+    ) is not None:
+        return STUDENT_ID_TAKEN
+    return "User could not be created"
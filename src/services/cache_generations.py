@@ -0,0 +1,90 @@
+"""
+Cache Generations
+Cross-worker invalidation for caches kept in each worker process.
+
+The access index and other per-process caches were cleared by session
+events after a commit that changed their source rows, but only in the
+worker that committed; the other uvicorn workers kept serving the old entry
+until its TTL ran out. Now:
+
+- writers ``mark`` a cache name on their session (from the same
+  before_flush / do_orm_execute hooks that detect the change); when the
+  transaction commits, its row in ``cache_generations`` is bumped in that
+  same transaction
+- readers tag what they cache with ``generation(db, name)`` and rebuild an
+  entry whose tag is no longer current
+
+A generation is read (by primary key) the first time a transaction asks
+for it and remembered until that transaction ends, so a request sees every
+commit that finished before it started, in every worker.
+"""
+from typing import Dict, Iterable
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.schemas.models import CacheGeneration
+
+_MARKS = "cache_generations_marked"
+_SEEN = "cache_generations_seen"
+
+
+def _dialect_insert(db: Session):
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert
+    return pg_insert
+
+
+def mark(session: Session, name: str) -> None:
+    """Bump ``name`` when the session's current transaction commits"""
+    session.info.setdefault(_MARKS, set()).add(name)
+
+
+def generations(db: Session, names: Iterable[str], refresh: bool = False) -> Dict[str, int]:
+    """
+    Current generations of ``names`` as seen by the session's transaction.
+    ``refresh`` reads them again instead of using the remembered values.
+    """
+    names = tuple(names)
+    seen: Dict[str, int] = db.info.setdefault(_SEEN, {})
+    missing = list(names) if refresh else [name for name in names if name not in seen]
+    if missing:
+        found = dict(db.execute(
+            select(CacheGeneration.name, CacheGeneration.generation).where(CacheGeneration.name.in_(missing))
+        ).all())
+        seen.update((name, found.get(name, 0)) for name in missing)
+    return {name: seen[name] for name in names}
+
+
+def generation(db: Session, name: str) -> int:
+    """Current generation of ``name`` as seen by the session's transaction"""
+    return generations(db, (name,))[name]
+
+
+def bump(db: Session, name: str) -> None:
+    """Bump ``name`` now, inside the session's transaction"""
+    stmt = _dialect_insert(db)(CacheGeneration).values(name=name, generation=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["name"], set_={"generation": CacheGeneration.generation + 1}
+    ))
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_marked(session):
+    # The commit's own flush runs after this hook; flush first so changes
+    # still pending in the session get marked too
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    marks = session.info.pop(_MARKS, None)
+    # Sorted, so concurrent commits lock the rows in the same order
+    for name in sorted(marks or ()):
+        bump(session, name)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_MARKS, None)
+        session.info.pop(_SEEN, None)
@@ -0,0 +1,268 @@
+"""
+Calendar Feed Cache
+Read model for the /events/my and /events/calendar feeds.
+
+The mobile app polls both endpoints. Each request used to resolve the
+user's groups and courses, run the multi-join event query, expand recurring
+events and deduplicate, even when nothing had changed. Now:
+
+- a built feed is stored serialized, per user and window (the query
+  parameters), with a strong ETag (hash of the body)
+- ``If-None-Match`` polls that match are answered with 304 straight from
+  the cache, without touching the database
+- every feed is tagged with the groups, courses and user it was built from,
+  and each tag has a cache generation (see src.services.cache_generations);
+  a committed write to events, their group/course links, participants,
+  lesson schedules, assignments or memberships bumps the generations of the
+  affected tags (bulk writes bump one that every feed carries)
+- a cached feed is served, or answered with 304, only while the generations
+  of its tags are the ones it was built under; they are read with one
+  primary-key query per request, so an edit committed by any worker is seen
+  by the next poll on every worker
+- feeds expire after CALENDAR_FEED_TTL_SECONDS, and "upcoming" feeds as soon
+  as their first item starts
+
+The ETag stays the hash of the body: a rebuilt feed whose content did not
+change still revalidates with 304.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from cachetools import TTLCache
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import event, inspect, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from src.events.schemas import EventSchema
+from src.schemas.models import (
+    Assignment, Course, CourseGroupAccess, Enrollment, Event, EventCourse, EventGroup,
+    EventParticipant, Group, GroupStudent, LessonSchedule,
+)
+from src.services import cache_generations
+
+CALENDAR_FEED_TTL_SECONDS = int(os.getenv("CALENDAR_FEED_TTL_SECONDS", "300"))
+CALENDAR_FEED_MAX_SIZE = int(os.getenv("CALENDAR_FEED_MAX_SIZE", "4096"))
+
+# Bumped by every write to a feed source; a feed built across one is not stored
+CACHE_NAME = "calendar"
+
+Tag = Tuple[Hashable, ...]
+
+ADMIN_TAG: Tag = ("admin",)
+CALENDAR_TAG: Tag = ("calendar",)
+# Carried by every feed; bumped by bulk writes, whose rows are not known
+_ALL: Tag = ("all",)
+
+_feed_adapter = TypeAdapter(List[EventSchema])
+
+
+def tag_cache_name(tag: Tag) -> str:
+    return ":".join((CACHE_NAME, *map(str, tag)))
+
+
+class CachedFeed:
+    __slots__ = ("body", "etag", "expires_at", "stamp")
+
+    def __init__(self, body: bytes, expires_at: float, stamp: Dict[str, int]):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.expires_at = expires_at
+        # Generations of the feed's tags it was built under
+        self.stamp = stamp
+
+
+class FeedTags:
+    """What a feed was built from; filled by the route while it builds"""
+
+    def __init__(self):
+        self.tags: Set[Tag] = {_ALL}
+        self.expires_at = time.monotonic() + CALENDAR_FEED_TTL_SECONDS
+
+    def user(self, user_id: int):
+        self.tags.add(("user", user_id))
+
+    def groups(self, group_ids: Iterable[int]):
+        self.tags.update(("group", group_id) for group_id in group_ids)
+
+    def courses(self, course_ids: Iterable[int]):
+        self.tags.update(("course", course_id) for course_id in course_ids)
+
+    def add(self, tag: Tag):
+        self.tags.add(tag)
+
+    def expire_at(self, moment: Optional[datetime]):
+        """Expire the feed once ``moment`` (naive UTC) has passed"""
+        if moment is None:
+            return
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        remaining = (moment - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+        self.expires_at = min(self.expires_at, time.monotonic() + max(remaining, 0))
+
+
+_feeds: TTLCache = TTLCache(maxsize=CALENDAR_FEED_MAX_SIZE, ttl=CALENDAR_FEED_TTL_SECONDS)
+_lock = threading.Lock()
+
+
+def render_feed(items: list) -> bytes:
+    """The body FastAPI would send for ``List[EventSchema]``"""
+    content = _feed_adapter.dump_python(items, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    candidates = (value.strip() for value in if_none_match.split(","))
+    return any(value.removeprefix("W/") == etag for value in candidates)
+
+
+def _get(db: Session, key: Hashable) -> Optional[CachedFeed]:
+    with _lock:
+        feed = _feeds.get(key)
+        if feed is not None and feed.expires_at <= time.monotonic():
+            _feeds.pop(key, None)
+            return None
+    if feed is None or cache_generations.generations(db, feed.stamp) != feed.stamp:
+        return None
+    return feed
+
+
+def _build(db: Session, key: Hashable, build: Callable[[FeedTags], list]) -> CachedFeed:
+    started = cache_generations.generation(db, CACHE_NAME)
+    tags = FeedTags()
+    items = build(tags)
+    names = sorted(tag_cache_name(tag) for tag in tags.tags)
+    # Read again rather than from this transaction's memo: a write committed
+    # while the feed was built must not be stamped onto the old content
+    current = cache_generations.generations(db, (CACHE_NAME, *names), refresh=True)
+    feed = CachedFeed(render_feed(items), tags.expires_at, {name: current[name] for name in names})
+    if current[CACHE_NAME] == started:
+        with _lock:
+            _feeds[key] = feed
+    return feed
+
+
+def feed_response(request: Request, db: Session, key: Hashable, build: Callable[[FeedTags], list]) -> Response:
+    """
+    Serve a feed from the cache, building it with ``build`` on a miss or
+    when a source of the cached one has changed since it was built.
+    Answers 304 when the client already has the current version.
+    """
+    feed = _get(db, key) or _build(db, key, build)
+
+    headers = {"ETag": feed.etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, feed.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=feed.body, media_type="application/json", headers=headers)
+
+
+def invalidate_calendar_feeds() -> None:
+    """Drop every feed cached by this process"""
+    with _lock:
+        _feeds.clear()
+
+
+# --- Invalidation -----------------------------------------------------------
+# Feed inputs are written from admin, curator, event, assignment and
+# enrollment routes, so changes are collected per session at flush time and
+# the generations of the affected tags are bumped when the transaction
+# commits (see src.services.cache_generations).
+
+_SOURCE_TABLES = frozenset(model.__tablename__ for model in (
+    Event, EventGroup, EventCourse, EventParticipant, LessonSchedule, Assignment,
+    GroupStudent, Enrollment, CourseGroupAccess, Group, Course,
+))
+
+
+def _values(obj, attr: str) -> Set:
+    """Current and previous values of a column"""
+    history = inspect(obj).attrs[attr].history
+    return {value for value in (*history.added, *history.unchanged, *history.deleted) if value is not None}
+
+
+def _event_tags(connection, event_ids: Set[int]) -> Set[Tag]:
+    """Group, course and teacher tags of events, as stored before this flush"""
+    rows = connection.execute(union_all(
+        select(literal("group"), EventGroup.group_id).where(EventGroup.event_id.in_(event_ids)),
+        select(literal("course"), EventCourse.course_id).where(EventCourse.event_id.in_(event_ids)),
+        select(literal("user"), Event.teacher_id).where(Event.id.in_(event_ids), Event.teacher_id.isnot(None)),
+    ))
+    return {(kind, value) for kind, value in rows}
+
+
+def _tags_of(obj, is_new: bool, is_deleted: bool, event_ids: Set[int]) -> Set[Tag]:
+    """Tags of the feeds ``obj`` shows up in; events whose links decide it go to ``event_ids``"""
+    if isinstance(obj, Event):
+        if not is_new:
+            # Visible through its EventGroup/EventCourse rows; a new one through those flushed with it
+            event_ids |= _values(obj, "id")
+        return {("user", teacher_id) for teacher_id in _values(obj, "teacher_id")}
+    if isinstance(obj, (EventGroup, EventCourse, EventParticipant)):
+        event_ids |= _values(obj, "event_id")
+        if isinstance(obj, EventGroup):
+            return {("group", group_id) for group_id in _values(obj, "group_id")}
+        if isinstance(obj, EventCourse):
+            return {("course", course_id) for course_id in _values(obj, "course_id")}
+        return set()
+    if isinstance(obj, LessonSchedule):
+        return {("group", group_id) for group_id in _values(obj, "group_id")}
+    if isinstance(obj, Assignment):
+        tags = {("group", group_id) for group_id in _values(obj, "group_id")}
+        # Course assignments are found through their lesson; calendars look them up per request
+        if _values(obj, "lesson_id"):
+            tags.add(CALENDAR_TAG)
+        return tags
+    if isinstance(obj, GroupStudent):
+        return {("user", student_id) for student_id in _values(obj, "student_id")}
+    if isinstance(obj, Enrollment):
+        return {("user", user_id) for user_id in _values(obj, "user_id")}
+    if isinstance(obj, CourseGroupAccess):
+        return {("group", group_id) for group_id in _values(obj, "group_id")}
+    if isinstance(obj, Group):
+        tags = {("user", user_id) for attr in ("teacher_id", "curator_id") for user_id in _values(obj, attr)}
+        tags.update(("group", group_id) for group_id in _values(obj, "id"))
+        if is_new or is_deleted:
+            tags.add(ADMIN_TAG)
+        return tags
+    if isinstance(obj, Course):
+        return {ADMIN_TAG} if is_new or is_deleted else set()
+    return set()
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_dirty_feeds(session, flush_context, instances):
+    tags: Set[Tag] = set()
+    event_ids: Set[int] = set()
+    for obj in session.new:
+        tags |= _tags_of(obj, True, False, event_ids)
+    for obj in session.dirty:
+        tags |= _tags_of(obj, False, False, event_ids)
+    for obj in session.deleted:
+        tags |= _tags_of(obj, False, True, event_ids)
+    if event_ids:
+        tags |= _event_tags(session.connection(), event_ids)
+    if not tags:
+        return
+    cache_generations.mark(session, CACHE_NAME)
+    for tag in tags:
+        cache_generations.mark(session, tag_cache_name(tag))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dirty_on_bulk_write(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    for mapper in orm_execute_state.all_mappers:
+        if mapper.local_table.name in _SOURCE_TABLES:
+            cache_generations.mark(orm_execute_state.session, CACHE_NAME)
+            cache_generations.mark(orm_execute_state.session, tag_cache_name(_ALL))
+            return
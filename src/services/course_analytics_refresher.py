@@ -0,0 +1,114 @@
+"""
+Course Analytics Refresher
+Periodically reconciles CourseAnalyticsCache with the raw progress tables.
+
+Step visits update the cached totals incrementally; this job recalculates
+every active course whose cache is missing, marked stale, or older than the
+refresh interval, so drift from other write paths (admin progress edits,
+deleted steps, enrollment changes) is corrected. Only one worker (the
+``LeaderLock`` holder) runs it.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import or_
+
+from src.config import SessionLocal
+from src.schemas.models import Course, CourseAnalyticsCache
+from src.services.leader_lock import LeaderLock
+from src.services.summary_cache import refresh_course_analytics_cache
+
+logger = logging.getLogger(__name__)
+
+COURSE_ANALYTICS_REFRESH_INTERVAL = int(os.getenv("COURSE_ANALYTICS_REFRESH_INTERVAL", "900"))
+
+
+class CourseAnalyticsRefresher:
+    """Background job that keeps course analytics caches reconciled"""
+
+    def __init__(self, check_interval: int = COURSE_ANALYTICS_REFRESH_INTERVAL):
+        self.check_interval = check_interval
+        self.leader = LeaderLock("course_analytics_refresher")
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            logger.warning("Course analytics refresher is already running")
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info("Course analytics refresher started")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.leader.release()
+        logger.info("Course analytics refresher stopped")
+
+    def _run(self):
+        logger.info(f"[ANALYTICS] Course analytics refresher started (interval: {self.check_interval}s)")
+        while self.running:
+            try:
+                if self.leader.is_leader():
+                    self.reconcile()
+            except Exception as e:
+                logger.error(f"[ANALYTICS] Error reconciling course analytics: {e}", exc_info=True)
+            time.sleep(self.check_interval)
+
+    def _courses_to_refresh(self, db) -> List[int]:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.check_interval)
+        rows = db.query(Course.id).outerjoin(
+            CourseAnalyticsCache, CourseAnalyticsCache.course_id == Course.id
+        ).filter(
+            Course.is_active == True,
+            or_(
+                CourseAnalyticsCache.id.is_(None),
+                CourseAnalyticsCache.last_calculated_at.is_(None),
+                CourseAnalyticsCache.last_calculated_at < cutoff,
+            )
+        ).all()
+        return [course_id for (course_id,) in rows]
+
+    def reconcile(self) -> int:
+        """Recalculate stale course caches. Returns the number refreshed."""
+        db = SessionLocal()
+        refreshed = 0
+        try:
+            for course_id in self._courses_to_refresh(db):
+                try:
+                    refresh_course_analytics_cache(course_id, db)
+                    db.commit()
+                    refreshed += 1
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"[ANALYTICS] Failed to refresh course {course_id}: {e}")
+            if refreshed:
+                logger.info(f"[ANALYTICS] Reconciled analytics for {refreshed} courses")
+        finally:
+            db.close()
+        return refreshed
+
+
+_refresher: Optional[CourseAnalyticsRefresher] = None
+
+
+def get_refresher() -> CourseAnalyticsRefresher:
+    global _refresher
+    if _refresher is None:
+        _refresher = CourseAnalyticsRefresher()
+    return _refresher
+
+
+def start_course_analytics_refresher():
+    get_refresher().start()
+
+
+def stop_course_analytics_refresher():
+    get_refresher().stop()
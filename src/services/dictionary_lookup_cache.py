@@ -0,0 +1,182 @@
+"""
+Dictionary Lookup Cache
+Shared cache of /ai-tools/lookup results.
+
+Every lookup used to be a Gemini call, although students in a class look up
+the same SAT words in the same passages. Results are now cached under the
+normalized word plus a fingerprint of the context sentence:
+
+- an in-process LRU answers repeat lookups without touching the database
+- the dictionary_lookups table shares results between workers and restarts
+- concurrent lookups of the same key wait for one in-flight call
+  (single-flight) instead of each calling Gemini
+
+Entries older than DICTIONARY_CACHE_TTL_DAYS are fetched again.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cachetools import LRUCache
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.config import SessionLocal
+from src.schemas.models import DictionaryLookup
+
+logger = logging.getLogger(__name__)
+
+DICTIONARY_LRU_SIZE = int(os.getenv("DICTIONARY_LRU_SIZE", "5000"))
+DICTIONARY_CACHE_TTL_DAYS = int(os.getenv("DICTIONARY_CACHE_TTL_DAYS", "180"))
+
+_WHITESPACE = re.compile(r"\s+")
+# Quotes and punctuation picked up when a student selects a word in a passage
+_EDGE_PUNCTUATION = "\"'`«»“”‘’.,;:!?()[]{}"
+
+Fetch = Callable[[str, Optional[str]], Awaitable[Dict[str, Any]]]
+
+
+def normalize_word(text: str) -> str:
+    return _WHITESPACE.sub(" ", text.strip().strip(_EDGE_PUNCTUATION).strip()).casefold()
+
+
+def context_fingerprint(context: Optional[str]) -> Optional[str]:
+    """Hash of the normalized context sentence, None without context"""
+    if not context or not context.strip():
+        return None
+    normalized = _WHITESPACE.sub(" ", context.strip()).casefold()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def cache_key(text: str, context: Optional[str]) -> str:
+    return hashlib.sha256(
+        f"{normalize_word(text)}\x00{context_fingerprint(context) or ''}".encode()
+    ).hexdigest()
+
+
+class DictionaryLookupCache:
+    """LRU in front of the dictionary_lookups table, with single-flight fetches"""
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        max_size: int = DICTIONARY_LRU_SIZE,
+        ttl_days: int = DICTIONARY_CACHE_TTL_DAYS,
+    ):
+        self.session_factory = session_factory
+        self.ttl = timedelta(days=ttl_days)
+        self._memory: LRUCache = LRUCache(maxsize=max_size)
+        self._lock = threading.Lock()
+        # Per event loop; the API runs one loop per worker process
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+    async def lookup(self, text: str, context: Optional[str], fetch: Fetch) -> Dict[str, Any]:
+        """
+        Cached result for ``text`` in ``context``; on a miss ``fetch(text,
+        context)`` is awaited once for all concurrent callers. Results of a
+        failed fetch are not cached.
+        """
+        key = cache_key(text, context)
+        with self._lock:
+            result = self._memory.get(key)
+        if result is not None:
+            self.stats["memory_hits"] += 1
+            return result
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await run_in_threadpool(self._load, key)
+            if result is not None:
+                self.stats["db_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                result = await fetch(text, context)
+                await run_in_threadpool(self._store, key, text, context, result)
+            with self._lock:
+                self._memory[key] = result
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Marks the exception retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        db: Session = self.session_factory()
+        try:
+            row = db.query(DictionaryLookup).filter(DictionaryLookup.cache_key == key).first()
+            if row is None or self._expired(row):
+                return None
+            return json.loads(row.result)
+        except Exception as e:
+            # A cache that cannot be read is a miss, not a failed lookup
+            logger.warning(f"[AI_TOOLS] Failed to load dictionary lookup: {e}")
+            return None
+        finally:
+            db.close()
+
+    def _store(self, key: str, text: str, context: Optional[str], result: Dict[str, Any]):
+        db: Session = self.session_factory()
+        try:
+            payload = json.dumps(result, ensure_ascii=False)
+            row = db.query(DictionaryLookup).filter(DictionaryLookup.cache_key == key).first()
+            if row is None:
+                db.add(DictionaryLookup(
+                    cache_key=key,
+                    word=normalize_word(text)[:100],
+                    context_fingerprint=context_fingerprint(context),
+                    result=payload,
+                ))
+            else:
+                row.result = payload
+                row.created_at = datetime.now(timezone.utc)
+            db.commit()
+        except IntegrityError:
+            # Another worker stored the same word first
+            db.rollback()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"[AI_TOOLS] Failed to store dictionary lookup: {e}")
+        finally:
+            db.close()
+
+    def _expired(self, row: DictionaryLookup) -> bool:
+        created_at = row.created_at
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return created_at + self.ttl <= datetime.now(timezone.utc)
+
+
+# Singleton instance
+_dictionary_lookup_cache = None
+
+
+def get_dictionary_lookup_cache() -> DictionaryLookupCache:
+    """Get singleton instance of the dictionary lookup cache"""
+    global _dictionary_lookup_cache
+    if _dictionary_lookup_cache is None:
+        _dictionary_lookup_cache = DictionaryLookupCache()
+    return _dictionary_lookup_cache
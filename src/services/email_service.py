@@ -6,9 +6,11 @@ import os
 import logging
 from typing import List, Optional
 
-import requests
+import httpx
 from dotenv import load_dotenv
 
+from src.services.http_client import get_integration
+
 # Load environment variables
 load_dotenv()
 
@@ -117,11 +119,10 @@ class EmailService:
         logger.debug(f"   Full payload keys: {list(payload.keys())}")
         
         try:
-            response = requests.post(
+            response = get_integration("resend").post(
                 self.RESEND_API_URL, 
                 json=payload, 
                 headers=self._get_headers(),
-                timeout=10
             )
             
             logger.info(f"📥 [EMAIL] Resend API response status: {response.status_code}")
@@ -133,14 +134,16 @@ class EmailService:
             logger.debug(f"   Response data: {response_data}")
             
             return response_data
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             logger.error("❌ [EMAIL] Request timed out after 10 seconds")
             return None
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPStatusError as e:
+            logger.error(f"❌ [EMAIL] Failed to send email: {e}")
+            logger.error(f"   Response status: {e.response.status_code}")
+            logger.error(f"   Response body: {e.response.text}")
+            return None
+        except (httpx.HTTPError, ValueError) as e:
             logger.error(f"❌ [EMAIL] Failed to send email: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"   Response status: {e.response.status_code}")
-                logger.error(f"   Response body: {e.response.text}")
             return None
 
 
@@ -4,12 +4,15 @@ Generates Excel files with detailed analytics and charts
 """
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.chart import BarChart, PieChart, Reference
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, BinaryIO
+from collections import Counter
 from datetime import datetime
 from io import BytesIO
+import heapq
 
 
 class ExcelExportService:
@@ -433,6 +436,312 @@ class ExcelExportService:
         
         return start_row + len(groups_data)
     
+    # ------------------------------------------------------------------
+    # Streaming (write-only) export
+    # ------------------------------------------------------------------
+
+    STUDENT_HEADERS = [
+        'Student Name', 'Email', 'Student ID', 'Groups',
+        'Progress %', 'Completed Steps', 'Total Steps',
+        'Assignments Done', 'Total Assignments', 'Score %',
+        'Study Time (min)', 'Streak (days)', 'Last Activity', 'Status'
+    ]
+
+    def write_streaming_analytics_workbook(
+        self,
+        target: BinaryIO,
+        course_name: str,
+        students_data: Iterable[Dict[str, Any]],
+        course_overview: Optional[Dict[str, Any]] = None,
+        groups_data: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """
+        Write the analytics workbook into ``target`` with a write-only workbook.
+
+        Student rows are consumed from ``students_data`` one at a time and
+        written straight to the sheet, so memory does not grow with the number
+        of students. The student-derived overview fields (totals, active
+        students, averages), the active students of each group and the chart
+        data are accumulated while the rows stream.
+
+        Args:
+            target: Binary file object receiving the .xlsx content
+            course_name: Name of the course
+            students_data: Iterable of student analytics dictionaries
+            course_overview: Course structure statistics
+            groups_data: List of group analytics dictionaries
+
+        Returns:
+            Number of student rows written
+        """
+        wb = Workbook(write_only=True)
+        stats = _StudentSheetStats()
+        self._write_student_progress_sheet(wb, students_data, course_name, stats)
+
+        if course_overview:
+            overview = dict(course_overview)
+            overview.update(
+                total_students=stats.count,
+                active_students=stats.active,
+                students_above_50=stats.above_50,
+                students_above_80=stats.above_80,
+                average_study_time=stats.study_time / stats.count if stats.count else 0,
+            )
+            self._write_course_overview_sheet(wb, overview, course_name)
+
+        if groups_data:
+            groups_data = [
+                {**group, 'active_students': stats.group_counts.get(group.get('group_name'), 0)}
+                for group in groups_data
+            ]
+            self._write_groups_summary_sheet(wb, groups_data)
+
+        if stats.count:
+            self._write_charts_sheet(wb, stats, groups_data)
+
+        wb.save(target)
+        return stats.count
+
+    def _styled(self, ws, value, font=None, fill=None, alignment=None, number_format=None) -> WriteOnlyCell:
+        cell = WriteOnlyCell(ws, value=value)
+        if font is not None:
+            cell.font = font
+        if fill is not None:
+            cell.fill = fill
+        if alignment is not None:
+            cell.alignment = alignment
+        if number_format is not None:
+            cell.number_format = number_format
+        return cell
+
+    def _fill(self, color: str) -> PatternFill:
+        return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+    def _write_title(self, ws, title: str, merge_range: str):
+        """Title row; sheet layout (widths, panes, merges) must be set before it"""
+        ws.merged_cells.add(merge_range)
+        ws.row_dimensions[1].height = 30
+        ws.append([self._styled(
+            ws, title,
+            font=Font(size=16, bold=True, color='FFFFFF'),
+            fill=self._fill(self.COLORS['header']),
+            alignment=Alignment(horizontal='center', vertical='center'),
+        )])
+
+    def _write_header_row(self, ws, headers: List[str]):
+        ws.row_dimensions[2].height = 25
+        header_font = Font(bold=True, color='FFFFFF')
+        header_fill = self._fill(self.COLORS['header'])
+        center = Alignment(horizontal='center', vertical='center')
+        ws.append([
+            self._styled(ws, header, font=header_font, fill=header_fill, alignment=center)
+            for header in headers
+        ])
+
+    def _write_student_progress_sheet(
+        self,
+        wb: Workbook,
+        students_data: Iterable[Dict[str, Any]],
+        course_name: str,
+        stats: "_StudentSheetStats"
+    ):
+        """Student Progress sheet, one row per streamed student"""
+        ws = wb.create_sheet("Student Progress")
+        headers = self.STUDENT_HEADERS
+        for col in range(1, len(headers) + 1):
+            ws.column_dimensions[get_column_letter(col)].width = 15
+        ws.column_dimensions['A'].width = 25  # Student Name
+        ws.column_dimensions['B'].width = 30  # Email
+        ws.column_dimensions['D'].width = 30  # Groups
+        ws.freeze_panes = 'A3'
+
+        self._write_title(ws, f"Student Progress - {course_name}", 'A1:L1')
+        self._write_header_row(ws, headers)
+
+        center = Alignment(horizontal='center', vertical='center')
+        progress_fills = {
+            'excellent': self._fill(self.COLORS['excellent']),
+            'good': self._fill(self.COLORS['good']),
+            'needs_attention': self._fill(self.COLORS['needs_attention']),
+        }
+
+        for student in students_data:
+            stats.add(student)
+            progress_pct = student.get('progress_percentage', 0)
+            score_pct = student.get('average_score', 0)
+
+            if progress_pct >= 80:
+                progress_fill = progress_fills['excellent']
+            elif progress_pct >= 50:
+                progress_fill = progress_fills['good']
+            else:
+                progress_fill = progress_fills['needs_attention']
+
+            row_data = [
+                student.get('student_name', 'N/A'),
+                student.get('email', 'N/A'),
+                student.get('student_id', 'N/A'),
+                ', '.join(student.get('groups', [])) if student.get('groups') else 'No groups',
+                progress_pct,
+                student.get('completed_steps', 0),
+                student.get('total_steps', 0),
+                student.get('assignments_completed', 0),
+                student.get('total_assignments', 0),
+                score_pct,
+                student.get('total_study_time', 0),
+                student.get('current_streak', 0),
+                student.get('last_activity', 'Never'),
+                self._get_status(progress_pct)
+            ]
+            ws.append([
+                self._styled(
+                    ws, value,
+                    alignment=center,
+                    fill=progress_fill if col == 5 else None,
+                    number_format='0.00"%"' if col in (5, 10) else None,
+                )
+                for col, value in enumerate(row_data, 1)
+            ])
+
+    def _write_course_overview_sheet(
+        self,
+        wb: Workbook,
+        course_overview: Dict[str, Any],
+        course_name: str
+    ):
+        """Course Overview sheet"""
+        ws = wb.create_sheet("Course Overview")
+        ws.column_dimensions['A'].width = 35
+        ws.column_dimensions['B'].width = 25
+
+        overview_data = [
+            ('Course Name', course_overview.get('course_name', 'N/A')),
+            ('Total Students', course_overview.get('total_students', 0)),
+            ('Average Progress', f"{course_overview.get('average_progress', 0):.2f}%"),
+            ('', ''),
+            ('Course Structure', ''),
+            ('Total Modules', course_overview.get('total_modules', 0)),
+            ('Total Lessons', course_overview.get('total_lessons', 0)),
+            ('Total Steps', course_overview.get('total_steps', 0)),
+            ('Total Assignments', course_overview.get('total_assignments', 0)),
+            ('', ''),
+            ('Engagement Metrics', ''),
+            ('Active Students (>0% progress)', course_overview.get('active_students', 0)),
+            ('Students with >50% progress', course_overview.get('students_above_50', 0)),
+            ('Students with >80% progress', course_overview.get('students_above_80', 0)),
+            ('Average Study Time (min)', f"{course_overview.get('average_study_time', 0):.1f}"),
+            ('', ''),
+            ('Report Generated', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        ]
+        for idx, (label, value) in enumerate(overview_data, 3):
+            if label and not value:  # Section headers
+                ws.merged_cells.add(f'A{idx}:B{idx}')
+
+        self._write_title(ws, f"Course Overview - {course_name}", 'A1:B1')
+        ws.append([])
+
+        for label, value in overview_data:
+            if label and not value:
+                ws.append([self._styled(ws, label, font=Font(bold=True, size=12)), value])
+            else:
+                ws.append([
+                    self._styled(ws, label, font=Font(bold=True), alignment=Alignment(horizontal='right')),
+                    self._styled(ws, value, alignment=Alignment(horizontal='left')),
+                ])
+
+    def _write_groups_summary_sheet(
+        self,
+        wb: Workbook,
+        groups_data: List[Dict[str, Any]]
+    ):
+        """Groups Summary sheet"""
+        ws = wb.create_sheet("Groups Summary")
+        headers = ['Group Name', 'Students', 'Avg Progress %', 'Teacher/Curator', 'Active Students', 'Completion Rate']
+        for col in range(1, len(headers) + 1):
+            ws.column_dimensions[get_column_letter(col)].width = 20
+        ws.freeze_panes = 'A3'
+
+        self._write_title(ws, "Groups Summary", 'A1:F1')
+        self._write_header_row(ws, headers)
+
+        center = Alignment(horizontal='center', vertical='center')
+        for group in groups_data:
+            row_data = [
+                group.get('group_name', 'N/A'),
+                group.get('student_count', 0),
+                group.get('average_progress', 0),
+                group.get('teacher_name', 'N/A') or group.get('curator_name', 'N/A'),
+                group.get('active_students', 0),
+                f"{(group.get('active_students', 0) / max(group.get('student_count', 1), 1) * 100):.1f}%"
+            ]
+            ws.append([
+                self._styled(ws, value, alignment=center, number_format='0.00"%"' if col == 3 else None)
+                for col, value in enumerate(row_data, 1)
+            ])
+
+    def _write_charts_sheet(
+        self,
+        wb: Workbook,
+        stats: "_StudentSheetStats",
+        groups_data: Optional[List[Dict[str, Any]]] = None
+    ):
+        """Charts sheet; chart data tables are written below each other in columns A-B"""
+        ws = wb.create_sheet("Charts & Analytics")
+        self._write_title(ws, "Analytics Charts", 'A1:H1')
+        ws.append([])
+        bold = Font(bold=True)
+
+        # Chart 1: Progress Distribution
+        start_row = 3
+        ws.append([self._styled(ws, "Progress Range", font=bold), self._styled(ws, "Number of Students", font=bold)])
+        for range_label, count in stats.bins.items():
+            ws.append([range_label, count])
+        chart = BarChart()
+        chart.title = "Student Progress Distribution"
+        chart.x_axis.title = "Progress Range"
+        chart.y_axis.title = "Number of Students"
+        chart.add_data(Reference(ws, min_col=2, min_row=start_row, max_row=start_row + 3), titles_from_data=True)
+        chart.set_categories(Reference(ws, min_col=1, min_row=start_row + 1, max_row=start_row + 3))
+        chart.height = 10
+        chart.width = 20
+        ws.add_chart(chart, f'D{start_row}')
+
+        # Chart 2: Top 10 Students
+        top_students = stats.top_students()
+        start_row = start_row + 3 + 2
+        ws.append([])
+        ws.append([self._styled(ws, "Student", font=bold), self._styled(ws, "Progress %", font=bold)])
+        for name, progress in top_students:
+            ws.append([name, progress])
+        chart = BarChart()
+        chart.title = "Top 10 Students by Progress"
+        chart.x_axis.title = "Student"
+        chart.y_axis.title = "Progress %"
+        chart.type = "col"
+        chart.add_data(Reference(ws, min_col=2, min_row=start_row, max_row=start_row + len(top_students)), titles_from_data=True)
+        chart.set_categories(Reference(ws, min_col=1, min_row=start_row + 1, max_row=start_row + len(top_students)))
+        chart.height = 12
+        chart.width = 20
+        ws.add_chart(chart, f'D{start_row}')
+
+        # Chart 3: Groups Comparison
+        if groups_data:
+            start_row = start_row + len(top_students) + 2
+            ws.append([])
+            ws.append([self._styled(ws, "Group", font=bold), self._styled(ws, "Avg Progress %", font=bold)])
+            for group in groups_data:
+                ws.append([group.get('group_name', 'N/A'), group.get('average_progress', 0)])
+            chart = BarChart()
+            chart.title = "Average Progress by Group"
+            chart.x_axis.title = "Group"
+            chart.y_axis.title = "Average Progress %"
+            chart.type = "col"
+            chart.add_data(Reference(ws, min_col=2, min_row=start_row, max_row=start_row + len(groups_data)), titles_from_data=True)
+            chart.set_categories(Reference(ws, min_col=1, min_row=start_row + 1, max_row=start_row + len(groups_data)))
+            chart.height = 12
+            chart.width = 20
+            ws.add_chart(chart, f'D{start_row}')
+
     def _get_status(self, progress: float) -> str:
         """Get status label based on progress"""
         if progress >= 80:
@@ -445,6 +754,53 @@ class ExcelExportService:
             return "Not Started"
 
 
+class _StudentSheetStats:
+    """Aggregates of the streamed student rows needed by the summary sheets"""
+
+    __slots__ = ("count", "active", "above_50", "above_80", "study_time", "bins", "group_counts", "_top")
+
+    TOP_STUDENTS = 10
+
+    def __init__(self):
+        self.count = 0
+        self.active = 0
+        self.above_50 = 0
+        self.above_80 = 0
+        self.study_time = 0
+        self.bins = {'0-49%': 0, '50-79%': 0, '80-100%': 0}
+        self.group_counts: Counter = Counter()
+        # min-heap of (progress, -row, name) holding the best rows seen so far
+        self._top: list = []
+
+    def add(self, student: Dict[str, Any]):
+        progress = student.get('progress_percentage', 0)
+        self.count += 1
+        self.study_time += student.get('total_study_time', 0) or 0
+        if progress > 0:
+            self.active += 1
+        if progress >= 50:
+            self.above_50 += 1
+        if progress >= 80:
+            self.above_80 += 1
+        if progress < 50:
+            self.bins['0-49%'] += 1
+        elif progress < 80:
+            self.bins['50-79%'] += 1
+        else:
+            self.bins['80-100%'] += 1
+        self.group_counts.update(set(student.get('groups') or ()))
+
+        item = (progress, -self.count, student.get('student_name', 'N/A'))
+        if len(self._top) < self.TOP_STUDENTS:
+            heapq.heappush(self._top, item)
+        elif item > self._top[0]:
+            heapq.heapreplace(self._top, item)
+
+    def top_students(self) -> List[tuple]:
+        """(name, progress) of the best students, ties in row order"""
+        return [(name, progress) for progress, _, name in sorted(self._top, reverse=True)]
+
+
 # Singleton instance
 _export_service = None
 
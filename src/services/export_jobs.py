@@ -0,0 +1,348 @@
+"""
+Export Jobs
+Background rendering of PDF and Excel analytics reports.
+
+Report endpoints used to collect analytics and render the file inside the
+request, so a large export held a worker until nginx timed out. Exports are
+now submitted as jobs and polled:
+
+- the request checks permissions and returns the job right away
+- a thread collects the report data with its own Session
+- the file is rendered in a process pool (reportlab/openpyxl are CPU-bound)
+  straight into EXPORT_JOBS_DIR
+
+A job is a JSON metadata file next to its artifact, so any worker can answer
+status and download requests. Both expire after EXPORT_JOB_TTL_SECONDS and
+are purged from submit and status reads (at most every
+EXPORT_JOB_PURGE_INTERVAL_SECONDS). Identical submissions (same user, report
+and parameters) within EXPORT_JOB_DEDUPE_SECONDS get the job that is already
+running or finished.
+
+The worker that owns a pending or running job stamps its ``heartbeat_at``
+every EXPORT_JOB_HEARTBEAT_SECONDS. A job whose heartbeat is older than
+EXPORT_JOB_STALE_SECONDS was lost with its worker (restart, crash): it is
+marked failed when read, so it is no longer polled or handed out by dedupe.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.config import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Must stay outside the public /uploads mount: artifacts hold student data
+# and are only served by the download endpoint, which checks ownership
+EXPORT_JOBS_DIR = os.getenv("EXPORT_JOBS_DIR", "exports")
+EXPORT_JOB_TTL_SECONDS = int(os.getenv("EXPORT_JOB_TTL_SECONDS", "3600"))
+EXPORT_JOB_DEDUPE_SECONDS = int(os.getenv("EXPORT_JOB_DEDUPE_SECONDS", "120"))
+EXPORT_JOB_HEARTBEAT_SECONDS = int(os.getenv("EXPORT_JOB_HEARTBEAT_SECONDS", "30"))
+# Several missed heartbeats: the owning worker is gone
+EXPORT_JOB_STALE_SECONDS = int(os.getenv("EXPORT_JOB_STALE_SECONDS", "300"))
+EXPORT_JOB_PURGE_INTERVAL_SECONDS = int(os.getenv("EXPORT_JOB_PURGE_INTERVAL_SECONDS", "60"))
+# Rendering processes per API worker
+EXPORT_JOB_PROCESSES = int(os.getenv("EXPORT_JOB_PROCESSES", "2"))
+# Threads collecting report data; each holds a DB connection while it runs
+EXPORT_JOB_COLLECTORS = int(os.getenv("EXPORT_JOB_COLLECTORS", "4"))
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ExportTask(NamedTuple):
+    """
+    What a collected job renders.
+
+    ``renderer(target, *args)`` writes the file into ``target``; it runs in a
+    worker process, so it must be a module-level function and ``args`` must
+    be picklable.
+    """
+    renderer: Callable
+    args: Tuple
+    filename: str
+    media_type: str
+
+
+def render_to_file(renderer: Callable, path: str, args: Tuple):
+    """Process pool entry point"""
+    with open(path, "wb") as target:
+        renderer(target, *args)
+
+
+class ExportJobManager:
+    """Runs export jobs and keeps their state on disk"""
+
+    def __init__(
+        self,
+        jobs_dir: str = EXPORT_JOBS_DIR,
+        session_factory: Callable = SessionLocal,
+        ttl_seconds: int = EXPORT_JOB_TTL_SECONDS,
+        dedupe_seconds: int = EXPORT_JOB_DEDUPE_SECONDS,
+        render_executor: Optional[Executor] = None,
+        heartbeat_seconds: int = EXPORT_JOB_HEARTBEAT_SECONDS,
+        stale_seconds: int = EXPORT_JOB_STALE_SECONDS,
+    ):
+        self.jobs_dir = Path(jobs_dir)
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.dedupe_seconds = dedupe_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self._render_executor = render_executor
+        self._collectors = ThreadPoolExecutor(max_workers=EXPORT_JOB_COLLECTORS, thread_name_prefix="export-job")
+        self._lock = threading.Lock()
+        # Pending and running jobs of this worker, kept alive by the heartbeat thread
+        self._active: Set[str] = set()
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._purged_at = 0.0
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def submit(
+        self,
+        report: str,
+        owner_id: int,
+        params: Dict[str, Any],
+        collect: Callable[[Session], ExportTask],
+    ) -> Dict[str, Any]:
+        """
+        Queue an export, or return the matching job submitted within the
+        dedupe window. ``collect(db)`` gathers the data and runs in a thread.
+        """
+        key = hashlib.sha256(
+            json.dumps([report, owner_id, params], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        now = time.time()
+
+        with self._lock:
+            self.jobs_dir.mkdir(parents=True, exist_ok=True)
+            self._maybe_purge(now)
+
+            existing = self._dedupe_lookup(key, now)
+            if existing is not None:
+                return existing
+
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "report": report,
+                "owner_id": owner_id,
+                "params": params,
+                "dedupe_key": key,
+                "status": "pending",
+                "filename": None,
+                "media_type": None,
+                "artifact": None,
+                "size": None,
+                "error": None,
+                "created_at": now,
+                "heartbeat_at": now,
+                "finished_at": None,
+                "expires_at": now + self.ttl_seconds,
+            }
+            self._write_job(job)
+            self._dedupe_path(key).write_text(job["job_id"])
+            self._active.add(job["job_id"])
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="export-job-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+        self._collectors.submit(self._run, job["job_id"], collect)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job metadata, or None for unknown and expired jobs; lost jobs come back failed"""
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        now = time.time()
+        with self._lock:
+            self._maybe_purge(now)
+        try:
+            job = json.loads(self._job_path(job_id).read_text())
+        except (OSError, ValueError):
+            return None
+        if job["expires_at"] <= now:
+            return None
+        if self._is_stale(job, now):
+            logger.warning(f"[EXPORT] Export job {job_id} lost its worker")
+            job = self._update(
+                job_id, only_if_stale=True, status="failed", error="Export was interrupted, please retry",
+                finished_at=now,
+            ) or job
+        return job
+
+    def artifact_path(self, job: Dict[str, Any]) -> Optional[Path]:
+        if job["status"] != "completed" or not job["artifact"]:
+            return None
+        path = self.jobs_dir / job["artifact"]
+        return path if path.exists() else None
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete expired jobs with their artifacts; returns how many"""
+        now = now or time.time()
+        purged = 0
+        for meta_path in self.jobs_dir.glob("*.json"):
+            try:
+                job = json.loads(meta_path.read_text())
+            except (OSError, ValueError):
+                continue
+            if job.get("expires_at", 0) > now:
+                continue
+            for path in self.jobs_dir.glob(f"{job['job_id']}*"):
+                path.unlink(missing_ok=True)
+            dedupe_path = self._dedupe_path(job["dedupe_key"])
+            try:
+                if dedupe_path.read_text() == job["job_id"]:
+                    dedupe_path.unlink()
+            except OSError:
+                pass
+            purged += 1
+        return purged
+
+    def shutdown(self):
+        self._stopped.set()
+        self._collectors.shutdown(wait=False, cancel_futures=True)
+        if self._render_executor is not None:
+            self._render_executor.shutdown(wait=False, cancel_futures=True)
+            self._render_executor = None
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _run(self, job_id: str, collect: Callable[[Session], ExportTask]):
+        try:
+            self._execute(job_id, collect)
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _execute(self, job_id: str, collect: Callable[[Session], ExportTask]):
+        self._update(job_id, status="running", heartbeat_at=time.time())
+        try:
+            db = self.session_factory()
+            try:
+                task = collect(db)
+            finally:
+                db.close()
+
+            extension = os.path.splitext(task.filename)[1]
+            artifact = f"{job_id}{extension}"
+            partial = self.jobs_dir / f"{artifact}.partial"
+            self._renderer().submit(render_to_file, task.renderer, str(partial), task.args).result()
+            os.replace(partial, self.jobs_dir / artifact)
+
+            self._update(
+                job_id,
+                status="completed",
+                filename=task.filename,
+                media_type=task.media_type,
+                artifact=artifact,
+                size=(self.jobs_dir / artifact).stat().st_size,
+                finished_at=time.time(),
+            )
+        except Exception as e:
+            logger.error(f"[EXPORT] Export job {job_id} failed: {e}", exc_info=True)
+            self._update(job_id, status="failed", error=getattr(e, "detail", None) or str(e), finished_at=time.time())
+
+    def _renderer(self) -> Executor:
+        with self._lock:
+            if self._render_executor is None:
+                # spawn: forking a process that runs threads and holds pooled connections is unsafe
+                self._render_executor = ProcessPoolExecutor(
+                    max_workers=EXPORT_JOB_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._render_executor
+
+    def _beat(self):
+        """Stamp this worker's pending and running jobs until it shuts down"""
+        while not self._stopped.wait(self.heartbeat_seconds):
+            with self._lock:
+                job_ids = list(self._active)
+            for job_id in job_ids:
+                self._update(job_id, heartbeat_at=time.time())
+
+    def _is_stale(self, job: Dict[str, Any], now: float) -> bool:
+        if job["status"] not in ("pending", "running"):
+            return False
+        return job.get("heartbeat_at", job["created_at"]) + self.stale_seconds <= now
+
+    def _maybe_purge(self, now: float):
+        # Called with the lock held
+        if now - self._purged_at < EXPORT_JOB_PURGE_INTERVAL_SECONDS or not self.jobs_dir.exists():
+            return
+        self._purged_at = now
+        self.purge_expired(now)
+
+    def _dedupe_lookup(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        # Called with the lock held
+        try:
+            job_id = self._dedupe_path(key).read_text()
+        except OSError:
+            return None
+        try:
+            job = json.loads(self._job_path(job_id).read_text())
+        except (OSError, ValueError):
+            return None
+        if job["expires_at"] <= now or job["status"] == "failed" or self._is_stale(job, now):
+            return None
+        if job["created_at"] + self.dedupe_seconds <= now:
+            return None
+        return job
+
+    def _update(self, job_id: str, only_if_stale: bool = False, **changes) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            try:
+                job = json.loads(self._job_path(job_id).read_text())
+            except (OSError, ValueError):
+                return None  # expired and purged while running
+            if only_if_stale and not self._is_stale(job, time.time()):
+                return job
+            job.update(changes)
+            self._write_job(job)
+            return job
+
+    def _write_job(self, job: Dict[str, Any]):
+        # Readers in other workers never see a half-written file
+        path = self._job_path(job["job_id"])
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(job))
+        os.replace(tmp_path, path)
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _dedupe_path(self, key: str) -> Path:
+        return self.jobs_dir / f"{key}.dedupe"
+
+
+# Singleton instance
+_export_job_manager = None
+
+
+def get_export_job_manager() -> ExportJobManager:
+    """Get singleton instance of the export job manager"""
+    global _export_job_manager
+    if _export_job_manager is None:
+        _export_job_manager = ExportJobManager()
+    return _export_job_manager
+
+
+def stop_export_jobs():
+    global _export_job_manager
+    if _export_job_manager is not None:
+        _export_job_manager.shutdown()
+    _export_job_manager = None
@@ -1,8 +1,8 @@
-import requests
-import time
+import httpx
 from typing import Optional, Dict, Tuple
 from sqlalchemy.orm import Session
 from src.schemas.models import PlaceCoordinates
+from src.services.http_client import get_integration
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,16 +16,9 @@ class GeocodingService:
         self.headers = {
             'User-Agent': 'JOL-Travel-Bot/1.0 (travel-assistant)'
         }
-        self.request_delay = 1  # Nominatim rate limit: 1 request per second
-        self.last_request_time = 0
-        
-    def _rate_limit(self):
-        """Ensure we don't exceed rate limits"""
-        current_time = time.time()
-        elapsed = current_time - self.last_request_time
-        if elapsed < self.request_delay:
-            time.sleep(self.request_delay - elapsed)
-        self.last_request_time = time.time()
+        # Nominatim allows 1 request per second; the "nominatim" integration
+        # spaces calls across threads and rejects those that would wait too long
+        self.client = get_integration("nominatim")
     
     def geocode_place(self, place_name: str, place_type: str = "general", 
                      city: str = "", country: str = "") -> Optional[Dict]:
@@ -42,8 +35,6 @@ class GeocodingService:
             Dict with coordinates and address info or None if not found
         """
         try:
-            self._rate_limit()
-            
             # Build search query
             query_parts = [place_name]
             if city:
@@ -80,7 +71,7 @@ class GeocodingService:
                 elif place_type == "activity":
                     params['tourism'] = 'attraction,museum,zoo,aquarium'
             
-            response = requests.get(self.base_url, params=params, headers=self.headers, timeout=10)
+            response = self.client.get(self.base_url, params=params, headers=self.headers)
             response.raise_for_status()
             
             results = response.json()
@@ -104,7 +95,7 @@ class GeocodingService:
                 'osm_id': best_result.get('osm_id')
             }
             
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Geocoding request failed for {place_name}: {e}")
             return None
         except Exception as e:
@@ -179,8 +170,6 @@ class GeocodingService:
             Dict with address info or None
         """
         try:
-            self._rate_limit()
-            
             params = {
                 'lat': latitude,
                 'lon': longitude,
@@ -188,7 +177,7 @@ class GeocodingService:
                 'addressdetails': 1
             }
             
-            response = requests.get(self.reverse_url, params=params, headers=self.headers, timeout=10)
+            response = self.client.get(self.reverse_url, params=params, headers=self.headers)
             response.raise_for_status()
             
             result = response.json()
@@ -0,0 +1,357 @@
+"""
+Outbound HTTP Clients
+Pooled, guarded clients for third-party integrations.
+
+Each integration (Resend, Expo, Telegram, Nominatim, the MasterEd API) used
+to open a new connection per call, with no bound on how many were in flight,
+so one slow provider could tie up request threads or stall the event loop.
+They now share an ``Integration`` per provider with:
+
+- one pooled httpx.Client and one httpx.AsyncClient per event loop, capped at
+  max_connections (every integration talks to a single host)
+- retries with exponential backoff and jitter: connection failures always,
+  timeouts, 429 and 502-504 only for requests that are safe to repeat
+- a circuit breaker that fails calls fast after consecutive failures and lets
+  a single probe through once the cool-down has passed
+- optional spacing between requests for rate-limited providers, failing fast
+  instead of queueing beyond max_wait
+- per-integration timing metrics, see ``integration_metrics()``
+
+Circuit and rate-limit rejections are ``httpx.RequestError`` subclasses, so
+callers handle them like any other connection failure.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_CLIENT_MAX_CONNECTIONS = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "10"))
+HTTP_CLIENT_RETRIES = int(os.getenv("HTTP_CLIENT_RETRIES", "2"))
+HTTP_CLIENT_BACKOFF_SECONDS = float(os.getenv("HTTP_CLIENT_BACKOFF_SECONDS", "0.5"))
+# How long a call waits for a free pooled connection before giving up
+HTTP_CLIENT_POOL_TIMEOUT = float(os.getenv("HTTP_CLIENT_POOL_TIMEOUT", "5"))
+HTTP_CLIENT_FAILURE_THRESHOLD = int(os.getenv("HTTP_CLIENT_FAILURE_THRESHOLD", "5"))
+HTTP_CLIENT_RESET_SECONDS = float(os.getenv("HTTP_CLIENT_RESET_SECONDS", "30"))
+HTTP_CLIENT_SLOW_SECONDS = float(os.getenv("HTTP_CLIENT_SLOW_SECONDS", "2"))
+
+MAX_BACKOFF_SECONDS = 10.0
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Raised before anything reached the provider, so always safe to retry
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Per-provider overrides of the defaults above
+INTEGRATION_SETTINGS: Dict[str, Dict[str, Any]] = {
+    "resend": {"timeout": 10.0},
+    "expo": {"timeout": 30.0},
+    "telegram": {"timeout": 10.0},
+    "mastered": {"timeout": 30.0},
+    # Nominatim usage policy: at most one request per second
+    "nominatim": {"timeout": 10.0, "max_connections": 1, "min_interval": 1.0, "max_wait": 10.0},
+}
+
+
+class CircuitOpenError(httpx.RequestError):
+    """The integration failed repeatedly and is not being called for now"""
+
+
+class RateLimitExceeded(httpx.RequestError):
+    """The integration's request budget is used up for longer than max_wait"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open (one probe)"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_seconds:
+                return "open"
+            return "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def release(self):
+        """End a probe that neither failed nor succeeded (cancelled, bad input)"""
+        with self._lock:
+            self._probing = False
+
+    def record(self, success: bool):
+        with self._lock:
+            self._probing = False
+            if success:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class Integration:
+    """Pooled sync and async access to one external provider"""
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = HTTP_CLIENT_MAX_CONNECTIONS,
+        retries: int = HTTP_CLIENT_RETRIES,
+        backoff_seconds: float = HTTP_CLIENT_BACKOFF_SECONDS,
+        failure_threshold: int = HTTP_CLIENT_FAILURE_THRESHOLD,
+        reset_seconds: float = HTTP_CLIENT_RESET_SECONDS,
+        min_interval: float = 0.0,
+        max_wait: Optional[float] = None,
+        transport: Optional[httpx.BaseTransport] = None,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.name = name
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.min_interval = min_interval
+        self.max_wait = max_wait
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self._client_options = {
+            "timeout": httpx.Timeout(timeout, connect=connect_timeout, pool=HTTP_CLIENT_POOL_TIMEOUT),
+            "limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        }
+        self._transport = transport
+        self._async_transport = async_transport
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+        self._metrics = {
+            "requests": 0, "errors": 0, "retries": 0, "rejected": 0,
+            "total_seconds": 0.0, "max_seconds": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def request(self, method: str, url: str, retry_unsafe: bool = False, **kwargs) -> httpx.Response:
+        """
+        Send a request on the pooled sync client. Responses are returned
+        whatever their status; transport errors are raised once retries are
+        exhausted. ``retry_unsafe`` allows retrying a POST after a timeout.
+        """
+        attempt = 0
+        while True:
+            wait = self._reserve_slot()
+            self._before_attempt()
+            if wait:
+                time.sleep(wait)
+            response, error = None, None
+            started = time.perf_counter()
+            try:
+                response = self._get_client().request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+            except BaseException:
+                self.breaker.release()
+                raise
+            delay = self._after_attempt(method, url, retry_unsafe, attempt, started, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    async def arequest(self, method: str, url: str, retry_unsafe: bool = False, **kwargs) -> httpx.Response:
+        """Async counterpart of ``request`` on the per-loop client"""
+        attempt = 0
+        while True:
+            wait = self._reserve_slot()
+            self._before_attempt()
+            if wait:
+                await asyncio.sleep(wait)
+            response, error = None, None
+            started = time.perf_counter()
+            try:
+                response = await self._get_async_client().request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+            except BaseException:
+                self.breaker.release()
+                raise
+            delay = self._after_attempt(method, url, retry_unsafe, attempt, started, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    async def apost(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("POST", url, **kwargs)
+
+    async def aget(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("GET", url, **kwargs)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._metrics)
+        snapshot["avg_ms"] = round(snapshot["total_seconds"] * 1000 / snapshot["requests"], 1) if snapshot["requests"] else 0.0
+        snapshot["max_ms"] = round(snapshot.pop("max_seconds") * 1000, 1)
+        snapshot.pop("total_seconds")
+        snapshot["circuit"] = self.breaker.state
+        return snapshot
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self):
+        client, self._async_client, self._async_loop = self._async_client, None, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _get_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(transport=self._transport, **self._client_options)
+            return self._client
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # httpx.AsyncClient is bound to the loop that first used it
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client.is_closed or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(transport=self._async_transport, **self._client_options)
+            self._async_loop = loop
+        return self._async_client
+
+    def _before_attempt(self):
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+    def _reserve_slot(self) -> float:
+        """Seconds to wait before sending, for integrations with min_interval"""
+        if not self.min_interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot)
+            wait = start - now
+            if self.max_wait is not None and wait > self.max_wait:
+                self._metrics["rejected"] += 1
+                raise RateLimitExceeded(f"{self.name} rate limit: next slot in {wait:.1f}s")
+            self._next_slot = start + self.min_interval
+            return wait
+
+    def _after_attempt(
+        self,
+        method: str,
+        url: str,
+        retry_unsafe: bool,
+        attempt: int,
+        started: float,
+        response: Optional[httpx.Response],
+        error: Optional[Exception],
+    ) -> Optional[float]:
+        """Record the attempt; returns the backoff before retrying, or None"""
+        elapsed = time.perf_counter() - started
+        failed = error is not None or response.status_code >= 500
+        self.breaker.record(not failed)
+        with self._lock:
+            self._metrics["requests"] += 1
+            self._metrics["errors"] += failed
+            self._metrics["total_seconds"] += elapsed
+            self._metrics["max_seconds"] = max(self._metrics["max_seconds"], elapsed)
+        if elapsed >= HTTP_CLIENT_SLOW_SECONDS:
+            logger.warning(f"[HTTP] Slow {self.name} call: {method} {url} took {elapsed:.2f}s")
+
+        if attempt >= self.retries:
+            return None
+        safe = retry_unsafe or method.upper() in SAFE_METHODS
+        if error is not None:
+            retry = isinstance(error, _NOT_SENT_ERRORS) or (safe and isinstance(error, (httpx.TimeoutException, httpx.NetworkError)))
+        else:
+            retry = safe and response.status_code in RETRY_STATUSES
+        if not retry:
+            return None
+
+        self._count("retries")
+        delay = min(MAX_BACKOFF_SECONDS, self.backoff_seconds * (2 ** attempt)) * random.uniform(0.5, 1.5)
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = min(MAX_BACKOFF_SECONDS, float(retry_after))
+        logger.info(f"[HTTP] Retrying {self.name} {method} {url} in {delay:.2f}s ({error or response.status_code})")
+        return delay
+
+    def _count(self, key: str):
+        with self._lock:
+            self._metrics[key] += 1
+
+
+_integrations: Dict[str, Integration] = {}
+_integrations_lock = threading.Lock()
+
+
+def get_integration(name: str) -> Integration:
+    """Shared client for ``name``, configured from INTEGRATION_SETTINGS"""
+    with _integrations_lock:
+        integration = _integrations.get(name)
+        if integration is None:
+            integration = _integrations[name] = Integration(name, **INTEGRATION_SETTINGS.get(name, {}))
+        return integration
+
+
+def integration_metrics() -> Dict[str, Dict[str, Any]]:
+    with _integrations_lock:
+        integrations = list(_integrations.values())
+    return {integration.name: integration.metrics() for integration in integrations}
+
+
+async def close_integrations():
+    """Close every pooled client (called on application shutdown)"""
+    with _integrations_lock:
+        integrations = list(_integrations.values())
+        _integrations.clear()
+    for integration in integrations:
+        integration.close()
+        await integration.aclose()
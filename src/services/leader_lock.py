@@ -0,0 +1,90 @@
+"""
+Leader Lock
+Elects the one process that runs a background scheduler.
+
+Every uvicorn worker starts the schedulers, so without coordination each of
+them sent the same reminders. A ``LeaderLock`` takes a session-level Postgres
+advisory lock on a connection it keeps open: the process holding it is the
+leader, the others keep calling ``is_leader()`` and take over once the
+holder's connection goes away (shutdown or crash releases the lock).
+
+On other databases (SQLite in development and tests) every process leads.
+"""
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from src.config import engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """Session-level advisory lock named ``name``"""
+
+    def __init__(self, name: str, engine: Optional[Engine] = None):
+        self.name = name
+        # Advisory lock keys are signed 64-bit integers
+        self.key = int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big", signed=True)
+        self.engine = engine or default_engine
+        self._connection: Optional[Connection] = None
+        self._lock = threading.Lock()
+
+    def is_leader(self) -> bool:
+        """Whether this process holds the lock, trying to take it if not"""
+        if self.engine.dialect.name != "postgresql":
+            return True
+        with self._lock:
+            if self._connection is not None:
+                try:
+                    self._connection.execute(text("SELECT 1"))
+                    self._connection.commit()
+                    return True
+                except Exception as e:
+                    logger.warning(f"[LEADER] Lost '{self.name}' lock connection: {e}")
+                    self._discard()
+            try:
+                connection = self.engine.connect()
+            except Exception as e:
+                logger.warning(f"[LEADER] Could not connect to elect '{self.name}' leader: {e}")
+                return False
+            try:
+                acquired = connection.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}
+                ).scalar()
+                connection.commit()
+            except Exception as e:
+                logger.warning(f"[LEADER] Advisory lock for '{self.name}' failed: {e}")
+                connection.close()
+                return False
+            if not acquired:
+                connection.close()
+                return False
+            self._connection = connection
+            logger.info(f"[LEADER] This worker now runs '{self.name}'")
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._connection is None:
+                return
+            try:
+                self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+                self._connection.commit()
+                self._connection.close()
+            except Exception:
+                self._discard()
+            self._connection = None
+
+    def _discard(self):
+        # Never hand a connection that may still hold the lock back to the pool
+        try:
+            self._connection.invalidate()
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
@@ -0,0 +1,487 @@
+"""
+Group leaderboard engine.
+
+The curator leaderboard of a group week is a student x column matrix: five
+homework slots, five attendance slots and the manual LeaderboardEntry
+columns. Building it needs the week layout (derived from all class events of
+the group), the assignment -> lesson slot mapping, graded submissions,
+attendance and manual entries.
+
+This module builds any number of weeks of a group in one pass, with one query
+per source table, fills each matrix by index, and caches the result per
+(group_id, week_number). The cache is per process and bounded by a TTL.
+Entries are tagged with the group's ``leaderboard:<group_id>`` cache
+generation (see src.services.cache_generations): a transaction that changes
+the group's attendance, graded submissions, leaderboard entries/config,
+class events, assignments or membership bumps it when it commits, and every
+worker rebuilds the group's weeks on their next read.
+
+SAT mock exam results come from an external API and are overlaid by the
+routes on top of the cached matrix.
+"""
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from cachetools import TTLCache
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from src.schemas.models import (
+    Assignment, AssignmentSubmission, Attendance, Event, EventGroup, GroupStudent,
+    LeaderboardConfig, LeaderboardEntry, UserInDB,
+)
+from src.services import cache_generations
+from src.services.attendance_service import AttendanceService
+
+LEADERBOARD_CACHE_TTL_SECONDS = int(os.getenv("LEADERBOARD_CACHE_TTL_SECONDS", "600"))
+LEADERBOARD_CACHE_MAX_SIZE = int(os.getenv("LEADERBOARD_CACHE_MAX_SIZE", "4096"))
+
+LESSON_SLOTS = 5
+HOMEWORK_COLUMNS = tuple(f"hw_lesson_{i}" for i in range(1, LESSON_SLOTS + 1))
+LESSON_COLUMNS = tuple(f"lesson_{i}" for i in range(1, LESSON_SLOTS + 1))
+MANUAL_COLUMNS = (
+    "curator_hour", "mock_exam", "study_buddy",
+    "self_reflection_journal", "weekly_evaluation", "extra_points",
+)
+COLUMNS = HOMEWORK_COLUMNS + LESSON_COLUMNS + MANUAL_COLUMNS
+COLUMN_INDEX = {name: index for index, name in enumerate(COLUMNS)}
+# Empty cell values: no homework score, no attendance, no manual points
+EMPTY_ROW = (None,) * LESSON_SLOTS + (0,) * (LESSON_SLOTS + len(MANUAL_COLUMNS))
+
+DEFAULT_CONFIG = {
+    "curator_hour_enabled": True,
+    "study_buddy_enabled": True,
+    "self_reflection_journal_enabled": True,
+    "weekly_evaluation_enabled": True,
+    "extra_points_enabled": True,
+    "curator_hour_date": None,
+}
+
+
+class GroupLayout:
+    """Week boundaries of a group, derived from its first class event."""
+
+    __slots__ = ("group_id", "start_of_week1", "weeks_count")
+
+    def __init__(self, group_id: int, start_of_week1: Optional[date], weeks_count: int):
+        self.group_id = group_id
+        self.start_of_week1 = start_of_week1
+        self.weeks_count = weeks_count
+
+    @property
+    def has_events(self) -> bool:
+        return self.start_of_week1 is not None
+
+    def week_start(self, week_number: int) -> datetime:
+        week_start_date = self.start_of_week1 + timedelta(weeks=week_number - 1)
+        return datetime.combine(week_start_date, datetime.min.time())
+
+    def week_of(self, moment: datetime) -> int:
+        return (moment.date() - self.start_of_week1).days // 7 + 1
+
+
+class WeekBoard:
+    """One leaderboard week: students (sorted by name) x COLUMNS."""
+
+    __slots__ = (
+        "group_id", "week_number", "week_start", "week_end", "has_events",
+        "students", "matrix", "event_ids", "lessons", "config",
+    )
+
+    def __init__(self, group_id: int, week_number: int, week_start: Optional[datetime], has_events: bool):
+        self.group_id = group_id
+        self.week_number = week_number
+        self.week_start = week_start
+        self.week_end = week_start + timedelta(days=7) if week_start else None
+        self.has_events = has_events
+        # (id, name, avatar_url, email) per matrix row
+        self.students: List[Tuple] = []
+        self.matrix: List[list] = []
+        # Event of each lesson slot, in slot order
+        self.event_ids: List[int] = []
+        # Lesson metadata for the structured (leaderboard-full) view
+        self.lessons: List[dict] = []
+        # Stored LeaderboardConfig columns, None if the week has no config row
+        self.config: Optional[dict] = None
+
+    def rows(self) -> List[dict]:
+        """Leaderboard rows as fresh dicts, safe for callers to modify."""
+        return [
+            {
+                "student_id": student[0],
+                "student_name": student[1],
+                "avatar_url": student[2],
+                **dict(zip(COLUMNS, values)),
+            }
+            for student, values in zip(self.students, self.matrix)
+        ]
+
+
+# (generation tag, layout) per group and (generation tag, board) per (group, week)
+_boards: TTLCache = TTLCache(maxsize=LEADERBOARD_CACHE_MAX_SIZE, ttl=LEADERBOARD_CACHE_TTL_SECONDS)
+_layouts: TTLCache = TTLCache(maxsize=LEADERBOARD_CACHE_MAX_SIZE, ttl=LEADERBOARD_CACHE_TTL_SECONDS)
+_lock = threading.Lock()
+
+# Bumped by bulk writes to the source tables, which cannot be mapped to groups
+CACHE_NAME = "leaderboard"
+
+
+def group_cache_name(group_id: int) -> str:
+    return f"{CACHE_NAME}:{group_id}"
+
+
+def _config_dict(config: LeaderboardConfig) -> dict:
+    return {field: getattr(config, field) for field in DEFAULT_CONFIG}
+
+
+def _load_students(db: Session, group_id: int) -> List[Tuple]:
+    rows = db.query(UserInDB.id, UserInDB.name, UserInDB.avatar_url, UserInDB.email).join(
+        GroupStudent, GroupStudent.student_id == UserInDB.id
+    ).filter(GroupStudent.group_id == group_id).all()
+    students = {row[0]: tuple(row) for row in rows}
+    return sorted(students.values(), key=lambda s: s[1] or "")
+
+
+def _load_events(db: Session, group_id: int) -> List[Tuple]:
+    rows = db.query(Event.id, Event.title, Event.start_datetime).join(
+        EventGroup, EventGroup.event_id == Event.id
+    ).filter(
+        EventGroup.group_id == group_id,
+        Event.event_type == 'class',
+        Event.is_active == True
+    ).order_by(Event.start_datetime.asc(), Event.id.asc()).all()
+    seen = set()
+    events = []
+    for row in rows:
+        if row[0] not in seen:
+            seen.add(row[0])
+            events.append(tuple(row))
+    return events
+
+
+def _slot_assignments(week_assignments, slot_event_ids: List[int]) -> Dict[int, int]:
+    """
+    assignment id -> lesson slot (1-5) for the row matrix.
+
+    Assignments linked to a lesson event take that lesson's slot; the rest
+    fill the free slots in due date order.
+    """
+    event_to_slot = {event_id: slot for slot, event_id in enumerate(slot_event_ids, start=1)}
+    slots: Dict[int, int] = {}
+    used = set()
+    for a in week_assignments:
+        if a.event_id and a.event_id in event_to_slot:
+            slots[a.id] = event_to_slot[a.event_id]
+            used.add(slots[a.id])
+    next_slot = 1
+    for a in week_assignments:
+        if a.id not in slots:
+            while next_slot in used and next_slot <= LESSON_SLOTS:
+                next_slot += 1
+            if next_slot <= LESSON_SLOTS:
+                slots[a.id] = next_slot
+                used.add(next_slot)
+                next_slot += 1
+    return slots
+
+
+def _lesson_meta(week_events: List[Tuple], week_assignments) -> List[dict]:
+    """Lesson list of the structured view: the homework of each lesson event."""
+    by_event = {a.event_id: a for a in week_assignments if a.event_id}
+    without_event = [a for a in week_assignments if not a.event_id]
+    lessons = []
+    for idx, (event_id, title, start) in enumerate(week_events[:LESSON_SLOTS]):
+        assignment = by_event.get(event_id)
+        if not assignment and idx < len(without_event):
+            assignment = without_event[idx]
+        lessons.append({
+            "lesson_number": idx + 1,
+            "event_id": event_id,
+            "title": title,
+            "start_datetime": start.isoformat(),
+            "homework": {"id": assignment.id, "title": assignment.title} if assignment else None,
+        })
+    return lessons
+
+
+def build_weeks(
+    db: Session, group_id: int, week_numbers: Optional[Iterable[int]] = None
+) -> Tuple[GroupLayout, Dict[int, WeekBoard]]:
+    """
+    Compute leaderboard weeks of a group without touching the cache.
+
+    ``week_numbers`` defaults to every week from the first to the last class
+    event. Each source table is read once for all requested weeks.
+    """
+    students = _load_students(db, group_id)
+    events = _load_events(db, group_id)
+
+    if not events:
+        layout = GroupLayout(group_id, None, 0)
+        weeks = sorted(set(week_numbers or ()))
+        boards = {}
+        for week_number in weeks:
+            board = boards[week_number] = WeekBoard(group_id, week_number, None, False)
+            board.students = students
+            board.matrix = [list(EMPTY_ROW) for _ in students]
+        return layout, boards
+
+    first_date = events[0][2].date()
+    layout = GroupLayout(group_id, first_date - timedelta(days=first_date.weekday()), 0)
+    layout.weeks_count = layout.week_of(events[-1][2])
+    weeks = sorted(set(week_numbers if week_numbers is not None else range(1, layout.weeks_count + 1)))
+    boards: Dict[int, WeekBoard] = {}
+    if not weeks:
+        return layout, boards
+
+    events_by_week: Dict[int, List[Tuple]] = {}
+    for ev in events:
+        events_by_week.setdefault(layout.week_of(ev[2]), []).append(ev)
+
+    row_of = {student[0]: row for row, student in enumerate(students)}
+    student_ids = list(row_of)
+    for week_number in weeks:
+        board = boards[week_number] = WeekBoard(group_id, week_number, layout.week_start(week_number), True)
+        board.students = students
+        board.matrix = [list(EMPTY_ROW) for _ in students]
+        board.event_ids = [ev[0] for ev in events_by_week.get(week_number, [])[:LESSON_SLOTS]]
+
+    # Assignments: linked to a lesson event of the weeks, or due in them
+    week_event_ids = [ev[0] for w in weeks for ev in events_by_week.get(w, [])]
+    range_start = layout.week_start(weeks[0])
+    range_end = layout.week_start(weeks[-1]) + timedelta(days=7)
+    conditions = [
+        (Assignment.group_id == group_id)
+        & (Assignment.due_date >= range_start)
+        & (Assignment.due_date < range_end)
+    ]
+    if week_event_ids:
+        conditions.append(Assignment.event_id.in_(week_event_ids))
+    candidates = db.query(
+        Assignment.id, Assignment.title, Assignment.event_id, Assignment.group_id, Assignment.due_date
+    ).filter(Assignment.is_active == True, or_(*conditions)).all()
+
+    # assignment id -> [(week, slot)]; one assignment can count in two weeks
+    assignment_slots: Dict[int, List[Tuple[int, int]]] = {}
+    due_key = lambda a: (a.due_date or datetime.max, a.id)
+    for week_number, board in boards.items():
+        week_events = events_by_week.get(week_number, [])
+        week_event_set = {ev[0] for ev in week_events}
+        slot_event_set = set(board.event_ids)
+        due = [
+            a for a in candidates
+            if a.group_id == group_id and a.due_date and board.week_start <= a.due_date < board.week_end
+        ]
+        linked = [a for a in candidates if a.event_id in week_event_set]
+
+        # Row matrix: assignments of the lesson slots plus those due this week
+        row_assignments = {a.id: a for a in linked if a.event_id in slot_event_set}
+        row_assignments.update((a.id, a) for a in due)
+        slots = _slot_assignments(sorted(row_assignments.values(), key=due_key), board.event_ids)
+        for assignment_id, slot in slots.items():
+            assignment_slots.setdefault(assignment_id, []).append((week_number, slot))
+
+        # Lesson list: everything due this week plus everything linked to its lessons
+        lesson_assignments = {a.id: a for a in due}
+        for a in linked:
+            lesson_assignments.setdefault(a.id, a)
+        board.lessons = _lesson_meta(week_events, sorted(lesson_assignments.values(), key=due_key))
+
+    if assignment_slots and student_ids:
+        submissions = db.query(
+            AssignmentSubmission.user_id, AssignmentSubmission.assignment_id, AssignmentSubmission.score
+        ).filter(
+            AssignmentSubmission.assignment_id.in_(list(assignment_slots)),
+            AssignmentSubmission.user_id.in_(student_ids),
+            AssignmentSubmission.is_graded == True
+        ).order_by(AssignmentSubmission.id).all()
+        for user_id, assignment_id, score in submissions:
+            row = row_of[user_id]
+            for week_number, slot in assignment_slots[assignment_id]:
+                boards[week_number].matrix[row][slot - 1] = score
+
+    slot_of_event = {
+        event_id: (week_number, slot)
+        for week_number, board in boards.items()
+        for slot, event_id in enumerate(board.event_ids, start=1)
+    }
+    attendance = AttendanceService.get_attendance_map_for_events(db, list(slot_of_event), student_ids)
+    for (user_id, event_id), att in attendance.items():
+        week_number, slot = slot_of_event[event_id]
+        boards[week_number].matrix[row_of[user_id]][LESSON_SLOTS + slot - 1] = (
+            1 if att["status"] in ("present", "late") else 0
+        )
+
+    entries = db.query(LeaderboardEntry).filter(
+        LeaderboardEntry.group_id == group_id,
+        LeaderboardEntry.week_number.in_(weeks)
+    ).all()
+    for entry in entries:
+        row = row_of.get(entry.user_id)
+        if row is None:
+            continue
+        values = boards[entry.week_number].matrix[row]
+        for column in MANUAL_COLUMNS:
+            values[COLUMN_INDEX[column]] = getattr(entry, column)
+
+    configs = db.query(LeaderboardConfig).filter(
+        LeaderboardConfig.group_id == group_id,
+        LeaderboardConfig.week_number.in_(weeks)
+    ).all()
+    for config in configs:
+        boards[config.week_number].config = _config_dict(config)
+    return layout, boards
+
+
+def _generation_tag(db: Session, group_id: int) -> Tuple[int, int]:
+    current = cache_generations.generations(db, (CACHE_NAME, group_cache_name(group_id)))
+    return current[CACHE_NAME], current[group_cache_name(group_id)]
+
+
+def get_group_weeks(
+    db: Session, group_id: int, week_numbers: Optional[Iterable[int]] = None
+) -> Tuple[GroupLayout, Dict[int, WeekBoard]]:
+    """
+    Cached leaderboard weeks of a group; all weeks of the season by default.
+
+    Weeks missing from the cache are built together in one pass.
+    """
+    # Read before building, so a build racing a commit is tagged as stale
+    tag = _generation_tag(db, group_id)
+    with _lock:
+        cached = _layouts.get(group_id)
+    layout = cached[1] if cached is not None and cached[0] == tag else None
+    if week_numbers is None and layout is not None:
+        week_numbers = range(1, layout.weeks_count + 1)
+
+    boards: Dict[int, WeekBoard] = {}
+    missing = []
+    if week_numbers is not None:
+        with _lock:
+            for week_number in week_numbers:
+                cached = _boards.get((group_id, week_number))
+                if cached is None or cached[0] != tag:
+                    missing.append(week_number)
+                else:
+                    boards[week_number] = cached[1]
+    if layout is not None and week_numbers is not None and not missing:
+        return layout, boards
+
+    layout, built = build_weeks(db, group_id, missing if week_numbers is not None else None)
+    with _lock:
+        _layouts[group_id] = (tag, layout)
+        for week_number, board in built.items():
+            _boards[(group_id, week_number)] = (tag, board)
+    boards.update(built)
+    return layout, boards
+
+
+def get_week_board(db: Session, group_id: int, week_number: int) -> WeekBoard:
+    """Cached leaderboard of one group week."""
+    return get_group_weeks(db, group_id, [week_number])[1][week_number]
+
+
+def invalidate_group_leaderboards(group_id: Optional[int] = None) -> None:
+    """
+    Drop this process's cached weeks of one group, or of every group when no
+    id is given. Committed writes invalidate every worker on their own.
+    """
+    with _lock:
+        if group_id is None:
+            _boards.clear()
+            _layouts.clear()
+            return
+        _layouts.pop(group_id, None)
+        for key in [k for k in list(_boards.keys()) if k[0] == group_id]:
+            _boards.pop(key, None)
+
+
+# --- Invalidation -----------------------------------------------------------
+# Leaderboard inputs are written from curator, assignment, event and admin
+# routes, so changes are collected per session at flush time. Attendance,
+# submissions and assignments are mapped to their groups through the
+# database (any worker may be writing them), and the affected groups'
+# generations are bumped when the transaction commits.
+
+_SOURCE_TABLES = frozenset({
+    Attendance.__tablename__,
+    AssignmentSubmission.__tablename__,
+    LeaderboardEntry.__tablename__,
+    LeaderboardConfig.__tablename__,
+    Assignment.__tablename__,
+    Event.__tablename__,
+    EventGroup.__tablename__,
+    GroupStudent.__tablename__,
+})
+
+
+def _changed(obj, *attrs) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+def _values(obj, attr) -> Set[int]:
+    """Current and, for a changed row, previous value of a foreign key"""
+    state = inspect(obj).attrs[attr]
+    return {state.value, *state.history.deleted} - {None}
+
+
+def _affected_groups(session) -> Set[int]:
+    groups: Set[int] = set()
+    event_ids: Set[int] = set()
+    assignment_ids: Set[int] = set()
+    changes = [(obj, True, False) for obj in session.new]
+    changes += [(obj, False, False) for obj in session.dirty]
+    changes += [(obj, False, True) for obj in session.deleted]
+    for obj, is_new, is_deleted in changes:
+        if isinstance(obj, (LeaderboardEntry, LeaderboardConfig, GroupStudent, EventGroup)):
+            groups |= _values(obj, "group_id")
+        elif isinstance(obj, Attendance):
+            event_ids |= _values(obj, "event_id")
+        elif isinstance(obj, AssignmentSubmission):
+            if is_deleted or (obj.is_graded if is_new else _changed(obj, "is_graded", "score")):
+                assignment_ids |= _values(obj, "assignment_id")
+        elif isinstance(obj, Assignment):
+            # Counted by the group it is set for and by the groups of its lesson event
+            groups |= _values(obj, "group_id")
+            event_ids |= _values(obj, "event_id")
+        elif isinstance(obj, Event) and obj.id:
+            event_ids.add(obj.id)
+
+    connection = session.connection()
+    if assignment_ids:
+        for group_id, event_id in connection.execute(
+            select(Assignment.group_id, Assignment.event_id).where(Assignment.id.in_(assignment_ids))
+        ):
+            groups.add(group_id)
+            event_ids.add(event_id)
+    event_ids.discard(None)
+    if event_ids:
+        groups.update(connection.execute(
+            select(EventGroup.group_id).where(EventGroup.event_id.in_(event_ids))
+        ).scalars())
+    groups.discard(None)
+    return groups
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_dirty_groups(session, flush_context, instances):
+    if not any(
+        getattr(getattr(obj, "__table__", None), "name", None) in _SOURCE_TABLES
+        for objects in (session.new, session.dirty, session.deleted) for obj in objects
+    ):
+        return
+    for group_id in _affected_groups(session):
+        cache_generations.mark(session, group_cache_name(group_id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dirty_on_bulk_write(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    for mapper in orm_execute_state.all_mappers:
+        if mapper.local_table.name in _SOURCE_TABLES:
+            cache_generations.mark(orm_execute_state.session, CACHE_NAME)
+            return
@@ -1,378 +1,470 @@
 """
 Lesson Reminder Scheduler
-Periodically checks for upcoming lessons (Events) and sends email reminders 30 minutes before.
+Periodically checks for upcoming lessons (Events) and sends email reminders 30 minutes before,
+and asks teachers to record attendance when a lesson ended without any.
+
+Notifications go through the notification_outbox table:
+
+- only one worker runs the scheduler, elected with a Postgres advisory lock
+- every tick adds one outbox row per (event, kind, occurrence) entering its
+  window; the unique key sends each notification once, across workers and
+  restarts
+- recipients of all due rows are resolved with a few set-based queries
+- emails are sent on a worker pool, pushes in Expo batches of 100
+- rows nobody could be notified for are retried up to
+  NOTIFICATION_MAX_ATTEMPTS times while their event is still ahead
 """
 import logging
+import os
 import threading
 import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Optional
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from src.config import SessionLocal
-from src.schemas.models import Event, EventGroup, EventParticipant, UserInDB, Group, GroupStudent
+from src.schemas.models import (
+    Event, EventGroup, EventParticipant, UserInDB, Group, GroupStudent, NotificationOutbox,
+)
 from src.services.email_service import send_lesson_reminder_notification
-from src.utils.push_notifications import send_push_notification
+from src.services.leader_lock import LeaderLock
+from src.services.push_delivery import build_message, get_push_sender
 
 logger = logging.getLogger(__name__)
 
+LESSON_REMINDER = "lesson_reminder"
+MISSING_ATTENDANCE = "missing_attendance"
+
+NOTIFICATION_WORKERS = int(os.getenv("NOTIFICATION_WORKERS", "8"))
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "3"))
+NOTIFICATION_RETRY_SECONDS = int(os.getenv("NOTIFICATION_RETRY_SECONDS", "60"))
+NOTIFICATION_OUTBOX_RETENTION_DAYS = int(os.getenv("NOTIFICATION_OUTBOX_RETENTION_DAYS", "30"))
+# Rows claimed per tick
+NOTIFICATION_BATCH_SIZE = 500
+
+# Lessons starting in 28-32 minutes get their reminder (accounts for the check interval)
+REMINDER_WINDOW = (timedelta(minutes=28), timedelta(minutes=32))
+# Lessons that ended 15-20 minutes ago are checked for attendance
+POST_LESSON_WINDOW = (timedelta(minutes=15), timedelta(minutes=20))
+# Attendance reminders are pointless after this
+POST_LESSON_EXPIRY = timedelta(hours=2)
+# A 'sending' row this old belongs to a leader that died mid-delivery
+STALE_SENDING = timedelta(minutes=15)
+
+# Event times are stored as naive UTC; reminders show Kazakhstan time (GMT+5)
+KZ_OFFSET = timedelta(hours=5)
+
+
+class Recipient(NamedTuple):
+    id: int
+    email: Optional[str]
+    name: Optional[str]
+    push_token: Optional[str]
+
+
+class EventRecipients(NamedTuple):
+    # (group id, group name, teacher id) of every group of the event
+    groups: List[Tuple[int, str, Optional[int]]]
+    students: Dict[int, List[Recipient]]  # group id -> active students
+    teachers: Dict[int, Recipient]  # active teachers of the event's groups
+
+
+# ("email" | "push", future of send_lesson_reminder_notification / PushSender.send)
+Delivery = Tuple[str, Future]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
 class LessonReminderScheduler:
     """Background scheduler to send reminders for upcoming class events"""
-    
-    def __init__(self, check_interval: int = 60):
+
+    def __init__(self, check_interval: int = 60, session_factory: Callable = SessionLocal):
         """
         Initialize the scheduler
-        
+
         Args:
             check_interval: How often to check for upcoming events (in seconds)
+            session_factory: Session factory for the outbox and recipient queries
         """
         self.check_interval = check_interval
+        self.session_factory = session_factory
         self.running = False
         self.thread = None
-        self.sent_reminders = set()  # Track sent reminders to avoid duplicates
-        
+        self.leader = LeaderLock("lesson_reminder_scheduler")
+        self._pool: Optional[ThreadPoolExecutor] = None
+
     def start(self):
         """Start the scheduler in a background thread"""
         if self.running:
             logger.warning("Lesson reminder scheduler is already running")
             return
-            
+
         self.running = True
         self.thread = threading.Thread(target=self._run, daemon=True)
         self.thread.start()
         logger.info("✅ Lesson reminder scheduler started")
-        
+
     def stop(self):
         """Stop the scheduler"""
         self.running = False
         if self.thread:
             self.thread.join(timeout=5)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self.leader.release()
         logger.info("🛑 Lesson reminder scheduler stopped")
-        
+
     def _run(self):
         """Main scheduler loop"""
-        logger.info("� [SCHEDULER] Lesson reminder scheduler thread started")
+        logger.info("🚀 [SCHEDULER] Lesson reminder scheduler thread started")
         logger.info(f"   Check interval: {self.check_interval} seconds")
         logger.info(f"   Pre-lesson reminder window: 28-32 minutes before lesson")
         logger.info(f"   Post-lesson reminder window: 15-20 minutes after lesson")
-        
+
         while self.running:
             try:
-                now = datetime.now(timezone.utc)
-                logger.info(f"⏰ [SCHEDULER] Checking at {now.strftime('%Y-%m-%d %H:%M:%S')} UTC")
-                self._check_and_send_reminders()
-                self._check_and_send_post_lesson_reminders()
+                if self.leader.is_leader():
+                    self.tick()
+                else:
+                    logger.debug("[SCHEDULER] Another worker runs the lesson reminder scheduler")
             except Exception as e:
                 logger.error(f"❌ [SCHEDULER] Error in lesson reminder scheduler: {e}", exc_info=True)
-            
+
             # Wait for next check
             time.sleep(self.check_interval)
-    
-    def _check_and_send_reminders(self):
-        """Check for upcoming lesson events and send reminders"""
-        db = SessionLocal()
+
+    def tick(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """One scheduler pass: enqueue what is due, deliver it. Returns row counts by outcome."""
+        now = now or _utcnow()
+        logger.info(f"⏰ [SCHEDULER] Checking at {now.strftime('%Y-%m-%d %H:%M:%S')} UTC")
+        db = self.session_factory()
         try:
-            now = datetime.now(timezone.utc)
-            # Look for lessons starting in 28-32 minutes (to account for check interval)
-            reminder_time_start = now + timedelta(minutes=28)
-            reminder_time_end = now + timedelta(minutes=32)
-            
-            logger.debug(f"🔍 [SCHEDULER] Checking for events between {reminder_time_start.strftime('%H:%M')} and {reminder_time_end.strftime('%H:%M')} UTC")
-            
-            # Query for active class events in the reminder window
-            upcoming_events = db.query(Event).filter(
-                Event.is_active == True,
-                Event.event_type == 'class',  # Only class events (lessons)
-                Event.start_datetime >= reminder_time_start,
-                Event.start_datetime <= reminder_time_end
-            ).all()
-            
-            if not upcoming_events:
-                logger.debug(f"✓ [SCHEDULER] No upcoming class events found in the next 30 minutes")
-                return
-                
-            logger.info(f"📅 [SCHEDULER] Found {len(upcoming_events)} upcoming class event(s) for reminders")
-            
-            for event in upcoming_events:
-                # Create unique key to avoid duplicate sends
-                reminder_key = f"event_{event.id}_{event.start_datetime.isoformat()}"
-                
-                if reminder_key in self.sent_reminders:
-                    logger.debug(f"⏭️  [SCHEDULER] Already sent reminder for event ID {event.id}, skipping")
-                    continue  # Already sent reminder for this event
-                
-                logger.info(f"📨 [SCHEDULER] Processing reminder for event ID {event.id} at {event.start_datetime.strftime('%H:%M')}")
-                
-                # Send reminders for this event
-                success = self._send_event_reminders(db, event)
-                
-                if success:
-                    self.sent_reminders.add(reminder_key)
-                    logger.info(f"✅ [SCHEDULER] Marked event ID {event.id} as sent")
-                    
-                    # Clean up old entries from sent_reminders to prevent memory bloat
-                    # Keep only reminders from last 24 hours
-                    cutoff_time = now - timedelta(hours=24)
-                    old_count = len(self.sent_reminders)
-                    self.sent_reminders = {
-                        key for key in self.sent_reminders 
-                        if '_' in key and len(key.split('_')) >= 3 and
-                        datetime.fromisoformat(key.split('_', 2)[2]) > cutoff_time
-                    }
-                    cleaned = old_count - len(self.sent_reminders)
-                    if cleaned > 0:
-                        logger.debug(f"🧹 [SCHEDULER] Cleaned {cleaned} old reminder(s) from cache")
-                else:
-                    logger.error(f"❌ [SCHEDULER] Failed to send reminders for event ID {event.id}")
-                    
-        except Exception as e:
-            logger.error(f"❌ [SCHEDULER] Error checking for lesson reminders: {e}", exc_info=True)
+            self._enqueue_due(db, now)
+            outcome = self._deliver_pending(db, now)
+            self._purge_old(db, now)
         finally:
             db.close()
-    
-    def _check_and_send_post_lesson_reminders(self):
-        """Check for recently finished lessons and send reminders to teachers if attendance missing"""
-        db = SessionLocal()
-        try:
-            now = datetime.now(timezone.utc)
-            # Look for lessons that ended 15-20 minutes ago
-            # If check_interval is 60s, a 5-minute window is safe
-            reminder_time_start = now - timedelta(minutes=20)
-            reminder_time_end = now - timedelta(minutes=15)
-            
-            # Query for active class events that ended in this window
-            ended_events = db.query(Event).filter(
+        return outcome
+
+    # ------------------------------------------------------------------
+    # Outbox
+    # ------------------------------------------------------------------
+
+    def _enqueue_due(self, db: Session, now: datetime):
+        """Add an outbox row for every notification entering its window"""
+        upcoming = db.execute(
+            select(Event.id, Event.start_datetime).where(
+                Event.is_active == True,
+                Event.event_type == 'class',  # Only class events (lessons)
+                Event.start_datetime >= now + REMINDER_WINDOW[0],
+                Event.start_datetime <= now + REMINDER_WINDOW[1],
+            )
+        ).all()
+        ended = db.execute(
+            select(Event.id, Event.end_datetime).where(
                 Event.is_active == True,
                 Event.event_type == 'class',
-                Event.end_datetime >= reminder_time_start,
-                Event.end_datetime <= reminder_time_end
-            ).all()
-            
-            if not ended_events:
-                return
-
-            logger.info(f"📅 [SCHEDULER] Found {len(ended_events)} recently ended class event(s)")
-            
-            for event in ended_events:
-                # Unique key for post-lesson reminder
-                reminder_key = f"post_lesson_{event.id}_{event.end_datetime.isoformat()}"
-                
-                if reminder_key in self.sent_reminders:
-                    continue
-                
-                # Check if attendance is recorded
-                # We check if there are any participants registered for this event
-                attendance_count = db.query(EventParticipant).filter(
-                    EventParticipant.event_id == event.id
-                ).count()
-                
-                # If attendance is empty or very low, send reminder
-                # We can't know exact expected count easily without querying groups, 
-                # but 0 means definitely no attendance
-                if attendance_count == 0:
-                    logger.info(f"⚠️  [POST-LESSON] Missing attendance for event {event.id}. sending notification.")
-                    success = self._send_post_lesson_notification(db, event)
-                    if success:
-                        self.sent_reminders.add(reminder_key)
-                        logger.info(f"✅ [POST-LESSON] Notification sent for event {event.id}")
-                else:
-                    logger.info(f"✓ [POST-LESSON] Attendance already recorded for event {event.id} ({attendance_count} records)")
-                    # Mark as 'sent' so we don't check again
-                    self.sent_reminders.add(reminder_key)
-                    
-        except Exception as e:
-            logger.error(f"❌ [SCHEDULER] Error checking post-lesson reminders: {e}", exc_info=True)
-        finally:
-            db.close()
-    
-    def _send_post_lesson_notification(self, db: Session, event: Event) -> bool:
-        """Send push notification to teacher about missing attendance/scores"""
-        try:
-            # Find teachers for this event
-            event_groups = db.query(EventGroup).filter(EventGroup.event_id == event.id).all()
-            if not event_groups:
-                return False
-                
-            teacher_ids = set()
-            for eg in event_groups:
-                group = db.query(Group).filter(Group.id == eg.group_id).first()
-                if group and group.teacher_id:
-                    teacher_ids.add(group.teacher_id)
-            
-            if not teacher_ids:
-                return False
-                
-            teachers = db.query(UserInDB).filter(
-                UserInDB.id.in_(teacher_ids),
-                UserInDB.is_active == True,
-                UserInDB.push_token.isnot(None) # Only if they have push token
-            ).all()
-            
-            sent_count = 0
-            for teacher in teachers:
-                if not teacher.push_token:
-                    continue
-                    
-                title = "⏳ Missing Attendance & Scores"
-                body = f"Lesson '{event.title}' has ended. Please record attendance and activity scores."
-                
-                success = send_push_notification(
-                    push_token=teacher.push_token,
-                    title=title,
-                    body=body,
-                    data={"type": "missing_attendance", "eventId": event.id}
-                )
-                if success:
-                    sent_count += 1
-            
-            return sent_count > 0
-            
-        except Exception as e:
-            logger.error(f"❌ [POST-LESSON] Error sending notification: {e}")
-            return False
-    
-    def _send_event_reminders(self, db: Session, event: Event) -> bool:
-        """
-        Send reminders for a specific class event
-        
-        Args:
-            db: Database session
-            event: Event to send reminders for
-            
-        Returns:
-            True if reminders sent successfully
-        """
+                Event.end_datetime >= now - POST_LESSON_WINDOW[1],
+                Event.end_datetime <= now - POST_LESSON_WINDOW[0],
+            )
+        ).all()
+        candidates = {(event_id, LESSON_REMINDER, start) for event_id, start in upcoming}
+        candidates |= {(event_id, MISSING_ATTENDANCE, end) for event_id, end in ended}
+        if not candidates:
+            logger.debug("✓ [SCHEDULER] No class events entering a reminder window")
+            return
+
+        existing = set(tuple(row) for row in db.execute(
+            select(NotificationOutbox.event_id, NotificationOutbox.kind, NotificationOutbox.occurrence).where(
+                NotificationOutbox.event_id.in_({event_id for event_id, _, _ in candidates})
+            )
+        ).all())
+        new_rows = [
+            NotificationOutbox(
+                event_id=event_id, kind=kind, occurrence=occurrence, status="pending",
+                attempts=0, next_attempt_at=now, sent_count=0, failed_count=0,
+            )
+            for event_id, kind, occurrence in candidates - existing
+        ]
+        if not new_rows:
+            return
+        db.add_all(new_rows)
         try:
-            logger.info(f"🎯 [REMINDER] Processing event ID {event.id}")
-            logger.info(f"   📚 Event: '{event.title}' (Type: {event.event_type})")
-            
-            # Convert UTC to Kazakhstan time (GMT+5) for display in email
-            KZ_OFFSET = timedelta(hours=5)
-            event_datetime_kz = event.start_datetime + KZ_OFFSET
-            event_datetime_str = event_datetime_kz.strftime("%d.%m.%Y в %H:%M")
-            
-            # Get groups associated with this event
-            event_groups = db.query(EventGroup).filter(
-                EventGroup.event_id == event.id
-            ).all()
-            
-            if not event_groups:
-                logger.warning(f"⚠️  [REMINDER] No groups found for event {event.id}")
-                return False
-            
-            logger.info(f"   � Found {len(event_groups)} group(s) for this event")
-            
-            sent_count = 0
-            failed_count = 0
-            
-            # Collect unique teachers from groups (teacher_id)
-            teacher_ids = set()
-            for event_group in event_groups:
-                group = db.query(Group).filter(Group.id == event_group.group_id).first()
-                if group and group.teacher_id:
-                    teacher_ids.add(group.teacher_id)
-            
-            # Get teacher objects
-            teachers = []
-            if teacher_ids:
-                teachers = db.query(UserInDB).filter(
-                    UserInDB.id.in_(teacher_ids),
-                    UserInDB.is_active == True,
-                    UserInDB.email.isnot(None)
-                ).all()
-            
-            logger.info(f"   👨‍🏫 Found {len(teachers)} unique teacher(s) from groups")
-            
-            # Process each group to get students
-            for event_group in event_groups:
-                group = db.query(Group).filter(Group.id == event_group.group_id).first()
-                if not group:
-                    logger.warning(f"⚠️  [REMINDER] Group {event_group.group_id} not found")
-                    continue
-                
-                logger.info(f"   📋 Processing group: '{group.name}' (ID: {group.id})")
-                
-                # Get students from the group
-                students = db.query(UserInDB).join(
-                    GroupStudent, UserInDB.id == GroupStudent.student_id
-                ).filter(
-                    GroupStudent.group_id == group.id,
-                    UserInDB.is_active == True,
-                    UserInDB.email.isnot(None)
-                ).all()
-                
-                logger.info(f"      👨‍🎓 Found {len(students)} active student(s) with email in group")
-                
-                # Send reminders to all students in this group
-                logger.info(f"      📤 Sending reminders to students...")
-                for student in students:
-                    try:
-                        result = send_lesson_reminder_notification(
-                            to_email=student.email,
-                            recipient_name=student.name or student.email.split('@')[0],
-                            lesson_title=event.title,
-                            lesson_datetime=event_datetime_str,
-                            group_name=group.name,
-                            role="student"
-                        )
-                        if result:
-                            sent_count += 1
-                        else:
-                            failed_count += 1
-                    except Exception as e:
-                        logger.error(f"❌ [REMINDER] Failed to send reminder to student {student.email}: {e}")
-                        failed_count += 1
-            
-            # Send reminders to teachers (from Group.teacher_id)
-            if teachers:
-                logger.info(f"   📤 Sending reminders to {len(teachers)} teacher(s)...")
-                for teacher in teachers:
-                    try:
-                        # Find all groups where this teacher teaches that are part of this event
-                        teacher_groups = [
-                            db.query(Group).filter(Group.id == eg.group_id).first()
-                            for eg in event_groups
-                            if db.query(Group).filter(
-                                Group.id == eg.group_id,
-                                Group.teacher_id == teacher.id
-                            ).first()
-                        ]
-                        
-                        # Use first group name or "Multiple Groups"
-                        group_names = [g.name for g in teacher_groups if g]
-                        group_name = group_names[0] if group_names else "Multiple Groups"
-                        
-                        result = send_lesson_reminder_notification(
-                            to_email=teacher.email,
-                            recipient_name=teacher.name or teacher.email.split('@')[0],
-                            lesson_title=event.title,
-                            lesson_datetime=event_datetime_str,
-                            group_name=group_name,
-                            role="teacher"
-                        )
-                        if result:
-                            sent_count += 1
-                            logger.info(f"      ✅ Sent to teacher: {teacher.email} (Group: {group_name})")
-                        else:
-                            failed_count += 1
-                    except Exception as e:
-                        logger.error(f"❌ [REMINDER] Failed to send reminder to teacher {teacher.email}: {e}")
-                        failed_count += 1
+            db.commit()
+            logger.info(f"📥 [SCHEDULER] Queued {len(new_rows)} notification(s)")
+        except IntegrityError:
+            # A previous leader queued them in the meantime
+            db.rollback()
+
+    def _deliver_pending(self, db: Session, now: datetime) -> Dict[str, int]:
+        outcome: Dict[str, int] = defaultdict(int)
+
+        # Deliveries interrupted by a crash are not repeated: part may have gone out
+        db.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.status == "sending", NotificationOutbox.updated_at < now - STALE_SENDING)
+            .values(status="failed", last_error="Interrupted while sending", updated_at=now)
+        )
+        rows = db.scalars(
+            select(NotificationOutbox)
+            .where(NotificationOutbox.status == "pending", NotificationOutbox.next_attempt_at <= now)
+            .order_by(NotificationOutbox.next_attempt_at)
+            .limit(NOTIFICATION_BATCH_SIZE)
+        ).all()
+        if not rows:
+            db.commit()
+            return dict(outcome)
+
+        events = {
+            event.id: event
+            for event in db.scalars(select(Event).where(Event.id.in_({row.event_id for row in rows})))
+        }
+        due = []
+        for row in rows:
+            event = events.get(row.event_id)
+            if event is None or not event.is_active or self._is_stale(row, event, now):
+                row.status = "expired"
+                outcome["expired"] += 1
+                continue
+            row.status = "sending"
+            row.attempts += 1
+            row.updated_at = now
+            due.append((row, event))
+        db.commit()
+        if not due:
+            return dict(outcome)
+
+        recipients = self._resolve_recipients(db, [event.id for _, event in due])
+        attended = self._events_with_attendance(
+            db, [event.id for row, event in due if row.kind == MISSING_ATTENDANCE]
+        )
+
+        # Start every delivery before waiting on any of them
+        pending = []
+        for row, event in due:
+            event_recipients = recipients.get(event.id)
+            if row.kind == LESSON_REMINDER:
+                tasks, skip_reason = self._start_lesson_reminder(event, event_recipients)
+            else:
+                tasks, skip_reason = self._start_missing_attendance(event, event_recipients, event.id in attended)
+            pending.append((row, event, tasks, skip_reason))
+
+        for row, event, tasks, skip_reason in pending:
+            sent, failed = self._collect(tasks)
+            row.sent_count += sent
+            row.failed_count += failed
+            row.updated_at = _utcnow()
+            if skip_reason:
+                row.status, row.last_error = "skipped", skip_reason
+            elif sent:
+                row.status = "sent"
+                logger.info(f"✅ [SCHEDULER] {row.kind} for event ID {event.id}: {sent} sent, {failed} failed")
+            elif row.attempts < NOTIFICATION_MAX_ATTEMPTS:
+                row.status = "pending"
+                row.next_attempt_at = now + timedelta(seconds=NOTIFICATION_RETRY_SECONDS)
+                row.last_error = f"{failed} delivery(ies) failed"
+                logger.warning(f"⚠️  [SCHEDULER] {row.kind} for event ID {event.id} failed, retrying")
             else:
-                logger.warning(f"⚠️  [REMINDER] No teachers found for event {event.id}")
-            
-            logger.info(
-                f"✅ [REMINDER] Completed for event '{event.title}' "
-                f"(Time: {event_datetime_str})"
+                row.status = "failed"
+                row.last_error = f"{failed} delivery(ies) failed"
+                logger.error(f"❌ [SCHEDULER] Failed to send {row.kind} for event ID {event.id}")
+            outcome[row.status] += 1
+        db.commit()
+        return dict(outcome)
+
+    @staticmethod
+    def _is_stale(row: NotificationOutbox, event: Event, now: datetime) -> bool:
+        if row.kind == LESSON_REMINDER:
+            # Rescheduled, or already started
+            return event.start_datetime != row.occurrence or event.start_datetime <= now
+        return event.end_datetime != row.occurrence or event.end_datetime + POST_LESSON_EXPIRY <= now
+
+    def _purge_old(self, db: Session, now: datetime):
+        db.execute(
+            delete(NotificationOutbox).where(
+                NotificationOutbox.created_at < now - timedelta(days=NOTIFICATION_OUTBOX_RETENTION_DAYS)
+            )
+        )
+        db.commit()
+
+    # ------------------------------------------------------------------
+    # Recipients
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _resolve_recipients(db: Session, event_ids: List[int]) -> Dict[int, EventRecipients]:
+        """Groups, students and teachers of all events, in three queries"""
+        groups_by_event: Dict[int, List[Tuple[int, str, Optional[int]]]] = defaultdict(list)
+        for event_id, group_id, name, teacher_id in db.execute(
+            select(EventGroup.event_id, Group.id, Group.name, Group.teacher_id)
+            .join(Group, Group.id == EventGroup.group_id)
+            .where(EventGroup.event_id.in_(event_ids))
+            .order_by(EventGroup.event_id, EventGroup.id)
+        ):
+            groups_by_event[event_id].append((group_id, name, teacher_id))
+
+        group_ids = {group[0] for groups in groups_by_event.values() for group in groups}
+        teacher_ids = {group[2] for groups in groups_by_event.values() for group in groups if group[2]}
+
+        students: Dict[int, List[Recipient]] = defaultdict(list)
+        if group_ids:
+            for group_id, *user in db.execute(
+                select(GroupStudent.group_id, UserInDB.id, UserInDB.email, UserInDB.name, UserInDB.push_token)
+                .join(UserInDB, UserInDB.id == GroupStudent.student_id)
+                .where(
+                    GroupStudent.group_id.in_(group_ids),
+                    UserInDB.is_active == True,
+                    UserInDB.email.isnot(None),
+                )
+                .order_by(GroupStudent.group_id, UserInDB.id)
+            ):
+                students[group_id].append(Recipient(*user))
+
+        teachers: Dict[int, Recipient] = {}
+        if teacher_ids:
+            for user in db.execute(
+                select(UserInDB.id, UserInDB.email, UserInDB.name, UserInDB.push_token)
+                .where(UserInDB.id.in_(teacher_ids), UserInDB.is_active == True)
+            ):
+                teachers[user.id] = Recipient(*user)
+
+        return {
+            event_id: EventRecipients(
+                groups=groups,
+                students={group_id: students.get(group_id, []) for group_id, _, _ in groups},
+                teachers={
+                    teacher_id: teachers[teacher_id]
+                    for _, _, teacher_id in groups if teacher_id in teachers
+                },
             )
-            logger.info(f"   📊 Sent: {sent_count}, Failed: {failed_count}")
-            
-            return sent_count > 0
-            
-        except Exception as e:
-            logger.error(f"❌ [REMINDER] Error sending event reminders for event {event.id}: {e}", exc_info=True)
-            return False
+            for event_id, groups in groups_by_event.items()
+        }
+
+    @staticmethod
+    def _events_with_attendance(db: Session, event_ids: List[int]) -> Set[int]:
+        if not event_ids:
+            return set()
+        return set(db.scalars(
+            select(EventParticipant.event_id).where(EventParticipant.event_id.in_(event_ids)).distinct()
+        ))
+
+    # ------------------------------------------------------------------
+    # Delivery
+    # ------------------------------------------------------------------
+
+    def _start_lesson_reminder(
+        self, event: Event, recipients: Optional[EventRecipients]
+    ) -> Tuple[List[Delivery], Optional[str]]:
+        """Submit the reminder emails and pushes of an event"""
+        if not recipients or not recipients.groups:
+            logger.warning(f"⚠️  [REMINDER] No groups found for event {event.id}")
+            return [], "No groups"
+
+        logger.info(f"🎯 [REMINDER] Processing event ID {event.id}: '{event.title}'")
+        event_datetime_kz = event.start_datetime + KZ_OFFSET
+        event_datetime_str = event_datetime_kz.strftime("%d.%m.%Y в %H:%M")
+
+        emails: List[Tuple[Recipient, str, str]] = []
+        seen: Set[int] = set()
+        for group_id, group_name, _ in recipients.groups:
+            for student in recipients.students[group_id]:
+                if student.id not in seen:
+                    seen.add(student.id)
+                    emails.append((student, group_name, "student"))
+        for teacher in recipients.teachers.values():
+            if teacher.email:
+                # First group of the event this teacher teaches
+                group_name = next(name for _, name, teacher_id in recipients.groups if teacher_id == teacher.id)
+                emails.append((teacher, group_name, "teacher"))
+        if not recipients.teachers:
+            logger.warning(f"⚠️  [REMINDER] No teachers found for event {event.id}")
+
+        pool = self._get_pool()
+        tasks = [
+            ("email", pool.submit(
+                send_lesson_reminder_notification,
+                to_email=recipient.email,
+                recipient_name=recipient.name or recipient.email.split('@')[0],
+                lesson_title=event.title,
+                lesson_datetime=event_datetime_str,
+                group_name=group_name,
+                role=role,
+            ))
+            for recipient, group_name, role in emails
+        ]
+
+        push_messages = [
+            build_message(
+                recipient.push_token,
+                "⏰ Lesson starts in 30 minutes",
+                f"'{event.title}' starts at {event_datetime_kz.strftime('%H:%M')}",
+                data={"type": "lesson_reminder", "eventId": event.id},
+            )
+            for recipient, _, _ in emails if recipient.push_token
+        ]
+        if push_messages:
+            tasks.append(("push", pool.submit(get_push_sender().send, push_messages)))
+
+        logger.info(f"   📤 {len(emails)} email(s), {len(push_messages)} push(es) for event ID {event.id}")
+        if not tasks:
+            return [], "No recipients"
+        return tasks, None
+
+    def _start_missing_attendance(
+        self, event: Event, recipients: Optional[EventRecipients], attendance_recorded: bool
+    ) -> Tuple[List[Delivery], Optional[str]]:
+        """Submit the push asking the event's teachers to record attendance"""
+        if attendance_recorded:
+            logger.info(f"✓ [POST-LESSON] Attendance already recorded for event {event.id}")
+            return [], "Attendance recorded"
+        teachers = [t for t in (recipients.teachers.values() if recipients else []) if t.push_token]
+        if not teachers:
+            return [], "No teachers with push tokens"
+
+        logger.info(f"⚠️  [POST-LESSON] Missing attendance for event {event.id}. sending notification.")
+        messages = [
+            build_message(
+                teacher.push_token,
+                "⏳ Missing Attendance & Scores",
+                f"Lesson '{event.title}' has ended. Please record attendance and activity scores.",
+                data={"type": "missing_attendance", "eventId": event.id},
+            )
+            for teacher in teachers
+        ]
+        return [("push", self._get_pool().submit(get_push_sender().send, messages))], None
+
+    @staticmethod
+    def _collect(tasks: List[Delivery]) -> Tuple[int, int]:
+        """(delivered, failed) over email results and push batch stats"""
+        sent = failed = 0
+        for channel, task in tasks:
+            try:
+                result = task.result()
+            except Exception as e:
+                logger.error(f"❌ [REMINDER] {channel} delivery failed: {e}")
+                failed += 1
+                continue
+            if channel == "push":
+                sent += result["success"]
+                failed += result["failed"]
+            elif result:
+                sent += 1
+            else:
+                failed += 1
+        return sent, failed
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=NOTIFICATION_WORKERS, thread_name_prefix="notification")
+        return self._pool
 
 
 # Global scheduler instance
@@ -0,0 +1,227 @@
+"""
+Media Storage
+Streamed uploads and conditional, range-capable downloads for the media router.
+
+Upload handlers used to ``await file.read()`` the whole upload (up to
+100 MB) and write it back out with aiofiles, so every concurrent upload held
+its full size in memory on top of the spooled copy Starlette already keeps.
+Downloads went through a bare ``FileResponse``. Now:
+
+- ``save_upload`` (``write_upload`` from a handler already in the threadpool)
+  copies the spooled upload in fixed-size chunks through one reused buffer,
+  in a worker thread, into a temp file next to the store;
+  size and sha256 are computed on the way, and uploads over the limit are
+  cut off as soon as they pass it
+- the finished temp file becomes the blob ``MEDIA_BLOB_DIR/ab/abcdef...``
+  (an atomic rename), or is dropped when that content is already stored
+- the public path (``uploads/materials/...``) is a hard link to the blob,
+  swapped in atomically, so identical uploads share disk and existing
+  ``/uploads`` URLs and ``Path.unlink`` deletes keep working
+- ``file_response`` answers ``If-None-Match`` with 304 and lets
+  ``FileResponse`` serve ``Range`` / ``If-Range`` requests, so video and PDF
+  viewers can seek without downloading the file again
+
+Where hard links are not supported the blob is copied instead (no dedupe).
+Which paths reference which blob, reference counts and removal of blobs
+nobody references are tracked in the database (see blob_store).
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from email.utils import formatdate
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional, Tuple, Union
+
+from fastapi import Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response
+
+logger = logging.getLogger(__name__)
+
+MEDIA_UPLOAD_ROOT = os.getenv("MEDIA_UPLOAD_ROOT", "uploads")
+# Must be on the same filesystem as MEDIA_UPLOAD_ROOT (renames and hard links)
+MEDIA_BLOB_DIR = os.getenv("MEDIA_BLOB_DIR", os.path.join(MEDIA_UPLOAD_ROOT, ".blobs"))
+MEDIA_MAX_UPLOAD_BYTES = int(os.getenv("MEDIA_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+MEDIA_UPLOAD_CHUNK_SIZE = int(os.getenv("MEDIA_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Downloads are access-checked per request; clients must revalidate
+DOWNLOAD_CACHE_CONTROL = "private, no-cache"
+
+
+class UploadTooLarge(Exception):
+    """The upload passed the size limit; nothing was stored"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds {limit} bytes")
+        self.limit = limit
+
+
+class StoredFile(NamedTuple):
+    path: Path
+    size: int
+    sha256: str
+    deduplicated: bool
+
+
+def blob_path(digest: str) -> Path:
+    return Path(MEDIA_BLOB_DIR) / digest[:2] / digest
+
+
+def relative_upload_path(path: Union[str, Path]) -> str:
+    """``path`` relative to the uploads root, as used after ``/uploads/`` in URLs"""
+    return Path(os.path.relpath(path, MEDIA_UPLOAD_ROOT)).as_posix()
+
+
+def ensure_blob(path: Union[str, Path], digest: str) -> None:
+    """Recreate a missing blob from an upload that still links its content"""
+    blob = blob_path(digest)
+    if blob.exists():
+        return
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(path, blob)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copyfile(path, blob)
+
+
+def remove_blob(digest: str) -> None:
+    try:
+        os.unlink(blob_path(digest))
+    except FileNotFoundError:
+        pass
+
+
+def iter_blob_files() -> Iterator[Tuple[Optional[str], Path, float]]:
+    """(digest or None for temp files, path, mtime) of every file in the blob directory"""
+    root = Path(MEDIA_BLOB_DIR)
+    if not root.is_dir():
+        return
+    for entry in root.iterdir():
+        if not entry.is_dir():
+            continue
+        for path in entry.iterdir():
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            yield (None if entry.name == "tmp" else path.name), path, mtime
+
+
+def _temp_dir() -> Path:
+    path = Path(MEDIA_BLOB_DIR) / "tmp"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _spool(source, limit: Optional[int], chunk_size: int):
+    """Copy ``source`` into a temp file; returns (temp path, size, sha256)"""
+    hasher = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    size = 0
+    fd, temp_name = tempfile.mkstemp(dir=_temp_dir(), prefix="upload-")
+    try:
+        with os.fdopen(fd, "wb") as target:
+            while True:
+                read = source.readinto(view)
+                if not read:
+                    break
+                size += read
+                if limit is not None and size > limit:
+                    raise UploadTooLarge(limit)
+                chunk = view[:read]
+                hasher.update(chunk)
+                target.write(chunk)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+    return temp_name, size, hasher.hexdigest()
+
+
+def link_into_place(blob: Path, destination: Path) -> None:
+    """Point ``destination`` at ``blob``, replacing whatever is there"""
+    fd, temp_name = tempfile.mkstemp(dir=_temp_dir(), prefix="link-")
+    os.close(fd)
+    os.unlink(temp_name)
+    try:
+        try:
+            os.link(blob, temp_name)
+        except OSError:
+            shutil.copyfile(blob, temp_name)
+        os.replace(temp_name, destination)
+    except BaseException:
+        if os.path.lexists(temp_name):
+            os.unlink(temp_name)
+        raise
+
+
+def store_stream(source, destination: Union[str, Path], max_bytes: Optional[int] = MEDIA_MAX_UPLOAD_BYTES,
+                 chunk_size: int = MEDIA_UPLOAD_CHUNK_SIZE) -> StoredFile:
+    """
+    Store a binary file object at ``destination`` through the blob store
+    (blocking; ``save_upload`` runs it in a worker thread)
+    """
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temp_name, size, digest = _spool(source, max_bytes, chunk_size)
+    blob = blob_path(digest)
+    deduplicated = blob.exists()
+    if deduplicated:
+        os.unlink(temp_name)
+    else:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_name, blob)
+    link_into_place(blob, destination)
+    return StoredFile(destination, size, digest, deduplicated)
+
+
+def write_upload(file: UploadFile, destination: Union[str, Path],
+                 max_bytes: Optional[int] = MEDIA_MAX_UPLOAD_BYTES) -> StoredFile:
+    """Blocking ``save_upload``, for handlers that already run in the threadpool"""
+    if max_bytes is not None and file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge(max_bytes)
+    file.file.seek(0)
+    return store_stream(file.file, destination, max_bytes)
+
+
+async def save_upload(file: UploadFile, destination: Union[str, Path],
+                      max_bytes: Optional[int] = MEDIA_MAX_UPLOAD_BYTES) -> StoredFile:
+    """Stream an uploaded file to ``destination``; raises UploadTooLarge past ``max_bytes``"""
+    return await run_in_threadpool(write_upload, file, destination, max_bytes)
+
+
+def resolve_under(root: Union[str, Path], relative: str) -> Optional[Path]:
+    """``root/relative`` if it stays inside ``root``, else None"""
+    base = Path(root).resolve()
+    path = (base / relative).resolve()
+    if path == base or base not in path.parents:
+        return None
+    return path
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    # Same validator FileResponse derives, so If-Range requests match it
+    etag_base = f"{stat_result.st_mtime}-{stat_result.st_size}"
+    return f'"{hashlib.md5(etag_base.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def file_response(request: Request, path: Union[str, Path], filename: Optional[str] = None,
+                  media_type: Optional[str] = None) -> Response:
+    """A download of ``path`` honouring If-None-Match, Range and If-Range"""
+    stat_result = os.stat(path)
+    etag = file_etag(stat_result)
+    headers = {"cache-control": DOWNLOAD_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        headers.update({"etag": etag, "last-modified": formatdate(stat_result.st_mtime, usegmt=True)})
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, filename=filename, media_type=media_type, stat_result=stat_result, headers=headers)
@@ -13,7 +13,7 @@ class GeminiParser:
     def __init__(self):
         self.model = genai.GenerativeModel('gemini-2.0-flash')
 
-    async def parse_file(self, file_path: str, mime_type: str = None, correct_answers: str = None) -> List[Dict[str, Any]]:
+    def parse_file(self, file_path: str, mime_type: str = None, correct_answers: str = None) -> List[Dict[str, Any]]:
         """
         Parse a file (PDF or Image) using Gemini to extract quiz questions.
         Returns a list of dictionaries compatible with the QuizQuestion model.
@@ -0,0 +1,332 @@
+"""
+PDF Report Service
+Renders the student, group and all-students analytics reports.
+
+Renderers take plain dictionaries and write into a binary file object, so they
+can run in a worker process (see export_jobs). Without reportlab they fall
+back to a plain text report.
+"""
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional
+
+
+def write_student_report(target: BinaryIO, student_data: Dict[str, Any], progress_data: Optional[Dict[str, Any]] = None):
+    """Генерация PDF отчета для студента"""
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.lib import colors
+    except ImportError:
+        # Если reportlab не установлен, возвращаем простой текстовый отчет
+        report_text = f"""
+ОТЧЕТ О ПРОГРЕССЕ СТУДЕНТА
+
+Имя: {student_data.get('student_name', 'N/A')}
+Email: {student_data.get('student_email', 'N/A')}
+Номер студента: {student_data.get('student_number', 'N/A')}
+
+ПРОГРЕСС:
+- Общий прогресс: {student_data.get('completion_percentage', 0)}%
+- Выполнено шагов: {student_data.get('completed_steps', 0)} из {student_data.get('total_steps', 0)}
+- Время обучения: {student_data.get('total_study_time_minutes', 0)} минут
+- Дневная серия: {student_data.get('daily_streak', 0)} дней
+
+ЗАДАНИЯ:
+- Всего заданий: {student_data.get('total_assignments', 0)}
+- Выполнено: {student_data.get('completed_assignments', 0)}
+- Средний балл: {student_data.get('assignment_score_percentage', 0)}%
+
+Отчет сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}
+        """
+        target.write(report_text.encode('utf-8'))
+        return
+
+    doc = SimpleDocTemplate(target, pagesize=A4)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Заголовок отчета
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=30,
+        alignment=1  # Center alignment
+    )
+
+    story.append(Paragraph("Отчет о прогрессе студента", title_style))
+    story.append(Spacer(1, 12))
+
+    # Информация о студенте
+    student_info = [
+        ['Имя:', student_data.get('student_name', 'N/A')],
+        ['Email:', student_data.get('student_email', 'N/A')],
+        ['Номер студента:', student_data.get('student_number', 'N/A')],
+        ['Общий прогресс:', f"{student_data.get('completion_percentage', 0)}%"],
+        ['Время обучения:', f"{student_data.get('total_study_time_minutes', 0)} мин"],
+        ['Дневная серия:', f"{student_data.get('daily_streak', 0)} дней"],
+    ]
+
+    student_table = Table(student_info, colWidths=[2*inch, 3*inch])
+    student_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('BACKGROUND', (1, 0), (1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+
+    story.append(Paragraph("Информация о студенте", styles['Heading2']))
+    story.append(student_table)
+    story.append(Spacer(1, 12))
+
+    # Прогресс по курсам
+    if progress_data and 'courses' in progress_data:
+        story.append(Paragraph("Прогресс по курсам", styles['Heading2']))
+
+        for course in progress_data['courses']:
+            story.append(Paragraph(f"Курс: {course.get('course_title', 'N/A')}", styles['Heading3']))
+
+            course_info = [
+                ['Преподаватель:', course.get('teacher_name', 'N/A')],
+                ['Модули:', str(len(course.get('modules', [])))],
+            ]
+
+            course_table = Table(course_info, colWidths=[2*inch, 3*inch])
+            course_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ]))
+
+            story.append(course_table)
+            story.append(Spacer(1, 12))
+
+    # Статистика заданий
+    story.append(Paragraph("Статистика выполнения заданий", styles['Heading2']))
+    assignment_info = [
+        ['Всего заданий:', str(student_data.get('total_assignments', 0))],
+        ['Выполнено:', str(student_data.get('completed_assignments', 0))],
+        ['Средний балл:', f"{student_data.get('assignment_score_percentage', 0)}%"],
+    ]
+
+    assignment_table = Table(assignment_info, colWidths=[2*inch, 3*inch])
+    assignment_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgreen),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ]))
+
+    story.append(assignment_table)
+    story.append(Spacer(1, 12))
+
+    # Дата генерации отчета
+    story.append(Paragraph(f"Отчет сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}", styles['Normal']))
+
+    doc.build(story)
+
+
+def write_group_report(target: BinaryIO, group_data: Dict[str, Any]):
+    """Генерация PDF отчета по группе"""
+    group_info = group_data['group_info']
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.lib.units import inch
+        from reportlab.lib import colors
+    except ImportError:
+        # Fallback к текстовому отчету
+        report_text = f"""
+ОТЧЕТ ПО ГРУППЕ: {group_info['name']}
+
+ИНФОРМАЦИЯ О ГРУППЕ:
+- Описание: {group_info['description'] or 'N/A'}
+- Преподаватель: {group_info['teacher_name'] or 'N/A'}
+- Куратор: {group_info['curator_name'] or 'N/A'}
+- Количество студентов: {group_data['total_students']}
+
+СТУДЕНТЫ:
+"""
+        for student in group_data['students']:
+            report_text += f"""
+- {student['student_name']} ({student['student_email']})
+  Прогресс: {student['completion_percentage']}%
+  Время обучения: {student['total_study_time_minutes']} мин
+  Задания: {student['completed_assignments']}/{student['total_assignments']}
+"""
+
+        report_text += f"\nОтчет сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
+        target.write(report_text.encode('utf-8'))
+        return
+
+    doc = SimpleDocTemplate(target, pagesize=A4)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Заголовок
+    story.append(Paragraph(f"Отчет по группе: {group_info['name']}", styles['Title']))
+    story.append(Spacer(1, 12))
+
+    # Информация о группе
+    info_rows = [
+        ['Название группы:', group_info['name']],
+        ['Описание:', group_info['description'] or 'N/A'],
+        ['Преподаватель:', group_info['teacher_name'] or 'N/A'],
+        ['Куратор:', group_info['curator_name'] or 'N/A'],
+        ['Количество студентов:', str(group_data['total_students'])],
+    ]
+
+    group_table = Table(info_rows, colWidths=[2*inch, 4*inch])
+    group_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ]))
+
+    story.append(Paragraph("Информация о группе", styles['Heading2']))
+    story.append(group_table)
+    story.append(Spacer(1, 12))
+
+    # Таблица студентов
+    if group_data['students']:
+        story.append(Paragraph("Студенты группы", styles['Heading2']))
+
+        student_rows = [['Имя', 'Email', 'Прогресс %', 'Время (мин)', 'Задания']]
+
+        for student in group_data['students']:
+            student_rows.append([
+                student['student_name'],
+                student['student_email'],
+                f"{student['completion_percentage']}%",
+                str(student['total_study_time_minutes']),
+                f"{student['completed_assignments']}/{student['total_assignments']}"
+            ])
+
+        students_table = Table(student_rows, colWidths=[1.5*inch, 2*inch, 1*inch, 1*inch, 1*inch])
+        students_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+
+        story.append(students_table)
+
+    story.append(Spacer(1, 12))
+    story.append(Paragraph(f"Отчет сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}", styles['Normal']))
+
+    doc.build(story)
+
+
+def write_all_students_report(target: BinaryIO, students: List[Dict[str, Any]]):
+    """PDF report over all students visible to the requesting user"""
+    total_students = len(students)
+    avg_completion = sum(s['completion_percentage'] for s in students) / total_students if total_students > 0 else 0
+    total_study_time = sum(s['total_study_time_minutes'] or 0 for s in students)
+
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.lib.units import inch
+        from reportlab.lib import colors
+    except ImportError:
+        # Fallback to text report
+        report_text = f"""
+ALL STUDENTS REPORT
+
+OVERALL STATISTICS:
+- Total Students: {total_students}
+- Average Progress: {avg_completion:.1f}%
+- Total Study Time: {total_study_time} min
+
+STUDENTS:
+"""
+        for student in students:
+            groups_str = ', '.join([g['name'] for g in student['groups']]) if student['groups'] else 'No group'
+            report_text += f"""
+- {student['student_name']} ({student['student_email']})
+  Groups: {groups_str}
+  Progress: {student['completion_percentage']}%
+  Active Courses: {student['active_courses_count']}
+  Study Time: {student['total_study_time_minutes']} min
+"""
+
+        report_text += f"\nReport generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        target.write(report_text.encode('utf-8'))
+        return
+
+    doc = SimpleDocTemplate(target, pagesize=A4)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Title (English to avoid Cyrillic encoding issues)
+    story.append(Paragraph("All Students Report", styles['Title']))
+    story.append(Spacer(1, 12))
+
+    # Overall Statistics
+    summary_info = [
+        ['Total Students:', str(total_students)],
+        ['Average Progress:', f"{avg_completion:.1f}%"],
+        ['Total Study Time:', f"{total_study_time} min ({total_study_time//60} h)"],
+    ]
+
+    summary_table = Table(summary_info, colWidths=[2*inch, 3*inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ]))
+
+    story.append(Paragraph("Overall Statistics", styles['Heading2']))
+    story.append(summary_table)
+    story.append(Spacer(1, 12))
+
+    # Students Table
+    if students:
+        story.append(Paragraph("Detailed Student Information", styles['Heading2']))
+
+        student_rows = [['Name', 'Groups', 'Progress %', 'Courses', 'Time (h)']]
+
+        for student in students:
+            groups_str = ', '.join([g['name'] for g in student['groups']]) if student['groups'] else 'No group'
+            student_rows.append([
+                student['student_name'],
+                groups_str[:20] + '...' if len(groups_str) > 20 else groups_str,
+                f"{student['completion_percentage']}%",
+                str(student['active_courses_count']),
+                str((student['total_study_time_minutes'] or 0) // 60)
+            ])
+
+        students_table = Table(student_rows, colWidths=[1.5*inch, 1.5*inch, 1*inch, 0.8*inch, 1*inch])
+        students_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+
+        story.append(students_table)
+
+    story.append(Spacer(1, 12))
+    story.append(Paragraph(f"Report generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
+
+    doc.build(story)
@@ -0,0 +1,124 @@
+"""
+Points Ledger
+Per-user weekly and monthly point totals for leaderboards and ranks.
+
+The monthly leaderboard and ``rank_this_month`` summed ``point_history``
+filtered by ``extract('year'/'month', created_at)`` - no index applies, so
+every request aggregated the whole history - and the weekly bonus
+allowance found a teacher's bonuses with ``description LIKE '%teacher:N%'``.
+Now:
+
+- every award adds its amount to the user's ``point_totals`` rows for the
+  current week (Monday, UTC) and month, with one upsert per period in the
+  same transaction as the ``point_history`` row
+- leaderboards read the top rows of ``(period, period_start, points)``;
+  a rank is the number of rows in that slice with more points, plus one
+- the all-time board reads ``users.activity_points`` through
+  ``(role, activity_points)``
+- teacher bonuses carry the giver in ``point_history.awarded_by``
+
+Nothing here commits; callers commit the award with the rest of their work.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.schemas.models import PointTotal, UserInDB
+
+PERIOD_WEEK = "week"
+PERIOD_MONTH = "month"
+PERIODS = (PERIOD_WEEK, PERIOD_MONTH)
+
+
+def period_bounds(period: str, moment: Optional[datetime] = None) -> Tuple[date, date]:
+    """First and last day of the week / month containing ``moment`` (UTC now by default)"""
+    day = (moment or datetime.now(timezone.utc)).date()
+    if period == PERIOD_WEEK:
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == PERIOD_MONTH:
+        start = day.replace(day=1)
+        following = date(start.year + 1, 1, 1) if start.month == 12 else date(start.year, start.month + 1, 1)
+        return start, following - timedelta(days=1)
+    raise ValueError(f"Unknown points period: {period!r}")
+
+
+def _dialect_insert(db: Session):
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert
+    return pg_insert
+
+
+def record_points(db: Session, user_id: int, amount: int, moment: Optional[datetime] = None) -> None:
+    """Add ``amount`` to the user's totals for the periods containing ``moment``"""
+    moment = moment or datetime.now(timezone.utc)
+    rows = [
+        {"user_id": user_id, "period": period, "period_start": period_bounds(period, moment)[0],
+         "points": amount, "updated_at": moment}
+        for period in PERIODS
+    ]
+    stmt = _dialect_insert(db)(PointTotal).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "period", "period_start"],
+        set_={"points": PointTotal.points + stmt.excluded.points, "updated_at": stmt.excluded.updated_at},
+    ))
+
+
+def user_points(db: Session, user_id: int, period: str, moment: Optional[datetime] = None) -> int:
+    """The user's total for the period containing ``moment``"""
+    points = db.query(PointTotal.points).filter(
+        PointTotal.period == period,
+        PointTotal.period_start == period_bounds(period, moment)[0],
+        PointTotal.user_id == user_id,
+    ).scalar()
+    return int(points or 0)
+
+
+def _period_totals(db: Session, period: str, moment: Optional[datetime], user_ids=None):
+    query = db.query(PointTotal.user_id, PointTotal.points).filter(
+        PointTotal.period == period,
+        PointTotal.period_start == period_bounds(period, moment)[0],
+    )
+    if user_ids is not None:
+        query = query.filter(PointTotal.user_id.in_(user_ids))
+    return query
+
+
+def top_users(db: Session, period: str, limit: int, moment: Optional[datetime] = None,
+              user_ids=None) -> List[Tuple[int, int]]:
+    """(user_id, points) of the ``limit`` highest totals, optionally among ``user_ids`` (a list or subquery)"""
+    rows = _period_totals(db, period, moment, user_ids).order_by(
+        PointTotal.points.desc(), PointTotal.user_id
+    ).limit(limit).all()
+    return [(user_id, int(points)) for user_id, points in rows]
+
+
+def rank_of(db: Session, period: str, points: int, moment: Optional[datetime] = None, user_ids=None) -> int:
+    """1 + how many totals in the period beat ``points``"""
+    ahead = _period_totals(db, period, moment, user_ids).filter(
+        PointTotal.points > points
+    ).with_entities(func.count()).scalar()
+    return (ahead or 0) + 1
+
+
+def top_students_all_time(db: Session, limit: int, user_ids=None) -> List[Tuple[int, int]]:
+    """(user_id, activity_points) of the ``limit`` students with the most points"""
+    query = db.query(UserInDB.id, UserInDB.activity_points).filter(UserInDB.role == 'student')
+    if user_ids is not None:
+        query = query.filter(UserInDB.id.in_(user_ids))
+    rows = query.order_by(UserInDB.activity_points.desc(), UserInDB.id).limit(limit).all()
+    return [(user_id, int(points or 0)) for user_id, points in rows]
+
+
+def rank_all_time(db: Session, points: int, user_ids=None) -> int:
+    """1 + how many students have more than ``points`` activity points"""
+    query = db.query(func.count(UserInDB.id)).filter(
+        UserInDB.role == 'student', UserInDB.activity_points > points
+    )
+    if user_ids is not None:
+        query = query.filter(UserInDB.id.in_(user_ids))
+    return (query.scalar() or 0) + 1
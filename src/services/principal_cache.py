@@ -0,0 +1,178 @@
+"""
+Per-process cache of authenticated principals.
+
+get_current_user_dependency runs on every authenticated request and used to
+look the caller up with ``lower(email) = ...``, which cannot use the unique
+index on ``users.email``. This module keeps a small TTL-bounded snapshot of
+the identity columns for recently seen users, keyed by the token's
+``user_id`` (or ``sub`` for older tokens without it).
+
+On a hit the snapshot is re-attached to the request session with
+``Session.merge(load=False)``, so no SELECT is issued. Columns that are not
+part of the snapshot (streaks, points, push tokens, ...) stay unloaded and are
+fetched by primary key the first time a route touches them, which keeps
+frequently changing counters from going stale.
+
+Each entry is tagged with the cache generations of its user (see
+src.services.cache_generations); a committed change to a user's snapshot
+columns, or a bulk update/delete on users, bumps them, and every worker
+drops the entry on its next hit. Checking them is a primary-key read, so a
+deactivated, deleted or demoted user loses the old snapshot in all workers
+at once instead of when the TTL runs out. ``invalidate_principal`` still
+drops the local entry right away.
+"""
+import logging
+import os
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from cachetools import TTLCache
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from src.schemas.models import UserInDB
+from src.services import cache_generations
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", "4096"))
+
+# Bumped by bulk writes to users; per-user names are bumped by ORM changes
+CACHE_NAME = "principal"
+
+# Columns that identify the caller and drive authorization decisions.
+_PRINCIPAL_COLUMNS = (
+    "id",
+    "email",
+    "name",
+    "role",
+    "is_active",
+    "avatar_url",
+    "student_id",
+    "no_substitutions",
+    "created_at",
+)
+
+_cache: TTLCache = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+# Invalidation also happens from the RabbitMQ consumer thread.
+_lock = threading.Lock()
+
+
+def _cache_key(payload: Dict[str, Any]) -> Optional[Hashable]:
+    user_id = payload.get("user_id")
+    if user_id is not None:
+        return ("id", int(user_id))
+    sub = payload.get("sub")
+    if sub:
+        return ("sub", sub.lower())
+    return None
+
+
+def user_cache_name(user_id: int) -> str:
+    return f"{CACHE_NAME}:{user_id}"
+
+
+def _generation_tag(db: Session, user_id: int) -> Tuple[int, int]:
+    name = user_cache_name(user_id)
+    current = cache_generations.generations(db, (CACHE_NAME, name))
+    return current[CACHE_NAME], current[name]
+
+
+def _snapshot(user: UserInDB) -> Dict[str, Any]:
+    return {column: getattr(user, column) for column in _PRINCIPAL_COLUMNS}
+
+
+def _attach(snapshot: Dict[str, Any], db: Session) -> UserInDB:
+    user = UserInDB(**snapshot)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def get_principal(payload: Dict[str, Any], db: Session) -> Optional[UserInDB]:
+    """
+    Resolve the user a decoded access token belongs to.
+
+    Returns a session-bound UserInDB (possibly inactive) or None if the user
+    does not exist. Inactive users are never cached.
+    """
+    sub = payload.get("sub")
+    if not sub:
+        return None
+
+    key = _cache_key(payload)
+    with _lock:
+        cached = _cache.get(key)
+
+    # The token subject must still match; an email change invalidates old tokens.
+    if cached is not None:
+        tag, snapshot = cached
+        if snapshot["email"].lower() == sub.lower() and _generation_tag(db, snapshot["id"]) == tag:
+            return _attach(snapshot, db)
+
+    user = db.query(UserInDB).filter(func.lower(UserInDB.email) == sub.lower()).first()
+    if user is None or not user.is_active:
+        with _lock:
+            _cache.pop(key, None)
+        return user
+    # Read after the user, in the same transaction: a change committed in
+    # between leaves the entry tagged with the older generation
+    tag = _generation_tag(db, user.id)
+    with _lock:
+        _cache[key] = (tag, _snapshot(user))
+    return user
+
+
+def invalidate_principal(user_id: Optional[int] = None, email: Optional[str] = None) -> None:
+    """Drop any cached principal matching the given user id or email."""
+    email = email.lower() if email else None
+    with _lock:
+        if user_id is not None:
+            _cache.pop(("id", user_id), None)
+        if email:
+            _cache.pop(("sub", email), None)
+        # Entries keyed by the other identifier still need to go.
+        for key in list(_cache.keys()):
+            cached = _cache.get(key)
+            if cached is None:
+                continue
+            snapshot = cached[1]
+            if (user_id is not None and snapshot["id"] == user_id) or (
+                email and snapshot["email"].lower() == email
+            ):
+                _cache.pop(key, None)
+
+
+def clear_principal_cache() -> None:
+    """Drop every cached principal."""
+    with _lock:
+        _cache.clear()
+
+
+# --- Invalidation -----------------------------------------------------------
+# Users are changed by admin routes, profile updates and the RabbitMQ
+# consumer (in whichever worker takes the message), so changes are detected
+# at the session level and published through cache generations.
+
+
+def _snapshot_changed(user: UserInDB) -> bool:
+    state = inspect(user)
+    return any(state.attrs[column].history.has_changes() for column in _PRINCIPAL_COLUMNS)
+
+
+@event.listens_for(Session, "before_flush")
+def _mark_changed_principals(session, flush_context, instances):
+    for user in session.dirty:
+        if isinstance(user, UserInDB) and user.id is not None and _snapshot_changed(user):
+            cache_generations.mark(session, user_cache_name(user.id))
+    for user in session.deleted:
+        if isinstance(user, UserInDB):
+            cache_generations.mark(session, user_cache_name(user.id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_all_on_bulk_write(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if any(mapper.local_table.name == UserInDB.__tablename__ for mapper in orm_execute_state.all_mappers):
+        cache_generations.mark(orm_execute_state.session, CACHE_NAME)
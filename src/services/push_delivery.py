@@ -0,0 +1,288 @@
+"""
+Push Delivery
+Batched Expo push notifications with receipt processing.
+
+Notifications used to be sent with one request per device. Expo accepts up to
+100 messages per request and reports delivery problems in two steps: a ticket
+per message in the send response, and a receipt per ticket that can be
+fetched once Expo has handed the message to APNs/FCM. The sender:
+
+- queues messages (``enqueue``) and sends them (``flush``/``send``) in chunks
+  of EXPO_PUSH_BATCH_SIZE over PUSH_DELIVERY_CONCURRENCY threads
+- keeps the ticket ids and fetches their receipts after
+  PUSH_RECEIPT_DELAY_SECONDS (``process_receipts``); every worker that sends
+  runs a receipt poller thread every PUSH_RECEIPT_POLL_SECONDS while it has
+  tickets pending, so pushes sent from request handlers are checked too
+- clears tokens Expo reports as DeviceNotRegistered from ``users`` with one
+  UPDATE per batch
+
+Pending receipts are kept in memory, per worker; receipts lost on restart
+only delay the cleanup of a dead token until the next notification to it.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import update
+
+from src.config import SessionLocal
+from src.schemas.models import UserInDB
+from src.services.http_client import get_integration
+
+logger = logging.getLogger(__name__)
+
+EXPO_PUSH_ENDPOINT = os.getenv("EXPO_PUSH_ENDPOINT", "https://exp.host/--/api/v2/push/send")
+EXPO_RECEIPTS_ENDPOINT = os.getenv("EXPO_RECEIPTS_ENDPOINT", "https://exp.host/--/api/v2/push/getReceipts")
+# Expo limits: 100 messages per send, 1000 ids per receipts request
+EXPO_PUSH_BATCH_SIZE = 100
+EXPO_RECEIPTS_BATCH_SIZE = 1000
+PUSH_DELIVERY_CONCURRENCY = int(os.getenv("PUSH_DELIVERY_CONCURRENCY", "4"))
+# Expo suggests checking receipts about 15 minutes after sending
+PUSH_RECEIPT_DELAY_SECONDS = int(os.getenv("PUSH_RECEIPT_DELAY_SECONDS", "900"))
+PUSH_MAX_PENDING_RECEIPTS = int(os.getenv("PUSH_MAX_PENDING_RECEIPTS", "100000"))
+PUSH_RECEIPT_POLL_SECONDS = float(os.getenv("PUSH_RECEIPT_POLL_SECONDS", "60"))
+
+_HEADERS = {
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "Content-Type": "application/json",
+}
+
+
+def is_expo_token(token: Optional[str]) -> bool:
+    return bool(token) and token.startswith("ExponentPushToken[")
+
+
+def build_message(
+    push_token: str,
+    title: str,
+    body: str,
+    data: Optional[Dict[str, Any]] = None,
+    sound: str = "default",
+    priority: str = "high",
+    badge: Optional[int] = None,
+) -> Dict[str, Any]:
+    message = {"to": push_token, "title": title, "body": body, "sound": sound, "priority": priority}
+    if data:
+        message["data"] = data
+    if badge is not None:
+        message["badge"] = badge
+    return message
+
+
+def _is_unregistered(result: Dict[str, Any]) -> bool:
+    return (result.get("details") or {}).get("error") == "DeviceNotRegistered"
+
+
+class PushSender:
+    """Sends Expo push messages in batches and follows up on their receipts"""
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        push_url: str = EXPO_PUSH_ENDPOINT,
+        receipts_url: str = EXPO_RECEIPTS_ENDPOINT,
+        batch_size: int = EXPO_PUSH_BATCH_SIZE,
+        concurrency: int = PUSH_DELIVERY_CONCURRENCY,
+        receipt_delay_seconds: int = PUSH_RECEIPT_DELAY_SECONDS,
+        receipt_poll_seconds: float = PUSH_RECEIPT_POLL_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.push_url = push_url
+        self.receipts_url = receipts_url
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.receipt_delay_seconds = receipt_delay_seconds
+        self.receipt_poll_seconds = receipt_poll_seconds
+        self._queue: List[Dict[str, Any]] = []
+        # (sent_at, ticket_id, token) awaiting a receipt, oldest first
+        self._tickets: List[Tuple[float, str, str]] = []
+        self._lock = threading.Lock()
+        # Runs while tickets are pending; started by the send that adds the first
+        self._poller: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def enqueue(self, push_token: str, title: str, body: str, **kwargs) -> bool:
+        """Queue a notification for the next flush; False for invalid tokens"""
+        if not is_expo_token(push_token):
+            logger.warning(f"Invalid push token format: {push_token}")
+            return False
+        with self._lock:
+            self._queue.append(build_message(push_token, title, body, **kwargs))
+        return True
+
+    def flush(self) -> Dict[str, int]:
+        """Send everything queued so far"""
+        with self._lock:
+            messages, self._queue = self._queue, []
+        return self.send(messages)
+
+    def send(self, messages: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Send messages in batches. Returns counts of accepted (``success``)
+        and rejected (``failed``) messages and of tokens cleared as invalid.
+        """
+        stats = {"success": 0, "failed": 0, "invalid_tokens": 0}
+        valid = []
+        for message in messages:
+            if is_expo_token(message.get("to")):
+                valid.append(message)
+            else:
+                logger.warning(f"Skipping invalid token: {message.get('to')}")
+                stats["failed"] += 1
+        if not valid:
+            return stats
+
+        chunks = [valid[i:i + self.batch_size] for i in range(0, len(valid), self.batch_size)]
+        if len(chunks) == 1:
+            results = [self._send_chunk(chunks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(chunks))) as pool:
+                results = list(pool.map(self._send_chunk, chunks))
+
+        unregistered: Set[str] = set()
+        tickets = []
+        now = time.time()
+        for chunk, tickets_data in zip(chunks, results):
+            if tickets_data is None:
+                stats["failed"] += len(chunk)
+                continue
+            for message, ticket in zip(chunk, tickets_data):
+                if ticket.get("status") == "ok":
+                    stats["success"] += 1
+                    if ticket.get("id"):
+                        tickets.append((now, ticket["id"], message["to"]))
+                else:
+                    stats["failed"] += 1
+                    logger.error(f"Expo push error: {ticket.get('message', 'Unknown error')}")
+                    if _is_unregistered(ticket):
+                        unregistered.add(message["to"])
+
+        with self._lock:
+            self._tickets.extend(tickets)
+            overflow = len(self._tickets) - PUSH_MAX_PENDING_RECEIPTS
+            if overflow > 0:
+                del self._tickets[:overflow]
+            if self._tickets and self._poller is None:
+                self._poller = threading.Thread(target=self._poll_receipts, name="push-receipts", daemon=True)
+                self._poller.start()
+
+        stats["invalid_tokens"] = self._clear_tokens(unregistered)
+        logger.info(
+            f"Push delivery: {stats['success']} sent, {stats['failed']} failed "
+            f"in {len(chunks)} request(s)"
+        )
+        return stats
+
+    def process_receipts(self, force: bool = False) -> Dict[str, int]:
+        """
+        Fetch receipts for tickets older than the receipt delay (all of them
+        with ``force``) and clear tokens of unregistered devices.
+        """
+        cutoff = float("inf") if force else time.time() - self.receipt_delay_seconds
+        with self._lock:
+            due = [ticket for ticket in self._tickets if ticket[0] <= cutoff]
+            self._tickets = [ticket for ticket in self._tickets if ticket[0] > cutoff]
+        stats = {"checked": 0, "errors": 0, "invalid_tokens": 0}
+        if not due:
+            return stats
+
+        token_by_ticket = {ticket_id: token for _, ticket_id, token in due}
+        ids = list(token_by_ticket)
+        unregistered: Set[str] = set()
+        for start in range(0, len(ids), EXPO_RECEIPTS_BATCH_SIZE):
+            receipts = self._fetch_receipts(ids[start:start + EXPO_RECEIPTS_BATCH_SIZE])
+            for ticket_id, receipt in receipts.items():
+                stats["checked"] += 1
+                if receipt.get("status") == "ok":
+                    continue
+                stats["errors"] += 1
+                logger.warning(f"Expo push receipt error: {receipt.get('message', 'Unknown error')}")
+                if _is_unregistered(receipt) and ticket_id in token_by_ticket:
+                    unregistered.add(token_by_ticket[ticket_id])
+
+        stats["invalid_tokens"] = self._clear_tokens(unregistered)
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _poll_receipts(self):
+        """Process receipts of this worker's tickets until none are pending"""
+        while True:
+            time.sleep(self.receipt_poll_seconds)
+            try:
+                self.process_receipts()
+            except Exception as e:
+                logger.error(f"Failed to process push receipts: {e}")
+            with self._lock:
+                if not self._tickets:
+                    self._poller = None
+                    return
+
+    def _send_chunk(self, chunk: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """Tickets for the chunk in message order, or None if the request failed"""
+        try:
+            response = get_integration("expo").post(self.push_url, json=chunk, headers=_HEADERS)
+            if response.status_code != 200:
+                logger.error(f"Batch push request failed: {response.status_code} - {response.text}")
+                return None
+            tickets = response.json().get("data", [])
+        except Exception as e:
+            logger.error(f"Exception in batch push: {str(e)}")
+            return None
+        if len(tickets) != len(chunk):
+            logger.error(f"Expo returned {len(tickets)} tickets for {len(chunk)} messages")
+            return None
+        return tickets
+
+    def _fetch_receipts(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            response = get_integration("expo").post(self.receipts_url, json={"ids": ids}, headers=_HEADERS)
+            if response.status_code != 200:
+                logger.error(f"Push receipts request failed: {response.status_code} - {response.text}")
+                return {}
+            return response.json().get("data", {})
+        except Exception as e:
+            logger.error(f"Exception fetching push receipts: {str(e)}")
+            return {}
+
+    def _clear_tokens(self, tokens: Iterable[str]) -> int:
+        tokens = list(tokens)
+        if not tokens:
+            return 0
+        db = self.session_factory()
+        try:
+            result = db.execute(
+                update(UserInDB)
+                .where(UserInDB.push_token.in_(tokens))
+                .values(push_token=None, device_type=None)
+            )
+            db.commit()
+            logger.info(f"Cleared {result.rowcount} unregistered push token(s)")
+            return result.rowcount
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to clear unregistered push tokens: {e}")
+            return 0
+        finally:
+            db.close()
+
+
+# Singleton instance
+_push_sender = None
+
+
+def get_push_sender() -> PushSender:
+    """Get singleton instance of the push sender"""
+    global _push_sender
+    if _push_sender is None:
+        _push_sender = PushSender()
+    return _push_sender
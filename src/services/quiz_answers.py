@@ -0,0 +1,148 @@
+"""
+Quiz Answers
+Per-question answer rows for finished quiz attempts.
+
+``QuizAttempt.answers`` is a JSON string, so the quiz-errors report used to
+load every attempt of the course, decode it and score each answer in Python.
+Now:
+
+- when an attempt is finished (created or updated as non-draft) its answers
+  are written to ``quiz_attempt_answers``, one row per answered question,
+  scored against the compiled answer key (see quiz_content)
+- each row remembers the ``Step.content_hash`` it was scored against; when
+  a step's content changes, its rows are rescored before the transaction
+  commits
+- per-question error rates are one ``GROUP BY`` over those rows, filtered by
+  the same attempt conditions the report applies (course, lesson, group,
+  the teacher's or curator's students)
+
+Drafts have no rows; they are written when the draft is finished.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, func, insert, inspect, update
+from sqlalchemy.orm import Query, Session
+
+from src.schemas.models import QuizAttempt, QuizAttemptAnswer, Step
+from src.services.quiz_content import CompiledQuiz, get_compiled_quiz, iter_answers
+
+
+def answer_rows(attempt_id: int, step_id: int, answers: Any, quiz: CompiledQuiz,
+                content_hash: Optional[str]) -> List[Dict[str, Any]]:
+    """Rows for an attempt's answers; unreadable answers give none"""
+    try:
+        pairs = list(iter_answers(answers))
+    except (TypeError, ValueError):
+        return []
+    rows = []
+    for question_id, value in pairs:
+        error_score = quiz.error_score(question_id, value)
+        rows.append({
+            "attempt_id": attempt_id,
+            "step_id": step_id,
+            "question_id": str(question_id),
+            "user_answer": json.dumps(value, ensure_ascii=False),
+            "is_correct": None if error_score is None else error_score == 0.0,
+            "error_score": error_score,
+            "content_hash": content_hash,
+        })
+    return rows
+
+
+def record_attempt_answers(db: Session, attempt: QuizAttempt, replace: bool = True) -> None:
+    """
+    Write the answer rows of a finished attempt (call before commit, after
+    the attempt has an id). ``replace=False`` skips clearing earlier rows of
+    an attempt that cannot have any yet.
+    """
+    if attempt.is_draft:
+        return
+    if replace:
+        db.query(QuizAttemptAnswer).filter(
+            QuizAttemptAnswer.attempt_id == attempt.id
+        ).delete(synchronize_session=False)
+    if not attempt.answers:
+        return
+    step = db.get(Step, attempt.step_id)
+    quiz = get_compiled_quiz(step) if step is not None else CompiledQuiz({})
+    rows = answer_rows(attempt.id, attempt.step_id, attempt.answers, quiz, step.content_hash if step else None)
+    if rows:
+        db.execute(insert(QuizAttemptAnswer), rows)
+
+
+def rescore_step(db: Session, step: Step) -> int:
+    """Rescore the rows of ``step`` against its current content; returns how many changed"""
+    quiz = get_compiled_quiz(step)
+    rows = db.query(
+        QuizAttemptAnswer.id, QuizAttemptAnswer.question_id, QuizAttemptAnswer.user_answer
+    ).filter(
+        QuizAttemptAnswer.step_id == step.id,
+        QuizAttemptAnswer.content_hash.is_distinct_from(step.content_hash),
+    ).all()
+    updates = []
+    for row_id, question_id, user_answer in rows:
+        try:
+            value = json.loads(user_answer) if user_answer is not None else None
+        except ValueError:
+            value = user_answer
+        error_score = quiz.error_score(question_id, value)
+        updates.append({
+            "id": row_id,
+            "is_correct": None if error_score is None else error_score == 0.0,
+            "error_score": error_score,
+            "content_hash": step.content_hash,
+        })
+    if updates:
+        db.execute(update(QuizAttemptAnswer), updates)
+    return len(updates)
+
+
+def question_error_stats(db: Session, attempts: Query) -> list:
+    """
+    (step_id, question_id, answered, wrong, lesson_id) per question, over
+    the gradable answers of the attempts ``attempts`` selects
+    """
+    return db.query(
+        QuizAttemptAnswer.step_id,
+        QuizAttemptAnswer.question_id,
+        func.count(QuizAttemptAnswer.id),
+        func.sum(QuizAttemptAnswer.error_score),
+        func.max(QuizAttempt.lesson_id),
+    ).join(
+        QuizAttempt, QuizAttempt.id == QuizAttemptAnswer.attempt_id
+    ).filter(
+        attempts.whereclause,
+        QuizAttemptAnswer.error_score.isnot(None),
+    ).group_by(
+        QuizAttemptAnswer.step_id, QuizAttemptAnswer.question_id
+    ).all()
+
+
+# --- Rescoring --------------------------------------------------------------
+# Steps are edited from the course editor and the question error-report
+# routes; edited steps are collected at flush time and their answer rows
+# rescored in the same transaction, just before it commits.
+
+_EDITED_STEPS = "quiz_answers_edited_steps"
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_edited_steps(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, Step) and inspect(obj).attrs.content_hash.history.has_changes():
+            session.info.setdefault(_EDITED_STEPS, set()).add(obj)
+
+
+@event.listens_for(Session, "before_commit")
+def _rescore_edited_steps(session):
+    session.flush()
+    steps = session.info.pop(_EDITED_STEPS, None)
+    for step in steps or ():
+        if step in session:
+            rescore_step(session, step)
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_on_rollback(session):
+    session.info.pop(_EDITED_STEPS, None)
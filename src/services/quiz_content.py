@@ -0,0 +1,311 @@
+"""
+Quiz Content
+Compiled answer keys for quiz steps, shared by grading and analytics.
+
+Every analytics and review path used to ``json.loads`` the step's
+``content_text`` again for each attempt, look the question up by scanning
+the list, and re-normalize the correct answer (lower-casing, stripping,
+splitting ``|`` alternatives, parsing fractions) for every answer it scored.
+Now:
+
+- a step is parsed once into a ``CompiledQuiz``: questions indexed by id,
+  correct answers already normalized into ``AcceptedAnswer`` sets (strings
+  plus their numeric values), choice option texts resolved
+- compiled quizzes are held in a bounded LRU keyed by
+  ``(step_id, content_hash)``, so an edited step is simply a new key
+- ``Step.content_hash`` (sha256 of ``content_text``) is kept current on every
+  write to ``content_text``; rows saved before that are hashed on first use
+
+Scoring an attempt is then a dict lookup and a set membership test per answer.
+Compiled content is shared between requests and must not be modified.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from cachetools import LRUCache
+from sqlalchemy import event
+
+from src.schemas.models import Step
+
+QUIZ_CONTENT_CACHE_SIZE = int(os.getenv("QUIZ_CONTENT_CACHE_SIZE", "2048"))
+
+# Two numeric answers closer than this are the same answer (0.0625 == 1/16)
+NUMERIC_TOLERANCE = 0.0001
+# Remembered verdicts per correct answer
+MATCH_MEMO_SIZE = 512
+
+CHOICE_TYPES = ("single_choice", "multiple_choice", "media_question")
+TEXT_ANSWER_TYPES = ("short_answer", "fill_blank", "text_completion")
+
+
+def content_hash(content_text: Optional[str]) -> Optional[str]:
+    """sha256 hex digest of a step's content, as stored in ``Step.content_hash``"""
+    if content_text is None:
+        return None
+    return hashlib.sha256(content_text.encode("utf-8")).hexdigest()
+
+
+def normalize_answer(value: Any) -> str:
+    """Lower-cased answer with whitespace removed, decimal commas as dots and single-item brackets unwrapped"""
+    if value is None:
+        return ""
+    s = str(value).strip().lower()
+    s = s.replace(",", ".")
+    s = "".join(s.split())
+    if s.startswith("[") and s.endswith("]") and "," not in s:
+        s = s[1:-1].strip()
+    return s
+
+
+def to_number(s: str) -> Optional[float]:
+    """Numeric value of a normalized answer ("0.5", "1/16"), or None"""
+    try:
+        if "/" in s:
+            parts = s.split("/")
+            if len(parts) == 2:
+                return float(parts[0]) / float(parts[1])
+        return float(s)
+    except (ValueError, ArithmeticError):
+        return None
+
+
+class AcceptedAnswer:
+    """
+    One correct answer: its ``|``-separated alternatives, normalized.
+    Verdicts for raw answers seen before are remembered (students repeat
+    each other's answers), up to MATCH_MEMO_SIZE per answer.
+    """
+
+    __slots__ = ("options", "numbers", "_verdicts")
+
+    def __init__(self, correct: Any):
+        options = [normalize_answer(option) for option in str(correct).strip().lower().split("|")]
+        self.options = frozenset(options)
+        self.numbers = tuple(n for n in map(to_number, options) if n is not None)
+        self._verdicts: Dict[Any, bool] = {}
+
+    def matches(self, answer: Any) -> bool:
+        try:
+            return self._verdicts[answer]
+        except (KeyError, TypeError):
+            pass
+        verdict = self._match(answer)
+        if type(answer) is str and len(self._verdicts) < MATCH_MEMO_SIZE:
+            self._verdicts[answer] = verdict
+        return verdict
+
+    def _match(self, answer: Any) -> bool:
+        value = normalize_answer(answer)
+        if value in self.options:
+            return True
+        if self.numbers:
+            number = to_number(value)
+            if number is not None:
+                return any(abs(number - n) < NUMERIC_TOLERANCE for n in self.numbers)
+        return False
+
+
+class QuizQuestion:
+    """A quiz question with its answer key compiled"""
+
+    __slots__ = ("id", "question_type", "data", "key", "is_multi_part",
+                 "option_texts", "correct_set", "correct_answer_text", "_review_error")
+
+    def __init__(self, data: Dict[str, Any]):
+        self.id = str(data.get("id"))
+        self.question_type = data.get("question_type")
+        self.data = data
+        self.key = None
+        self.is_multi_part = False
+        self.option_texts: List[Optional[str]] = []
+        self.correct_set = None
+        self.correct_answer_text = ""
+        self._review_error: Optional[Exception] = None
+        self._compile_key()
+        try:
+            self._compile_review()
+        except Exception as e:
+            self._review_error = e
+
+    @property
+    def text(self) -> Optional[str]:
+        return self.data.get("question_text") or self.data.get("text") or self.data.get("content")
+
+    def _compile_key(self):
+        if self.question_type == "long_text":
+            return
+        correct = self.data.get("correct_answer")
+        if correct is None:
+            correct = self.data.get("correctAnswer")
+        if correct is None:
+            return
+        if isinstance(correct, str) and not correct.strip():
+            return
+        if isinstance(correct, list):
+            if not correct or all(not normalize_answer(x) for x in correct):
+                return
+            self.key = tuple(AcceptedAnswer(x) for x in correct)
+            self.is_multi_part = True
+        else:
+            self.key = AcceptedAnswer(correct)
+
+    def _compile_review(self):
+        if self.question_type in CHOICE_TYPES:
+            options = self.data.get("options", []) or []
+            self.option_texts = [o.get("text", "") if isinstance(o, dict) else None for o in options]
+            correct = self.data.get("correct_answer")
+            if isinstance(correct, int) and 0 <= correct < len(options):
+                self.correct_answer_text = options[correct].get("text", "")
+            elif isinstance(correct, list):
+                self.correct_answer_text = ", ".join(
+                    options[idx].get("text", "") for idx in correct if isinstance(idx, int) and 0 <= idx < len(options)
+                )
+                self.correct_set = {int(x) for x in correct if str(x).isdigit()}
+        elif self.question_type in TEXT_ANSWER_TYPES:
+            correct = self.data.get("correct_answer", "")
+            if isinstance(correct, list):
+                self.correct_set = {str(a).strip().lower() for a in correct}
+                self.correct_answer_text = ", ".join(str(a) for a in correct)
+            else:
+                self.correct_set = {str(correct).strip().lower()}
+                self.correct_answer_text = str(correct)
+
+    def error_score(self, answer: Any) -> Optional[float]:
+        """
+        Share of the answer that is wrong, from 0.0 (correct) to 1.0.
+        None when the question has no usable answer key.
+        Multi-part answers (gaps) are compared in order; extra parts count as wrong.
+        """
+        if self.key is None:
+            return None
+        if self.is_multi_part:
+            answers = answer if isinstance(answer, list) else [answer]
+            given, expected = len(answers), len(self.key)
+            mismatches = max(given - expected, 0)
+            for i, accepted in enumerate(self.key):
+                if not accepted.matches(answers[i] if i < given else ""):
+                    mismatches += 1
+            return min(mismatches / expected, 1.0)
+        if isinstance(answer, list) and answer:
+            answer = answer[0]
+        return 0.0 if self.key.matches(answer) else 1.0
+
+    def review(self, raw_answer: Any) -> Tuple[str, bool]:
+        """(student answer as text, is correct) for the teacher's attempt review"""
+        if self._review_error is not None:
+            raise self._review_error
+        answer_text = str(raw_answer)
+        if self.question_type in CHOICE_TYPES:
+            options = self.option_texts
+            try:
+                if self.question_type == "multiple_choice":
+                    if isinstance(raw_answer, list):
+                        selected = [self._option_text(idx) for idx in raw_answer if isinstance(idx, int) and 0 <= idx < len(options)]
+                        is_correct = False
+                        if self.correct_set is not None:
+                            is_correct = {int(x) for x in raw_answer if str(x).isdigit()} == self.correct_set
+                        return (", ".join(selected) if selected else "No answer"), is_correct
+                    return answer_text, False
+                idx = int(raw_answer) if str(raw_answer).isdigit() else -1
+                if 0 <= idx < len(options):
+                    return self._option_text(idx), idx == self.data.get("correct_answer")
+                return ("No answer" if not raw_answer else answer_text), False
+            except Exception as e:
+                print(f"Error resolving answer for Q {self.id}: {e}")
+                return answer_text, False
+        if self.question_type in TEXT_ANSWER_TYPES:
+            return answer_text, answer_text.strip().lower() in self.correct_set
+        return answer_text, False
+
+    def _option_text(self, idx: int) -> str:
+        text = self.option_texts[idx]
+        if text is None:
+            raise TypeError(f"option {idx} is not an object")
+        return text
+
+
+class CompiledQuiz:
+    """A parsed quiz step: its content plus questions indexed by id"""
+
+    __slots__ = ("content", "questions", "_by_id")
+
+    def __init__(self, content: Any):
+        self.content: Dict[str, Any] = content if isinstance(content, dict) else {}
+        questions = self.content.get("questions") or []
+        self.questions: Tuple[QuizQuestion, ...] = tuple(
+            QuizQuestion(q) for q in (questions if isinstance(questions, list) else ()) if isinstance(q, dict)
+        )
+        self._by_id: Dict[str, QuizQuestion] = {}
+        for question in self.questions:
+            # The first question with an id wins, as a scan would find it
+            self._by_id.setdefault(question.id, question)
+
+    @property
+    def global_passage(self) -> str:
+        if self.content.get("quiz_type") == "text_based" or self.content.get("quiz_media_type") == "text":
+            return self.content.get("quiz_media_url", "")
+        return ""
+
+    def question(self, question_id: Any) -> Optional[QuizQuestion]:
+        return self._by_id.get(str(question_id))
+
+    def error_score(self, question_id: Any, answer: Any) -> Optional[float]:
+        question = self._by_id.get(str(question_id))
+        return question.error_score(answer) if question is not None else None
+
+
+EMPTY_QUIZ = CompiledQuiz({})
+
+
+def compile_quiz(content_text: Optional[str]) -> CompiledQuiz:
+    """Parse and compile quiz content; unreadable content compiles to an empty quiz"""
+    if not content_text:
+        return EMPTY_QUIZ
+    try:
+        content = json.loads(content_text) if isinstance(content_text, str) else content_text
+    except (TypeError, ValueError):
+        return EMPTY_QUIZ
+    return CompiledQuiz(content)
+
+
+_cache: LRUCache = LRUCache(maxsize=QUIZ_CONTENT_CACHE_SIZE)
+_lock = threading.Lock()
+
+
+def get_compiled_quiz(step: Step) -> CompiledQuiz:
+    """Compiled content of ``step``, from the cache while its content is unchanged"""
+    if not step.content_text:
+        return EMPTY_QUIZ
+    key = (step.id, step.content_hash or content_hash(step.content_text))
+    with _lock:
+        quiz = _cache.get(key)
+    if quiz is None:
+        quiz = compile_quiz(step.content_text)
+        with _lock:
+            _cache[key] = quiz
+    return quiz
+
+
+def iter_answers(answers: Any) -> Iterator[Tuple[Any, Any]]:
+    """(question id, answer) pairs of an attempt's answers, stored as [[id, value], ...] or {id: value}"""
+    if isinstance(answers, str):
+        answers = json.loads(answers)
+    if isinstance(answers, list):
+        for item in answers:
+            if isinstance(item, list) and len(item) >= 2:
+                yield item[0], item[1]
+    elif isinstance(answers, dict):
+        yield from answers.items()
+
+
+def clear_quiz_cache():
+    with _lock:
+        _cache.clear()
+
+
+@event.listens_for(Step.content_text, "set")
+def _rehash_content(step, value, oldvalue, initiator):
+    step.content_hash = content_hash(value)
@@ -0,0 +1,189 @@
+"""
+Recurrence
+Expands recurring events into the occurrences that fall inside a window.
+
+Expansion used to step from each parent's original start one day/week/month
+at a time until it reached the window, and built a transient ORM ``Event``
+(with the parent's relationship collections attached) for every occurrence.
+A daily event created a year ago cost hundreds of iterations per request.
+
+- ``occurrence_starts`` jumps straight to the first occurrence in the window:
+  ``ceil((window_start - start) / step)`` steps for daily/weekly/biweekly,
+  the month difference for monthly (day clamped to the month's length, as
+  before)
+- starts are memoized per (parent, window) in a small LRU
+- occurrences are ``EventOccurrence`` records with ``__slots__`` that share
+  the parent for everything but their own id and times
+"""
+import calendar
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from cachetools import LRUCache
+
+RECURRENCE_CACHE_SIZE = int(os.getenv("RECURRENCE_CACHE_SIZE", "20000"))
+
+RECURRENCE_STEPS = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+    "biweekly": timedelta(weeks=2),
+}
+
+# Parent columns an occurrence reports as its own
+_PARENT_FIELDS = frozenset({
+    "title", "description", "event_type", "location", "is_online", "meeting_url",
+    "created_by", "recurrence_pattern", "max_participants", "creator", "event_groups",
+    "created_at", "updated_at",
+})
+# Occurrences are not linked to these (same as the transient Events they replace)
+_OCCURRENCE_DEFAULTS = {
+    "is_recurring": True,
+    "recurrence_end_date": None,
+    "teacher_id": None,
+    "teacher": None,
+    "teacher_name": None,
+    "is_substitution": False,
+    "event_courses": (),
+    "event_participants": (),
+}
+
+
+def pseudo_event_id(parent_id: int, start: datetime) -> int:
+    """Stable id of a virtual occurrence (resolved back by materialize_virtual_event)"""
+    return int(f"{parent_id}{int(start.timestamp())}") % 2147483647
+
+
+def _add_months(first_start: datetime, months: int) -> datetime:
+    month_index = first_start.month - 1 + months
+    year, month = first_start.year + month_index // 12, month_index % 12 + 1
+    day = min(first_start.day, calendar.monthrange(year, month)[1])
+    return first_start.replace(year=year, month=month, day=day)
+
+
+def occurrence_starts(
+    first_start: datetime,
+    pattern: Optional[str],
+    window_start: datetime,
+    window_end: datetime,
+    until: Optional[date] = None,
+) -> Tuple[datetime, ...]:
+    """
+    Starts of the occurrences in [window_start, window_end]. The first
+    occurrence is ``first_start`` itself; later ones stop after ``until``.
+    Unknown patterns only have the first occurrence.
+    """
+    step = RECURRENCE_STEPS.get(pattern)
+    if step is None and pattern != "monthly":
+        return (first_start,) if window_start <= first_start <= window_end else ()
+
+    def nth(n: int) -> datetime:
+        return first_start + step * n if step is not None else _add_months(first_start, n)
+
+    n = 0
+    if window_start > first_start:
+        if step is not None:
+            n = -((first_start - window_start) // step)
+        else:
+            # Clamping can pull an occurrence before the window: start one month early
+            n = max(0, (window_start.year - first_start.year) * 12 + window_start.month - first_start.month - 1)
+            while nth(n) < window_start:
+                n += 1
+
+    starts = []
+    current = nth(n)
+    while current <= window_end:
+        if n and until and current.date() > until:
+            break
+        starts.append(current)
+        n += 1
+        current = nth(n)
+    return tuple(starts)
+
+
+class EventOccurrence:
+    """One occurrence of a recurring event, read like an ``Event``"""
+
+    __slots__ = ("parent", "id", "start_datetime", "end_datetime", "is_active", "is_pseudo",
+                 "_group_ids", "_instance_number")
+
+    def __init__(self, parent, start: datetime, end: datetime, group_ids: List[int], instance_number: int):
+        self.parent = parent
+        self.id = pseudo_event_id(parent.id, start)
+        self.start_datetime = start
+        self.end_datetime = end
+        self.is_active = True
+        self._group_ids = group_ids
+        self._instance_number = instance_number
+
+    def __getattr__(self, name):
+        if name in _PARENT_FIELDS:
+            return getattr(self.parent, name)
+        try:
+            return _OCCURRENCE_DEFAULTS[name]
+        except KeyError:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'") from None
+
+    def __repr__(self):
+        return f"<EventOccurrence {self.id} of event {self.parent.id} at {self.start_datetime}>"
+
+
+_cache: LRUCache = LRUCache(maxsize=RECURRENCE_CACHE_SIZE)
+_lock = threading.Lock()
+
+
+def cached_occurrence_starts(parent, first_start: datetime, window_start: datetime, window_end: datetime) -> Tuple[datetime, ...]:
+    # Everything the result depends on is in the key, so edits to the parent never hit stale entries
+    key = (parent.id, first_start, parent.recurrence_pattern, parent.recurrence_end_date, window_start, window_end)
+    with _lock:
+        starts = _cache.get(key)
+    if starts is None:
+        starts = occurrence_starts(first_start, parent.recurrence_pattern, window_start, window_end,
+                                   parent.recurrence_end_date)
+        with _lock:
+            _cache[key] = starts
+    return starts
+
+
+def expand_occurrences(
+    parents: Iterable,
+    window_start: datetime,
+    window_end: datetime,
+    naive: bool = False,
+) -> List[EventOccurrence]:
+    """Occurrences of ``parents`` starting inside the window, parent by parent"""
+
+    def normalize(dt: datetime) -> datetime:
+        return dt.replace(tzinfo=None) if naive and dt.tzinfo is not None else dt
+
+    window_start, window_end = normalize(window_start), normalize(window_end)
+    occurrences = []
+    for parent in parents:
+        first_start = normalize(parent.start_datetime)
+        duration = normalize(parent.end_datetime) - first_start
+        starts = cached_occurrence_starts(parent, first_start, window_start, window_end)
+        if not starts:
+            continue
+        group_ids = [eg.group_id for eg in parent.event_groups] if parent.event_groups else []
+        occurrences.extend(
+            EventOccurrence(parent, start, start + duration, group_ids, number)
+            for number, start in enumerate(starts, start=1)
+        )
+    return occurrences
+
+
+def find_occurrence(parents: Iterable, pseudo_id: int, window_start: datetime, window_end: datetime):
+    """(parent, start) of the occurrence with ``pseudo_id`` in the window, or (None, None)"""
+    for parent in parents:
+        starts = occurrence_starts(parent.start_datetime, parent.recurrence_pattern, window_start, window_end,
+                                   parent.recurrence_end_date)
+        for start in starts:
+            if pseudo_event_id(parent.id, start) == pseudo_id:
+                return parent, start
+    return None, None
+
+
+def clear_occurrence_cache():
+    with _lock:
+        _cache.clear()
@@ -1,3 +1,17 @@
+"""
+Gateway to the external SAT platform (api.mastereducation.kz).
+
+All SAT lookups (course overview, student SAT page, leaderboards) go through
+this module so that they share:
+
+- the "mastered" integration (src.services.http_client): its pooled client,
+  timeouts, retries, circuit breaker and metrics apply to SAT calls as well
+- a semaphore capping concurrent outbound requests, so fan-outs queue here
+  instead of timing out on the integration's connection pool
+- batch endpoints first, per-email requests only for what a batch missed
+- an in-process TTL cache keyed by lower-cased email, so repeated page loads
+  within the TTL make no outbound calls at all
+"""
 import os
 import httpx
 import logging
@@ -5,70 +19,244 @@ import asyncio
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+from cachetools import TTLCache
+
+from src.services.http_client import get_integration
+
 logger = logging.getLogger(__name__)
 
-SAT_API_BASE_URL = "https://api.mastereducation.kz/api/lms"
+SAT_API_BASE_URL = os.getenv("SAT_API_BASE_URL", "https://api.mastereducation.kz/api/lms")
 SAT_API_KEY = os.getenv("MASTEREDU_API_KEY", "LMS_MasterEd_2025_SecureKey_XyZ789")
 
+SAT_API_MAX_CONCURRENCY = int(os.getenv("SAT_API_MAX_CONCURRENCY", "10"))
+SAT_CACHE_TTL_SECONDS = int(os.getenv("SAT_CACHE_TTL_SECONDS", "300"))
+SAT_CACHE_MAX_SIZE = int(os.getenv("SAT_CACHE_MAX_SIZE", "10000"))
+
+# Batch endpoint limits (per documentation)
+LATEST_DETAILS_BATCH_SIZE = 100
+TEST_RESULTS_BATCH_SIZE = 50
+
+# If more emails than this are still missing after the batch call, the batch
+# API is probably failing; do not hammer the per-email endpoints.
+MAX_INDIVIDUAL_FALLBACK = 50
+
+
+class SATAPIError(Exception):
+    """Raised when the SAT platform returns an unexpected response"""
+
+
+# email -> data (None means "no results", which is cached as well)
+_latest_details_cache: TTLCache = TTLCache(maxsize=SAT_CACHE_MAX_SIZE, ttl=SAT_CACHE_TTL_SECONDS)
+_test_results_cache: TTLCache = TTLCache(maxsize=SAT_CACHE_MAX_SIZE, ttl=SAT_CACHE_TTL_SECONDS)
+
+_semaphore: Optional[asyncio.Semaphore] = None
+_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _headers() -> Dict[str, str]:
+    return {
+        "X-API-Key": SAT_API_KEY,
+        "Content-Type": "application/json"
+    }
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Return the concurrency cap, creating it for the running event loop if needed"""
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(SAT_API_MAX_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+
+def clear_cache():
+    """Drop every cached SAT response"""
+    _latest_details_cache.clear()
+    _test_results_cache.clear()
+
+
+async def _request(method: str, path: str, **kwargs) -> httpx.Response:
+    async with _get_semaphore():
+        # Every SAT endpoint only reads, so timed out POSTs are retried as well
+        return await get_integration("mastered").arequest(
+            method, f"{SAT_API_BASE_URL}{path}", headers=_headers(), retry_unsafe=True, **kwargs
+        )
+
+
+def _normalize(emails: List[str]) -> List[str]:
+    return list(dict.fromkeys(e.lower() for e in emails if e))
+
+
+def _as_results(emails: List[str], found: Dict[str, Any]) -> Dict[str, Any]:
+    return {"results": [{"email": e, "data": found[e]} for e in emails if found.get(e)]}
+
+
 class SATService:
     @staticmethod
-    async def fetch_batch_latest_test_details(emails: List[str]) -> Dict[str, Any]:
-        """Fetch latest test details for a batch of student emails"""
-        url = f"{SAT_API_BASE_URL}/students/latest-test-details"
-        headers = {
-            "X-API-Key": SAT_API_KEY,
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "emails": emails,
-            "limit": 100
+    async def _post_batch(path: str, chunk: List[str], limit: int) -> Optional[Dict[str, Any]]:
+        """POST one batch chunk. Returns {email: data} or None if the call failed."""
+        try:
+            response = await _request("POST", path, json={"emails": chunk, "limit": limit}, timeout=20.0)
+        except Exception as e:
+            logger.error(f"SAT Batch API exception ({path}): {e}")
+            return None
+        if response.status_code != 200:
+            logger.error(f"SAT Batch API error ({path}): {response.status_code} - {response.text}")
+            return None
+        data = response.json()
+        # If batch failed globally (MasterEDU crash)
+        if "error" in data and not data.get("results"):
+            logger.warning(f"SAT Batch API returned global error: {data['error']}")
+            return None
+        return {
+            (item.get("email") or "").lower(): item.get("data")
+            for item in data.get("results", [])
         }
-        
+
+    @staticmethod
+    async def _fetch_batched(
+        emails: List[str],
+        cache: TTLCache,
+        path: str,
+        batch_size: int,
+        fallback,
+        retry_empty: bool,
+    ) -> Dict[str, Any]:
+        """
+        Serve from cache, then batch calls, then per-email fallback for the rest.
+
+        Emails from failed chunks always go to the fallback. Emails the batch
+        answered with no data only do when ``retry_empty`` is set; otherwise
+        the empty answer is cached.
+        """
+        found: Dict[str, Any] = {}
+        missing = []
+        for email in emails:
+            if email in cache:
+                found[email] = cache[email]
+            else:
+                missing.append(email)
+        if not missing:
+            return found
+
+        chunks = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        batch_results = await asyncio.gather(
+            *(SATService._post_batch(path, chunk, batch_size) for chunk in chunks)
+        )
+        for chunk, chunk_results in zip(chunks, batch_results):
+            if chunk_results is None:
+                continue
+            for email in chunk:
+                data = chunk_results.get(email)
+                if data:
+                    found[email] = cache[email] = data
+                elif email in chunk_results and not retry_empty:
+                    found[email] = cache[email] = None
+
+        still_missing = [e for e in missing if e not in found]
+        if still_missing:
+            if len(still_missing) > MAX_INDIVIDUAL_FALLBACK:
+                logger.warning(
+                    f"SAT fallback skipped: {len(still_missing)} emails missing data. "
+                    f"Batch API might be failing or data missing at source."
+                )
+            else:
+                individual = await asyncio.gather(*(fallback(e) for e in still_missing))
+                for email, (ok, data) in zip(still_missing, individual):
+                    if ok:
+                        # Cache "no results" too so the next page load skips the fallback
+                        cache[email] = data
+                    if data:
+                        found[email] = data
+        return found
+
+    @staticmethod
+    async def _fetch_latest_single(email: str):
+        """Per-email fallback: latest-test-details, then most recent pair of test-results"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=payload, timeout=15.0)
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.error(f"SAT Batch API error: {response.status_code} - {response.text}")
-                    return {"results": []}
+            response = await _request("GET", f"/students/{email}/latest-test-details", timeout=10.0)
+            if response.status_code == 200:
+                data = response.json()
+                if "error" not in data:
+                    return True, data
+                logger.warning(f"latest-test-details failed for {email}: {data.get('error')}")
+
+            ok, history = await SATService._fetch_results_single(email)
+            pairs = (history or {}).get("testPairs", [])
+            if pairs:
+                latest = pairs[0]
+                return True, {
+                    "mathTest": latest.get("mathTest"),
+                    "verbalTest": latest.get("verbalTest"),
+                    "combinedScore": latest.get("combinedScore")
+                }
+            return ok, None
         except Exception as e:
-            logger.error(f"SAT Batch API exception: {e}")
-            return {"results": []}
+            logger.error(f"Fallback SAT fetch for {email} failed: {e}")
+            return False, None
+
+    @staticmethod
+    async def _fetch_results_single(email: str):
+        """Per-email test-results. Returns (succeeded, data)."""
+        try:
+            response = await _request("GET", f"/students/{email}/test-results", timeout=15.0)
+        except Exception as e:
+            logger.error(f"SAT test-results fetch for {email} failed: {e}")
+            return False, None
+        if response.status_code == 404:
+            return True, None
+        if response.status_code != 200:
+            logger.error(f"SAT API Error for {email}: {response.status_code} {response.text}")
+            return False, None
+        return True, response.json()
+
+    @staticmethod
+    async def fetch_batch_latest_test_details(emails: List[str]) -> Dict[str, Any]:
+        """Fetch latest test details for a batch of student emails"""
+        emails = _normalize(emails)
+        found = await SATService._fetch_batched(
+            emails,
+            _latest_details_cache,
+            "/students/latest-test-details",
+            LATEST_DETAILS_BATCH_SIZE,
+            SATService._fetch_latest_single,
+            # The latest-details batch sometimes returns nothing for students
+            # whose history is available, so retry those individually
+            retry_empty=True,
+        )
+        return _as_results(emails, found)
 
     @staticmethod
     async def fetch_batch_test_results(emails: List[str]) -> Dict[str, Any]:
         """Fetch all test results for a batch of student emails with chunking (max 50)"""
-        if not emails:
-            return {"results": []}
-            
-        url = f"{SAT_API_BASE_URL}/students/test-results"
-        headers = {
-            "X-API-Key": SAT_API_KEY,
-            "Content-Type": "application/json"
-        }
-        
-        all_results = []
-        # Chunk emails into 50 (based on documentation limit)
-        for i in range(0, len(emails), 50):
-            chunk = emails[i:i + 50]
-            payload = {
-                "emails": chunk,
-                "limit": 50
-            }
-            
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(url, headers=headers, json=payload, timeout=20.0)
-                    if response.status_code == 200:
-                        data = response.json()
-                        all_results.extend(data.get("results", []))
-                    else:
-                        logger.error(f"SAT Batch API error (chunk {i}): {response.status_code} - {response.text}")
-            except Exception as e:
-                logger.error(f"SAT Batch API exception (chunk {i}): {e}")
-        
-        return {"results": all_results}
+        emails = _normalize(emails)
+        found = await SATService._fetch_batched(
+            emails,
+            _test_results_cache,
+            "/students/test-results",
+            TEST_RESULTS_BATCH_SIZE,
+            SATService._fetch_results_single,
+            retry_empty=False,
+        )
+        return _as_results(emails, found)
+
+    @staticmethod
+    async def fetch_student_test_results(email: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch the full test history of one student.
+
+        Returns None if the student has no results. Raises SATAPIError if the
+        platform responded with an error.
+        """
+        email = email.lower()
+        if email in _test_results_cache:
+            return _test_results_cache[email]
+        ok, data = await SATService._fetch_results_single(email)
+        if not ok:
+            raise SATAPIError(f"SAT API request failed for {email}")
+        _test_results_cache[email] = data
+        return data
 
     @staticmethod
     def get_percentage_for_week(student_data: Dict[str, Any], week_start: datetime, week_end: datetime) -> Optional[float]:
@@ -78,24 +266,24 @@ class SATService:
             # Check mathTest or verbalTest date
             math_test = pair.get("mathTest")
             verbal_test = pair.get("verbalTest")
-            
+
             test_date_str = None
             if math_test:
                 test_date_str = math_test.get("completedAt")
             elif verbal_test:
                 test_date_str = verbal_test.get("completedAt")
-            
+
             if test_date_str:
                 test_date = datetime.fromisoformat(test_date_str.replace("Z", "+00:00"))
                 # Make sure test_date is naive if week_start/end are naive, or both aware
                 if week_start.tzinfo is None and test_date.tzinfo is not None:
                     test_date = test_date.replace(tzinfo=None)
-                
+
                 if week_start <= test_date < week_end:
                     # Calculate average percentage
                     math_pct = math_test.get("percentage") if math_test else None
                     verbal_pct = verbal_test.get("percentage") if verbal_test else None
-                    
+
                     percentages = [p for p in [math_pct, verbal_pct] if p is not None]
                     if percentages:
                         avg_pct = sum(percentages) / len(percentages)
@@ -0,0 +1,196 @@
+"""
+Socket.IO client managers shared by all workers.
+
+The API runs several uvicorn workers, each with its own ``AsyncServer``. With
+the default in-memory manager an emit only reaches sockets attached to the
+worker that made it. A pub/sub manager publishes every room emit, disconnect
+and room change on a channel that all workers listen to.
+
+Backends, selected with ``SOCKETIO_MANAGER``:
+
+- ``postgres`` (default when POSTGRES_URL points at PostgreSQL): LISTEN/NOTIFY
+  on the application database, so no extra infrastructure is needed
+- ``redis``: python-socketio's ``AsyncRedisManager`` on ``SOCKETIO_REDIS_URL``
+- ``memory``: single-process manager (development, tests)
+
+NOTIFY payloads are limited to 8000 bytes. Larger messages are compressed
+and, if still too large, split into chunks sent in one transaction, which
+Postgres delivers together and in order.
+"""
+import asyncio
+import base64
+import logging
+import os
+import uuid
+import zlib
+from typing import Dict, List, Optional
+
+import socketio
+from engineio import json
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+SOCKETIO_MANAGER = os.getenv("SOCKETIO_MANAGER", "")
+SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "socketio")
+SOCKETIO_REDIS_URL = os.getenv("SOCKETIO_REDIS_URL", "redis://localhost:6379/0")
+
+# NOTIFY rejects payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD = 7900
+_CHUNK_PREFIX = "#"
+_COMPRESSED_PREFIX = "z"
+# Incomplete chunked messages kept per listener before the oldest is dropped
+_MAX_PARTIAL_MESSAGES = 100
+
+
+def encode_payloads(message: dict, limit: int = MAX_NOTIFY_PAYLOAD) -> List[str]:
+    """Serialize a pub/sub message into one or more NOTIFY payloads"""
+    payload = json.dumps(message)
+    if len(payload.encode()) <= limit:
+        return [payload]
+
+    compressed = _COMPRESSED_PREFIX + base64.b64encode(zlib.compress(payload.encode())).decode()
+    if len(compressed) <= limit:
+        return [compressed]
+
+    message_id = uuid.uuid4().hex
+    size = limit - 64  # room for the chunk header
+    pieces = [compressed[i:i + size] for i in range(0, len(compressed), size)]
+    return [
+        f"{_CHUNK_PREFIX}{message_id}:{index}:{len(pieces)}:{piece}"
+        for index, piece in enumerate(pieces)
+    ]
+
+
+class PayloadDecoder:
+    """Turns NOTIFY payloads back into messages, reassembling chunks"""
+
+    def __init__(self):
+        self._partial: Dict[str, List[Optional[str]]] = {}
+
+    def feed(self, payload: str) -> Optional[dict]:
+        if payload.startswith(_CHUNK_PREFIX):
+            message_id, index, count, piece = payload[1:].split(":", 3)
+            parts = self._partial.get(message_id)
+            if parts is None:
+                if len(self._partial) >= _MAX_PARTIAL_MESSAGES:
+                    self._partial.pop(next(iter(self._partial)))
+                parts = self._partial[message_id] = [None] * int(count)
+            parts[int(index)] = piece
+            if any(part is None for part in parts):
+                return None
+            payload = "".join(self._partial.pop(message_id))
+
+        if payload.startswith(_COMPRESSED_PREFIX):
+            payload = zlib.decompress(base64.b64decode(payload[1:])).decode()
+        return json.loads(payload)
+
+
+def _asyncpg_dsn(url: str) -> str:
+    """SQLAlchemy URL -> plain libpq DSN understood by asyncpg"""
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class AsyncPostgresManager(AsyncPubSubManager):
+    """
+    Postgres LISTEN/NOTIFY client manager.
+
+    Publishes on a shared connection and listens on a dedicated one, which
+    is re-established with backoff if the database connection drops.
+    """
+    name = "asyncpg"
+
+    def __init__(self, url: str, channel: str = "socketio", write_only: bool = False, logger=None):
+        import asyncpg  # noqa: F401  (fail early if the driver is missing)
+
+        self.dsn = _asyncpg_dsn(url)
+        self._publish_conn = None
+        self._publish_lock: Optional[asyncio.Lock] = None
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    async def _connect(self):
+        import asyncpg
+        return await asyncpg.connect(self.dsn)
+
+    async def _publish(self, data):
+        payloads = encode_payloads(data)
+        if self._publish_lock is None:
+            self._publish_lock = asyncio.Lock()
+        async with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None or self._publish_conn.is_closed():
+                        self._publish_conn = await self._connect()
+                    async with self._publish_conn.transaction():
+                        for payload in payloads:
+                            await self._publish_conn.execute(
+                                "SELECT pg_notify($1, $2)", self.channel, payload
+                            )
+                    return
+                except Exception as e:
+                    self._publish_conn = None
+                    if attempt:
+                        self._get_logger().error(f"Cannot publish to postgres channel: {e}")
+                    else:
+                        self._get_logger().warning(f"Postgres publish failed, reconnecting: {e}")
+
+    async def _listen(self):
+        decoder = PayloadDecoder()
+        retry_sleep = 1
+        while True:
+            queue: asyncio.Queue = asyncio.Queue()
+            conn = None
+            try:
+                conn = await self._connect()
+                await conn.add_listener(
+                    self.channel, lambda _conn, _pid, _channel, payload: queue.put_nowait(payload)
+                )
+                conn.add_termination_listener(lambda _conn: queue.put_nowait(None))
+                retry_sleep = 1
+                while True:
+                    payload = await queue.get()
+                    if payload is None:
+                        raise ConnectionError("listen connection closed")
+                    try:
+                        message = decoder.feed(payload)
+                    except Exception as e:
+                        self._get_logger().error(f"Invalid socket.io payload on postgres channel: {e}")
+                        continue
+                    if message is not None:
+                        yield message
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._get_logger().error(
+                    f"Cannot receive from postgres channel, retrying in {retry_sleep} secs: {e}"
+                )
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+
+
+def create_client_manager() -> Optional[socketio.AsyncManager]:
+    """
+    Build the client manager configured by SOCKETIO_MANAGER.
+
+    Returns None for the in-memory manager so AsyncServer uses its default.
+    """
+    from src.config import POSTGRES_URL
+
+    backend = SOCKETIO_MANAGER.lower()
+    if not backend:
+        is_postgres = bool(POSTGRES_URL) and make_url(POSTGRES_URL).get_backend_name() == "postgresql"
+        backend = "postgres" if is_postgres else "memory"
+
+    if backend == "memory":
+        return None
+    if backend == "postgres":
+        logger.info(f"Socket.IO using postgres LISTEN/NOTIFY on channel '{SOCKETIO_CHANNEL}'")
+        return AsyncPostgresManager(POSTGRES_URL, channel=SOCKETIO_CHANNEL)
+    if backend == "redis":
+        logger.info(f"Socket.IO using redis channel '{SOCKETIO_CHANNEL}'")
+        return socketio.AsyncRedisManager(SOCKETIO_REDIS_URL, channel=SOCKETIO_CHANNEL)
+    raise ValueError(f"Unknown SOCKETIO_MANAGER: {SOCKETIO_MANAGER}")
@@ -0,0 +1,264 @@
+"""
+Step Visit Aggregator
+Write-behind buffer for the derived progress data of step visits.
+
+A step visit only upserts its StepProgress row and emits an event here. The
+aggregator merges events per (user, course) and every few seconds applies
+each pair at once:
+
+- users.total_study_time_minutes and the daily streak
+- StudentCourseSummary counters and last lesson
+- CourseAnalyticsCache totals
+- the legacy StudentProgress recount and the daily ProgressSnapshot
+
+So a student clicking through ten steps causes one summary/streak/snapshot
+update instead of ten, and the request no longer locks the users and
+student_course_summaries rows.
+
+Events live in process memory; each worker runs its own aggregator and
+flushes what is pending on shutdown. A pair that fails to apply (a lock
+timeout, the database restarting) is merged back into the buffer and
+retried on the next cycles, up to STEP_VISIT_MAX_ATTEMPTS times; only then,
+or when it still fails at shutdown, is it dropped, and logged with its
+values so the totals can be corrected by hand.
+"""
+import logging
+import os
+import threading
+from datetime import date
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from sqlalchemy import func
+
+from src.config import SessionLocal
+from src.schemas.models import UserInDB
+from src.services.summary_cache import record_course_step_progress, update_student_course_summary
+
+logger = logging.getLogger(__name__)
+
+STEP_VISIT_FLUSH_INTERVAL = float(os.getenv("STEP_VISIT_FLUSH_INTERVAL", "5"))
+# Flush cycles a (user, course) pair may fail before its visits are dropped
+STEP_VISIT_MAX_ATTEMPTS = int(os.getenv("STEP_VISIT_MAX_ATTEMPTS", "12"))
+
+
+class PendingVisits:
+    """Step visits of one student in one course that are not applied yet"""
+
+    __slots__ = ("time_spent_minutes", "steps_completed", "lesson_id", "lesson_title", "activity_dates", "attempts")
+
+    def __init__(self):
+        self.time_spent_minutes = 0
+        self.steps_completed = 0
+        self.lesson_id: Optional[int] = None
+        self.lesson_title: Optional[str] = None
+        self.activity_dates: Set[date] = set()
+        # Failed flushes so far
+        self.attempts = 0
+
+    def merge_earlier(self, earlier: "PendingVisits"):
+        """Fold in visits that happened before these (the last lesson stays ours)"""
+        self.time_spent_minutes += earlier.time_spent_minutes
+        self.steps_completed += earlier.steps_completed
+        if self.lesson_id is None:
+            self.lesson_id, self.lesson_title = earlier.lesson_id, earlier.lesson_title
+        self.activity_dates |= earlier.activity_dates
+        self.attempts = max(self.attempts, earlier.attempts)
+
+    def describe(self) -> str:
+        return (
+            f"time_spent_minutes={self.time_spent_minutes} steps_completed={self.steps_completed} "
+            f"lesson_id={self.lesson_id} activity_dates={sorted(d.isoformat() for d in self.activity_dates)}"
+        )
+
+
+class StepVisitAggregator:
+    """Batches progress aggregates of step visits per (user, course)"""
+
+    def __init__(
+        self,
+        flush_interval: float = STEP_VISIT_FLUSH_INTERVAL,
+        session_factory: Callable = SessionLocal,
+    ):
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory
+        self.running = False
+        self.thread = None
+        self._pending: Dict[Tuple[int, int], PendingVisits] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def emit(
+        self,
+        user_id: int,
+        course_id: int,
+        lesson_id: int,
+        lesson_title: Optional[str],
+        time_spent_minutes: int = 0,
+        step_completed: bool = False,
+        activity_date: Optional[date] = None,
+    ):
+        """Queue one step visit; called after the StepProgress upsert committed"""
+        with self._lock:
+            pending = self._pending.get((user_id, course_id))
+            if pending is None:
+                pending = self._pending[(user_id, course_id)] = PendingVisits()
+            pending.time_spent_minutes += time_spent_minutes or 0
+            if step_completed:
+                pending.steps_completed += 1
+            pending.lesson_id = lesson_id
+            pending.lesson_title = lesson_title
+            pending.activity_dates.add(activity_date or date.today())
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def start(self):
+        if self.running:
+            logger.warning("Step visit aggregator is already running")
+            return
+        self.running = True
+        self._wakeup.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info("Step visit aggregator started")
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+        # Whatever arrived after the last cycle
+        self.flush()
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        for (user_id, course_id), pending in batch.items():
+            logger.error(
+                f"[PROGRESS] Dropping step visits of user {user_id} in course {course_id} "
+                f"at shutdown: {pending.describe()}"
+            )
+        logger.info("Step visit aggregator stopped")
+
+    def _run(self):
+        logger.info(f"[PROGRESS] Step visit aggregator started (interval: {self.flush_interval}s)")
+        while self.running:
+            self._wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"[PROGRESS] Error flushing step visits: {e}", exc_info=True)
+
+    def flush(self) -> int:
+        """Apply all pending visits. Returns the number of (user, course) pairs applied."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        applied = 0
+        failed: Dict[Tuple[int, int], PendingVisits] = {}
+        try:
+            db = self.session_factory()
+        except Exception as e:
+            logger.error(f"[PROGRESS] Cannot open a session to apply step visits: {e}")
+            self._requeue(batch)
+            return 0
+        try:
+            for (user_id, course_id), pending in batch.items():
+                try:
+                    self._apply(db, user_id, course_id, pending)
+                    db.commit()
+                    applied += 1
+                except Exception as e:
+                    db.rollback()
+                    pending.attempts += 1
+                    logger.error(
+                        f"[PROGRESS] Failed to apply step visits for user {user_id} "
+                        f"in course {course_id} (attempt {pending.attempts}): {e}"
+                    )
+                    failed[(user_id, course_id)] = pending
+        finally:
+            db.close()
+            self._requeue(failed)
+        return applied
+
+    def _requeue(self, failed: Dict[Tuple[int, int], PendingVisits]):
+        """Put failed pairs back in front of visits that arrived meanwhile"""
+        with self._lock:
+            for key, pending in failed.items():
+                if pending.attempts >= STEP_VISIT_MAX_ATTEMPTS:
+                    logger.error(
+                        f"[PROGRESS] Dropping step visits of user {key[0]} in course {key[1]} "
+                        f"after {pending.attempts} attempts: {pending.describe()}"
+                    )
+                    continue
+                newer = self._pending.get(key)
+                if newer is None:
+                    self._pending[key] = pending
+                else:
+                    newer.merge_earlier(pending)
+
+    def _apply(self, db, user_id: int, course_id: int, pending: PendingVisits):
+        # Routes import this module, so their helpers are imported lazily
+        from src.progress.routes.progress import (
+            create_progress_snapshot, update_daily_streak, update_student_progress
+        )
+
+        user = db.query(UserInDB).filter(UserInDB.id == user_id).first()
+        if user is None:
+            return
+
+        if pending.time_spent_minutes:
+            db.query(UserInDB).filter(UserInDB.id == user_id).update(
+                {
+                    UserInDB.total_study_time_minutes: func.coalesce(
+                        UserInDB.total_study_time_minutes, 0
+                    ) + pending.time_spent_minutes
+                },
+                synchronize_session=False,
+            )
+
+        for activity_date in sorted(pending.activity_dates):
+            update_daily_streak(user, db, activity_date=activity_date)
+
+        update_student_course_summary(
+            user_id=user_id,
+            course_id=course_id,
+            db=db,
+            steps_completed=pending.steps_completed,
+            time_spent_delta=pending.time_spent_minutes,
+            lesson_id=pending.lesson_id,
+            lesson_title=pending.lesson_title,
+        )
+        record_course_step_progress(
+            course_id=course_id,
+            db=db,
+            time_spent_delta=pending.time_spent_minutes,
+            steps_completed=pending.steps_completed,
+        )
+
+        # Обновляем старый StudentProgress для совместимости
+        update_student_progress(user_id, course_id, db)
+        create_progress_snapshot(user_id, course_id, db)
+
+
+_aggregator: Optional[StepVisitAggregator] = None
+
+
+def get_step_visit_aggregator() -> StepVisitAggregator:
+    global _aggregator
+    if _aggregator is None:
+        _aggregator = StepVisitAggregator()
+    return _aggregator
+
+
+def emit_step_visit(**kwargs):
+    get_step_visit_aggregator().emit(**kwargs)
+
+
+def start_step_visit_aggregator():
+    get_step_visit_aggregator().start()
+
+
+def stop_step_visit_aggregator():
+    get_step_visit_aggregator().stop()
@@ -0,0 +1,268 @@
+"""
+Set-based analytics for the /analytics/students/all listing.
+
+The endpoint used to run several queries per student and per course (groups,
+courses with progress, step counts, completed steps, one submission lookup per
+assignment, last lesson). Here every metric is computed with one grouped
+query for the whole student set and stitched together in Python, so the
+number of round trips does not depend on how many students are visible.
+"""
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Query, Session
+
+from src.schemas.models import (
+    Assignment, AssignmentSubmission, Course, Enrollment, Group, GroupStudent,
+    Lesson, Module, Step, StepProgress, UserInDB,
+)
+
+
+def _last_lessons(db: Session, student_ids, course_id: Optional[int]):
+    """
+    Most recently visited lesson per student (optionally within one course),
+    with the lesson step totals and each student's completed steps in it.
+    """
+    ranked = (
+        db.query(
+            StepProgress.user_id.label("user_id"),
+            Step.lesson_id.label("lesson_id"),
+            func.row_number().over(
+                partition_by=StepProgress.user_id,
+                order_by=(StepProgress.visited_at.desc().nulls_last(), StepProgress.id.desc()),
+            ).label("rn"),
+        )
+        .join(Step, StepProgress.step_id == Step.id)
+        .join(Lesson, Step.lesson_id == Lesson.id)
+        .join(Module, Lesson.module_id == Module.id)
+        .filter(StepProgress.user_id.in_(student_ids))
+    )
+    if course_id:
+        ranked = ranked.filter(Module.course_id == course_id)
+    ranked = ranked.subquery()
+    last_lessons: Dict[int, tuple] = {
+        student_id: (lesson_id, lesson_title)
+        for student_id, lesson_id, lesson_title in (
+            db.query(ranked.c.user_id, Lesson.id, Lesson.title)
+            .join(Lesson, Lesson.id == ranked.c.lesson_id)
+            .filter(ranked.c.rn == 1)
+            .all()
+        )
+    }
+
+    last_lesson_ids = {lesson_id for lesson_id, _ in last_lessons.values()}
+    steps_per_lesson: Dict[int, int] = {}
+    completed_per_lesson: Dict[tuple, int] = {}
+    if last_lesson_ids:
+        steps_per_lesson = dict(
+            db.query(Step.lesson_id, func.count(Step.id))
+            .filter(Step.lesson_id.in_(last_lesson_ids))
+            .group_by(Step.lesson_id)
+            .all()
+        )
+        completed_per_lesson = {
+            (student_id, lesson_id): count
+            for student_id, lesson_id, count in (
+                db.query(StepProgress.user_id, Step.lesson_id, func.count(StepProgress.id))
+                .join(Step, StepProgress.step_id == Step.id)
+                .filter(
+                    StepProgress.user_id.in_(student_ids),
+                    Step.lesson_id.in_(last_lesson_ids),
+                    StepProgress.status == "completed",
+                )
+                .group_by(StepProgress.user_id, Step.lesson_id)
+                .all()
+            )
+        }
+
+    return last_lessons, steps_per_lesson, completed_per_lesson
+
+
+def build_students_analytics(
+    db: Session,
+    students_query: Query,
+    course_id: Optional[int] = None,
+    include_last_lesson: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Build the per-student analytics rows for every student matched by
+    ``students_query`` using a fixed number of queries.
+
+    Args:
+        db: Database session
+        students_query: Query over UserInDB selecting the visible students
+        course_id: Optional course to restrict the "last lesson" lookup to
+        include_last_lesson: Look up the last visited lesson; ``last_lesson`` is None when False
+    """
+    students = students_query.all()
+    if not students:
+        return []
+
+    student_ids = select(students_query.with_entities(UserInDB.id).subquery().c.id)
+
+    # Groups per student
+    groups_by_student: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for student_id, group_id, group_name in (
+        db.query(GroupStudent.student_id, Group.id, Group.name)
+        .join(Group, Group.id == GroupStudent.group_id)
+        .filter(GroupStudent.student_id.in_(student_ids))
+        .all()
+    ):
+        groups_by_student[student_id].append({"id": group_id, "name": group_name})
+
+    # Courses where the student has any step progress
+    courses_by_student: Dict[int, set] = defaultdict(set)
+    for student_id, progress_course_id in (
+        db.query(StepProgress.user_id, Module.course_id)
+        .join(Step, StepProgress.step_id == Step.id)
+        .join(Lesson, Step.lesson_id == Lesson.id)
+        .join(Module, Lesson.module_id == Module.id)
+        .filter(StepProgress.user_id.in_(student_ids))
+        .distinct()
+        .all()
+    ):
+        courses_by_student[student_id].add(progress_course_id)
+
+    # Students without progress fall back to their active enrollments
+    enrolled_by_student: Dict[int, set] = defaultdict(set)
+    for student_id, enrolled_course_id in (
+        db.query(Enrollment.user_id, Enrollment.course_id)
+        .join(Course, Course.id == Enrollment.course_id)
+        .filter(Enrollment.user_id.in_(student_ids), Course.is_active == True)
+        .distinct()
+        .all()
+    ):
+        enrolled_by_student[student_id].add(enrolled_course_id)
+    for student_id, enrolled_course_ids in enrolled_by_student.items():
+        if not courses_by_student.get(student_id):
+            courses_by_student[student_id] = enrolled_course_ids
+
+    all_course_ids = set()
+    for course_ids in courses_by_student.values():
+        all_course_ids.update(course_ids)
+
+    # Per-course totals
+    steps_per_course: Dict[int, int] = {}
+    assignments_per_course: Dict[int, int] = {}
+    if all_course_ids:
+        steps_per_course = dict(
+            db.query(Module.course_id, func.count(Step.id))
+            .join(Lesson, Lesson.module_id == Module.id)
+            .join(Step, Step.lesson_id == Lesson.id)
+            .filter(Module.course_id.in_(all_course_ids))
+            .group_by(Module.course_id)
+            .all()
+        )
+        assignments_per_course = dict(
+            db.query(Module.course_id, func.count(Assignment.id))
+            .join(Lesson, Lesson.module_id == Module.id)
+            .join(Assignment, Assignment.lesson_id == Lesson.id)
+            .filter(Module.course_id.in_(all_course_ids))
+            .group_by(Module.course_id)
+            .all()
+        )
+
+    # Completed steps per (student, course)
+    completed_steps: Dict[tuple, int] = {
+        (student_id, step_course_id): count
+        for student_id, step_course_id, count in (
+            db.query(StepProgress.user_id, Module.course_id, func.count(StepProgress.id))
+            .join(Step, StepProgress.step_id == Step.id)
+            .join(Lesson, Step.lesson_id == Lesson.id)
+            .join(Module, Lesson.module_id == Module.id)
+            .filter(
+                StepProgress.user_id.in_(student_ids),
+                StepProgress.status == "completed",
+            )
+            .group_by(StepProgress.user_id, Module.course_id)
+            .all()
+        )
+    }
+
+    # Graded assignment totals per (student, course), counting the first
+    # submission of each student for each assignment
+    first_submissions = (
+        db.query(func.min(AssignmentSubmission.id).label("id"))
+        .filter(AssignmentSubmission.user_id.in_(student_ids))
+        .group_by(AssignmentSubmission.user_id, AssignmentSubmission.assignment_id)
+        .subquery()
+    )
+    graded: Dict[tuple, tuple] = {
+        (student_id, submission_course_id): (count, score or 0, max_score or 0)
+        for student_id, submission_course_id, count, score, max_score in (
+            db.query(
+                AssignmentSubmission.user_id,
+                Module.course_id,
+                func.count(AssignmentSubmission.id),
+                func.sum(func.coalesce(AssignmentSubmission.score, 0)),
+                func.sum(func.coalesce(Assignment.max_score, 0)),
+            )
+            .join(first_submissions, first_submissions.c.id == AssignmentSubmission.id)
+            .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
+            .join(Lesson, Assignment.lesson_id == Lesson.id)
+            .join(Module, Lesson.module_id == Module.id)
+            .filter(AssignmentSubmission.is_graded == True)
+            .group_by(AssignmentSubmission.user_id, Module.course_id)
+            .all()
+        )
+    }
+
+    last_lessons: Dict[int, tuple] = {}
+    steps_per_lesson: Dict[int, int] = {}
+    completed_per_lesson: Dict[tuple, int] = {}
+    if include_last_lesson:
+        last_lessons, steps_per_lesson, completed_per_lesson = _last_lessons(db, student_ids, course_id)
+
+    students_analytics = []
+    for student in students:
+        active_course_ids = courses_by_student.get(student.id, set())
+
+        total_steps = sum(steps_per_course.get(cid, 0) for cid in active_course_ids)
+        student_completed_steps = sum(completed_steps.get((student.id, cid), 0) for cid in active_course_ids)
+        total_assignments = sum(assignments_per_course.get(cid, 0) for cid in active_course_ids)
+        completed_assignments = 0
+        total_assignment_score = 0
+        total_max_score = 0
+        for cid in active_course_ids:
+            count, score, max_score = graded.get((student.id, cid), (0, 0, 0))
+            completed_assignments += count
+            total_assignment_score += score
+            total_max_score += max_score
+
+        completion_percentage = (student_completed_steps / total_steps * 100) if total_steps > 0 else 0
+        assignment_score_percentage = (total_assignment_score / total_max_score * 100) if total_max_score > 0 else 0
+
+        last_lesson_info = None
+        if student.id in last_lessons:
+            lesson_id, lesson_title = last_lessons[student.id]
+            total_lesson_steps = steps_per_lesson.get(lesson_id, 0)
+            completed_lesson_steps = completed_per_lesson.get((student.id, lesson_id), 0)
+            lesson_progress_percentage = (completed_lesson_steps / total_lesson_steps * 100) if total_lesson_steps > 0 else 0
+            last_lesson_info = {
+                "lesson_title": lesson_title,
+                "lesson_progress_percentage": round(lesson_progress_percentage, 1),
+                "completed_steps": completed_lesson_steps,
+                "total_steps": total_lesson_steps
+            }
+
+        students_analytics.append({
+            "student_id": student.id,
+            "student_name": student.name,
+            "student_email": student.email,
+            "student_number": student.student_id,
+            "groups": groups_by_student.get(student.id, []),
+            "active_courses_count": len(active_course_ids),
+            "total_steps": total_steps,
+            "completed_steps": student_completed_steps,
+            "completion_percentage": round(completion_percentage, 1),
+            "total_assignments": total_assignments,
+            "completed_assignments": completed_assignments,
+            "assignment_score_percentage": round(assignment_score_percentage, 1),
+            "total_study_time_minutes": student.total_study_time_minutes,
+            "daily_streak": student.daily_streak,
+            "last_activity_date": student.last_activity_date,
+            "last_lesson": last_lesson_info
+        })
+
+    return students_analytics
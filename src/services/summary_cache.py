@@ -4,23 +4,32 @@ Service for maintaining cached progress summaries.
 This service updates StudentCourseSummary and CourseAnalyticsCache
 tables when progress changes occur, keeping cached data in sync.
 """
-from datetime import datetime, timezone
+import logging
+import os
+from datetime import datetime, timedelta, timezone
 from typing import Optional
-from sqlalchemy import func
+from sqlalchemy import case, event, func, select, union, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from src.schemas.models import (
     StudentCourseSummary, CourseAnalyticsCache,
-    Step, Lesson, Module, StepProgress, Assignment, AssignmentSubmission
+    Step, Lesson, Module, StepProgress, Assignment, AssignmentSubmission,
+    Enrollment, CourseGroupAccess, GroupStudent, UserInDB
 )
 
+logger = logging.getLogger(__name__)
+
+# Cached course analytics older than this are recalculated on read
+COURSE_ANALYTICS_MAX_AGE_SECONDS = int(os.getenv("COURSE_ANALYTICS_MAX_AGE_SECONDS", "3600"))
+
 
 def update_student_course_summary(
     user_id: int,
     course_id: int,
     db: Session,
     time_spent_delta: int = 0,
-    step_completed: bool = False,
+    steps_completed: int = 0,
     lesson_id: Optional[int] = None,
     lesson_title: Optional[str] = None
 ) -> StudentCourseSummary:
@@ -37,7 +46,7 @@ def update_student_course_summary(
         course_id: Course ID
         db: Database session
         time_spent_delta: Additional time spent to add (minutes)
-        step_completed: Whether a step was just completed
+        steps_completed: Number of steps that were just completed
         lesson_id: Current lesson ID (for last activity tracking)
         lesson_title: Current lesson title
         
@@ -81,8 +90,8 @@ def update_student_course_summary(
     if summary.total_time_spent_minutes is None: summary.total_time_spent_minutes = 0
     
     # Increment counters
-    if step_completed:
-        summary.completed_steps += 1
+    if steps_completed:
+        summary.completed_steps += steps_completed
         summary.completion_percentage = (
             (summary.completed_steps / summary.total_steps * 100)
             if summary.total_steps > 0 else 0
@@ -228,3 +237,271 @@ def recalculate_student_summary(
     summary.updated_at = datetime.now(timezone.utc)
     
     return summary
+
+
+def refresh_course_analytics_cache(course_id: int, db: Session) -> CourseAnalyticsCache:
+    """
+    Fully recalculate a course's analytics cache from raw data.
+
+    Every metric is a single aggregate query, so the cost does not depend on
+    the number of lessons or progress rows loaded into Python.
+    """
+    now = datetime.now(timezone.utc)
+
+    lesson_step_counts = {
+        str(lesson_id): count
+        for lesson_id, count in db.query(Lesson.id, func.count(Step.id)).join(
+            Module, Lesson.module_id == Module.id
+        ).outerjoin(
+            Step, Step.lesson_id == Lesson.id
+        ).filter(
+            Module.course_id == course_id
+        ).group_by(Lesson.id).all()
+    }
+
+    total_modules = db.query(func.count(Module.id)).filter(
+        Module.course_id == course_id
+    ).scalar() or 0
+
+    total_assignments = db.query(func.count(Assignment.id)).join(
+        Lesson
+    ).join(Module).filter(
+        Module.course_id == course_id,
+        Assignment.is_active == True
+    ).scalar() or 0
+
+    completed_steps, total_time = db.query(
+        func.sum(case((StepProgress.status == "completed", 1), else_=0)),
+        func.sum(StepProgress.time_spent_minutes)
+    ).filter(
+        StepProgress.course_id == course_id
+    ).one()
+
+    active_7d, active_30d = db.query(
+        func.count(func.distinct(case(
+            (StepProgress.visited_at >= now - timedelta(days=7), StepProgress.user_id)
+        ))),
+        func.count(func.distinct(case(
+            (StepProgress.visited_at >= now - timedelta(days=30), StepProgress.user_id)
+        )))
+    ).filter(
+        StepProgress.course_id == course_id
+    ).one()
+
+    # Students with progress, an active enrollment or access through a group
+    enrolled_ids = union(
+        select(StepProgress.user_id.label("user_id")).where(StepProgress.course_id == course_id),
+        select(Enrollment.user_id).where(
+            Enrollment.course_id == course_id,
+            Enrollment.is_active == True
+        ),
+        select(GroupStudent.student_id).join(
+            CourseGroupAccess, CourseGroupAccess.group_id == GroupStudent.group_id
+        ).where(
+            CourseGroupAccess.course_id == course_id,
+            CourseGroupAccess.is_active == True
+        ),
+    ).subquery()
+    total_enrolled = db.query(func.count(UserInDB.id)).filter(
+        UserInDB.id.in_(select(enrolled_ids.c.user_id)),
+        UserInDB.role == "student",
+        UserInDB.is_active == True
+    ).scalar() or 0
+
+    average_completion, average_score = db.query(
+        func.avg(StudentCourseSummary.completion_percentage),
+        func.avg(StudentCourseSummary.average_assignment_percentage)
+    ).filter(
+        StudentCourseSummary.course_id == course_id
+    ).one()
+
+    cache = db.query(CourseAnalyticsCache).filter(
+        CourseAnalyticsCache.course_id == course_id
+    ).first()
+    if not cache:
+        cache = CourseAnalyticsCache(course_id=course_id)
+        db.add(cache)
+
+    cache.total_enrolled = total_enrolled
+    cache.active_students_7d = active_7d or 0
+    cache.active_students_30d = active_30d or 0
+    cache.average_completion_percentage = float(average_completion or 0)
+    cache.average_assignment_score = float(average_score or 0)
+    cache.total_modules = total_modules
+    cache.total_lessons = len(lesson_step_counts)
+    cache.total_steps = sum(lesson_step_counts.values())
+    cache.total_assignments = total_assignments
+    cache.total_completed_steps = int(completed_steps or 0)
+    cache.total_time_spent_minutes = int(total_time or 0)
+    cache.lesson_step_counts = lesson_step_counts
+    cache.last_calculated_at = now
+
+    return cache
+
+
+def get_course_analytics_cache(
+    course_id: int,
+    db: Session,
+    max_age_seconds: int = COURSE_ANALYTICS_MAX_AGE_SECONDS
+) -> CourseAnalyticsCache:
+    """
+    Return the analytics cache for a course, recalculating it first if it is
+    missing, marked stale, or older than ``max_age_seconds``.
+    """
+    cache = db.query(CourseAnalyticsCache).filter(
+        CourseAnalyticsCache.course_id == course_id
+    ).first()
+
+    if cache and cache.last_calculated_at is not None:
+        calculated_at = cache.last_calculated_at
+        if calculated_at.tzinfo is None:
+            calculated_at = calculated_at.replace(tzinfo=timezone.utc)
+        if datetime.now(timezone.utc) - calculated_at < timedelta(seconds=max_age_seconds):
+            return cache
+
+    cache = refresh_course_analytics_cache(course_id, db)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request created the row concurrently; use theirs
+        db.rollback()
+        cache = db.query(CourseAnalyticsCache).filter(
+            CourseAnalyticsCache.course_id == course_id
+        ).first()
+    return cache
+
+
+def record_course_step_progress(
+    course_id: int,
+    db: Session,
+    time_spent_delta: int = 0,
+    steps_completed: int = 0
+):
+    """
+    Apply step visits to the course analytics cache.
+
+    Uses an atomic UPDATE so concurrent visits do not lose increments. If the
+    course has no cache row yet nothing happens; it is created on first read.
+
+    Args:
+        course_id: Course ID
+        db: Database session
+        time_spent_delta: Minutes to add to the course total
+        steps_completed: Number of steps that moved to "completed" for the first time
+    """
+    values = {}
+    if time_spent_delta:
+        values["total_time_spent_minutes"] = func.coalesce(
+            CourseAnalyticsCache.total_time_spent_minutes, 0
+        ) + time_spent_delta
+    if steps_completed:
+        values["total_completed_steps"] = func.coalesce(
+            CourseAnalyticsCache.total_completed_steps, 0
+        ) + steps_completed
+    if not values:
+        return
+
+    db.query(CourseAnalyticsCache).filter(
+        CourseAnalyticsCache.course_id == course_id
+    ).update(values, synchronize_session=False)
+
+
+# --- Structure invalidation -------------------------------------------------
+# Lesson/step counts only change when content is edited. Those writes are
+# spread over many course routes, so they are detected at the session level
+# and the cache rows of the courses they belong to are marked stale in the
+# same transaction; the next overview read recalculates them.
+
+_STRUCTURE_MODELS = (Module, Lesson, Step, Assignment)
+_STRUCTURE_FLAG = "course_structure_changed"
+
+
+def _parent_key(obj):
+    """(table the parent id points into, parent id) of a structure row"""
+    if isinstance(obj, Module):
+        return "course", obj.course_id
+    if isinstance(obj, Lesson):
+        return "module", obj.module_id
+    return "lesson", obj.lesson_id
+
+
+def _course_of(model):
+    """SELECT of the course id of ``model`` rows, to be filtered on that model"""
+    if model is Module:
+        return select(Module.course_id)
+    query = select(Module.course_id)
+    if model is Step:
+        query = query.select_from(Step).join(Lesson, Step.lesson_id == Lesson.id)
+    elif model is Assignment:
+        query = query.select_from(Assignment).join(Lesson, Assignment.lesson_id == Lesson.id)
+    else:
+        query = query.select_from(Lesson)
+    return query.join(Module, Lesson.module_id == Module.id)
+
+
+def _resolve_course_ids(connection, keys) -> set:
+    keys = {(kind, parent_id) for kind, parent_id in keys if parent_id is not None}
+    course_ids = {parent_id for kind, parent_id in keys if kind == "course"}
+    module_ids = {parent_id for kind, parent_id in keys if kind == "module"}
+    lesson_ids = {parent_id for kind, parent_id in keys if kind == "lesson"}
+    if module_ids:
+        course_ids.update(connection.execute(
+            select(Module.course_id).where(Module.id.in_(module_ids))
+        ).scalars())
+    if lesson_ids:
+        course_ids.update(connection.execute(
+            _course_of(Lesson).where(Lesson.id.in_(lesson_ids))
+        ).scalars())
+    return course_ids
+
+
+def _mark_stale(connection, course_ids) -> None:
+    if not course_ids:
+        return
+    connection.execute(
+        update(CourseAnalyticsCache)
+        .where(
+            CourseAnalyticsCache.course_id.in_(sorted(course_ids)),
+            CourseAnalyticsCache.last_calculated_at.isnot(None),
+        )
+        .values(last_calculated_at=None)
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _detect_structure_change(session, flush_context, instances):
+    # Deleted rows: read the parent now, it may be gone after the flush.
+    # New rows: their parent ids are only set once the flush has run.
+    deleted = {_parent_key(obj) for obj in session.deleted if isinstance(obj, _STRUCTURE_MODELS)}
+    new = [obj for obj in session.new if isinstance(obj, _STRUCTURE_MODELS)]
+    if deleted or new:
+        changes = session.info.setdefault(_STRUCTURE_FLAG, {"keys": set(), "new": []})
+        changes["keys"] |= deleted
+        changes["new"] += new
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _mark_stale_after_flush(session, flush_context):
+    changes = session.info.pop(_STRUCTURE_FLAG, None)
+    if not changes:
+        return
+    keys = changes["keys"] | {_parent_key(obj) for obj in changes["new"]}
+    connection = session.connection()
+    _mark_stale(connection, _resolve_course_ids(connection, keys))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_stale_on_bulk_delete(orm_execute_state):
+    if not orm_execute_state.is_delete:
+        return
+    model = next((mapper.class_ for mapper in orm_execute_state.all_mappers
+                  if mapper.class_ in _STRUCTURE_MODELS), None)
+    if model is None:
+        return
+    # Runs before the DELETE: find the courses of the rows it is about to remove
+    query = _course_of(model).distinct()
+    where = orm_execute_state.statement.whereclause
+    if where is not None:
+        query = query.where(where)
+    connection = orm_execute_state.session.connection()
+    _mark_stale(connection, set(connection.execute(query).scalars()) - {None})
@@ -2,11 +2,12 @@
 Telegram Bot Service for sending notifications about question error reports.
 """
 import os
-import httpx
 import asyncio
 import logging
 from typing import List, Optional
 
+from src.services.http_client import get_integration
+
 logger = logging.getLogger(__name__)
 
 # Telegram Bot Configuration
@@ -46,14 +47,13 @@ async def send_telegram_message(chat_id: str, message: str, parse_mode: str = "H
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, timeout=10.0)
-            if response.status_code == 200:
-                logger.info(f"Telegram message sent to {chat_id}")
-                return True
-            else:
-                logger.error(f"Failed to send Telegram message: {response.text}")
-                return False
+        response = await get_integration("telegram").apost(url, json=payload)
+        if response.status_code == 200:
+            logger.info(f"Telegram message sent to {chat_id}")
+            return True
+        else:
+            logger.error(f"Failed to send Telegram message: {response.text}")
+            return False
     except Exception as e:
         logger.error(f"Error sending Telegram message: {e}")
         return False
@@ -134,8 +134,7 @@ async def notify_admins_about_error_report(
 <a href="{FRONTEND_URL}/admin/question-reports?report={report_id}">Open Report in Admin Panel</a>"""
 
     # Send to all admins
-    for chat_id in admin_chat_ids:
-        await send_telegram_message(chat_id, message)
+    await asyncio.gather(*(send_telegram_message(chat_id, message) for chat_id in admin_chat_ids))
 
 
 def notify_admins_sync(
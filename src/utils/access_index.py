@@ -0,0 +1,209 @@
+"""
+Precomputed access-control index.
+
+check_course_access / check_student_access used to walk Course,
+CourseTeacherAccess, Group, CourseGroupAccess and GroupStudent with several
+sequential queries on every call, and many routes call them inside loops.
+This module resolves, in a single UNION ALL round trip, every course id and
+student id a user can reach and caches the result per user, so permission
+checks become set lookups and list endpoints can filter with one ``IN``.
+
+The cache is per process and bounded by a TTL. Each entry is tagged with
+the ``access_index`` cache generation it was built under (see
+src.services.cache_generations): any committed change to the tables the
+index is derived from (groups, group membership, course/group access,
+teacher access, head-teacher links, course ownership) bumps that generation,
+so revoked access stops being granted on the next request in every worker.
+"""
+import os
+import threading
+from typing import FrozenSet, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import event, inspect, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from src.schemas.models import (
+    UserInDB, Course, Group, GroupStudent, CourseGroupAccess,
+    CourseTeacherAccess, CourseHeadTeacher,
+)
+from src.services import cache_generations
+
+ACCESS_INDEX_TTL_SECONDS = int(os.getenv("ACCESS_INDEX_TTL_SECONDS", "300"))
+ACCESS_INDEX_MAX_SIZE = int(os.getenv("ACCESS_INDEX_MAX_SIZE", "4096"))
+
+CACHE_NAME = "access_index"
+
+# Roles that can reach every course and student.
+UNRESTRICTED_ROLES = ("admin", "head_curator")
+
+# Tables whose rows the index is derived from.
+_SOURCE_TABLES = frozenset({
+    Course.__tablename__,
+    Group.__tablename__,
+    GroupStudent.__tablename__,
+    CourseGroupAccess.__tablename__,
+    CourseTeacherAccess.__tablename__,
+    CourseHeadTeacher.__tablename__,
+})
+
+_cache: TTLCache = TTLCache(maxsize=ACCESS_INDEX_MAX_SIZE, ttl=ACCESS_INDEX_TTL_SECONDS)
+_lock = threading.Lock()
+
+
+class AccessIndex:
+    """Courses and students reachable by one user."""
+
+    __slots__ = ("user_id", "role", "course_ids", "student_ids")
+
+    def __init__(self, user_id: int, role: str, course_ids: FrozenSet[int], student_ids: FrozenSet[int]):
+        self.user_id = user_id
+        self.role = role
+        self.course_ids = course_ids
+        self.student_ids = student_ids
+
+    @property
+    def is_unrestricted(self) -> bool:
+        return self.role in UNRESTRICTED_ROLES
+
+    def can_access_course(self, course_id: int) -> bool:
+        return self.is_unrestricted or course_id in self.course_ids
+
+    def can_access_student(self, student_id: int) -> bool:
+        if self.is_unrestricted:
+            return True
+        if self.role == "student":
+            return student_id == self.user_id
+        return student_id in self.student_ids
+
+
+def _build_queries(user_id: int, role: str):
+    """Return (kind, id) selects describing everything the role can reach."""
+    teacher_groups = select(Group.id).where(Group.teacher_id == user_id)
+    curator_groups = select(Group.id).where(Group.curator_id == user_id)
+    student_groups = select(GroupStudent.group_id).where(GroupStudent.student_id == user_id)
+
+    def group_courses(group_ids):
+        return select(literal("course").label("kind"), CourseGroupAccess.course_id.label("id")).where(
+            CourseGroupAccess.group_id.in_(group_ids),
+            CourseGroupAccess.is_active == True,
+        )
+
+    def group_students(group_ids):
+        return select(literal("student").label("kind"), GroupStudent.student_id.label("id")).join(
+            UserInDB, UserInDB.id == GroupStudent.student_id
+        ).where(
+            GroupStudent.group_id.in_(group_ids),
+            UserInDB.role == "student",
+        )
+
+    if role == "teacher":
+        own_active_courses = select(Course.id).where(Course.teacher_id == user_id, Course.is_active == True)
+        groups_with_own_courses = select(CourseGroupAccess.group_id).where(
+            CourseGroupAccess.course_id.in_(own_active_courses),
+            CourseGroupAccess.is_active == True,
+        )
+        return [
+            select(literal("course").label("kind"), Course.id.label("id")).where(Course.teacher_id == user_id),
+            select(literal("course").label("kind"), CourseTeacherAccess.course_id.label("id")).where(
+                CourseTeacherAccess.teacher_id == user_id,
+                CourseTeacherAccess.is_active == True,
+            ),
+            group_courses(teacher_groups),
+            group_students(teacher_groups),
+            group_students(groups_with_own_courses),
+        ]
+    if role == "head_teacher":
+        return [
+            select(literal("course").label("kind"), CourseHeadTeacher.course_id.label("id")).where(
+                CourseHeadTeacher.head_teacher_id == user_id
+            ),
+        ]
+    if role == "curator":
+        return [
+            group_courses(curator_groups),
+            group_students(curator_groups),
+        ]
+    if role == "student":
+        return [group_courses(student_groups)]
+    return []
+
+
+def build_access_index(user: UserInDB, db: Session) -> AccessIndex:
+    """Compute the access index for a user with a single query."""
+    course_ids = set()
+    student_ids = set()
+    queries = [] if user.role in UNRESTRICTED_ROLES else _build_queries(user.id, user.role)
+    if queries:
+        for kind, target_id in db.execute(union_all(*queries)):
+            if kind == "course":
+                course_ids.add(target_id)
+            else:
+                student_ids.add(target_id)
+    return AccessIndex(user.id, user.role, frozenset(course_ids), frozenset(student_ids))
+
+
+def get_access_index(user: UserInDB, db: Session) -> AccessIndex:
+    """Return the cached access index for a user, building it on a miss."""
+    key = (user.id, user.role)
+    current = cache_generations.generation(db, CACHE_NAME)
+    with _lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == current:
+        return cached[1]
+    index = build_access_index(user, db)
+    with _lock:
+        _cache[key] = (current, index)
+    return index
+
+
+def invalidate_access_index(user_id: Optional[int] = None) -> None:
+    """Drop the cached index for one user, or for everyone when no id is given."""
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+            return
+        for key in [k for k in list(_cache.keys()) if k[0] == user_id]:
+            _cache.pop(key, None)
+
+
+# --- Invalidation -----------------------------------------------------------
+# Access-graph writes are spread across admin, course and group routes and
+# include bulk insert()/query().delete() calls, so they are detected at the session
+# level; the committing transaction bumps the cache generation for all workers.
+
+
+def _touches_source_tables(instances) -> bool:
+    return any(
+        getattr(getattr(obj, "__table__", None), "name", None) in _SOURCE_TABLES
+        for obj in instances
+    )
+
+
+def _role_changed(instances) -> bool:
+    # Only a role change on users affects the index; streak/points writes do not.
+    return any(
+        isinstance(obj, UserInDB) and inspect(obj).attrs.role.history.has_changes()
+        for obj in instances
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _mark_dirty_on_flush(session, flush_context, instances):
+    if (
+        _touches_source_tables(session.new)
+        or _touches_source_tables(session.deleted)
+        or _touches_source_tables(session.dirty)
+        or _role_changed(session.dirty)
+    ):
+        cache_generations.mark(session, CACHE_NAME)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dirty_on_bulk_write(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    for mapper in orm_execute_state.all_mappers:
+        if mapper.local_table.name in _SOURCE_TABLES:
+            cache_generations.mark(orm_execute_state.session, CACHE_NAME)
+            return
@@ -2,8 +2,9 @@ from fastapi import HTTPException, Depends
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from src.config import get_db
-from src.schemas.models import UserInDB, Course, Group, Enrollment, CourseHeadTeacher, CourseTeacherAccess
+from src.schemas.models import UserInDB, Course, Group, Enrollment
 from src.routes.auth import get_current_user_dependency
+from src.utils.access_index import get_access_index
 
 def require_role(allowed_roles: List[str]):
     """
@@ -49,107 +50,15 @@ def require_teacher_curator_or_admin():
 def check_course_access(course_id: int, user: UserInDB, db: Session) -> bool:
     """
     Check if user has access to a specific course
-    - Students: if enrolled OR if their group has access to the course
-    - Teachers: only if they created the course
-    - Curators: if they have access to students in the course
+    - Students: if their group has access to the course
+    - Teachers: courses they created, were granted directly, or their groups can access
+    - Head teachers: courses they are assigned to
+    - Curators: if their groups have access to the course
     - Admins: always
-    """
-    if user.role in ["admin", "head_curator"]:
-        return True
-    
-    # Get course
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        return False
-    
-    if user.role == "teacher":
-        # Teachers can access their own courses AND courses their groups have access to
-        # Check if teacher created this course
-        if course.teacher_id == user.id:
-            return True
-        
-        # Check if teacher has direct access granted by admin
-        direct_access = db.query(CourseTeacherAccess).filter(
-            CourseTeacherAccess.course_id == course_id,
-            CourseTeacherAccess.teacher_id == user.id,
-            CourseTeacherAccess.is_active == True
-        ).first()
-        if direct_access:
-            return True
-        
-        # Check if any of teacher's groups have access to this course
-        from src.schemas.models import Group, CourseGroupAccess
-        
-        # Get groups where user is teacher
-        teacher_groups = db.query(Group).filter(Group.teacher_id == user.id).all()
-        
-        if not teacher_groups:
-            return False
-        
-        teacher_group_ids = [g.id for g in teacher_groups]
-        
-        # Check if any of teacher's groups have access to this course
-        group_access = db.query(CourseGroupAccess).filter(
-            CourseGroupAccess.group_id.in_(teacher_group_ids),
-            CourseGroupAccess.course_id == course_id,
-            CourseGroupAccess.is_active == True
-        ).first()
-        
-        return group_access is not None
-    
-    elif user.role == "head_teacher":
-        # Head teachers can access courses they are assigned to
-        head_teacher_link = db.query(CourseHeadTeacher).filter(
-            CourseHeadTeacher.course_id == course_id,
-            CourseHeadTeacher.head_teacher_id == user.id
-        ).first()
-        return head_teacher_link is not None
 
-    elif user.role == "student":
-        # Students can access if their group has access to the course
-        from src.schemas.models import GroupStudent, CourseGroupAccess
-        
-        # Find student's groups
-        group_students = db.query(GroupStudent).filter(
-            GroupStudent.student_id == user.id
-        ).all()
-        
-        if not group_students:
-            return False
-        
-        group_ids = [gs.group_id for gs in group_students]
-        
-        # Check if any of the student's groups have access to this course
-        group_access = db.query(CourseGroupAccess).filter(
-            CourseGroupAccess.group_id.in_(group_ids),
-            CourseGroupAccess.course_id == course_id,
-            CourseGroupAccess.is_active == True
-        ).first()
-        
-        return group_access is not None
-    
-    elif user.role == "curator":
-        # Curators can access courses if their groups have access to the course
-        from src.schemas.models import GroupStudent, Group, CourseGroupAccess
-        
-        # Get groups where user is curator
-        curator_groups = db.query(Group).filter(Group.curator_id == user.id).all()
-        
-        if not curator_groups:
-            return False
-        
-        curator_group_ids = [g.id for g in curator_groups]
-        
-        # Check if any of curator's groups have access to this course
-        group_access = db.query(CourseGroupAccess).filter(
-            CourseGroupAccess.group_id.in_(curator_group_ids),
-            CourseGroupAccess.course_id == course_id,
-            CourseGroupAccess.is_active == True
-        ).first()
-        
-        return group_access is not None
-    
-    return False
+    Resolved against the cached per-user access index (see src.utils.access_index).
+    """
+    return get_access_index(user, db).can_access_course(course_id)
 
 def require_course_access(course_id: int):
     """
@@ -172,75 +81,13 @@ def check_student_access(student_id: int, user: UserInDB, db: Session) -> bool:
     """
     Check if user has access to a specific student's data
     - Students: only their own data
-    - Teachers: only their students (enrolled in their courses)
-    - Curators: only assigned students
+    - Teachers: students in their groups or in groups with access to their active courses
+    - Curators: only students in their groups
     - Admins: all students
+
+    Resolved against the cached per-user access index (see src.utils.access_index).
     """
-    if user.role in ["admin", "head_curator"]:
-        return True
-    
-    if user.role == "student":
-        # Students can only access their own data
-        return user.id == student_id
-    
-    student = db.query(UserInDB).filter(UserInDB.id == student_id).first()
-    if not student or student.role != "student":
-        return False
-    
-    if user.role == "teacher":
-        from src.schemas.models import GroupStudent, Group, CourseGroupAccess
-        
-        # 1. Check if teacher is assigned to any of the student's groups
-        student_groups = db.query(Group).join(GroupStudent).filter(
-            GroupStudent.student_id == student_id,
-            Group.teacher_id == user.id
-        ).first()
-        
-        if student_groups:
-            return True
-            
-        # 2. Check if student has access to any of the teacher's courses (legacy/creator access)
-        teacher_courses = db.query(Course).filter(Course.teacher_id == user.id, Course.is_active == True).all()
-        teacher_course_ids = [course.id for course in teacher_courses]
-        
-        if teacher_course_ids:
-            # Найти все группы, в которых состоит студент
-            group_students = db.query(GroupStudent).filter(GroupStudent.student_id == student_id).all()
-            group_ids = [gs.group_id for gs in group_students]
-            
-            if group_ids:
-                # Проверить, есть ли у этих групп доступ к курсам учителя
-                access = db.query(CourseGroupAccess).filter(
-                    CourseGroupAccess.group_id.in_(group_ids),
-                    CourseGroupAccess.course_id.in_(teacher_course_ids),
-                    CourseGroupAccess.is_active == True
-                ).first()
-                if access:
-                    return True
-        
-        return False
-    
-    elif user.role == "curator":
-        # Curators can access students in their assigned groups
-        from src.schemas.models import GroupStudent, Group
-        
-        # Get groups where user is curator
-        curator_groups = db.query(Group).filter(Group.curator_id == user.id).all()
-        
-        if not curator_groups:
-            return False
-        
-        curator_group_ids = [g.id for g in curator_groups]
-        
-        # Check if student is in any of curator's groups
-        student_in_group = db.query(GroupStudent).filter(
-            GroupStudent.student_id == student_id,
-            GroupStudent.group_id.in_(curator_group_ids)
-        ).first()
-        
-        return student_in_group is not None
-    
-    return False
+    return get_access_index(user, db).can_access_student(student_id)
 
 def require_student_access(student_id: int):
     """
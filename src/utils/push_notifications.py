@@ -1,13 +1,12 @@
 """
 Utility for sending push notifications via Expo Push Notification service.
 """
-import requests
 import logging
 from typing import List, Dict, Any, Optional
 
-logger = logging.getLogger(__name__)
+from src.services.push_delivery import build_message, get_push_sender, is_expo_token
 
-EXPO_PUSH_ENDPOINT = "https://exp.host/--/api/v2/push/send"
+logger = logging.getLogger(__name__)
 
 
 def send_push_notification(
@@ -22,6 +21,9 @@ def send_push_notification(
     """
     Send a push notification to a single device.
     
+    To notify many devices, queue them on ``get_push_sender()`` and flush
+    once, which sends up to 100 messages per request.
+    
     Args:
         push_token: Expo push token (starts with ExponentPushToken[...])
         title: Notification title
@@ -34,60 +36,19 @@ def send_push_notification(
     Returns:
         bool: True if notification was sent successfully
     """
-    if not push_token or not push_token.startswith('ExponentPushToken['):
+    if not is_expo_token(push_token):
         logger.warning(f"Invalid push token format: {push_token}")
         return False
     
-    message = {
-        "to": push_token,
-        "title": title,
-        "body": body,
-        "sound": sound,
-        "priority": priority,
-    }
-    
-    if data:
-        message["data"] = data
-    
-    if badge is not None:
-        message["badge"] = badge
-    
-    try:
-        response = requests.post(
-            EXPO_PUSH_ENDPOINT,
-            json=message,
-            headers={
-                "Accept": "application/json",
-                "Content-Type": "application/json",
-            },
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            data_result = result.get("data", [{}])[0]
-            
-            if data_result.get("status") == "ok":
-                logger.info(f"Push notification sent successfully to {push_token[:20]}...")
-                return True
-            else:
-                error = data_result.get("message", "Unknown error")
-                logger.error(f"Expo push error: {error}")
-                return False
-        else:
-            logger.error(f"Failed to send push notification: {response.status_code} - {response.text}")
-            return False
-            
-    except Exception as e:
-        logger.error(f"Exception sending push notification: {str(e)}")
-        return False
+    message = build_message(push_token, title, body, data=data, sound=sound, priority=priority, badge=badge)
+    return get_push_sender().send([message])["success"] == 1
 
 
 def send_push_notifications_batch(
     messages: List[Dict[str, Any]]
 ) -> Dict[str, int]:
     """
-    Send multiple push notifications in a single batch request.
+    Send multiple push notifications in batched requests.
     
     Args:
         messages: List of message dictionaries with keys: to, title, body, data, etc.
@@ -98,46 +59,8 @@ def send_push_notifications_batch(
     if not messages:
         return {"success": 0, "failed": 0}
     
-    # Validate all tokens
-    valid_messages = []
-    for msg in messages:
-        token = msg.get("to", "")
-        if token and token.startswith('ExponentPushToken['):
-            valid_messages.append(msg)
-        else:
-            logger.warning(f"Skipping invalid token: {token}")
-    
-    if not valid_messages:
-        return {"success": 0, "failed": len(messages)}
-    
-    try:
-        response = requests.post(
-            EXPO_PUSH_ENDPOINT,
-            json=valid_messages,
-            headers={
-                "Accept": "application/json",
-                "Content-Type": "application/json",
-            },
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            data_results = result.get("data", [])
-            
-            success_count = sum(1 for r in data_results if r.get("status") == "ok")
-            failed_count = len(data_results) - success_count
-            
-            logger.info(f"Batch push notifications: {success_count} success, {failed_count} failed")
-            
-            return {"success": success_count, "failed": failed_count}
-        else:
-            logger.error(f"Batch push request failed: {response.status_code}")
-            return {"success": 0, "failed": len(valid_messages)}
-            
-    except Exception as e:
-        logger.error(f"Exception in batch push: {str(e)}")
-        return {"success": 0, "failed": len(valid_messages)}
+    stats = get_push_sender().send(messages)
+    return {"success": stats["success"], "failed": stats["failed"]}
 
 
 def send_message_notification(
@@ -0,0 +1,36 @@
+from sqlalchemy.orm import sessionmaker
+
+from src.schemas.models import CacheGeneration, Course, CourseGroupAccess, Group, GroupStudent, UserInDB
+from src.utils import access_index
+
+
+def test_revoked_access_is_seen_by_every_worker(db_engine):
+    Session = sessionmaker(bind=db_engine, autoflush=False)
+    db = Session()
+    teacher = UserInDB(email="t@example.com", name="Teacher", hashed_password="x", role="teacher")
+    student = UserInDB(email="s@example.com", name="Student", hashed_password="x", role="student")
+    db.add_all([teacher, student])
+    db.flush()
+    course = Course(title="SAT", teacher_id=teacher.id)
+    group = Group(name="G", teacher_id=teacher.id)
+    db.add_all([course, group])
+    db.flush()
+    db.add_all([GroupStudent(group_id=group.id, student_id=student.id),
+                CourseGroupAccess(course_id=course.id, group_id=group.id, granted_by=teacher.id)])
+    db.commit()
+    access_index.invalidate_access_index()
+    generation = db.get(CacheGeneration, access_index.CACHE_NAME).generation
+
+    assert access_index.get_access_index(student, db).can_access_course(course.id)
+    db.commit()
+
+    # Revoked through another session, as another worker would; nothing here clears the local cache
+    other = Session()
+    other.query(CourseGroupAccess).filter(CourseGroupAccess.course_id == course.id).delete()
+    other.commit()
+    other.close()
+    assert (student.id, "student") in access_index._cache
+    assert db.get(CacheGeneration, access_index.CACHE_NAME).generation == generation + 1
+
+    assert not access_index.get_access_index(student, db).can_access_course(course.id)
+    db.close()
@@ -0,0 +1,141 @@
+import asyncio
+import tracemalloc
+from datetime import date
+from io import BytesIO
+
+import pytest
+from openpyxl import load_workbook
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from src.admin.routes.analytics import export_analytics_to_excel
+from src.models import Base
+from src.schemas.models import (
+    Course, Enrollment, Group, GroupStudent, Lesson, Module, Step, StepProgress, UserInDB,
+)
+from src.services import analytics_export_service
+from src.services.analytics_export_service import write_course_analytics_export
+
+
+def _seed_course(db, students_count, progress_every=2):
+    """Course with four steps; every other student completed two of them."""
+    teacher = UserInDB(email="teacher@example.com", name="Teacher", hashed_password="x", role="teacher")
+    db.add(teacher)
+    db.flush()
+    course = Course(title="Big Course", teacher_id=teacher.id, is_active=True)
+    group = Group(name="Group A", teacher_id=teacher.id, is_active=True)
+    db.add_all([course, group])
+    db.flush()
+    module = Module(course_id=course.id, title="Module", order_index=0)
+    db.add(module)
+    db.flush()
+    lesson = Lesson(module_id=module.id, title="Lesson", order_index=0)
+    db.add(lesson)
+    db.flush()
+    steps = [Step(lesson_id=lesson.id, title=f"Step {i}", order_index=i) for i in range(4)]
+    db.add_all(steps)
+    db.flush()
+
+    db.execute(insert(UserInDB), [
+        {"email": f"s{i:05d}@example.com", "name": f"Student {i:05d}", "hashed_password": "x",
+         "role": "student", "is_active": True, "total_study_time_minutes": 10, "daily_streak": 1,
+         "last_activity_date": date(2026, 1, 5)}
+        for i in range(students_count)
+    ])
+    student_ids = [row.id for row in db.query(UserInDB.id).filter(UserInDB.role == "student").order_by(UserInDB.id)]
+    db.execute(insert(Enrollment), [
+        {"user_id": sid, "course_id": course.id, "is_active": True} for sid in student_ids
+    ])
+    db.execute(insert(GroupStudent), [
+        {"group_id": group.id, "student_id": sid} for sid in student_ids[::2]
+    ])
+    db.execute(insert(StepProgress), [
+        {"user_id": sid, "course_id": course.id, "lesson_id": lesson.id, "step_id": step.id,
+         "status": "completed", "time_spent_minutes": 1}
+        for sid in student_ids[::progress_every] for step in steps[:2]
+    ])
+    db.commit()
+    return teacher.id, course.id, group.id
+
+
+def _export(db, user_id, **params):
+    response = export_analytics_to_excel(
+        current_user=UserInDB(id=user_id, email="teacher@example.com", name="Teacher", role="admin", is_active=True),
+        db=db,
+        **params,
+    )
+
+    async def read():
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    return response, asyncio.run(read())
+
+
+def test_export_endpoint_streams_workbook(db_session):
+    teacher_id, course_id, group_id = _seed_course(db_session, 6)
+
+    response, content = _export(db_session, teacher_id, course_id=course_id, group_id=None)
+    assert response.headers["content-length"] == str(len(content))
+    assert "Analytics_Big_Course_" in response.headers["content-disposition"]
+
+    wb = load_workbook(BytesIO(content))
+    assert wb.sheetnames == ["Student Progress", "Course Overview", "Groups Summary", "Charts & Analytics"]
+
+    rows = list(wb["Student Progress"].iter_rows(min_row=3, values_only=True))
+    assert [row[0] for row in rows] == [f"Student {i:05d}" for i in range(6)]
+    first = rows[0]
+    assert first[3] == "Group A"
+    assert first[4:7] == (50, 2, 4)
+    assert first[12] == "2026-01-05"
+    assert first[13] == "Good"
+    assert rows[1][3] == "No groups" and rows[1][4] == 0 and rows[1][13] == "Not Started"
+
+    overview = {row[0]: row[1] for row in wb["Course Overview"].iter_rows(min_row=3, values_only=True) if row[0]}
+    assert overview["Total Students"] == 6
+    assert overview["Average Progress"] == "25.00%"
+    assert overview["Total Steps"] == 4
+    assert overview["Active Students (>0% progress)"] == 3
+    assert overview["Students with >50% progress"] == 3
+
+    groups = list(wb["Groups Summary"].iter_rows(min_row=3, values_only=True))
+    assert groups == [("Group A", 3, 50, "Teacher", 3, "100.0%")]
+
+    _, content = _export(db_session, teacher_id, course_id=course_id, group_id=group_id)
+    wb = load_workbook(BytesIO(content))
+    assert "Groups Summary" not in wb.sheetnames
+    assert len(list(wb["Student Progress"].iter_rows(min_row=3))) == 3
+
+
+def _peak_export_memory(db, course_id):
+    course = db.get(Course, course_id)
+    tracemalloc.start()
+    try:
+        export_file = write_course_analytics_export(db, course)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    export_file.close()
+    return peak
+
+
+def test_export_memory_does_not_grow_with_students(db_engine, monkeypatch):
+    monkeypatch.setattr(analytics_export_service, "EXCEL_EXPORT_BATCH_SIZE", 100)
+    # Spill to disk right away so the measurement covers only working memory
+    monkeypatch.setattr(analytics_export_service, "EXCEL_EXPORT_SPOOL_MAX_BYTES", 0)
+    Session = sessionmaker(bind=db_engine, autoflush=False)
+
+    small = Session()
+    _, small_course, _ = _seed_course(small, 200)
+    small_peak = _peak_export_memory(small, small_course)
+    small.close()
+
+    Base.metadata.drop_all(db_engine)
+    Base.metadata.create_all(db_engine)
+
+    large = Session()
+    _, large_course, _ = _seed_course(large, 2000)
+    large_peak = _peak_export_memory(large, large_course)
+    large.close()
+
+    # Ten times the students, about the same peak
+    assert large_peak < small_peak * 1.5, (small_peak, large_peak)
@@ -0,0 +1,122 @@
+import pytest
+
+from src.admin.routes.admin import (
+    BulkCreateUsersFromTextRequest, BulkCreateUsersRequest, CreateUserRequest,
+    create_bulk_users, create_bulk_users_from_text,
+)
+from src.schemas.models import Group, GroupStudent, UserInDB
+from src.services import bulk_user_import
+from src.utils.auth_utils import verify_password
+
+
+@pytest.fixture
+def existing(db_session):
+    teacher = UserInDB(email="teacher@example.com", name="Teacher", hashed_password="x", role="teacher")
+    taken = UserInDB(email="taken@example.com", name="Taken", hashed_password="x", role="student", student_id="STU00001")
+    db_session.add_all([teacher, taken])
+    db_session.flush()
+    group = Group(name="Group", teacher_id=teacher.id, is_active=True)
+    db_session.add(group)
+    db_session.commit()
+    return {"group": group.id}
+
+
+@pytest.fixture
+def fast_hashing(monkeypatch):
+    monkeypatch.setattr(bulk_user_import, "hash_passwords", lambda passwords: [f"hash:{p}" for p in passwords])
+
+
+def test_bulk_create_reports_failures_per_row(db_session, existing):
+    group_id = existing["group"]
+    request = BulkCreateUsersRequest(users=[
+        CreateUserRequest(email="New1@Example.com", name="New 1", password="secret1", group_ids=[group_id, group_id, 999]),
+        CreateUserRequest(email="taken@example.com", name="Taken again"),
+        CreateUserRequest(email="new2@example.com", name="New 2", student_id="STU00001"),
+        CreateUserRequest(email="new3@example.com", name="New 3", group_ids=[group_id]),
+        CreateUserRequest(email="new1@example.com", name="New 1 twice"),
+        CreateUserRequest(email="teacher2@example.com", name="Teacher 2", role="teacher", group_ids=[group_id]),
+    ])
+
+    response = create_bulk_users(request, db=db_session, current_user=None)
+
+    assert [u.user.email for u in response.created_users] == [
+        "new1@example.com", "new3@example.com", "teacher2@example.com",
+    ]
+    assert sorted((f["email"], f["error"]) for f in response.failed_users) == [
+        ("new1@example.com", "Email already registered"),
+        ("new2@example.com", "Student ID already registered"),
+        ("taken@example.com", "Email already registered"),
+    ]
+
+    first, second, teacher = response.created_users
+    assert first.generated_password is None and second.generated_password
+    assert first.user.student_id.startswith("STU") and teacher.user.student_id is None
+    assert first.user.course_ids == []
+
+    stored = db_session.query(UserInDB).filter(UserInDB.email == "new1@example.com").one()
+    assert verify_password("secret1", stored.hashed_password)
+    new3 = db_session.query(UserInDB).filter(UserInDB.email == "new3@example.com").one()
+    assert verify_password(second.generated_password, new3.hashed_password)
+
+    members = {row.student_id for row in db_session.query(GroupStudent).filter(GroupStudent.group_id == group_id)}
+    assert members == {first.user.id, second.user.id}
+
+
+def test_bulk_text_import(db_session, existing, fast_hashing):
+    text = "\n".join([
+        "# name\tphone\tmonths\tdate\temail",
+        "Student A\t8700\tноябрь\tDecember 3 2025\ta@example.com",
+        "Broken line",
+        "\t8700\tноябрь\tDecember 3 2025\tb@example.com",
+        "Student C\t8700\tноябрь\tDecember 3 2025\tnot-an-email",
+        "Student D\t8700\tноябрь\tDecember 3 2025\ttaken@example.com",
+    ])
+    request = BulkCreateUsersFromTextRequest(text=text, group_ids=[existing["group"]], generate_passwords=False)
+
+    response = create_bulk_users_from_text(request, db=db_session, current_user=None)
+
+    assert [(u.user.email, u.generated_password) for u in response.created_users] == [("a@example.com", None)]
+    assert not response.created_users[0].user.onboarding_completed
+    assert [f["email"] for f in response.failed_users] == ["Line 3", "Line 4", "not-an-email", "taken@example.com"]
+    assert db_session.query(GroupStudent).count() == 1
+
+
+def test_bulk_import_query_count_is_constant(db_session, existing, fast_hashing, count_queries, monkeypatch):
+    # Free ids, so no run pays for a collision with an existing student
+    ids = iter(range(10000, 100000))
+    monkeypatch.setattr(bulk_user_import, "generate_student_id", lambda: f"STU{next(ids):05d}")
+
+    def run(prefix, count):
+        rows = [
+            bulk_user_import.ImportRow(email=f"{prefix}{i}@example.com", name=f"{prefix}{i}", group_ids=[existing["group"]])
+            for i in range(count)
+        ]
+        with count_queries() as counter:
+            created, failed = bulk_user_import.import_users(db_session, rows)
+        assert len(created) == count and not failed
+        return counter.count
+
+    assert run("small", 5) == run("large", 200)
+
+
+def test_conflicting_row_is_reported_alone(db_session, existing, monkeypatch):
+    def register_meanwhile(passwords):
+        # Another request registers one of the emails after the lookups
+        db_session.add(UserInDB(email="late@example.com", name="Late", hashed_password="x", role="student"))
+        db_session.flush()
+        return [f"hash:{p}" for p in passwords]
+
+    monkeypatch.setattr(bulk_user_import, "hash_passwords", register_meanwhile)
+    rows = [
+        bulk_user_import.ImportRow(email=email, name=email, group_ids=[existing["group"]])
+        for email in ("first@example.com", "late@example.com", "last@example.com")
+    ]
+
+    created, failed = bulk_user_import.import_users(db_session, rows)
+    db_session.commit()
+
+    assert [user.email for user, _ in created] == ["first@example.com", "last@example.com"]
+    assert failed == [{"email": "late@example.com", "error": "Email already registered"}]
+    assert db_session.query(UserInDB).filter(UserInDB.email == "late@example.com").one().name == "Late"
+    members = {row.student_id for row in db_session.query(GroupStudent)}
+    assert members == {user.id for user, _ in created}
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from conftest import QueryCounter
+from src.config import get_db
+from src.events.routes.events import router as events_router
+from src.models import Base
+from src.routes.auth import get_current_user_dependency
+from src.schemas.models import Event, EventGroup, Group, GroupStudent, UserInDB
+from src.services import cache_generations, calendar_feed_cache
+from src.services.calendar_feed_cache import tag_cache_name
+
+
+@pytest.fixture
+def calendar():
+    calendar_feed_cache.invalidate_calendar_feeds()
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    curator = UserInDB(email="curator@example.com", name="Curator", hashed_password="x", role="curator")
+    student = UserInDB(email="student@example.com", name="Student", hashed_password="x", role="student")
+    db.add_all([curator, student])
+    db.flush()
+    group = Group(name="A1", teacher_id=curator.id, curator_id=curator.id)
+    other = Group(name="B2", teacher_id=curator.id)
+    db.add_all([group, other])
+    db.flush()
+    db.add(GroupStudent(group_id=group.id, student_id=student.id))
+    club = Event(title="Speaking club", event_type="webinar", start_datetime=datetime(2025, 9, 1, 14),
+                 end_datetime=datetime(2025, 9, 1, 15), created_by=curator.id, is_recurring=True,
+                 recurrence_pattern="weekly", is_active=True)
+    club.event_groups.append(EventGroup(group_id=group.id))
+    db.add(club)
+    db.commit()
+    users = {u.role: (u.id, u.email, u.name, u.role) for u in (curator, student)}
+    ids = {"group": group.id, "other": other.id, "club": club.id}
+    db.close()
+
+    current = {"role": "student"}
+
+    def override_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def override_user():
+        user_id, email, name, role = users[current["role"]]
+        return UserInDB(id=user_id, email=email, name=name, role=role, is_active=True)
+
+    app = FastAPI()
+    app.include_router(events_router, prefix="/events")
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user_dependency] = override_user
+    yield {"client": TestClient(app), "engine": engine, "Session": Session, "current": current, **ids}
+    engine.dispose()
+
+
+def test_unchanged_feed_is_revalidated_with_one_generation_read(calendar):
+    client = calendar["client"]
+    first = client.get("/events/calendar", params={"year": 2026, "month": 3})
+    assert first.status_code == 200
+    assert [e["title"] for e in first.json()] == ["A1: Speaking club"] * 5
+    etag = first.headers["etag"]
+
+    with QueryCounter(calendar["engine"]) as counter:
+        cached = client.get("/events/calendar", params={"year": 2026, "month": 3})
+        revalidated = client.get("/events/calendar", params={"year": 2026, "month": 3},
+                                 headers={"If-None-Match": etag})
+    # Only the generations of the feed's tags are read, one query per request
+    assert counter.count == 2
+    assert cached.content == first.content and cached.headers["etag"] == etag
+    assert revalidated.status_code == 304 and revalidated.headers["etag"] == etag
+
+    # A write to a group the student is not in keeps the feed
+    db = calendar["Session"]()
+    db.get(Group, calendar["other"]).name = "B2 evening"
+    db.commit()
+    db.close()
+    assert client.get("/events/calendar", params={"year": 2026, "month": 3},
+                      headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_curator_event_changes_the_student_feed(calendar):
+    client = calendar["client"]
+    before = client.get("/events/my", params={"start_date": "2026-03-01", "end_date": "2026-03-31",
+                                              "upcoming_only": False})
+    assert len(before.json()) == 5
+
+    calendar["current"]["role"] = "curator"
+    created = client.post("/events/curator/create", json={
+        "title": "Mock exam", "event_type": "weekly_test",
+        "start_datetime": "2026-03-12T09:00:00", "end_datetime": "2026-03-12T12:00:00",
+        "group_ids": [calendar["group"]],
+    })
+    assert created.status_code == 200
+
+    calendar["current"]["role"] = "student"
+    after = client.get("/events/my", params={"start_date": "2026-03-01", "end_date": "2026-03-31",
+                                             "upcoming_only": False},
+                       headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200 and after.headers["etag"] != before.headers["etag"]
+    assert "A1: Mock exam" in [e["title"] for e in after.json()]
+
+    # Renaming the recurring parent reaches the feed of its group as well; the
+    # commit leaves this process's entries alone (other workers would not see
+    # them) and only bumps the generations stored in the database
+    cached = dict(calendar_feed_cache._feeds)
+    db = calendar["Session"]()
+    club = db.get(Event, calendar["club"])
+    club.title = "Debate club"
+    db.commit()
+    assert cache_generations.generation(db, tag_cache_name(("group", calendar["group"]))) > 0
+    db.close()
+    assert dict(calendar_feed_cache._feeds) == cached
+    moved = client.get("/events/my", params={"start_date": "2026-03-01", "end_date": "2026-03-31",
+                                             "upcoming_only": False})
+    assert "A1: Debate club" in [e["title"] for e in moved.json()]
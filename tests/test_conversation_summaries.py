@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+from src.messages.services import get_conversation_summaries
+from src.schemas.models import Message, UserInDB
+
+
+def _user(db_session, name, role="student"):
+    user = UserInDB(email=f"{name}@example.com", name=name, hashed_password="x", role=role)
+    db_session.add(user)
+    db_session.flush()
+    return user
+
+
+def test_conversation_summaries_in_one_query(db_session, count_queries):
+    me = _user(db_session, "curator", role="curator")
+    alice = _user(db_session, "alice")
+    bob = _user(db_session, "bob")
+    carol = _user(db_session, "carol")
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def msg(sender, recipient, minutes, content, is_read=False):
+        db_session.add(Message(
+            from_user_id=sender.id, to_user_id=recipient.id, content=content,
+            is_read=is_read, created_at=base + timedelta(minutes=minutes),
+        ))
+
+    msg(alice, me, 1, "hi", is_read=True)
+    msg(alice, me, 2, "are you there?")
+    msg(alice, me, 3, "hello?")
+    msg(me, alice, 4, "yes")
+    msg(bob, me, 10, "question")
+    msg(me, carol, 5, "reminder")
+    msg(bob, carol, 20, "not mine")
+    db_session.commit()
+    my_id = me.id
+
+    with count_queries() as counter:
+        conversations = get_conversation_summaries(my_id, db_session)
+
+    assert counter.count == 1
+    assert [c["partner_id"] for c in conversations] == [bob.id, carol.id, alice.id]
+    bob_thread, carol_thread, alice_thread = conversations
+    assert bob_thread == {
+        "partner_id": bob.id,
+        "partner_name": "bob",
+        "partner_role": "student",
+        "partner_avatar": None,
+        "last_message": {
+            "content": "question",
+            "created_at": bob_thread["last_message"]["created_at"],
+            "from_me": False,
+        },
+        "unread_count": 1,
+    }
+    assert alice_thread["last_message"]["content"] == "yes"
+    assert alice_thread["last_message"]["from_me"] is True
+    assert alice_thread["unread_count"] == 2
+    assert carol_thread["unread_count"] == 0
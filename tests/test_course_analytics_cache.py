@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.schemas.models import (
+    Course, CourseAnalyticsCache, Enrollment, Lesson, Module, Step, StepProgress, UserInDB,
+)
+from src.services.summary_cache import (
+    get_course_analytics_cache, record_course_step_progress, refresh_course_analytics_cache,
+)
+
+
+@pytest.fixture
+def course_with_progress(db_session):
+    """One course with 2 lessons (3 + 2 steps), one active and one enrolled-only student."""
+    teacher = UserInDB(email="teacher@example.com", name="Teacher", hashed_password="x", role="teacher")
+    active = UserInDB(email="active@example.com", name="Active", hashed_password="x", role="student")
+    idle = UserInDB(email="idle@example.com", name="Idle", hashed_password="x", role="student")
+    db_session.add_all([teacher, active, idle])
+    db_session.flush()
+
+    course = Course(title="Course", teacher_id=teacher.id, is_active=True)
+    db_session.add(course)
+    db_session.flush()
+    module = Module(course_id=course.id, title="Module", order_index=0)
+    db_session.add(module)
+    db_session.flush()
+    lessons = []
+    for l, n_steps in enumerate((3, 2)):
+        lesson = Lesson(module_id=module.id, title=f"Lesson {l}", order_index=l)
+        db_session.add(lesson)
+        db_session.flush()
+        steps = [Step(lesson_id=lesson.id, title=f"Step {s}", order_index=s) for s in range(n_steps)]
+        db_session.add_all(steps)
+        db_session.flush()
+        lessons.append((lesson, steps))
+
+    lesson, steps = lessons[0]
+    now = datetime.now(timezone.utc)
+    db_session.add_all([
+        StepProgress(user_id=active.id, course_id=course.id, lesson_id=lesson.id, step_id=steps[0].id,
+                     status="completed", visited_at=now - timedelta(days=1), time_spent_minutes=5),
+        StepProgress(user_id=active.id, course_id=course.id, lesson_id=lesson.id, step_id=steps[1].id,
+                     status="in_progress", visited_at=now - timedelta(days=10), time_spent_minutes=3),
+    ])
+    db_session.add(Enrollment(user_id=idle.id, course_id=course.id, is_active=True))
+    db_session.commit()
+    return course, lessons
+
+
+def test_refresh_computes_structure_and_engagement(db_session, course_with_progress):
+    course, lessons = course_with_progress
+
+    cache = refresh_course_analytics_cache(course.id, db_session)
+    db_session.commit()
+
+    assert cache.total_modules == 1
+    assert cache.total_lessons == 2
+    assert cache.total_steps == 5
+    assert cache.lesson_step_counts == {str(lessons[0][0].id): 3, str(lessons[1][0].id): 2}
+    assert cache.total_completed_steps == 1
+    assert cache.total_time_spent_minutes == 8
+    assert cache.total_enrolled == 2
+    assert cache.active_students_7d == 1
+    assert cache.active_students_30d == 1
+    assert cache.last_calculated_at is not None
+
+
+def test_step_visits_update_cache_incrementally(db_session, course_with_progress):
+    course, _ = course_with_progress
+    get_course_analytics_cache(course.id, db_session)
+
+    record_course_step_progress(course.id, db_session, time_spent_delta=4, steps_completed=1)
+    record_course_step_progress(course.id, db_session, time_spent_delta=2)
+    db_session.commit()
+
+    cache = db_session.query(CourseAnalyticsCache).filter_by(course_id=course.id).one()
+    db_session.refresh(cache)
+    assert cache.total_completed_steps == 2
+    assert cache.total_time_spent_minutes == 14
+
+
+def test_structure_change_marks_only_its_course_stale(db_session, course_with_progress):
+    course, lessons = course_with_progress
+    other = Course(title="Other", teacher_id=course.teacher_id, is_active=True)
+    db_session.add(other)
+    db_session.flush()
+    other_module = Module(course_id=other.id, title="Module", order_index=0)
+    db_session.add(other_module)
+    db_session.commit()
+    get_course_analytics_cache(course.id, db_session)
+    get_course_analytics_cache(other.id, db_session)
+
+    def stale():
+        db_session.expire_all()
+        return {c.course_id for c in db_session.query(CourseAnalyticsCache) if c.last_calculated_at is None}
+
+    db_session.add(Step(lesson_id=lessons[1][0].id, title="New step", order_index=2))
+    db_session.commit()
+    assert stale() == {course.id}
+
+    cache = get_course_analytics_cache(course.id, db_session)
+    assert cache.total_steps == 6
+    assert cache.last_calculated_at is not None
+
+    # A lesson created together with its module, in the other course
+    db_session.add(Lesson(module=Module(course_id=other.id, title="New", order_index=1), title="L", order_index=0))
+    db_session.commit()
+    assert stale() == {other.id}
+    get_course_analytics_cache(other.id, db_session)
+
+    db_session.query(Step).filter(Step.lesson_id == lessons[0][0].id).delete(synchronize_session=False)
+    db_session.commit()
+    assert stale() == {course.id}
+    assert get_course_analytics_cache(course.id, db_session).total_steps == 3
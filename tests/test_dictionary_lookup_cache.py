@@ -0,0 +1,125 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.content.routes import ai_tools
+from src.content.routes.ai_tools import GeminiLookupService, LookupRequest
+from src.models import Base
+from src.schemas.models import DictionaryLookup
+from src.services.dictionary_lookup_cache import DictionaryLookupCache, cache_key
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Blocking stand-in for genai.GenerativeModel"""
+
+    def __init__(self, delay=0.0, text=None):
+        self.delay = delay
+        self.text = text
+        self.prompts = []
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        word = prompt.split('Word/Phrase: "', 1)[1].split('"', 1)[0]
+        return StubResponse(self.text or "```json\n" + json.dumps({
+            "word": word, "definition_en": f"meaning of {word}", "translation_ru": "перевод", "synonyms": [],
+        }) + "\n```")
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # Lookups read and write the cache from threadpool threads
+    engine = create_engine(f"sqlite:///{tmp_path / 'dictionary.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+def test_repeat_lookups_hit_the_cache(session_factory, monkeypatch):
+    model = StubModel()
+    cache = DictionaryLookupCache(session_factory=session_factory)
+    service = GeminiLookupService(model=model, cache=cache)
+    monkeypatch.setattr(ai_tools, "lookup_service", service)
+    monkeypatch.setattr(ai_tools, "GEMINI_API_KEY", "test")
+
+    async def scenario():
+        first = await ai_tools.lookup_word(LookupRequest(text="Ubiquitous"), current_user=None, db=None)
+        again = await ai_tools.lookup_word(LookupRequest(text=" ubiquitous. "), current_user=None, db=None)
+        in_context = await service.lookup_word("ubiquitous", "Phones are ubiquitous.")
+        return first, again, in_context
+
+    first, again, in_context = asyncio.run(scenario())
+    assert first.definition_en == "meaning of Ubiquitous"
+    assert again == first
+    # A different context is a different entry
+    assert len(model.prompts) == 2 and "Phones are ubiquitous." in model.prompts[1]
+    assert cache.stats == {"memory_hits": 1, "db_hits": 0, "misses": 2}
+    assert threading.main_thread().ident not in model.threads
+
+    # Another worker (empty LRU) is answered from the table
+    other_worker = GeminiLookupService(model=model, cache=DictionaryLookupCache(session_factory=session_factory))
+    result = asyncio.run(other_worker.lookup_word("UBIQUITOUS", "phones  are ubiquitous."))
+    assert result["definition_en"] == "meaning of ubiquitous"
+    assert len(model.prompts) == 2
+
+    db = session_factory()
+    try:
+        assert db.query(DictionaryLookup).filter(DictionaryLookup.word == "ubiquitous").count() == 2
+    finally:
+        db.close()
+
+
+def test_concurrent_lookups_share_one_call(session_factory):
+    model = StubModel(delay=0.2)
+    service = GeminiLookupService(model=model, cache=DictionaryLookupCache(session_factory=session_factory))
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(service.lookup_word("candid") for _ in range(10)))
+        ticking.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(scenario())
+    assert len(model.prompts) == 1
+    assert all(result == results[0] for result in results)
+    # The event loop kept running while the model call was in flight
+    assert ticks >= 5
+
+
+def test_unparseable_responses_are_not_cached(session_factory):
+    model = StubModel(text="not json")
+    cache = DictionaryLookupCache(session_factory=session_factory)
+    service = GeminiLookupService(model=model, cache=cache)
+
+    for _ in range(2):
+        result = asyncio.run(service.lookup_word("laconic"))
+        assert result["definition_en"] == "Definition not available"
+    assert len(model.prompts) == 2
+
+    db = session_factory()
+    try:
+        assert db.query(DictionaryLookup).filter(DictionaryLookup.cache_key == cache_key("laconic", None)).count() == 0
+    finally:
+        db.close()
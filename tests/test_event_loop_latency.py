@@ -0,0 +1,112 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.admin.routes.analytics import router as analytics_router
+from src.config import configure_threadpool, get_db
+from src.models import Base
+from src.routes.auth import get_current_user_dependency
+from src.schemas.models import UserInDB
+
+SLOW_QUERY_SECONDS = 0.2
+
+
+def _build_app():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    admin = UserInDB(email="admin@example.com", name="admin", hashed_password="x", role="admin")
+    db.add(admin)
+    db.add_all(
+        UserInDB(email=f"s{i}@example.com", name=f"s{i}", hashed_password="x", role="student")
+        for i in range(20)
+    )
+    db.commit()
+    admin_id = admin.id
+    db.close()
+
+    # Every query of the analytics request is slow; /health issues none
+    @event.listens_for(engine, "before_cursor_execute")
+    def _slow_query(*args):
+        time.sleep(SLOW_QUERY_SECONDS)
+
+    def override_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def override_user(db=None):
+        return UserInDB(id=admin_id, email="admin@example.com", name="admin", role="admin", is_active=True)
+
+    app = FastAPI()
+    app.include_router(analytics_router, prefix="/analytics")
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user_dependency] = override_user
+    return app, engine
+
+
+def test_health_latency_flat_during_heavy_analytics_request():
+    app, engine = _build_app()
+
+    async def scenario():
+        configure_threadpool()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async def health():
+                started = time.perf_counter()
+                response = await client.get("/health")
+                assert response.status_code == 200
+                return time.perf_counter() - started
+
+            async def heavy():
+                started = time.perf_counter()
+                response = await client.get("/analytics/students/all")
+                return response, time.perf_counter() - started
+
+            # Same runner, same run, nothing else in flight
+            baseline = [await health() for _ in range(20)]
+
+            heavy_task = asyncio.create_task(heavy())
+            await asyncio.sleep(0.05)
+
+            latencies = []
+            while not heavy_task.done():
+                latencies.append(await health())
+                await asyncio.sleep(0.01)
+
+            return await heavy_task, baseline, latencies
+
+    try:
+        (heavy_response, heavy_elapsed), baseline, latencies = asyncio.run(scenario())
+    finally:
+        engine.dispose()
+
+    assert heavy_response.status_code == 200
+    assert heavy_response.json()["total_students"] == 20
+    assert heavy_elapsed >= 3 * SLOW_QUERY_SECONDS
+
+    # Relative to the idle latency measured above rather than a wall-clock
+    # threshold: were the handler blocking the loop, /health would wait out
+    # the slow queries (SLOW_QUERY_SECONDS each) and could not run this often
+    assert len(latencies) >= 20
+    assert statistics.median(latencies) < statistics.median(baseline) + SLOW_QUERY_SECONDS / 4
+    assert statistics.quantiles(latencies, n=10)[-1] < max(baseline) + SLOW_QUERY_SECONDS / 2
@@ -0,0 +1,229 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from openpyxl import load_workbook
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.admin.routes.analytics import (
+    ExportJobCreateSchema, download_export_job, get_export_job, submit_export_job,
+)
+from src.models import Base
+from src.schemas.models import (
+    Course, Enrollment, Group, GroupStudent, Lesson, Module, Step, StepProgress, UserInDB,
+)
+from src.services import analytics_export_service, export_jobs
+from src.services.export_jobs import ExportJobManager
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    # Export jobs collect in their own threads; an in-memory SQLite database is per connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'exports.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(file_engine, monkeypatch):
+    factory = sessionmaker(bind=file_engine, autoflush=False)
+    monkeypatch.setattr(analytics_export_service, "SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture
+def seeded(session_factory):
+    """An admin and a course with three enrolled students, one of them in a group with progress."""
+    db = session_factory()
+    admin = UserInDB(email="admin@example.com", name="Admin", hashed_password="x", role="admin", is_active=True)
+    teacher = UserInDB(email="teacher@example.com", name="Teacher", hashed_password="x", role="teacher", is_active=True)
+    db.add_all([admin, teacher])
+    db.flush()
+    course = Course(title="Export Course", teacher_id=teacher.id, is_active=True)
+    group = Group(name="Group A", teacher_id=teacher.id, is_active=True)
+    db.add_all([course, group])
+    db.flush()
+    module = Module(course_id=course.id, title="Module", order_index=0)
+    db.add(module)
+    db.flush()
+    lesson = Lesson(module_id=module.id, title="Lesson", order_index=0)
+    db.add(lesson)
+    db.flush()
+    steps = [Step(lesson_id=lesson.id, title=f"Step {i}", order_index=i) for i in range(2)]
+    students = [
+        UserInDB(email=f"s{i}@example.com", name=f"Student {i}", hashed_password="x", role="student",
+                 is_active=True, total_study_time_minutes=30, daily_streak=0)
+        for i in range(3)
+    ]
+    db.add_all(steps + students)
+    db.flush()
+    db.add_all([Enrollment(user_id=s.id, course_id=course.id, is_active=True) for s in students])
+    db.add(GroupStudent(group_id=group.id, student_id=students[0].id))
+    db.add(StepProgress(user_id=students[0].id, course_id=course.id, lesson_id=lesson.id, step_id=steps[0].id,
+                        status="completed", time_spent_minutes=1))
+    db.commit()
+    admin = UserInDB(id=admin.id, email=admin.email, name=admin.name, role="admin", is_active=True)
+    ids = {"admin": admin, "course": course.id, "group": group.id, "students": [s.id for s in students]}
+    db.close()
+    return ids
+
+
+def _manager(session_factory, tmp_path, monkeypatch, **kwargs):
+    manager = ExportJobManager(jobs_dir=str(tmp_path / "exports"), session_factory=session_factory, **kwargs)
+    monkeypatch.setattr(export_jobs, "_export_job_manager", manager)
+    return manager
+
+
+def _submit(session_factory, user, **payload):
+    db = session_factory()
+    try:
+        return submit_export_job(ExportJobCreateSchema(**payload), current_user=user, db=db)
+    finally:
+        db.close()
+
+
+def _wait(job_id, user, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = get_export_job(job_id, current_user=user)
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"export job {job_id} did not finish")
+
+
+def test_pdf_job_renders_in_worker_process(seeded, session_factory, tmp_path, monkeypatch):
+    manager = _manager(session_factory, tmp_path, monkeypatch)
+    admin = seeded["admin"]
+    try:
+        job = _submit(session_factory, admin, report="all_students_pdf")
+        assert job["status"] == "pending" and job["download_url"] is None
+
+        job = _wait(job["job_id"], admin)
+        assert job["status"] == "completed", job["error"]
+        assert job["filename"].startswith("all_students_report_")
+
+        response = download_export_job(job["job_id"], current_user=admin)
+        with open(response.path, "rb") as f:
+            content = f.read()
+        assert job["size"] == len(content)
+        # reportlab is optional; without it the renderer writes a text report
+        assert content.startswith(b"%PDF") or b"Total Students: 3" in content
+    finally:
+        manager.shutdown()
+
+
+def test_excel_job_streams_course_workbook(seeded, session_factory, tmp_path, monkeypatch):
+    manager = _manager(session_factory, tmp_path, monkeypatch, render_executor=ThreadPoolExecutor(1))
+    admin = seeded["admin"]
+    try:
+        job = _wait(_submit(session_factory, admin, report="course_excel", course_id=seeded["course"])["job_id"], admin)
+        assert job["status"] == "completed", job["error"]
+        assert job["filename"].startswith("Analytics_Export_Course_")
+
+        path = manager.artifact_path(manager.get(job["job_id"]))
+        rows = list(load_workbook(BytesIO(path.read_bytes()))["Student Progress"].iter_rows(min_row=3, values_only=True))
+        assert [(row[0], row[4]) for row in rows] == [("Student 0", 50), ("Student 1", 0), ("Student 2", 0)]
+    finally:
+        manager.shutdown()
+
+
+def test_identical_submissions_share_a_job(seeded, session_factory, tmp_path, monkeypatch):
+    manager = _manager(session_factory, tmp_path, monkeypatch, render_executor=ThreadPoolExecutor(1))
+    admin = seeded["admin"]
+    first_student, second_student = seeded["students"][:2]
+    try:
+        first = _submit(session_factory, admin, report="student_pdf", student_id=first_student)
+        again = _submit(session_factory, admin, report="student_pdf", student_id=first_student)
+        other = _submit(session_factory, admin, report="student_pdf", student_id=second_student)
+        assert again["job_id"] == first["job_id"]
+        assert other["job_id"] != first["job_id"]
+        assert _wait(first["job_id"], admin)["status"] == "completed"
+
+        # Outside the dedupe window a new job is started
+        manager.dedupe_seconds = 0
+        later = _submit(session_factory, admin, report="student_pdf", student_id=first_student)
+        assert later["job_id"] != first["job_id"]
+        _wait(later["job_id"], admin)
+        _wait(other["job_id"], admin)
+    finally:
+        manager.shutdown()
+
+
+def test_submit_checks_access_before_queueing(seeded, session_factory, tmp_path, monkeypatch):
+    manager = _manager(session_factory, tmp_path, monkeypatch, render_executor=ThreadPoolExecutor(1))
+    student = UserInDB(id=seeded["students"][0], email="s0@example.com", name="Student 0", role="student", is_active=True)
+    try:
+        with pytest.raises(HTTPException) as exc:
+            _submit(session_factory, student, report="all_students_pdf")
+        assert exc.value.status_code == 403
+        with pytest.raises(HTTPException) as exc:
+            _submit(session_factory, seeded["admin"], report="group_pdf", group_id=999)
+        assert exc.value.status_code == 404
+        assert list((tmp_path / "exports").glob("*.json")) == []
+    finally:
+        manager.shutdown()
+
+
+def test_jobs_are_private_and_expire(seeded, session_factory, tmp_path, monkeypatch):
+    manager = _manager(session_factory, tmp_path, monkeypatch, render_executor=ThreadPoolExecutor(1))
+    admin = seeded["admin"]
+    try:
+        job = _wait(_submit(session_factory, admin, report="group_pdf", group_id=seeded["group"])["job_id"], admin)
+        assert job["status"] == "completed", job["error"]
+
+        # Not reachable through the public /uploads static mount
+        uploads = Path("uploads").resolve()
+        assert uploads not in Path(export_jobs.EXPORT_JOBS_DIR).resolve().parents
+
+        other_admin = UserInDB(id=admin.id + 100, email="x@example.com", name="X", role="admin", is_active=True)
+        with pytest.raises(HTTPException) as exc:
+            get_export_job(job["job_id"], current_user=other_admin)
+        assert exc.value.status_code == 404
+
+        assert manager.purge_expired(time.time() + manager.ttl_seconds + 1) == 1
+        assert list((tmp_path / "exports").iterdir()) == []
+        with pytest.raises(HTTPException):
+            download_export_job(job["job_id"], current_user=admin)
+    finally:
+        manager.shutdown()
+
+
+def test_jobs_lost_with_their_worker_fail_and_are_not_reused(seeded, session_factory, tmp_path, monkeypatch):
+    manager = _manager(session_factory, tmp_path, monkeypatch, render_executor=ThreadPoolExecutor(1))
+    admin = seeded["admin"]
+    try:
+        job = _submit(session_factory, admin, report="group_pdf", group_id=seeded["group"])
+        _wait(job["job_id"], admin)
+
+        # A worker restarted while the job was running: nothing stamps it any more
+        stale = dict(manager.get(job["job_id"]), status="running", artifact=None,
+                     heartbeat_at=time.time() - manager.stale_seconds - 1)
+        manager._write_job(stale)
+
+        lost = get_export_job(job["job_id"], current_user=admin)
+        assert lost["status"] == "failed" and lost["error"]
+        retried = _submit(session_factory, admin, report="group_pdf", group_id=seeded["group"])
+        assert retried["job_id"] != job["job_id"]
+        assert _wait(retried["job_id"], admin)["status"] == "completed"
+    finally:
+        manager.shutdown()
+
+
+def test_expired_jobs_are_purged_on_read(seeded, session_factory, tmp_path, monkeypatch):
+    manager = _manager(session_factory, tmp_path, monkeypatch, render_executor=ThreadPoolExecutor(1))
+    admin = seeded["admin"]
+    try:
+        job = _wait(_submit(session_factory, admin, report="group_pdf", group_id=seeded["group"])["job_id"], admin)
+        manager._write_job(dict(manager.get(job["job_id"]), expires_at=time.time() - 1))
+
+        manager._purged_at = 0.0
+        assert manager.get(job["job_id"]) is None
+        assert list((tmp_path / "exports").iterdir()) == []
+    finally:
+        manager.shutdown()
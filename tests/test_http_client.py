@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.services.http_client import CircuitOpenError, Integration, RateLimitExceeded
+
+
+class Provider:
+    """Scripted upstream: each call pops the next status (or exception)"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def __call__(self, request):
+        self.calls.append(request.method)
+        outcome = self.outcomes.pop(0) if self.outcomes else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={"ok": outcome == 200})
+
+
+def _integration(provider, **kwargs):
+    kwargs.setdefault("backoff_seconds", 0.001)
+    return Integration(
+        "test",
+        transport=httpx.MockTransport(provider),
+        async_transport=httpx.MockTransport(provider),
+        **kwargs,
+    )
+
+
+def test_retries_depend_on_what_is_safe_to_repeat():
+    provider = Provider(503, 503, 200)
+    integration = _integration(provider)
+    assert integration.get("https://provider.test/x").status_code == 200
+    assert len(provider.calls) == 3
+
+    # A POST that reached the provider is not sent twice...
+    provider = Provider(503)
+    integration = _integration(provider)
+    assert integration.post("https://provider.test/x").status_code == 503
+    assert len(provider.calls) == 1
+
+    # ...unless it never got there
+    provider = Provider(httpx.ConnectError("refused"), 200)
+    integration = _integration(provider)
+    assert integration.post("https://provider.test/x").status_code == 200
+    assert len(provider.calls) == 2
+    assert integration.metrics()["retries"] == 1
+
+
+def test_circuit_opens_after_consecutive_failures_and_probes_again():
+    provider = Provider(*[httpx.ReadTimeout("slow")] * 3)
+    integration = _integration(provider, retries=0, failure_threshold=3, reset_seconds=0.2)
+
+    for _ in range(3):
+        with pytest.raises(httpx.ReadTimeout):
+            integration.post("https://provider.test/x")
+    with pytest.raises(CircuitOpenError):
+        integration.post("https://provider.test/x")
+    assert len(provider.calls) == 3
+    assert integration.metrics()["circuit"] == "open"
+
+    time.sleep(0.25)
+    assert integration.post("https://provider.test/x").status_code == 200
+    assert integration.metrics()["circuit"] == "closed"
+    assert integration.metrics()["rejected"] == 1
+
+
+def test_min_interval_spaces_requests_and_rejects_long_waits():
+    provider = Provider()
+    integration = _integration(provider, min_interval=0.1, max_wait=0.15)
+
+    started = time.monotonic()
+    integration.get("https://provider.test/x")
+    integration.get("https://provider.test/x")
+    assert time.monotonic() - started >= 0.1
+
+    integration.min_interval = 1.0
+    integration.get("https://provider.test/x")
+    with pytest.raises(RateLimitExceeded):
+        integration.get("https://provider.test/x")
+
+
+def test_async_requests_share_the_pool():
+    provider = Provider(502, 200)
+    integration = _integration(provider)
+
+    async def scenario():
+        first = await integration.aget("https://provider.test/x")
+        second = await integration.apost("https://provider.test/y")
+        await integration.aclose()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert provider.calls == ["GET", "GET", "POST"]
+    metrics = integration.metrics()
+    assert metrics["requests"] == 3 and metrics["errors"] == 1
@@ -0,0 +1,153 @@
+from datetime import datetime
+
+import pytest
+
+from src.schemas.models import (
+    Assignment, AssignmentSubmission, Attendance, Event, EventGroup, Group, GroupStudent,
+    LeaderboardConfig, LeaderboardEntry, UserInDB,
+)
+from src.services import leaderboard_engine
+from src.services.leaderboard_engine import get_group_weeks, get_week_board, invalidate_group_leaderboards
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    invalidate_group_leaderboards()
+    yield
+    invalidate_group_leaderboards()
+
+
+@pytest.fixture
+def group_season(db_session):
+    """Two students, three lessons over two weeks (Mon 2026-01-05 and Mon 2026-01-12)."""
+    curator = UserInDB(email="curator@example.com", name="Curator", hashed_password="x", role="curator")
+    bob = UserInDB(email="bob@example.com", name="Bob", hashed_password="x", role="student")
+    alice = UserInDB(email="alice@example.com", name="Alice", hashed_password="x", role="student")
+    db_session.add_all([curator, bob, alice])
+    db_session.flush()
+    alice_id, bob_id = alice.id, bob.id
+    group = Group(name="Group", teacher_id=curator.id, curator_id=curator.id, is_active=True)
+    other = Group(name="Other", teacher_id=curator.id, is_active=True)
+    db_session.add_all([group, other])
+    db_session.flush()
+    group_id, other_id = group.id, other.id
+    db_session.add_all([GroupStudent(group_id=group_id, student_id=s) for s in (bob_id, alice_id)])
+
+    events = [
+        Event(title=f"Lesson {i}", event_type="class", start_datetime=start, end_datetime=start,
+              created_by=curator.id, is_active=True)
+        for i, start in enumerate([datetime(2026, 1, 6, 18), datetime(2026, 1, 8, 18), datetime(2026, 1, 13, 18)])
+    ]
+    db_session.add_all(events)
+    db_session.flush()
+    event_ids = [e.id for e in events]
+    db_session.add_all([EventGroup(event_id=e.id, group_id=group_id) for e in events])
+
+    def assignment(title, **kwargs):
+        return Assignment(title=title, assignment_type="text", content="{}", max_score=100, is_active=True, **kwargs)
+
+    # Linked to the second lesson; due in week 1 without a lesson (takes the free slot 1)
+    linked = assignment("Linked", event_id=events[1].id, due_date=datetime(2026, 1, 9))
+    due = assignment("Due", group_id=group_id, due_date=datetime(2026, 1, 7))
+    week2 = assignment("Week 2", group_id=group_id, due_date=datetime(2026, 1, 14))
+    db_session.add_all([linked, due, week2])
+    db_session.flush()
+
+    db_session.add_all([
+        AssignmentSubmission(assignment_id=linked.id, user_id=alice_id, answers="{}", max_score=100,
+                             score=90, is_graded=True),
+        AssignmentSubmission(assignment_id=due.id, user_id=alice_id, answers="{}", max_score=100,
+                             score=70, is_graded=True),
+        AssignmentSubmission(assignment_id=due.id, user_id=bob_id, answers="{}", max_score=100,
+                             score=50, is_graded=False),
+        AssignmentSubmission(assignment_id=week2.id, user_id=bob_id, answers="{}", max_score=100,
+                             score=80, is_graded=True),
+        Attendance(event_id=events[0].id, user_id=alice_id, status="present", score=1),
+        Attendance(event_id=events[1].id, user_id=alice_id, status="late", score=1),
+        Attendance(event_id=events[0].id, user_id=bob_id, status="absent", score=0),
+        Attendance(event_id=events[2].id, user_id=bob_id, status="present", score=1),
+        LeaderboardEntry(user_id=bob_id, group_id=group_id, week_number=1, curator_hour=2, extra_points=5),
+        LeaderboardConfig(group_id=group_id, week_number=2, study_buddy_enabled=False),
+    ])
+    db_session.commit()
+    return group_id, other_id, event_ids, alice_id, bob_id
+
+
+def test_season_built_in_one_pass(db_session, count_queries, group_season):
+    group_id, _, event_ids, alice_id, bob_id = group_season
+
+    with count_queries() as counter:
+        layout, boards = get_group_weeks(db_session, group_id)
+    # cache generations, students, events, assignments, submissions, attendance, entries, configs
+    assert counter.count == 8
+    assert layout.weeks_count == 2
+    assert sorted(boards) == [1, 2]
+
+    week1 = {row["student_name"]: row for row in boards[1].rows()}
+    assert list(week1) == ["Alice", "Bob"]
+    assert week1["Alice"]["hw_lesson_1"] == 70
+    assert week1["Alice"]["hw_lesson_2"] == 90
+    assert week1["Alice"]["lesson_1"] == 1 and week1["Alice"]["lesson_2"] == 1
+    assert week1["Bob"]["hw_lesson_1"] is None
+    assert week1["Bob"]["lesson_1"] == 0
+    assert week1["Bob"]["curator_hour"] == 2 and week1["Bob"]["extra_points"] == 5
+    assert boards[1].event_ids == event_ids[:2]
+    assert [lesson["homework"]["title"] for lesson in boards[1].lessons] == ["Due", "Linked"]
+    assert boards[1].config is None
+
+    week2 = {row["student_name"]: row for row in boards[2].rows()}
+    assert week2["Bob"]["hw_lesson_1"] == 80
+    assert week2["Bob"]["lesson_1"] == 1
+    assert week2["Alice"]["curator_hour"] == 0
+    assert boards[2].config["study_buddy_enabled"] is False
+    assert boards[2].week_start == datetime(2026, 1, 12)
+
+
+def test_weeks_cached_until_a_source_write_commits(db_session, count_queries, group_season):
+    group_id, other_id, event_ids, alice_id, bob_id = group_season
+    get_group_weeks(db_session, group_id)
+    get_week_board(db_session, other_id, 1)
+
+    with count_queries() as counter:
+        board = get_week_board(db_session, group_id, 1)
+        get_group_weeks(db_session, group_id)
+    assert counter.count == 0
+
+    # Attendance is mapped to the group through its event, in the database: the
+    # commit only bumps the group's generation, which every worker checks on read
+    db_session.query(Attendance).filter_by(event_id=event_ids[0], user_id=bob_id).one().status = "present"
+    db_session.commit()
+    assert leaderboard_engine._boards[(group_id, 1)][1] is board
+    rebuilt = get_week_board(db_session, group_id, 1)
+    assert rebuilt is not board
+    assert {r["student_name"]: r["lesson_1"] for r in rebuilt.rows()}["Bob"] == 1
+
+    # Grading a submission
+    submission = db_session.query(AssignmentSubmission).filter_by(user_id=bob_id, is_graded=False).one()
+    submission.is_graded = True
+    db_session.commit()
+    board = get_week_board(db_session, group_id, 1)
+    assert {r["student_name"]: r["hw_lesson_1"] for r in board.rows()}["Bob"] == 50
+
+    # Manual entries and config
+    db_session.add(LeaderboardEntry(user_id=alice_id, group_id=group_id, week_number=1, mock_exam=60))
+    db_session.commit()
+    board = get_week_board(db_session, group_id, 1)
+    assert {r["student_name"]: r["mock_exam"] for r in board.rows()}["Alice"] == 60
+
+    db_session.add(LeaderboardConfig(group_id=group_id, week_number=1, extra_points_enabled=False))
+    db_session.commit()
+    assert get_week_board(db_session, group_id, 1).config["extra_points_enabled"] is False
+
+    # Uncommitted or unrelated changes keep the cache
+    board = get_week_board(db_session, group_id, 1)
+    submission.feedback = "Nice"
+    db_session.commit()
+    db_session.add(LeaderboardEntry(user_id=alice_id, group_id=other_id, week_number=1, extra_points=1))
+    db_session.flush()
+    db_session.rollback()
+    with count_queries() as counter:
+        assert get_week_board(db_session, group_id, 1) is board
+        assert get_week_board(db_session, other_id, 1) is leaderboard_engine._boards[(other_id, 1)][1]
+    # Only the generation checks of the new transaction, one per group
+    assert counter.count == 2
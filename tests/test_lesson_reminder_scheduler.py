@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from conftest import QueryCounter
+from src.models import Base
+from src.schemas.models import (
+    Event, EventGroup, EventParticipant, Group, GroupStudent, NotificationOutbox, UserInDB,
+)
+from src.services import lesson_reminder_scheduler
+from src.services.lesson_reminder_scheduler import LessonReminderScheduler
+
+NOW = datetime(2026, 3, 2, 9, 0)
+
+
+class FakePushSender:
+    def __init__(self):
+        self.batches = []
+
+    def send(self, messages):
+        self.batches.append([m["to"] for m in messages])
+        return {"success": len(messages), "failed": 0, "invalid_tokens": 0}
+
+
+@pytest.fixture
+def outbox(db_engine, monkeypatch):
+    emails = []
+    email_ok = {"value": True}
+
+    def send_email(**kwargs):
+        emails.append((kwargs["to_email"], kwargs["group_name"], kwargs["role"]))
+        return {"id": "email"} if email_ok["value"] else None
+
+    push = FakePushSender()
+    monkeypatch.setattr(lesson_reminder_scheduler, "send_lesson_reminder_notification", send_email)
+    monkeypatch.setattr(lesson_reminder_scheduler, "get_push_sender", lambda: push)
+    factory = sessionmaker(bind=db_engine, autoflush=False)
+    return {"emails": emails, "email_ok": email_ok, "push": push, "factory": factory}
+
+
+def _seed(db, students_per_group=3):
+    teacher = UserInDB(email="teacher@example.com", name="Teacher", hashed_password="x", role="teacher",
+                       push_token="ExponentPushToken[teacher]")
+    db.add(teacher)
+    db.flush()
+    groups = [Group(name=f"Group {i}", teacher_id=teacher.id, is_active=True) for i in range(2)]
+    db.add_all(groups)
+    db.flush()
+    for index, group in enumerate(groups):
+        for i in range(students_per_group):
+            student = UserInDB(email=f"g{index}s{i}@example.com", name=f"S{i}", hashed_password="x", role="student",
+                               push_token=f"ExponentPushToken[g{index}s{i}]" if i == 0 else None)
+            db.add(student)
+            db.flush()
+            db.add(GroupStudent(group_id=group.id, student_id=student.id))
+
+    def event(title, start):
+        item = Event(title=title, event_type="class", start_datetime=start, end_datetime=start + timedelta(hours=1),
+                     created_by=teacher.id, is_active=True)
+        db.add(item)
+        db.flush()
+        db.add_all(EventGroup(event_id=item.id, group_id=group.id) for group in groups)
+        return item
+
+    upcoming = event("Upcoming", NOW + timedelta(minutes=30))
+    ended = event("Ended", NOW - timedelta(minutes=77))
+    attended = event("Attended", NOW - timedelta(minutes=77))
+    db.add(EventParticipant(event_id=attended.id, user_id=teacher.id))
+    db.commit()
+    return {"upcoming": upcoming.id, "ended": ended.id, "attended": attended.id}
+
+
+def test_each_notification_goes_out_once(db_session, outbox):
+    events = _seed(db_session)
+    # Two workers that both run the scheduler (no advisory locks on SQLite)
+    first = LessonReminderScheduler(session_factory=outbox["factory"])
+    second = LessonReminderScheduler(session_factory=outbox["factory"])
+
+    assert first.tick(NOW) == {"sent": 2, "skipped": 1}
+    assert second.tick(NOW) == {}
+    assert first.tick(NOW + timedelta(minutes=1)) == {}
+
+    assert sorted(outbox["emails"]) == sorted(
+        [(f"g{g}s{i}@example.com", f"Group {g}", "student") for g in range(2) for i in range(3)]
+        + [("teacher@example.com", "Group 0", "teacher")]
+    )
+    assert sorted(map(sorted, outbox["push"].batches)) == [
+        ["ExponentPushToken[g0s0]", "ExponentPushToken[g1s0]", "ExponentPushToken[teacher]"],
+        ["ExponentPushToken[teacher]"],
+    ]
+    rows = {(row.event_id, row.kind): row for row in db_session.query(NotificationOutbox)}
+    assert rows[(events["upcoming"], "lesson_reminder")].sent_count == 10
+    assert rows[(events["ended"], "missing_attendance")].status == "sent"
+    assert rows[(events["attended"], "missing_attendance")].status == "skipped"
+
+
+def test_recipients_are_resolved_per_window_not_per_person(outbox):
+    def queries_for(students_per_group):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine, autoflush=False)
+        db = factory()
+        _seed(db, students_per_group=students_per_group)
+        db.close()
+        with QueryCounter(engine) as counter:
+            LessonReminderScheduler(session_factory=factory).tick(NOW)
+        engine.dispose()
+        return counter.count
+
+    assert queries_for(1) == queries_for(40)
+    assert len(outbox["emails"]) == 3 + 81
+
+
+def test_failed_reminders_are_retried_then_given_up(db_session, outbox, monkeypatch):
+    monkeypatch.setattr(lesson_reminder_scheduler, "NOTIFICATION_MAX_ATTEMPTS", 2)
+    events = _seed(db_session, students_per_group=1)
+    db_session.query(UserInDB).update({UserInDB.push_token: None})
+    db_session.commit()
+    outbox["email_ok"]["value"] = False
+    scheduler = LessonReminderScheduler(session_factory=outbox["factory"])
+
+    assert scheduler.tick(NOW)["pending"] == 1
+    assert scheduler.tick(NOW + timedelta(seconds=30)) == {}  # not due yet
+    assert scheduler.tick(NOW + timedelta(seconds=61))["failed"] == 1
+    assert len(outbox["emails"]) == 6
+
+    row = db_session.query(NotificationOutbox).filter(NotificationOutbox.event_id == events["upcoming"]).one()
+    assert (row.status, row.attempts, row.failed_count) == ("failed", 2, 6)
@@ -0,0 +1,338 @@
+import io
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from conftest import QueryCounter
+from src.admin.routes.media import router as media_router
+from src.config import get_db
+from src.models import Base
+from src.routes.auth import get_current_user_dependency
+from src.schemas.models import (
+    Assignment, AssignmentSubmission, Course, FileReference, Group, GroupStudent, Lesson, Module, Step, StoredBlob,
+    UserInDB, UserStorageUsage,
+)
+from src.services import blob_store, media_storage
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    teacher = UserInDB(email="t@example.com", name="Teacher", hashed_password="x", role="teacher")
+    student = UserInDB(email="s@example.com", name="Student", hashed_password="x", role="student")
+    other = UserInDB(email="o@example.com", name="Other", hashed_password="x", role="student")
+    admin = UserInDB(email="a@example.com", name="Admin", hashed_password="x", role="admin")
+    db.add_all([teacher, student, other, admin])
+    db.flush()
+    group = Group(name="A1", teacher_id=teacher.id)
+    db.add(group)
+    db.flush()
+    db.add_all([GroupStudent(group_id=group.id, student_id=s.id) for s in (student, other)])
+    assignment = Assignment(group_id=group.id, title="Essay", assignment_type="file_upload", content="{}",
+                            max_file_size_mb=1)
+    db.add(assignment)
+    db.commit()
+    users = {u.role if u is not other else "other": (u.id, u.email, u.name, u.role) for u in (teacher, student, other, admin)}
+    ids = {"assignment": assignment.id, "student": student.id}
+    db.close()
+
+    current = {"role": "student"}
+
+    def override_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def override_user():
+        user_id, email, name, role = users[current["role"]]
+        return UserInDB(id=user_id, email=email, name=name, role=role, is_active=True)
+
+    app = FastAPI()
+    app.include_router(media_router, prefix="/media")
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user_dependency] = override_user
+    yield {"client": TestClient(app), "engine": engine, "Session": Session, "current": current, **ids}
+    engine.dispose()
+
+
+def test_identical_uploads_share_one_blob(media, monkeypatch):
+    client, payload = media["client"], os.urandom(3 * 1024 * 1024 + 17)
+    urls = []
+    for name in ("a.pdf", "b.pdf"):
+        response = client.post("/media/upload", data={"file_type": "submission"},
+                               files={"file": (name, io.BytesIO(payload), "application/pdf")})
+        assert response.status_code == 200
+        assert response.json()["file_size"] == len(payload)
+        urls.append(response.json()["file_url"])
+
+    first, second = (os.stat(f".{url}") for url in urls)
+    assert first.st_ino == second.st_ino and first.st_nlink == 3
+    blobs = [name for _, _, names in os.walk(media_storage.MEDIA_BLOB_DIR) for name in names]
+    assert len(blobs) == 1
+
+    monkeypatch.setattr(media_storage, "MEDIA_MAX_UPLOAD_BYTES", 1024 * 1024)
+    response = client.post("/media/upload", data={"file_type": "submission"},
+                           files={"file": ("c.pdf", io.BytesIO(payload), "application/pdf")})
+    assert response.status_code == 413
+    assert not os.listdir(os.path.join(media_storage.MEDIA_BLOB_DIR, "tmp"))
+
+
+def test_submission_download_supports_ranges_and_revalidation(media):
+    client, current = media["client"], media["current"]
+    payload = bytes(range(256)) * 1024
+    response = client.post("/media/submissions/upload", data={"assignment_id": media["assignment"]},
+                           files={"file": ("essay.pdf", io.BytesIO(payload), "application/pdf")})
+    assert response.status_code == 200
+    file_url = response.json()["file_url"]
+    too_big = client.post("/media/submissions/upload", data={"assignment_id": media["assignment"]},
+                          files={"file": ("big.pdf", io.BytesIO(payload * 5), "application/pdf")})
+    assert too_big.status_code == 400
+
+    db = media["Session"]()
+    db.add(AssignmentSubmission(assignment_id=media["assignment"], user_id=media["student"], answers="{}",
+                                file_url=file_url, max_score=100))
+    db.commit()
+    db.close()
+    url = file_url.replace("/uploads/", "/media/files/")
+
+    with QueryCounter(media["engine"]) as counter:
+        full = client.get(url)
+    assert full.status_code == 200 and full.content == payload
+    assert counter.count == 1
+    etag = full.headers["etag"]
+
+    part = client.get(url, headers={"Range": "bytes=1000-1999"})
+    assert part.status_code == 206
+    assert part.content == payload[1000:2000]
+    assert part.headers["content-range"] == f"bytes 1000-1999/{len(payload)}"
+    assert client.get(url, headers={"Range": "bytes=10-19", "If-Range": etag}).status_code == 206
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+
+    current["role"] = "teacher"
+    assert client.get(url).status_code == 200
+    current["role"] = "other"
+    assert client.get(url).status_code == 403
+    with open("secret.txt", "w") as secret:
+        secret.write("outside uploads")
+    assert client.get("/media/files/submissions/..%2F..%2Fsecret.txt").status_code == 404
+
+
+def test_uploads_are_reference_counted_with_quota_and_report(media, monkeypatch):
+    client, current, Session = media["client"], media["current"], media["Session"]
+    payload = b"%PDF essay " * 5000
+
+    def submit(name, data=payload):
+        return client.post("/media/submissions/upload", data={"assignment_id": media["assignment"]},
+                           files={"file": (name, io.BytesIO(data), "application/pdf")})
+
+    # Resubmitting the same file name replaces its reference; another name shares the blob,
+    # and the student is charged for it once
+    for name in ("essay.pdf", "essay.pdf", "copy.pdf"):
+        assert submit(name).status_code == 200
+    db = Session()
+    assert db.query(FileReference).count() == 2
+    assert [b.ref_count for b in db.query(StoredBlob)] == [2]
+    assert db.get(UserStorageUsage, media["student"]).bytes_used == len(payload)
+    db.close()
+
+    monkeypatch.setattr(blob_store, "MEDIA_STUDENT_QUOTA_BYTES", 3 * len(payload))
+    assert submit("essay.pdf", b"x" * len(payload)).status_code == 200
+    refused = submit("third.pdf", b"y" * (len(payload) + 1))
+    assert refused.status_code == 413
+    assert not os.path.exists(f"uploads/submissions/submission_{media['assignment']}_{media['student']}_third.pdf")
+    assert client.get("/media/storage/report").json() == {
+        "bytes_used": 2 * len(payload), "quota_bytes": 3 * len(payload), "remaining_bytes": len(payload),
+    }
+
+    current["role"] = "admin"
+    with QueryCounter(media["engine"]) as counter:
+        storage = client.get("/media/storage/report").json()["storage"]
+    assert counter.count == 3
+    assert (storage["logical_bytes"], storage["physical_bytes"], storage["saved_bytes"]) == (
+        2 * len(payload), 2 * len(payload), 0)
+    assert (storage["reference_count"], storage["blob_count"]) == (2, 2)
+    assert [(u["user_id"], u["file_count"]) for u in storage["top_uploaders"]] == [(media["student"], 2)]
+
+
+def test_unreferenced_blobs_are_collected_and_old_urls_resolve(media):
+    client, Session = media["client"], media["Session"]
+    payload = b"shared handout " * 1000
+    urls = []
+    for name in ("a.pdf", "b.pdf"):
+        response = client.post("/media/submissions/upload", data={"assignment_id": media["assignment"]},
+                               files={"file": (name, io.BytesIO(payload), "application/pdf")})
+        urls.append(response.json()["file_url"])
+    db = Session()
+    db.add(AssignmentSubmission(assignment_id=media["assignment"], user_id=media["student"], answers="{}",
+                                file_url=urls[0], max_score=100))
+    db.commit()
+    digest = db.query(StoredBlob.sha256).scalar()
+    # A stray blob with no row (an upload that never committed)
+    stray = media_storage.blob_path("0" * 64)
+    stray.parent.mkdir(parents=True, exist_ok=True)
+    stray.write_bytes(b"orphan")
+
+    # The public file is gone, but its reference still maps the URL to the blob
+    os.unlink(f".{urls[0]}")
+    assert client.get(urls[0].replace("/uploads/", "/media/files/")).content == payload
+
+    collector = blob_store.BlobCollector(grace_seconds=-1, session_factory=Session)
+    blob_store.detach(db, urls[0])
+    db.commit()
+    assert collector.collect() == 1 and not stray.exists()
+    assert media_storage.blob_path(digest).exists()
+
+    os.unlink(f".{urls[1]}")
+    blob_store.detach(db, urls[1])
+    db.commit()
+    assert collector.collect() == 1
+    assert not media_storage.blob_path(digest).exists() and db.query(StoredBlob).count() == 0
+    db.close()
+
+
+def test_resubmitting_the_same_file_is_charged_once(media):
+    client, Session = media["client"], media["Session"]
+    payload = b"%PDF final essay " * 4000
+
+    def upload(name, data=payload):
+        response = client.post("/media/submissions/upload", data={"assignment_id": media["assignment"]},
+                               files={"file": (name, io.BytesIO(data), "application/pdf")})
+        assert response.status_code == 200
+        return response.json()["file_url"]
+
+    # Every resubmission lands on a new path; all of them point at one blob
+    urls = [upload(f"essay_v{i}.pdf") for i in range(5)]
+    db = Session()
+    usage = db.get(UserStorageUsage, media["student"])
+    assert (usage.bytes_used, usage.file_count) == (len(payload), 5)
+
+    submission = AssignmentSubmission(assignment_id=media["assignment"], user_id=media["student"], answers="{}",
+                                      file_url=urls[0], max_score=100)
+    db.add(submission)
+    db.commit()
+    for url in urls[1:]:
+        submission.file_url = url
+        db.commit()
+    # The submission owns the file it points at; each one it replaced was dropped
+    assert db.query(FileReference.path, FileReference.owner_id).all() == [(urls[-1][len("/uploads/"):], submission.id)]
+    db.expire_all()
+    usage = db.get(UserStorageUsage, media["student"])
+    assert (usage.bytes_used, usage.file_count) == (len(payload), 1)
+
+    # An upload nothing submitted is released by the collector, file and all
+    draft = upload("draft.pdf", b"unsent draft " * 1000)
+    db.expire_all()
+    assert db.get(UserStorageUsage, media["student"]).bytes_used > len(payload)
+    blob_store.BlobCollector(grace_seconds=-1, pending_ttl=-1, session_factory=Session).collect()
+    assert not os.path.exists(f".{draft}")
+    db.expire_all()
+    assert db.get(UserStorageUsage, media["student"]).bytes_used == len(payload)
+    assert [b.ref_count for b in db.query(StoredBlob)] == [1]
+
+    db.delete(submission)
+    db.commit()
+    db.expire_all()
+    usage = db.get(UserStorageUsage, media["student"])
+    assert (usage.bytes_used, usage.file_count) == (0, 0)
+    assert db.query(FileReference).count() == 0
+    db.close()
+
+
+def test_replaced_and_deleted_uploads_drop_their_references(media):
+    client, current, Session = media["client"], media["current"], media["Session"]
+    db = Session()
+    teacher_id = db.query(UserInDB.id).filter(UserInDB.role == "teacher").scalar()
+    course = Course(title="IELTS", teacher_id=teacher_id)
+    db.add(course)
+    db.flush()
+    module = Module(course_id=course.id, title="Reading")
+    db.add(module)
+    db.flush()
+    lesson = Lesson(module_id=module.id, title="Skimming")
+    db.add(lesson)
+    db.flush()
+    step = Step(lesson_id=lesson.id, title="Handout")
+    assignment = Assignment(lesson_id=lesson.id, title="Homework", assignment_type="file_upload", content="{}")
+    db.add_all([step, assignment])
+    db.commit()
+    ids = {"course": course.id, "step": step.id, "assignment": assignment.id}
+    db.close()
+
+    current["role"] = "teacher"
+
+    def upload(path, name, data, content_type="application/pdf", **form):
+        response = client.post(path, data=form, files={"file": (name, io.BytesIO(data), content_type)})
+        assert response.status_code == 200
+        return response
+
+    def references():
+        with Session() as session:
+            return sorted(session.query(FileReference.owner_type, FileReference.path))
+
+    upload(f"/media/courses/{ids['course']}/thumbnail", "cover.png", b"png cover", "image/png")
+    upload(f"/media/courses/{ids['course']}/thumbnail", "cover.jpg", b"jpg cover", "image/jpeg")
+    upload("/media/assignments/upload", "task.pdf", b"task v1", assignment_id=ids["assignment"])
+    upload("/media/assignments/upload", "task_v2.pdf", b"task v2", assignment_id=ids["assignment"])
+    upload(f"/media/steps/{ids['step']}/attachments", "notes.pdf", b"notes")
+    # The replaced thumbnail (another extension) and assignment file are gone
+    assert [owner for owner, _ in references()] == ["assignment", "course_thumbnail", "step"]
+
+    response = client.put(f"/media/courses/{ids['course']}/thumbnail-url", json={"url": "https://cdn.example.com/c.png"})
+    assert response.status_code == 200
+    assert [owner for owner, _ in references()] == ["assignment", "step"]
+
+    # Deleting the course cascades to its step and assignment, and their uploads
+    with Session() as session:
+        session.delete(session.get(Course, ids["course"]))
+        session.commit()
+    assert references() == []
+    with Session() as session:
+        usage = session.get(UserStorageUsage, teacher_id)
+        assert (usage.bytes_used, usage.file_count) == (0, 0)
+        assert {b.ref_count for b in session.query(StoredBlob)} == {0}
+
+
+def test_reuploading_a_submitted_file_name_keeps_it_owned(media):
+    client, Session = media["client"], media["Session"]
+
+    def upload(data):
+        response = client.post("/media/submissions/upload", data={"assignment_id": media["assignment"]},
+                               files={"file": ("essay.pdf", io.BytesIO(data), "application/pdf")})
+        assert response.status_code == 200
+        return response.json()["file_url"]
+
+    url = upload(b"first draft " * 100)
+    db = Session()
+    submission = AssignmentSubmission(assignment_id=media["assignment"], user_id=media["student"], answers="{}",
+                                      file_url=url, max_score=100, is_graded=True, score=90)
+    db.add(submission)
+    db.commit()
+    # Same name again: same path, the submission's URL does not change
+    assert upload(b"second draft " * 100) == url
+    assert db.query(FileReference.owner_id).scalar() == submission.id
+
+    collector = blob_store.BlobCollector(grace_seconds=-1, pending_ttl=-1, session_factory=Session)
+    collector.collect()
+    assert os.path.exists(f".{url}")
+
+    # A reference left unowned while a submission still points at it is claimed, not released
+    db.query(FileReference).update({FileReference.owner_id: None})
+    db.commit()
+    collector.collect()
+    assert os.path.exists(f".{url}")
+    assert db.query(FileReference.owner_id).scalar() == submission.id
+    db.close()
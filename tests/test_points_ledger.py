@@ -0,0 +1,76 @@
+from datetime import date, datetime, timedelta, timezone
+
+from conftest import QueryCounter
+from src.gamification.routes.gamification import (
+    TeacherBonusRequest, award_points, get_bonus_allowance, get_gamification_status, get_leaderboard,
+    give_teacher_bonus,
+)
+from src.schemas.models import Group, GroupStudent, PointHistory, PointTotal, UserInDB
+from src.services import points_ledger
+
+
+def make_users(db, count):
+    teacher = UserInDB(email="t@example.com", name="Teacher", hashed_password="x", role="teacher")
+    students = [UserInDB(email=f"s{i}@example.com", name=f"S{i}", hashed_password="x", role="student")
+                for i in range(count)]
+    db.add_all([teacher, *students])
+    db.flush()
+    group = Group(name="G", teacher_id=teacher.id)
+    db.add(group)
+    db.flush()
+    db.add_all(GroupStudent(group_id=group.id, student_id=s.id) for s in students[:2])
+    db.commit()
+    return teacher, group, students
+
+
+def test_period_bounds():
+    moment = datetime(2026, 12, 31, 23, 0, tzinfo=timezone.utc)
+    assert points_ledger.period_bounds("month", moment) == (date(2026, 12, 1), date(2026, 12, 31))
+    assert points_ledger.period_bounds("week", moment) == (date(2026, 12, 28), date(2027, 1, 3))
+
+
+def test_awards_keep_period_totals_and_ranks(db_engine, db_session):
+    teacher, group, students = make_users(db_session, 4)
+    for student, amount in zip(students, (30, 10, 50, 20)):
+        award_points(db_session, student.id, amount, "homework")
+        award_points(db_session, student.id, 5, "homework")
+    # A previous month's points stay out of this month's totals
+    points_ledger.record_points(db_session, students[1].id, 500, datetime.now(timezone.utc) - timedelta(days=40))
+    db_session.commit()
+
+    totals = {(t.user_id, t.period): t.points for t in db_session.query(PointTotal).filter(PointTotal.points < 100)}
+    assert totals[(students[0].id, "week")] == totals[(students[0].id, "month")] == 35
+    assert db_session.query(PointHistory).count() == 8
+
+    with QueryCounter(db_engine) as counter:
+        status = get_gamification_status(current_user=students[0], db=db_session)
+    assert (status.monthly_points, status.rank_this_month) == (35, 2)
+    assert counter.count == 2
+
+    board = get_leaderboard(period="monthly", group_id=None, limit=2, current_user=students[3], db=db_session)
+    assert [(e.user_id, e.points, e.rank) for e in board.entries] == [(students[2].id, 55, 1), (students[0].id, 35, 2)]
+    assert (board.my_points, board.my_rank) == (25, 3)
+
+    board = get_leaderboard(period="weekly", group_id=group.id, limit=10, current_user=students[1], db=db_session)
+    assert [e.user_id for e in board.entries] == [students[0].id, students[1].id]
+    assert (board.my_points, board.my_rank) == (15, 2)
+
+    board = get_leaderboard(period="all_time", group_id=None, limit=10, current_user=students[1], db=db_session)
+    assert [e.points for e in board.entries] == [55, 35, 25, 15]
+    assert board.my_rank == 4
+
+
+def test_teacher_bonus_is_counted_by_giver(db_session):
+    teacher, group, students = make_users(db_session, 2)
+    other = UserInDB(email="t2@example.com", name="Other", hashed_password="x", role="teacher")
+    db_session.add(other)
+    db_session.commit()
+
+    give_teacher_bonus(TeacherBonusRequest(student_id=students[0].id, amount=20, reason=f"notes like teacher:{other.id}'s"),
+                       current_user=teacher, db=db_session)
+    give_teacher_bonus(TeacherBonusRequest(student_id=students[1].id, amount=15), current_user=other, db=db_session)
+
+    assert get_bonus_allowance(group_id=None, current_user=teacher, db=db_session)["given"] == 20
+    assert get_bonus_allowance(group_id=group.id, current_user=other, db=db_session)["given"] == 15
+    assert {h.awarded_by for h in db_session.query(PointHistory)} == {teacher.id, other.id}
+    assert points_ledger.user_points(db_session, students[0].id, "week") == 20
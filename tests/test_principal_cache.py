@@ -0,0 +1,48 @@
+from sqlalchemy.orm import sessionmaker
+
+from src.schemas.models import UserInDB
+from src.services import principal_cache
+
+
+def test_deactivation_in_another_worker_is_seen_on_the_next_hit(db_engine, count_queries):
+    Session = sessionmaker(bind=db_engine, autoflush=False)
+    db = Session()
+    user = UserInDB(email="t@example.com", name="Teacher", hashed_password="x", role="teacher")
+    other = UserInDB(email="o@example.com", name="Other", hashed_password="x", role="teacher")
+    db.add_all([user, other])
+    db.commit()
+    user_id, other_id = user.id, other.id
+    principal_cache.clear_principal_cache()
+    payload = {"sub": "T@example.com", "user_id": user_id}
+    assert principal_cache.get_principal(payload, db).role == "teacher"
+    db.close()
+
+    # A hit only reads the user's cache generations
+    db = Session()
+    with count_queries() as counter:
+        assert principal_cache.get_principal(payload, db).is_active
+    assert counter.count == 1
+    db.close()
+
+    # Changes to someone else keep the entry
+    writer = Session()
+    writer.get(UserInDB, other_id).role = "admin"
+    writer.commit()
+    db = Session()
+    with count_queries() as counter:
+        principal_cache.get_principal(payload, db)
+    assert counter.count == 1
+    db.close()
+
+    # Changed through another session, as another worker would; nothing here clears the local cache
+    demoted = writer.get(UserInDB, user_id)
+    demoted.role, demoted.is_active = "student", False
+    writer.commit()
+    writer.close()
+    assert ("id", user_id) in principal_cache._cache
+
+    db = Session()
+    principal = principal_cache.get_principal(payload, db)
+    assert (principal.role, principal.is_active) == ("student", False)
+    assert ("id", user_id) not in principal_cache._cache
+    db.close()
@@ -0,0 +1,166 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models import Base
+from src.schemas.models import UserInDB
+from src.services import http_client
+from src.services.push_delivery import PushSender
+
+
+class StubExpoServer:
+    """Local stand-in for the Expo push API"""
+
+    def __init__(self):
+        self.sends = []  # message count per /send request
+        self.receipt_requests = []
+        self.unregistered_on_send = set()  # tokens rejected in the ticket
+        self.unregistered_on_receipt = set()  # tokens rejected in the receipt
+        self.tickets = {}  # ticket id -> token
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path.endswith("/send"):
+                    payload = {"data": [stub._ticket(message["to"]) for message in body]}
+                    with stub._lock:
+                        stub.sends.append(len(body))
+                else:
+                    stub.receipt_requests.append(len(body["ids"]))
+                    payload = {"data": {ticket_id: stub._receipt(ticket_id) for ticket_id in body["ids"]}}
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/--/api/v2/push"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _ticket(self, token):
+        if token in self.unregistered_on_send:
+            return {"status": "error", "message": "not registered", "details": {"error": "DeviceNotRegistered"}}
+        with self._lock:
+            ticket_id = f"ticket-{len(self.tickets)}"
+            self.tickets[ticket_id] = token
+        return {"status": "ok", "id": ticket_id}
+
+    def _receipt(self, ticket_id):
+        if self.tickets[ticket_id] in self.unregistered_on_receipt:
+            return {"status": "error", "message": "gone", "details": {"error": "DeviceNotRegistered"}}
+        return {"status": "ok"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_integrations(monkeypatch):
+    # Failures here must not trip the process-wide Expo circuit breaker
+    monkeypatch.setattr(http_client, "_integrations", {})
+
+
+@pytest.fixture
+def expo():
+    server = StubExpoServer()
+    server.thread.start()
+    yield server
+    server.server.shutdown()
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'push.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+def _token(i):
+    return f"ExponentPushToken[device-{i}]"
+
+
+def test_cohort_reminder_is_batched_and_dead_tokens_are_cleared(expo, session_factory):
+    db = session_factory()
+    db.add_all(
+        UserInDB(email=f"s{i}@example.com", name=f"S{i}", hashed_password="x", role="student",
+                 push_token=_token(i), device_type="expo")
+        for i in range(2000)
+    )
+    db.commit()
+    db.close()
+    expo.unregistered_on_send = {_token(7)}
+    expo.unregistered_on_receipt = {_token(1500), _token(1999)}
+
+    sender = PushSender(
+        session_factory=session_factory,
+        push_url=f"{expo.url}/send",
+        receipts_url=f"{expo.url}/getReceipts",
+    )
+    for i in range(2000):
+        assert sender.enqueue(_token(i), "Lesson starts in 30 minutes", "Math", data={"eventId": 1})
+    assert not sender.enqueue("not-a-token", "x", "y")
+
+    stats = sender.flush()
+    assert stats == {"success": 1999, "failed": 1, "invalid_tokens": 1}
+    assert expo.sends == [100] * 20
+    assert sender.flush() == {"success": 0, "failed": 0, "invalid_tokens": 0}
+
+    # Receipts are not due yet
+    assert sender.process_receipts()["checked"] == 0
+    receipts = sender.process_receipts(force=True)
+    assert receipts == {"checked": 1999, "errors": 2, "invalid_tokens": 2}
+    assert expo.receipt_requests == [1000, 999]
+
+    db = session_factory()
+    try:
+        cleared = {u.email for u in db.query(UserInDB).filter(UserInDB.push_token.is_(None))}
+        assert cleared == {"s7@example.com", "s1500@example.com", "s1999@example.com"}
+    finally:
+        db.close()
+
+
+def test_failed_batches_count_as_failed(session_factory):
+    sender = PushSender(session_factory=session_factory, push_url="http://127.0.0.1:9/send")
+    stats = sender.send([{"to": _token(1), "title": "t", "body": "b"}, {"to": "bad", "title": "t", "body": "b"}])
+    assert stats == {"success": 0, "failed": 2, "invalid_tokens": 0}
+
+
+def test_receipts_are_polled_by_the_sending_worker(expo, session_factory):
+    db = session_factory()
+    db.add(UserInDB(email="s1@example.com", name="S1", hashed_password="x", role="student",
+                    push_token=_token(1), device_type="expo"))
+    db.commit()
+    db.close()
+    expo.unregistered_on_receipt = {_token(1)}
+
+    # Sent from a request handler: nothing but the sender itself checks the receipt
+    sender = PushSender(
+        session_factory=session_factory,
+        push_url=f"{expo.url}/send",
+        receipts_url=f"{expo.url}/getReceipts",
+        receipt_delay_seconds=0,
+        receipt_poll_seconds=0.05,
+    )
+    assert sender.send([{"to": _token(1), "title": "New message", "body": "Hi"}])["success"] == 1
+
+    poller = sender._poller
+    assert poller is not None
+    poller.join(timeout=5)
+    assert not poller.is_alive()
+    assert expo.receipt_requests == [1]
+    assert sender._poller is None
+
+    db = session_factory()
+    try:
+        assert db.query(UserInDB).filter(UserInDB.push_token.is_(None)).count() == 1
+    finally:
+        db.close()
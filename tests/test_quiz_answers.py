@@ -0,0 +1,118 @@
+import json
+
+from conftest import QueryCounter
+from src.admin.routes.analytics import get_quiz_question_errors
+from src.progress.routes.progress import create_quiz_attempt, update_quiz_attempt
+from src.schemas.models import (
+    Course, Group, GroupStudent, Lesson, Module, QuizAttempt, QuizAttemptAnswer, Step, UserInDB,
+)
+from src.progress.schemas import QuizAttemptCreateSchema, QuizAttemptUpdateSchema
+
+
+def make_course(db):
+    teacher = UserInDB(email="t@example.com", name="Teacher", hashed_password="x", role="teacher")
+    db.add(teacher)
+    db.flush()
+    course = Course(title="Geography", teacher_id=teacher.id)
+    db.add(course)
+    db.flush()
+    module = Module(course_id=course.id, title="Europe", order_index=1)
+    db.add(module)
+    db.flush()
+    lesson = Lesson(module_id=module.id, title="Capitals", order_index=1)
+    db.add(lesson)
+    db.flush()
+    step = Step(lesson_id=lesson.id, title="Quiz", content_type="quiz", order_index=1, content_text=json.dumps({
+        "questions": [
+            {"id": "fr", "question_type": "short_answer", "question_text": "Capital of France", "correct_answer": "Paris"},
+            {"id": "it", "question_type": "short_answer", "question_text": "Capital of Italy", "correct_answer": "Rome"},
+            {"id": "essay", "question_type": "long_text", "question_text": "Why?"},
+        ],
+    }))
+    db.add(step)
+    db.commit()
+    return teacher, course, lesson, step
+
+
+def add_students(db, teacher, count, start=0):
+    group = Group(name=f"G{start}", teacher_id=teacher.id)
+    db.add(group)
+    db.flush()
+    students = [UserInDB(email=f"s{start + i}@example.com", name=f"S{start + i}", hashed_password="x", role="student")
+                for i in range(count)]
+    db.add_all(students)
+    db.flush()
+    db.add_all(GroupStudent(group_id=group.id, student_id=s.id) for s in students)
+    db.commit()
+    return group, students
+
+
+def submit(db, student, course, lesson, step, answers, draft_first=True):
+    data = dict(step_id=step.id, course_id=course.id, lesson_id=lesson.id, total_questions=3,
+                answers=json.dumps(answers))
+    if draft_first:
+        draft = create_quiz_attempt(QuizAttemptCreateSchema(**data, is_draft=True), current_user=student, db=db)
+        return update_quiz_attempt(draft.id, QuizAttemptUpdateSchema(answers=json.dumps(answers), is_draft=False),
+                                   current_user=student, db=db)
+    return create_quiz_attempt(QuizAttemptCreateSchema(**data), current_user=student, db=db)
+
+
+def test_finished_attempts_get_scored_answer_rows(db_session):
+    teacher, course, lesson, step = make_course(db_session)
+    _, (student,) = add_students(db_session, teacher, 1)
+
+    draft = create_quiz_attempt(QuizAttemptCreateSchema(step_id=step.id, course_id=course.id, lesson_id=lesson.id,
+                                                        total_questions=3, answers='{"fr": "Lyon"}', is_draft=True),
+                                current_user=student, db=db_session)
+    assert db_session.query(QuizAttemptAnswer).count() == 0
+
+    update_quiz_attempt(draft.id, QuizAttemptUpdateSchema(answers='[["fr", " paris "], ["it", "Milan"], ["essay", "..."]]',
+                                                          is_draft=False), current_user=student, db=db_session)
+    rows = {r.question_id: (r.is_correct, r.error_score, r.user_answer)
+            for r in db_session.query(QuizAttemptAnswer).filter_by(attempt_id=draft.id)}
+    assert rows == {"fr": (True, 0.0, '" paris "'), "it": (False, 1.0, '"Milan"'), "essay": (None, None, '"..."')}
+
+    # Re-submitting the answers replaces the rows
+    update_quiz_attempt(draft.id, QuizAttemptUpdateSchema(answers='{"it": "rome"}'), current_user=student, db=db_session)
+    assert [(r.question_id, r.is_correct) for r in db_session.query(QuizAttemptAnswer)] == [("it", True)]
+
+
+def test_question_errors_are_one_group_by(db_engine, db_session):
+    teacher, course, lesson, step = make_course(db_session)
+    group, students = add_students(db_session, teacher, 4)
+    _, others = add_students(db_session, teacher, 2, start=100)
+    for i, student in enumerate(students):
+        submit(db_session, student, course, lesson, step, {"fr": "Paris", "it": "Rome" if i < 3 else "Milan"},
+               draft_first=bool(i % 2))
+    for student in others:
+        submit(db_session, student, course, lesson, step, {"fr": "Nice", "it": "Turin"})
+
+    def errors(**filters):
+        with QueryCounter(db_engine) as counter:
+            result = get_quiz_question_errors(course.id, lesson_id=None, limit=500, current_user=teacher,
+                                              db=db_session, **filters)
+        return counter.count, result
+
+    queries, result = errors(group_id=group.id)
+    assert result["total_attempts_analyzed"] == 4
+    assert [(q["question_id"], q["total_attempts"], q["error_rate"], q["question_text"]) for q in result["questions"]] == [
+        ("it", 4, 25.0, "Capital of Italy"),
+    ]
+
+    _, result = errors(group_id=None)
+    assert result["total_attempts_analyzed"] == 6
+    assert [(q["question_id"], q["wrong_answers"]) for q in result["questions"]] == [("it", 3.0), ("fr", 2.0)]
+
+    # More attempts do not mean more queries
+    for student in add_students(db_session, teacher, 20, start=300)[1]:
+        submit(db_session, student, course, lesson, step, {"fr": "Paris", "it": "Rome"})
+    assert errors(group_id=group.id)[0] == queries
+
+    # Fixing the answer key rescores the stored answers
+    content = json.loads(step.content_text)
+    content["questions"][1]["correct_answer"] = "Rome|Milan|Turin"
+    step.content_text = json.dumps(content)
+    db_session.commit()
+    _, result = errors(group_id=None)
+    assert [(q["question_id"], q["wrong_answers"]) for q in result["questions"]] == [("fr", 2.0)]
+    assert db_session.query(QuizAttempt).count() == 26
@@ -0,0 +1,136 @@
+import json
+import random
+
+import pytest
+
+from src.admin.routes.analytics import get_quiz_question_errors
+from src.schemas.models import Course, Lesson, Module, QuizAttempt, Step, UserInDB
+from src.services import quiz_content
+from src.services.quiz_answers import record_attempt_answers
+from src.services.quiz_content import compile_quiz, content_hash
+
+
+def legacy_error_score(step_content, question_id, user_answer):
+    """The per-answer check get_quiz_question_errors used to run"""
+    def norm_val(v):
+        if v is None:
+            return ""
+        s = "".join(str(v).strip().lower().replace(",", ".").split())
+        if s.startswith("[") and s.endswith("]") and "," not in s:
+            s = s[1:-1].strip()
+        return s
+
+    def to_float(s):
+        try:
+            if "/" in s:
+                parts = s.split("/")
+                if len(parts) == 2:
+                    return float(parts[0]) / float(parts[1])
+            return float(s)
+        except Exception:
+            return None
+
+    def check_match(u, a):
+        u_norm = norm_val(u)
+        options = [norm_val(o) for o in str(a).strip().lower().split("|")]
+        if u_norm in options:
+            return True
+        u_float = to_float(u_norm)
+        if u_float is not None:
+            for opt in options:
+                o_float = to_float(opt)
+                if o_float is not None and abs(u_float - o_float) < 0.0001:
+                    return True
+        return False
+
+    for q in step_content.get("questions", []):
+        if str(q.get("id")) != str(question_id):
+            continue
+        if q.get("question_type") == "long_text":
+            return None
+        correct = q.get("correct_answer")
+        if correct is None:
+            correct = q.get("correctAnswer")
+        if correct is None or (isinstance(correct, str) and not correct.strip()):
+            return None
+        if isinstance(correct, list):
+            if not correct or all(not norm_val(x) for x in correct):
+                return None
+            answers = user_answer if isinstance(user_answer, list) else [user_answer]
+            mismatches = sum(not check_match(answers[i] if i < len(answers) else "", correct[i]) for i in range(len(correct)))
+            mismatches += max(len(answers) - len(correct), 0)
+            return min(mismatches / len(correct), 1.0)
+        if isinstance(user_answer, list) and user_answer:
+            user_answer = user_answer[0]
+        return 0.0 if check_match(user_answer, correct) else 1.0
+    return None
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    quiz_content.clear_quiz_cache()
+
+
+def test_compiled_key_scores_like_the_old_check():
+    rng = random.Random(3)
+    values = ["1/16", "0,0625", " Paris ", "paris|Lyon", "[b]", "", None, 2, "2.0", "x / 0", "cat", "1e3", "1000"]
+    for _ in range(2000):
+        questions = []
+        for qid in range(1, 5):
+            correct = rng.choice([rng.choice(values), [rng.choice(values) for _ in range(rng.randrange(0, 4))]])
+            key = rng.choice(["correct_answer", "correctAnswer"])
+            questions.append({"id": qid, "question_type": rng.choice(["fill_blank", "short_answer", "long_text"]), key: correct})
+        content = {"questions": questions}
+        quiz = compile_quiz(json.dumps(content))
+        for qid in (1, "2", 3, 4, 9):
+            answer = rng.choice([rng.choice(values), [rng.choice(values) for _ in range(rng.randrange(0, 5))]])
+            assert quiz.error_score(qid, answer) == legacy_error_score(content, qid, answer), (content, qid, answer)
+
+
+def test_quiz_errors_are_scored_from_the_cached_key(db_session):
+    admin = UserInDB(email="admin@example.com", name="Admin", hashed_password="x", role="admin")
+    student = UserInDB(email="s@example.com", name="Student", hashed_password="x", role="student")
+    db_session.add_all([admin, student])
+    db_session.flush()
+    course = Course(title="Math", teacher_id=admin.id)
+    db_session.add(course)
+    db_session.flush()
+    module = Module(course_id=course.id, title="Fractions", order_index=1)
+    db_session.add(module)
+    db_session.flush()
+    lesson = Lesson(module_id=module.id, title="Halves", order_index=1)
+    db_session.add(lesson)
+    db_session.flush()
+    step = Step(lesson_id=lesson.id, title="Quiz", content_type="quiz", order_index=1, content_text=json.dumps({
+        "questions": [
+            {"id": "q1", "question_type": "short_answer", "question_text": "Half of 1/8?", "correct_answer": "1/16"},
+            {"id": "q2", "question_type": "fill_blank", "question_text": "Capitals", "correct_answer": ["Paris", "Rome|Roma"]},
+        ],
+    }))
+    db_session.add(step)
+    db_session.flush()
+    assert step.content_hash == content_hash(step.content_text)
+    for answers in ([["q1", "0,0625"], ["q2", ["paris", "roma"]]], {"q1": "1/8", "q2": ["Paris", "Milan"]}):
+        attempt = QuizAttempt(user_id=student.id, step_id=step.id, course_id=course.id, lesson_id=lesson.id,
+                              total_questions=2, correct_answers=0, score_percentage=0, answers=json.dumps(answers))
+        db_session.add(attempt)
+        db_session.flush()
+        record_attempt_answers(db_session, attempt, replace=False)
+    db_session.commit()
+
+    def errors():
+        result = get_quiz_question_errors(course.id, group_id=None, lesson_id=lesson.id, limit=500,
+                                          current_user=admin, db=db_session)
+        return {q["question_id"]: (q["total_attempts"], q["wrong_answers"], q["question_text"]) for q in result["questions"]}
+
+    assert errors() == {"q1": (2, 1.0, "Half of 1/8?"), "q2": (2, 0.5, "Capitals")}
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(quiz_content, "compile_quiz", lambda *a: pytest.fail("step compiled twice"))
+        assert errors()["q1"] == (2, 1.0, "Half of 1/8?")
+
+    # Editing the step changes its hash, so the new key is compiled and the answers rescored
+    step.content_text = step.content_text.replace('"1/16"', '"1/16|1/8"')
+    db_session.commit()
+    assert errors()["q1"] == (2, 0.0, "Half of 1/8?")
+    assert step.content_hash == content_hash(step.content_text)
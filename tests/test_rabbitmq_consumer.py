@@ -0,0 +1,147 @@
+import json
+
+import pika
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from src.schemas.models import UserInDB
+from src.services import rabbitmq_consumer
+from src.services.rabbitmq_consumer import Delivery, RabbitMQConsumer
+
+
+class FakeChannel:
+    def __init__(self):
+        self.acks = []
+        self.published = []  # (queue, body, headers)
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acks.append((delivery_tag, multiple))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((routing_key, body, properties.headers))
+
+
+@pytest.fixture
+def consumer(db_engine, monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(rabbitmq_consumer, "invalidate_principal", lambda **kw: invalidated.append(kw["email"]))
+    consumer = RabbitMQConsumer("amqp://local", "user_events", max_retries=2,
+                                session_factory=sessionmaker(bind=db_engine, autoflush=False))
+    consumer.invalidated = invalidated
+    return consumer
+
+
+def _user(email, **fields):
+    return {"email": email, "first_name": "Ann", "last_name": "Lee", "role": "student",
+            "allowed_services_json": '["lms"]', "password_hash": "hash", **fields}
+
+
+def _deliveries(*messages, start=1):
+    return [
+        Delivery(start + i, None, message if isinstance(message, bytes) else json.dumps(message).encode())
+        for i, message in enumerate(messages)
+    ]
+
+
+def test_batch_is_applied_in_one_transaction_and_acked_once(consumer, db_session, count_queries):
+    db_session.add(UserInDB(email="old@example.com", name="Old", hashed_password="x", role="student"))
+    db_session.commit()
+    channel = FakeChannel()
+    deliveries = _deliveries(
+        *({"event_type": "user.created", "version": 1, "user": _user(f"s{i}@example.com")} for i in range(20)),
+        {"event_type": "user.updated", "version": 2, "user": _user("s3@example.com", first_name="Renamed")},
+        {"event_type": "user.deleted", "version": 3, "user": _user("s3@example.com")},
+        {"event_type": "user.deleted", "version": 5, "user": _user("old@example.com")},
+        {"event_type": "user.updated", "version": 4, "user": _user("old@example.com", first_name="Stale")},
+        {"event_type": "user.created", "user": _user("nolms@example.com", allowed_services_json="[]")},
+    )
+
+    with count_queries() as counter:
+        stats = consumer.process_batch(channel, deliveries)
+
+    assert stats == {"received": 25, "applied": 23, "retried": 0, "dead_lettered": 0}
+    assert channel.acks == [(25, True)]
+    # One SELECT for all emails; the rest are the inserts of the new rows, one UPDATE
+    # and the bump of the changed user's principal cache generation
+    assert counter.count <= 3 + 20
+    users = {u.email: u for u in db_session.query(UserInDB)}
+    assert len(users) == 21
+    assert (users["s3@example.com"].name, users["s3@example.com"].is_active) == ("Renamed Lee", False)
+    assert (users["old@example.com"].name, users["old@example.com"].is_active) == ("Old", False)
+    assert users["old@example.com"].sync_version == 5
+    assert consumer.invalidated == ["old@example.com"]
+
+
+def test_redelivered_events_are_idempotent(consumer, db_session):
+    events = [
+        {"event_type": "user.created", "version": 1, "user": _user("a@example.com")},
+        {"event_type": "user.updated", "version": 2, "user": _user("a@example.com", first_name="New")},
+    ]
+    consumer.process_batch(FakeChannel(), _deliveries(*events))
+    db_session.query(UserInDB).filter(UserInDB.email == "a@example.com").update({UserInDB.name: "Edited"})
+    db_session.commit()
+
+    stats = consumer.process_batch(FakeChannel(), _deliveries(*reversed(events), start=3))
+
+    assert stats["applied"] == 0
+    user = db_session.query(UserInDB).one()
+    assert (user.name, user.sync_version) == ("Edited", 2)
+
+
+def test_poison_messages_are_retried_then_dead_lettered(consumer, db_session):
+    channel = FakeChannel()
+    broken = {"event_type": "user.created", "user": _user("broken@example.com", password_hash=None)}
+    stats = consumer.process_batch(channel, _deliveries(
+        b"{not json",
+        broken,
+        {"event_type": "user.created", "user": _user("ok@example.com")},
+    ))
+
+    # The failing transaction is replayed message by message so the good one still lands
+    assert stats == {"received": 3, "applied": 1, "retried": 1, "dead_lettered": 1}
+    assert [u.email for u in db_session.query(UserInDB)] == ["ok@example.com"]
+    assert channel.acks == [(3, True)]
+    (dead_queue, _, dead_headers), (retry_queue, retry_body, retry_headers) = channel.published
+    assert dead_queue == "lms_user_events.dead" and "invalid JSON" in dead_headers["x-dead-letter-reason"]
+    # Not back onto the main queue right away: parked until the delay queue's TTL expires
+    assert retry_queue == "lms_user_events.retry.5000" and retry_headers["x-retry-count"] == 1
+
+    # Redelivered with its retry count, each time with a longer delay, until max_retries is used up
+    queues = []
+    for attempt in (2, 3):
+        channel = FakeChannel()
+        properties = pika.BasicProperties(headers=retry_headers)
+        consumer.process_batch(channel, [Delivery(10 + attempt, properties, retry_body)])
+        [(queue, retry_body, retry_headers)] = channel.published
+        queues.append(queue)
+    assert queues == ["lms_user_events.retry.10000", "lms_user_events.dead"]
+    assert "gave up after 2 retries" in retry_headers["x-dead-letter-reason"]
+    assert consumer.stats["dead_lettered"] == 2
+
+
+def test_delay_queues_dead_letter_back_to_the_main_queue(consumer):
+    declared = {}
+
+    class DeclaringChannel(FakeChannel):
+        def exchange_declare(self, **kwargs):
+            pass
+
+        def queue_declare(self, queue, durable=False, arguments=None):
+            declared[queue] = arguments
+
+        def queue_bind(self, **kwargs):
+            pass
+
+    class Connection:
+        def channel(self):
+            return DeclaringChannel()
+
+    consumer.connection_factory = Connection
+    consumer.connect()
+
+    assert declared["lms_user_events"] is None and declared["lms_user_events.dead"] is None
+    assert declared["lms_user_events.retry.5000"] == {
+        "x-message-ttl": 5000, "x-dead-letter-exchange": "", "x-dead-letter-routing-key": "lms_user_events",
+    }
+    assert declared["lms_user_events.retry.10000"]["x-message-ttl"] == 10000
+    assert len(declared) == 4
@@ -0,0 +1,90 @@
+import calendar
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from src.events.schemas import EventSchema
+from src.schemas.models import Event, EventGroup, Group, UserInDB
+from src.services import recurrence
+from src.services.event_service import EventService
+from src.services.recurrence import occurrence_starts
+
+
+def stepped_starts(first_start, pattern, window_start, window_end, until=None):
+    """The day-by-day walk expansion used to do"""
+    starts = []
+    current = first_start
+    while current <= window_end:
+        if current >= window_start:
+            starts.append(current)
+        if pattern in ("daily", "weekly", "biweekly"):
+            current += {"daily": timedelta(days=1), "weekly": timedelta(weeks=1), "biweekly": timedelta(weeks=2)}[pattern]
+        elif pattern == "monthly":
+            year = current.year + (current.month // 12)
+            month = (current.month % 12) + 1
+            day = min(first_start.day, calendar.monthrange(year, month)[1])
+            current = current.replace(year=year, month=month, day=day)
+        else:
+            break
+        if until and current.date() > until:
+            break
+    return tuple(starts)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    recurrence.clear_occurrence_cache()
+
+
+def test_fast_forward_matches_stepping():
+    rng = random.Random(7)
+    for _ in range(3000):
+        first = datetime(2024, 1, 1, 9, 30) + timedelta(days=rng.randrange(800), minutes=rng.randrange(1440))
+        if rng.random() < 0.3:
+            first = first.replace(day=min(rng.choice([29, 30, 31]), calendar.monthrange(first.year, first.month)[1]))
+        pattern = rng.choice(["daily", "weekly", "biweekly", "monthly", "yearly", None])
+        window_start = datetime(2024, 1, 1) + timedelta(days=rng.randrange(1000), hours=rng.randrange(24))
+        window_end = window_start + timedelta(days=rng.choice([1, 7, 31, 90, 365]))
+        until = rng.choice([None, (first + timedelta(days=rng.randrange(-30, 600))).date()])
+        assert occurrence_starts(first, pattern, window_start, window_end, until) == \
+            stepped_starts(first, pattern, window_start, window_end, until), (first, pattern, window_start, until)
+
+
+def test_monthly_clamps_to_month_end():
+    starts = occurrence_starts(datetime(2023, 1, 31, 10), "monthly", datetime(2024, 1, 15), datetime(2024, 5, 1))
+    assert [s.date() for s in starts] == [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+
+
+def test_expansion_serializes_occurrences_without_touching_parents(db_session):
+    teacher = UserInDB(email="t@example.com", name="Teacher", hashed_password="x", role="teacher")
+    db_session.add(teacher)
+    db_session.flush()
+    group = Group(name="A1", teacher_id=teacher.id)
+    db_session.add(group)
+    db_session.flush()
+    parent = Event(title="Speaking club", event_type="webinar", start_datetime=datetime(2025, 1, 6, 14),
+                   end_datetime=datetime(2025, 1, 6, 15, 30), created_by=teacher.id, is_recurring=True,
+                   recurrence_pattern="weekly", is_active=True)
+    parent.event_groups.append(EventGroup(group_id=group.id))
+    db_session.add(parent)
+    db_session.commit()
+
+    instances = EventService.expand_recurring_events(db_session, datetime(2026, 3, 1), datetime(2026, 3, 31, 23, 59),
+                                                     group_ids=[group.id])
+
+    assert [e.start_datetime.day for e in instances] == [2, 9, 16, 23, 30]
+    assert [e._instance_number for e in instances] == [1, 2, 3, 4, 5]
+    assert instances[0]._group_ids == [group.id]
+    assert len(parent.event_groups) == 1 and parent.event_groups[0].event is parent
+    data = EventSchema.from_orm(instances[1])
+    assert (data.title, data.is_recurring, data.teacher_id) == ("Speaking club", True, None)
+    assert data.end_datetime - data.start_datetime == timedelta(hours=1, minutes=30)
+    assert data.id == recurrence.pseudo_event_id(parent.id, datetime(2026, 3, 9, 14))
+
+    # The same window is served from the memo
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(recurrence, "occurrence_starts", lambda *a, **kw: pytest.fail("not memoized"))
+        again = EventService.expand_recurring_events(db_session, datetime(2026, 3, 1), datetime(2026, 3, 31, 23, 59),
+                                                     parent_events=[parent])
+    assert [e.id for e in again] == [e.id for e in instances]
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.services import http_client, sat_service
+from src.services.sat_service import SATAPIError, SATService
+
+
+class StubSATServer:
+    """Local stand-in for the SAT platform that records every request."""
+
+    def __init__(self):
+        self.calls = []
+        self.known = {}  # email -> data
+        self.batch_omits = set()  # emails the batch endpoints silently drop
+        self.batch_status = 200
+        self.single_status = {}  # email -> status for per-email endpoints
+        self.latest_errors = set()  # emails whose latest-test-details reports an error
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _track(self):
+                with stub._lock:
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                time.sleep(stub.delay)
+                with stub._lock:
+                    stub.in_flight -= 1
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.calls.append(("POST", self.path, len(body["emails"])))
+                self._track()
+                if stub.batch_status != 200:
+                    return self._send(stub.batch_status, {"error": "down"})
+                results = [
+                    {"email": email.upper(), "data": stub.known.get(email)}
+                    for email in body["emails"] if email not in stub.batch_omits
+                ]
+                self._send(200, {"results": results})
+
+            def do_GET(self):
+                stub.calls.append(("GET", self.path, 1))
+                self._track()
+                email = self.path.split("/")[2]
+                if self.path.endswith("/latest-test-details") and email in stub.latest_errors:
+                    return self._send(200, {"error": "no latest test"})
+                status = stub.single_status.get(email, 200 if email in stub.known else 404)
+                self._send(status, stub.known.get(email) or {"error": "not found"})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def count(self, method, suffix=""):
+        return len([c for c in self.calls if c[0] == method and c[1].endswith(suffix)])
+
+
+@pytest.fixture(autouse=True)
+def fresh_integrations(monkeypatch):
+    # Failures here must not trip the process-wide MasterEd circuit breaker
+    monkeypatch.setattr(http_client, "_integrations", {})
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubSATServer()
+    server.thread.start()
+    monkeypatch.setattr(sat_service, "SAT_API_BASE_URL", server.url)
+    sat_service.clear_cache()
+    yield server
+    server.server.shutdown()
+    sat_service.clear_cache()
+
+
+def run(coro):
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await http_client.close_integrations()
+    return asyncio.run(wrapper())
+
+
+def _pair(score):
+    return {"testPairs": [{"mathTest": {"score": score}, "verbalTest": None, "combinedScore": score}]}
+
+
+def test_batch_first_then_served_from_cache(stub):
+    emails = [f"s{i}@example.com" for i in range(300)]
+    stub.known = {e: {"combinedScore": 1200} for e in emails}
+
+    async def scenario():
+        first = await SATService.fetch_batch_latest_test_details([e.upper() for e in emails])
+        second = await SATService.fetch_batch_latest_test_details(emails)
+        return first, second
+
+    first, second = run(scenario())
+
+    assert len(first["results"]) == 300
+    assert first["results"][0] == {"email": "s0@example.com", "data": {"combinedScore": 1200}}
+    assert second == first
+    assert stub.count("POST") == 3
+    assert stub.count("GET") == 0
+
+
+def test_per_email_fallback_only_for_emails_the_batch_missed(stub):
+    stub.known = {"a@example.com": {"combinedScore": 1000}, "b@example.com": {"combinedScore": 1100}}
+    stub.batch_omits = {"b@example.com"}
+    # latest-test-details fails for c, so its history is used instead
+    stub.known["c@example.com"] = _pair(900)
+    stub.batch_omits.add("c@example.com")
+    stub.latest_errors.add("c@example.com")
+
+    async def scenario():
+        emails = ["a@example.com", "b@example.com", "c@example.com", "d@example.com"]
+        first = await SATService.fetch_batch_latest_test_details(emails)
+        await SATService.fetch_batch_latest_test_details(emails)
+        return first
+
+    result = run(scenario())
+
+    by_email = {r["email"]: r["data"] for r in result["results"]}
+    assert by_email["a@example.com"] == {"combinedScore": 1000}
+    assert by_email["b@example.com"] == {"combinedScore": 1100}
+    assert by_email["c@example.com"] == {"mathTest": {"score": 900}, "verbalTest": None, "combinedScore": 900}
+    assert "d@example.com" not in by_email
+    assert stub.count("POST") == 1
+    # b, c and d fall back individually once; d's empty answer is cached too
+    assert stub.count("GET", "/latest-test-details") == 3
+    assert stub.count("GET", "/test-results") == 2
+    assert len(stub.calls) == 6
+
+
+def test_failed_batch_chunk_falls_back_and_single_lookup_errors(stub):
+    stub.known = {"a@example.com": _pair(1300)}
+    stub.batch_status = 500
+    stub.single_status["broken@example.com"] = 500
+
+    async def scenario():
+        batch = await SATService.fetch_batch_test_results(["a@example.com", "none@example.com"])
+        single = await SATService.fetch_student_test_results("A@example.com")
+        missing = await SATService.fetch_student_test_results("nobody@example.com")
+        with pytest.raises(SATAPIError):
+            await SATService.fetch_student_test_results("broken@example.com")
+        return batch, single, missing
+
+    batch, single, missing = run(scenario())
+
+    assert batch == {"results": [{"email": "a@example.com", "data": _pair(1300)}]}
+    assert single == _pair(1300)
+    assert missing is None
+    # The single lookup for a@ was served from the cache filled by the fallback
+    assert stub.count("GET", "/a@example.com/test-results") == 1
+
+
+def test_concurrency_is_capped(stub, monkeypatch):
+    monkeypatch.setattr(sat_service, "SAT_API_MAX_CONCURRENCY", 2)
+    stub.batch_status = 500
+    stub.delay = 0.05
+    emails = [f"s{i}@example.com" for i in range(8)]
+    stub.known = {e: _pair(1000) for e in emails}
+
+    result = run(SATService.fetch_batch_test_results(emails))
+
+    assert len(result["results"]) == 8
+    assert stub.max_in_flight <= 2
+
+
+def test_calls_go_through_the_mastered_integration(stub):
+    stub.known = {"a@example.com": _pair(1100)}
+    stub.batch_status = 503
+
+    async def scenario():
+        await SATService.fetch_batch_test_results(["a@example.com"])
+        # Metrics are read before run() closes the integrations
+        return http_client.integration_metrics()["mastered"]
+
+    metrics = run(scenario())
+
+    # The batch POST is a read, so the integration retried the 503s
+    assert stub.count("POST") == http_client.HTTP_CLIENT_RETRIES + 1
+    assert metrics["requests"] == stub.count("POST") + stub.count("GET")
+    assert metrics["retries"] == http_client.HTTP_CLIENT_RETRIES
@@ -0,0 +1,124 @@
+import asyncio
+import os
+
+import socketio
+
+from src.services.socketio_manager import AsyncPostgresManager, PayloadDecoder, encode_payloads
+
+
+class FakeNotifyBus:
+    """In-process stand-in for Postgres LISTEN/NOTIFY"""
+
+    def __init__(self):
+        self.listeners = []
+        self.notify_count = 0
+
+    def connection(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, bus):
+        self.bus = bus
+        self.pending = None
+
+    def is_closed(self):
+        return False
+
+    async def close(self):
+        self.bus.listeners = [l for l in self.bus.listeners if l[0] is not self]
+
+    async def add_listener(self, channel, callback):
+        self.bus.listeners.append((self, channel, callback))
+
+    def add_termination_listener(self, callback):
+        pass
+
+    def transaction(self):
+        conn = self
+
+        class Transaction:
+            async def __aenter__(self):
+                conn.pending = []
+
+            async def __aexit__(self, exc_type, *args):
+                # NOTIFY is delivered on commit, in order
+                pending, conn.pending = conn.pending, None
+                if exc_type is None:
+                    for channel, payload in pending:
+                        conn.bus.notify_count += 1
+                        for _, listen_channel, callback in conn.bus.listeners:
+                            if listen_channel == channel:
+                                callback(None, 1, channel, payload)
+
+        return Transaction()
+
+    async def execute(self, query, channel, payload):
+        assert query == "SELECT pg_notify($1, $2)"
+        assert len(payload.encode()) < 8000
+        self.pending.append((channel, payload))
+
+
+class FakeBusManager(AsyncPostgresManager):
+    def __init__(self, bus):
+        self.bus = bus
+        super().__init__("postgresql://user:secret@db/lms")
+
+    async def _connect(self):
+        return self.bus.connection()
+
+
+def test_payloads_fit_notify_limit_and_round_trip():
+    small = {"method": "emit", "event": "unread:update", "data": None, "room": "user:1"}
+    assert len(encode_payloads(small)) == 1
+    assert PayloadDecoder().feed(encode_payloads(small)[0]) == small
+
+    repetitive = {"method": "emit", "event": "message:new", "data": {"content": "a" * 20000}}
+    assert len(encode_payloads(repetitive)) == 1
+    assert PayloadDecoder().feed(encode_payloads(repetitive)[0]) == repetitive
+
+    random_text = os.urandom(30000).hex()
+    large = {"method": "emit", "event": "message:new", "data": {"content": random_text}}
+    payloads = encode_payloads(large)
+    assert len(payloads) > 1
+    assert all(len(p.encode()) <= 7900 for p in payloads)
+
+    decoder = PayloadDecoder()
+    assert [decoder.feed(p) for p in payloads[:-1]] == [None] * (len(payloads) - 1)
+    assert decoder.feed(payloads[-1]) == large
+
+
+def test_room_emit_reaches_socket_on_another_worker():
+    bus = FakeNotifyBus()
+
+    async def scenario():
+        worker_a = socketio.AsyncServer(async_mode="asgi", client_manager=FakeBusManager(bus))
+        worker_b = socketio.AsyncServer(async_mode="asgi", client_manager=FakeBusManager(bus))
+        delivered = []
+
+        async def send_b(eio_sid, pkt):
+            delivered.append((eio_sid, pkt.data))
+
+        worker_b._send_eio_packet = send_b
+        worker_b.manager.initialize()
+        sid = await worker_b.manager.connect("eio-1", "/")
+        await worker_b.manager.enter_room(sid, "/", "user:7")
+        await asyncio.sleep(0.01)  # listener connects
+
+        content = os.urandom(10000).hex()  # needs several NOTIFY chunks
+        await worker_a.emit("message:new", {"content": content}, to="user:7")
+        await worker_a.emit("unread:update", to="user:8")
+        for _ in range(50):
+            if delivered:
+                break
+            await asyncio.sleep(0.01)
+        worker_b.manager.thread.cancel()
+        return delivered
+
+    delivered = asyncio.run(scenario())
+
+    assert len(delivered) == 1
+    eio_sid, data = delivered[0]
+    assert eio_sid == "eio-1"
+    assert "message:new" in data
+    assert bus.notify_count > 2
@@ -0,0 +1,139 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from src.progress.routes.progress import record_step_visit
+from src.schemas.models import (
+    Course, CourseGroupAccess, Group, GroupStudent, Lesson, Module, ProgressSnapshot, Step,
+    StepProgress, StepProgressCreateSchema, StudentCourseSummary, StudentProgress, UserInDB,
+)
+from src.services import step_visit_aggregator
+from src.services.step_visit_aggregator import StepVisitAggregator
+
+
+@pytest.fixture
+def aggregator(db_engine, monkeypatch):
+    instance = StepVisitAggregator(session_factory=sessionmaker(bind=db_engine, autoflush=False))
+    monkeypatch.setattr(step_visit_aggregator, "_aggregator", instance)
+    return instance
+
+
+@pytest.fixture
+def student_course(db_session):
+    """A student whose group has access to a course with two steps, one already started."""
+    teacher = UserInDB(email="teacher@example.com", name="Teacher", hashed_password="x", role="teacher")
+    student = UserInDB(email="student@example.com", name="Student", hashed_password="x", role="student",
+                       daily_streak=3, last_activity_date=date.today() - timedelta(days=1))
+    db_session.add_all([teacher, student])
+    db_session.flush()
+    course = Course(title="Course", teacher_id=teacher.id, is_active=True)
+    group = Group(name="Group", teacher_id=teacher.id, is_active=True)
+    db_session.add_all([course, group])
+    db_session.flush()
+    db_session.add(GroupStudent(group_id=group.id, student_id=student.id))
+    db_session.add(CourseGroupAccess(course_id=course.id, group_id=group.id, granted_by=teacher.id, is_active=True))
+    module = Module(course_id=course.id, title="Module", order_index=0)
+    db_session.add(module)
+    db_session.flush()
+    lesson = Lesson(module_id=module.id, title="Lesson", order_index=0)
+    db_session.add(lesson)
+    db_session.flush()
+    steps = [Step(lesson_id=lesson.id, title=f"Step {i}", order_index=i) for i in range(2)]
+    db_session.add_all(steps)
+    db_session.flush()
+    db_session.add(StepProgress(user_id=student.id, course_id=course.id, lesson_id=lesson.id,
+                                step_id=steps[1].id, status="in_progress", time_spent_minutes=2))
+    db_session.commit()
+    return student, course, steps
+
+
+def test_step_visit_writes_only_step_progress(db_session, db_engine, aggregator, student_course):
+    student, course, steps = student_course
+    visit = StepProgressCreateSchema(step_id=steps[0].id, time_spent_minutes=4)
+    record_step_visit(db_session, student, steps[0].id, visit)  # warms the access index
+
+    written = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            written.append(statement.split("(")[0].strip())
+
+    event.listen(db_engine, "before_cursor_execute", capture)
+    try:
+        progress = record_step_visit(db_session, student, steps[1].id, StepProgressCreateSchema(
+            step_id=steps[1].id, time_spent_minutes=3
+        ))
+        record_step_visit(db_session, student, steps[0].id, visit)
+    finally:
+        event.remove(db_engine, "before_cursor_execute", capture)
+
+    assert progress.status == "completed"
+    assert progress.time_spent_minutes == 5
+    assert progress.started_at is not None
+    assert written and all("step_progress" in statement for statement in written), written
+    assert db_session.query(StudentCourseSummary).count() == 0
+    assert aggregator.pending_count() == 1
+
+
+def test_flush_applies_visits_once_per_user_and_course(db_session, aggregator, student_course):
+    student, course, steps = student_course
+    student_id = student.id
+    for step, minutes in ((steps[0], 4), (steps[1], 3), (steps[0], 1)):
+        record_step_visit(db_session, student, step.id, StepProgressCreateSchema(
+            step_id=step.id, time_spent_minutes=minutes
+        ))
+
+    assert aggregator.flush() == 1
+    assert aggregator.flush() == 0
+
+    db_session.expire_all()
+    summary = db_session.query(StudentCourseSummary).filter_by(user_id=student_id).one()
+    # Re-visiting a completed step adds time but does not count it again
+    assert summary.completed_steps == 2
+    assert summary.total_time_spent_minutes == 8
+    assert summary.completion_percentage == 100
+
+    user = db_session.get(UserInDB, student_id)
+    assert user.total_study_time_minutes == 8
+    assert user.daily_streak == 4
+    assert user.last_activity_date == date.today()
+
+    legacy = db_session.query(StudentProgress).filter_by(user_id=student_id, course_id=course.id).one()
+    assert legacy.completion_percentage == 100
+    assert legacy.time_spent_minutes == 10
+    assert db_session.query(ProgressSnapshot).filter_by(user_id=student_id).count() == 1
+
+
+def test_failed_visits_are_retried_then_dropped(db_session, aggregator, student_course, monkeypatch):
+    student, course, steps = student_course
+    student_id = student.id
+    record_step_visit(db_session, student, steps[0].id, StepProgressCreateSchema(step_id=steps[0].id, time_spent_minutes=4))
+
+    apply = aggregator._apply
+    failures = {"left": 1}
+
+    def flaky_apply(*args):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("database restarting")
+        return apply(*args)
+
+    monkeypatch.setattr(aggregator, "_apply", flaky_apply)
+    assert aggregator.flush() == 0
+    assert aggregator.pending_count() == 1
+
+    # Visits arriving before the retry are merged with the failed ones
+    record_step_visit(db_session, student, steps[1].id, StepProgressCreateSchema(step_id=steps[1].id, time_spent_minutes=3))
+    assert aggregator.flush() == 1
+    db_session.expire_all()
+    summary = db_session.query(StudentCourseSummary).filter_by(user_id=student_id).one()
+    assert (summary.completed_steps, summary.total_time_spent_minutes) == (2, 7)
+    assert db_session.get(UserInDB, student_id).total_study_time_minutes == 7
+
+    monkeypatch.setattr(step_visit_aggregator, "STEP_VISIT_MAX_ATTEMPTS", 2)
+    failures["left"] = 2
+    aggregator.emit(student_id, course.id, steps[1].lesson_id, "Lesson", time_spent_minutes=1)
+    assert aggregator.flush() == 0 and aggregator.pending_count() == 1
+    assert aggregator.flush() == 0 and aggregator.pending_count() == 0
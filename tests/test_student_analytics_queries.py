@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.schemas.models import (
+    Assignment, AssignmentSubmission, Course, Group, GroupStudent, Lesson,
+    Module, Step, StepProgress, UserInDB,
+)
+from src.services.student_analytics_service import build_students_analytics
+
+
+@pytest.fixture
+def seed_cohort(db_session):
+    """Seed N students x M courses, each course with 2 lessons x 3 steps and one assignment."""
+
+    def seed(n_students, n_courses, prefix="a"):
+        teacher = UserInDB(email=f"{prefix}-teacher@example.com", name="Teacher", hashed_password="x", role="teacher")
+        db_session.add(teacher)
+        db_session.flush()
+        group = Group(name="Cohort", teacher_id=teacher.id)
+        db_session.add(group)
+
+        courses = []
+        for c in range(n_courses):
+            course = Course(title=f"Course {c}", teacher_id=teacher.id, is_active=True)
+            db_session.add(course)
+            db_session.flush()
+            module = Module(course_id=course.id, title="Module", order_index=0)
+            db_session.add(module)
+            db_session.flush()
+            lessons = []
+            for l in range(2):
+                lesson = Lesson(module_id=module.id, title=f"Lesson {c}.{l}", order_index=l)
+                db_session.add(lesson)
+                db_session.flush()
+                steps = [Step(lesson_id=lesson.id, title=f"Step {s}", order_index=s) for s in range(3)]
+                db_session.add_all(steps)
+                lessons.append((lesson, steps))
+            assignment = Assignment(
+                lesson_id=lessons[0][0].id, title="HW", assignment_type="text", content="{}", max_score=10
+            )
+            db_session.add(assignment)
+            db_session.flush()
+            courses.append((course, lessons, assignment))
+
+        base = datetime(2025, 1, 1)
+        for i in range(n_students):
+            student = UserInDB(email=f"{prefix}-s{i}@example.com", name=f"Student {i}", hashed_password="x", role="student")
+            db_session.add(student)
+            db_session.flush()
+            db_session.add(GroupStudent(group_id=group.id, student_id=student.id))
+            for c, (course, lessons, assignment) in enumerate(courses):
+                lesson, steps = lessons[0]
+                for s, step in enumerate(steps[:2]):
+                    db_session.add(StepProgress(
+                        user_id=student.id, course_id=course.id, lesson_id=lesson.id, step_id=step.id,
+                        status="completed", visited_at=base + timedelta(minutes=c * 10 + s),
+                    ))
+                db_session.add(AssignmentSubmission(
+                    assignment_id=assignment.id, user_id=student.id, answers="{}",
+                    score=7, max_score=10, is_graded=True,
+                ))
+        db_session.commit()
+
+    return seed
+
+
+def _students_query(db_session):
+    return db_session.query(UserInDB).filter(UserInDB.role == "student", UserInDB.is_active == True)
+
+
+def test_students_analytics_values(db_session, seed_cohort):
+    seed_cohort(n_students=2, n_courses=2)
+
+    rows = build_students_analytics(db_session, _students_query(db_session))
+
+    assert len(rows) == 2
+    row = rows[0]
+    assert row["groups"][0]["name"] == "Cohort"
+    assert row["active_courses_count"] == 2
+    assert row["total_steps"] == 12
+    assert row["completed_steps"] == 4
+    assert row["completion_percentage"] == 33.3
+    assert row["total_assignments"] == 2
+    assert row["completed_assignments"] == 2
+    assert row["assignment_score_percentage"] == 70.0
+    assert row["last_lesson"] == {
+        "lesson_title": "Lesson 1.0",
+        "lesson_progress_percentage": 66.7,
+        "completed_steps": 2,
+        "total_steps": 3,
+    }
+
+
+def test_students_analytics_query_count_is_constant(db_session, seed_cohort, count_queries):
+    seed_cohort(n_students=5, n_courses=3)
+    with count_queries() as small:
+        assert len(build_students_analytics(db_session, _students_query(db_session))) == 5
+
+    seed_cohort(n_students=60, n_courses=3, prefix="b")
+
+    with count_queries() as large:
+        assert len(build_students_analytics(db_session, _students_query(db_session))) == 65
+
+    assert large.count == small.count